@@ -0,0 +1,382 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Códigos de erro do boto3 que indicam limite de concorrência/taxa do endpoint
+THROTTLE_CODES = frozenset({"ThrottlingException", "Throttling", "ThrottledException",
+                            "TooManyRequestsException", "RequestLimitExceeded"})
+
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MAX_LIMIT = 64
+DEFAULT_RATE = 10.0
+DEFAULT_MAX_RATE = 200.0
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 0.1
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+# Reduções dentro deste intervalo contam como um único evento (a mesma "onda" de
+# requisições em voo costuma receber vários throttles de uma vez)
+DEFAULT_DECREASE_COOLDOWN = 0.5
+# Contadores acumulados de AdaptiveClient.metrics(); os demais valores são medidas do momento
+COUNTERS = ("requests", "successes", "throttles", "retries", "failures", "rejected")
+
+
+class CircuitOpenError(RuntimeError):
+    """Chamada recusada sem ir ao endpoint: o circuit breaker está aberto."""
+
+
+def is_throttle(exc: BaseException) -> bool:
+    """
+    True para ClientError de throttling (pelo código ou HTTP 429).
+    """
+    response = getattr(exc, "response", None)
+    if not isinstance(response, dict):
+        return False
+    code = response.get("Error", {}).get("Code", "")
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in THROTTLE_CODES or status == 429
+
+
+def is_server_error(exc: BaseException) -> bool:
+    """
+    Falhas que contam para o circuit breaker: HTTP 5xx ou erros sem resposta
+    (timeout, conexão). Erros 4xx do chamador (ex.: ValidationError) não contam.
+    """
+    response = getattr(exc, "response", None)
+    if not isinstance(response, dict):
+        return True
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+    return status >= 500
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """
+    Full jitter: uniforme entre 0 e min(cap, base * 2^attempt).
+    """
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AIMDLimiter:
+    """
+    Limite de requisições em voo com aumento aditivo e redução multiplicativa:
+    cada sucesso soma increase / limite (≈ +increase por janela completa) e cada
+    throttle multiplica o limite por `decrease`.
+    """
+
+    def __init__(self, initial: float = DEFAULT_INITIAL_LIMIT, min_limit: float = 1,
+                 max_limit: float = DEFAULT_MAX_LIMIT, increase: float = 1.0, decrease: float = 0.5,
+                 cooldown: float = DEFAULT_DECREASE_COOLDOWN, clock: Callable[[], float] = time.monotonic):
+        if not 1 <= min_limit <= initial <= max_limit:
+            raise ValueError("Limites inválidos: exige 1 <= min_limit <= initial <= max_limit.")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease deve estar entre 0 e 1.")
+        self.limit = float(initial)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.clock = clock
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._last_decrease = None
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            grew = int(self.limit + self.increase / self.limit) > int(self.limit)
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            if grew:
+                self._cond.notify_all()
+
+    def on_throttle(self) -> bool:
+        """Reduz o limite; retorna False se a redução foi absorvida pelo cooldown."""
+        with self._cond:
+            now = self.clock()
+            if self._last_decrease is not None and now - self._last_decrease < self.cooldown:
+                return False
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            return True
+
+
+class TokenBucket:
+    """
+    Balde de tokens com taxa ajustável (AIMD, como o limite de concorrência):
+    `acquire` bloqueia até haver um token.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: Optional[float] = None, min_rate: float = 0.5,
+                 max_rate: float = DEFAULT_MAX_RATE, increase: float = 1.0, decrease: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if not 0 < min_rate <= rate <= max_rate:
+            raise ValueError("Taxas inválidas: exige 0 < min_rate <= rate <= max_rate.")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1 - 1e-9:  # Tolera o arredondamento de (1 - tokens) / rate
+                    self.tokens = max(self.tokens - 1, 0.0)
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 1.0)  # Sem rajada logo após o throttle
+
+
+class CircuitBreaker:
+    """
+    closed -> open após `failure_threshold` falhas seguidas; depois de `reset_timeout`
+    segundos passa a half_open e deixa uma única chamada de teste passar: sucesso
+    fecha o circuito, falha o reabre. Se a chamada de teste desistir antes de chegar ao
+    endpoint, release_probe() libera a vaga para a próxima.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        """
+        Levanta CircuitOpenError se a chamada não pode passar; retorna True se ela é a
+        chamada de teste do half_open.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+        raise CircuitOpenError(f"Circuit breaker aberto após {self.failures} falhas seguidas.")
+
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.times_opened += 1
+                self.opened_at = self.clock()
+                self._probing = False
+                logger.warning(f"Circuit breaker aberto ({self.failures} falhas seguidas)")
+
+
+class AdaptiveClient:
+    """
+    Envolve um cliente boto3 `sagemaker-runtime`: `invoke_endpoint` passa pelo circuit
+    breaker, pelo balde de tokens e pelo limite AIMD de concorrência; ThrottlingException
+    reduz limite e taxa e é repetida com backoff exponencial com jitter (fora do slot de
+    concorrência). Sucessos aumentam ambos aos poucos, então o cliente converge para a
+    taxa sustentável do endpoint. Demais atributos são repassados ao cliente original.
+
+    Uma mesma instância deve ser compartilhada por todas as threads que chamam o
+    endpoint (ver `shared`).
+    """
+
+    def __init__(self, client, limiter: Optional[AIMDLimiter] = None, bucket: Optional[TokenBucket] = None,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY,
+                 acquire_timeout: Optional[float] = None, sleep: Callable[[float], None] = time.sleep,
+                 rng: random.Random = random):
+        self.client = client
+        self.limiter = limiter or AIMDLimiter()
+        self.bucket = bucket or TokenBucket(sleep=sleep)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self.sleep = sleep
+        self.rng = rng
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def invoke_endpoint(self, **kwargs):
+        self._count("requests")
+        try:
+            probe = self.breaker.allow()  # Só na primeira tentativa: os retries pertencem à mesma chamada
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        try:
+            return self._invoke_with_retries(kwargs)
+        finally:
+            if probe:
+                # Sem resposta do endpoint (ex.: timeout do slot), o half_open continua aceitando um teste;
+                # após record_success/record_failure a vaga já foi liberada e isto não muda nada
+                self.breaker.release_probe()
+
+    def _invoke_with_retries(self, kwargs: dict):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            if not self.limiter.acquire(self.acquire_timeout):
+                self._count("rejected")
+                raise TimeoutError(f"Sem slot de concorrência em {self.acquire_timeout} s "
+                                   f"(limite atual {int(self.limiter.limit)}).")
+            error = None
+            try:
+                response = self.client.invoke_endpoint(**kwargs)
+            except Exception as exc:
+                if not is_throttle(exc):
+                    self._count("failures")
+                    if is_server_error(exc):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()  # 4xx: o endpoint respondeu
+                    raise
+                error = exc
+            finally:
+                self.limiter.release()
+
+            if error is None:
+                self.limiter.on_success()
+                self.bucket.on_success()
+                self.breaker.record_success()
+                self._count("successes")
+                return response
+
+            self._count("throttles")
+            if self.limiter.on_throttle():
+                self.bucket.on_throttle()
+                logger.info(f"Throttling: limite reduzido para {int(self.limiter.limit)} em voo, "
+                            f"{self.bucket.rate:.1f} req/s")
+            if attempt == self.max_retries:
+                self._count("failures")
+                self.breaker.record_failure()
+                raise error
+            self._count("retries")
+            self.sleep(backoff_delay(attempt, self.base_delay, self.max_delay, self.rng))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {"concurrency_limit": int(self.limiter.limit), "in_flight": self.limiter.in_flight,
+                "peak_in_flight": self.limiter.peak_in_flight, "rate_limit": round(self.bucket.rate, 2),
+                "circuit_state": self.breaker.state, **counters}
+
+
+def emf_record(metrics: dict, namespace: str = "CBIS/Inference",
+               dimensions: Optional[Dict[str, str]] = None, units: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Métricas numéricas em CloudWatch Embedded Metric Format: basta imprimir o JSON
+    no log da Lambda para virarem métricas, sem chamadas à API do CloudWatch.
+    `units` mapeia métrica -> unidade do CloudWatch (padrão: Count). Uma lista de
+    números publica vários valores da métrica no mesmo registro; listas vazias ficam de fora.
+    """
+    dimensions = dimensions or {}
+    units = units or {}
+
+    def numeric(v):
+        return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+    values = {k: v for k, v in metrics.items()
+              if numeric(v) or (isinstance(v, list) and v and all(numeric(x) for x in v))}
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [sorted(dimensions)],
+                "Metrics": [{"Name": name, "Unit": units.get(name, "Count")} for name in sorted(values)],
+            }],
+        },
+        **dimensions,
+        **values,
+    }
+
+
+def metric_deltas(before: dict, after: dict, counters: Iterable[str]) -> dict:
+    """
+    `after` com cada contador trocado pelo quanto cresceu desde `before`. Contadores
+    do processo emitidos a cada invocação repetiriam todo o histórico do container
+    warm; a diferença é o que a invocação fez, e o CloudWatch soma.
+    """
+    return {**after, **{name: after[name] - before.get(name, 0) for name in counters}}
+
+
+_shared: Dict[int, AdaptiveClient] = {}
+_shared_lock = threading.Lock()
+
+
+def shared(client, **kwargs) -> AdaptiveClient:
+    """
+    Wrapper único por cliente boto3 (criado na primeira chamada com `kwargs`), para que
+    todos os chamadores do processo dividam o mesmo limite e o mesmo circuit breaker.
+    """
+    with _shared_lock:
+        wrapper = _shared.get(id(client))
+        if wrapper is None or wrapper.client is not client:
+            wrapper = _shared[id(client)] = AdaptiveClient(client, **kwargs)
+        return wrapper
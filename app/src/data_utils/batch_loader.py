@@ -0,0 +1,306 @@
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import commons, grayscale
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_IMAGE_SIZE = (224, 224)
+DEFAULT_PREFETCH = 4
+# Tempo máximo esperando um worker antes de verificar se algum processo morreu
+POLL_SECONDS = 1.0
+
+
+@dataclass
+class Batch:
+    """
+    Lote de formato fixo. `images` (N x H x W x C, uint8) é uma view da memória
+    compartilhada: vale até o próximo lote ser pedido (use .copy() para guardar).
+    `failed` lista as posições cujas imagens não puderam ser lidas (preenchidas com zero).
+    """
+    images: np.ndarray
+    labels: np.ndarray
+    indices: np.ndarray
+    failed: List[int]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Abre o bloco criado pelo processo principal sem registrá-lo no resource_tracker
+    (senão o worker o removeria, ou avisaria de vazamento, ao terminar).
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def load_resized(path: str, height: int, width: int) -> np.ndarray:
+    """
+    Decodifica em um canal e redimensiona para height x width (INTER_AREA ao reduzir).
+    """
+    import cv2
+
+    with open(path, "rb") as f:
+        gray = grayscale.decode_image(f.read(), channels=1)
+    if gray.shape != (height, width):
+        shrinking = gray.shape[0] > height or gray.shape[1] > width
+        gray = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+    return gray
+
+
+def _worker(shm_name: str, ring_shape: Tuple[int, ...], tasks, done):
+    """
+    Processo worker: decodifica cada imagem direto no slot do anel (sem pickle dos pixels)
+    e avisa quando o pedaço do lote está pronto. O canal cinza é replicado na escrita.
+    """
+    shm = _attach(shm_name)
+    ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    height, width = ring_shape[2], ring_shape[3]
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            token, slot, rows = task
+            failed = []
+            for row, path in rows:
+                try:
+                    ring[slot, row] = load_resized(path, height, width)[:, :, None]
+                except Exception:
+                    ring[slot, row] = 0
+                    failed.append(row)
+            done.put((token, slot, len(rows), failed))
+    finally:
+        del ring
+        shm.close()
+
+
+class BatchLoader:
+    """
+    Carregador local de um split .lst: `num_workers` processos decodificam e redimensionam
+    as imagens num anel de `prefetch + 1` slots em memória compartilhada; cada slot guarda
+    um lote N x H x W x C. Enquanto um lote é consumido, até `prefetch` lotes seguintes
+    são preparados. A ordem de cada época depende só de (seed, época).
+
+    Uso:
+        with BatchLoader("train.lst", "data/jpeg_gray") as loader:
+            for batch in loader:
+                ...
+            print(loader.report())
+    """
+
+    def __init__(self, lst_path: str, image_root: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 image_size: Tuple[int, int] = DEFAULT_IMAGE_SIZE, channels: int = 3,
+                 shuffle: bool = True, seed: int = 42, num_workers: Optional[int] = None,
+                 prefetch: int = DEFAULT_PREFETCH, drop_last: bool = False):
+        entries = commons.read_lst_file(lst_path)
+        if not entries:
+            raise ValueError(f"Nenhuma imagem em {lst_path}")
+        self.paths = [os.path.join(image_root, e.path) for e in entries]
+        self.labels = np.array([e.label for e in entries], dtype=np.int64)
+        self.batch_size = batch_size
+        self.image_size = tuple(image_size)
+        self.channels = channels
+        self.shuffle = shuffle
+        self.seed = seed
+        self.num_workers = num_workers or max(1, min(os.cpu_count() or 1, 8))
+        self.slots = max(prefetch, 1) + 1
+        self.drop_last = drop_last
+        self.epoch = 0
+        self.stats = {"epochs": 0, "images": 0, "failed": 0, "seconds": 0.0, "wait_seconds": 0.0}
+        self._token = 0
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._procs: List = []
+
+    def __len__(self) -> int:
+        full, rest = divmod(len(self.paths), self.batch_size)
+        return full + (1 if rest and not self.drop_last else 0)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def ring_shape(self) -> Tuple[int, ...]:
+        return (self.slots, self.batch_size) + self.image_size + (self.channels,)
+
+    def start(self):
+        if self._procs:
+            return
+        ctx = mp.get_context()
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.ring_shape)))
+        self._ring = np.ndarray(self.ring_shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._tasks, self._done = ctx.Queue(), ctx.Queue()
+        self._procs = [ctx.Process(target=_worker, args=(self._shm.name, self.ring_shape, self._tasks, self._done),
+                                   name=f"batch-loader-{i}", daemon=True) for i in range(self.num_workers)]
+        for proc in self._procs:
+            proc.start()
+        logger.info(f"BatchLoader: {len(self.paths)} imagens, {self.num_workers} workers, "
+                    f"{self.slots} slots de {self._ring[0].nbytes / 1e6:.1f} MB")
+
+    def close(self):
+        for _ in self._procs:
+            self._tasks.put(None)
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
+        if self._shm is not None:
+            del self._ring
+            try:
+                self._shm.close()
+            except BufferError:
+                pass  # Um Batch ainda aponta para o anel; o mapeamento some com ele
+            self._shm.unlink()
+            self._shm = None
+
+    def order(self, epoch: int) -> np.ndarray:
+        """
+        Índices da época: permutação determinística por (seed, época) ou a ordem do .lst.
+        """
+        if not self.shuffle:
+            return np.arange(len(self.paths))
+        return np.random.default_rng([self.seed, epoch]).permutation(len(self.paths))
+
+    def __iter__(self) -> Iterator[Batch]:
+        epoch, self.epoch = self.epoch, self.epoch + 1
+        return self.iter_epoch(epoch)
+
+    def _submit(self, token: int, slot: int, indices: np.ndarray) -> int:
+        rows = [(row, self.paths[i]) for row, i in enumerate(indices)]
+        chunk = -(-len(rows) // self.num_workers)
+        chunks = [rows[i:i + chunk] for i in range(0, len(rows), chunk)]
+        for part in chunks:
+            self._tasks.put((token, slot, part))
+        return len(chunks)
+
+    def _wait(self) -> tuple:
+        if not self._procs:
+            raise RuntimeError("BatchLoader fechado.")
+        while True:
+            try:
+                return self._done.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                dead = [p.name for p in self._procs if not p.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Workers do BatchLoader terminaram inesperadamente: {dead}")
+
+    def iter_epoch(self, epoch: int) -> Iterator[Batch]:
+        """
+        Lotes de uma época, na ordem de `order(epoch)`.
+        """
+        self.start()
+        self._token += 1
+        token = self._token
+        order = self.order(epoch)
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+            batches.pop()
+
+        free = deque(range(self.slots))
+        pending = {}  # lote -> [slot, pedaços pendentes, falhas]
+        by_slot = {}
+        next_submit = 0
+        start, waited, images, failures = time.perf_counter(), 0.0, 0, 0
+        try:
+            for batch_id, indices in enumerate(batches):
+                while free and next_submit < len(batches):
+                    slot = free.popleft()
+                    pending[next_submit] = [slot, self._submit(token, slot, batches[next_submit]), []]
+                    by_slot[slot] = next_submit
+                    next_submit += 1
+
+                t0 = time.perf_counter()
+                while pending[batch_id][1]:
+                    msg_token, slot, _, failed = self._wait()
+                    if msg_token != token:
+                        continue  # Resto de uma época abandonada
+                    entry = pending[by_slot[slot]]
+                    entry[1] -= 1
+                    entry[2].extend(failed)
+                waited += time.perf_counter() - t0
+
+                slot, _, failed = pending.pop(batch_id)
+                n = len(indices)
+                images += n
+                failures += len(failed)
+                yield Batch(self._ring[slot, :n], self.labels[indices], indices, sorted(failed))
+                free.append(slot)  # Só depois que o consumidor pede o próximo lote
+        finally:
+            # Época interrompida: espera os pedaços em voo para o anel ficar livre
+            remaining = sum(entry[1] for entry in pending.values()) if self._procs else 0
+            while remaining:
+                if self._wait()[0] == token:
+                    remaining -= 1
+            seconds = time.perf_counter() - start
+            self.stats["epochs"] += 1
+            self.stats["images"] += images
+            self.stats["failed"] += failures
+            self.stats["seconds"] += seconds
+            self.stats["wait_seconds"] += waited
+            if failures:
+                logger.warning(f"BatchLoader: {failures} imagens ilegíveis na época {epoch}")
+
+    def report(self) -> dict:
+        """
+        Vazão acumulada (imagens/s) e o tempo que o consumidor ficou esperando os workers:
+        espera alta indica que o carregamento, e não o modelo, é o gargalo.
+        """
+        seconds = self.stats["seconds"]
+        return {**self.stats, "seconds": round(seconds, 3), "wait_seconds": round(self.stats["wait_seconds"], 3),
+                "images_per_sec": round(self.stats["images"] / seconds, 1) if seconds > 0 else 0.0,
+                "workers": self.num_workers, "batch_size": self.batch_size, "prefetch": self.slots - 1}
+
+
+def measure_throughput(lst_path: str, image_root: str, epochs: int = 1, **kwargs) -> dict:
+    """
+    Percorre `epochs` épocas sem consumidor e retorna o report() do carregador.
+    """
+    with BatchLoader(lst_path, image_root, **kwargs) as loader:
+        for _ in range(epochs):
+            for _ in loader:
+                pass
+        return loader.report()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vazão do BatchLoader (imagens/s) sobre um split .lst.")
+    parser.add_argument("lst_path")
+    parser.add_argument("image_root")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--image-size", type=int, nargs=2, default=list(DEFAULT_IMAGE_SIZE), metavar=("H", "W"))
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    report = measure_throughput(args.lst_path, args.image_root, epochs=args.epochs, batch_size=args.batch_size,
+                                image_size=tuple(args.image_size), channels=args.channels,
+                                num_workers=args.workers, prefetch=args.prefetch, seed=args.seed)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,325 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from typing import Callable, Dict, List, Optional
+
+from . import commons, grayscale, pipeline, streaming_split
+from .inventory import scan_tree
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_REPEAT = 3
+DEFAULT_FILE_SIZE = 512
+CASES = ("extract", "listing", "index", "lst")
+# Arquivos por pasta de série, como no CBIS-DDSM (jpeg/<UID>/1-xxx.jpg)
+FILES_PER_DIR = 4
+DICOM_UID_PREFIX = "1.3.6.1.4.1.9590.100.1.2."
+# Benchmark de canais: imagens sintéticas no tamanho de treino redimensionado do CBIS
+DEFAULT_CHANNEL_IMAGES = 200
+DEFAULT_CHANNEL_SHAPE = (1024, 640)
+
+
+def _relative_paths(n_files: int) -> List[str]:
+    return [f"{DICOM_UID_PREFIX}{i // FILES_PER_DIR}/1-{i % FILES_PER_DIR + 1}.jpg" for i in range(n_files)]
+
+
+def write_split_inputs(csv_path: str, index_path: str, n_files: int):
+    """
+    Entradas da etapa split do pipeline para n_files imagens: índice UID -> caminho
+    (uma imagem por pasta de série, como no CBIS) e um CSV de descrição com uma linha
+    por imagem e FILES_PER_DIR imagens por paciente.
+    """
+    file_map, rows = {}, []
+    for i in range(n_files):
+        uid = f"{DICOM_UID_PREFIX}{i}"
+        file_map[uid] = f"{uid}/1-1.jpg"
+        rows.append({"patient_id": f"P_{i // FILES_PER_DIR:06d}",
+                     "pathology": "MALIGNANT" if i % 2 else "BENIGN",
+                     "image file path": f"Mass-Training_P_{i // FILES_PER_DIR:06d}/{uid}/000000.dcm"})
+    with open(index_path, "w") as f:
+        json.dump(file_map, f)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["patient_id", "pathology", "image file path"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def make_archive(zip_path: str, n_files: int, file_size: int = DEFAULT_FILE_SIZE) -> str:
+    """
+    Gera um ZIP sintético com o layout do CBIS-DDSM (jpeg/<UID>/1-n.jpg).
+    O conteúdo é armazenado sem compressão para medir o custo por arquivo, não o zlib.
+    """
+    payload = b"\xff\xd8" + b"\0" * max(file_size - 4, 0) + b"\xff\xd9"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+        for rel in _relative_paths(n_files):
+            zf.writestr(f"jpeg/{rel}", payload)
+    return zip_path
+
+
+def make_tree(root: str, n_files: int, file_size: int = DEFAULT_FILE_SIZE) -> str:
+    """
+    Gera a mesma árvore de make_archive diretamente em disco.
+    """
+    payload = b"\xff\xd8" + b"\0" * max(file_size - 4, 0) + b"\xff\xd9"
+    for rel in _relative_paths(n_files):
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(payload)
+    return root
+
+
+def measure(fn: Callable[[], object], n_files: int, repeat: int = 1,
+            setup: Optional[Callable[[], None]] = None) -> dict:
+    """
+    Mede fn(): melhor tempo de `repeat` execuções (files/sec) e o pico de memória
+    Python (tracemalloc) numa execução separada, para não distorcer o tempo.
+    `setup` roda antes de cada execução (ex.: limpar o destino da extração).
+    """
+    best = float("inf")
+    for _ in range(max(repeat, 1)):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "files": n_files,
+        "seconds": round(best, 4),
+        "files_per_sec": round(n_files / best, 1) if best > 0 else float("inf"),
+        "peak_mb": round(peak / 1e6, 3),
+    }
+
+
+def _bench_scale(work_dir: str, n_files: int, repeat: int, cases: List[str]) -> Dict[str, dict]:
+    zip_path = make_archive(os.path.join(work_dir, "dataset.zip"), n_files)
+    extract_dir = os.path.join(work_dir, "extract")
+    tree = os.path.join(extract_dir, "jpeg")
+    index_path = os.path.join(work_dir, "image_index.json")
+    split_index_path = os.path.join(work_dir, "split_index.json")
+    csv_path = os.path.join(work_dir, "description.csv")
+    split_dir = os.path.join(work_dir, "splits")
+    lst_dir = os.path.join(work_dir, "lst")
+
+    def reset_extract():
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+    def reset_split():
+        # A divisão só acrescenta imagens novas: sem limpar, as repetições mediriam o caminho "já listada"
+        shutil.rmtree(split_dir, ignore_errors=True)
+
+    def split_and_export():
+        # Etapas split + export do build_cbis_pipeline
+        streaming_split.split_csv_files([csv_path], split_index_path, split_dir)
+        pipeline.export_split(split_dir, lst_dir, os.path.join(work_dir, "splits.json"))
+
+    results = {}
+    if "extract" in cases:
+        results["extract"] = measure(lambda: commons.extract_dataset(zip_path, extract_dir), n_files,
+                                     repeat, setup=reset_extract)
+    if not os.path.isdir(tree):
+        commons.extract_dataset(zip_path, extract_dir)
+    if "listing" in cases:
+        results["listing"] = measure(lambda: scan_tree(tree), n_files, repeat)
+    if "index" in cases:
+        results["index"] = measure(lambda: pipeline.index_images(tree, index_path), n_files, repeat)
+    if "lst" in cases:
+        write_split_inputs(csv_path, split_index_path, n_files)
+        results["lst"] = measure(split_and_export, n_files, repeat, setup=reset_split)
+    return results
+
+
+def run_suite(scales=DEFAULT_SCALES, work_dir: Optional[str] = None, repeat: int = 1,
+              cases=CASES) -> Dict[str, Dict[str, dict]]:
+    """
+    Executa os casos (extração, listagem, indexação e divisão -> .lst) em cada escala.
+    Retorna {caso: {escala: métricas}}; as escalas viram chaves string (JSON).
+    """
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise ValueError(f"Casos desconhecidos: {sorted(unknown)}")
+
+    results: Dict[str, Dict[str, dict]] = {case: {} for case in cases}
+    owns_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="cbis-bench-")
+    # Logs por arquivo/etapa dominariam a medição
+    previous_level = logging.root.manager.disable
+    logging.disable(logging.INFO)
+    try:
+        for n_files in scales:
+            scale_dir = os.path.join(work_dir, str(n_files))
+            os.makedirs(scale_dir, exist_ok=True)
+            for case, metrics in _bench_scale(scale_dir, n_files, repeat, list(cases)).items():
+                results[case][str(n_files)] = metrics
+            shutil.rmtree(scale_dir, ignore_errors=True)
+    finally:
+        logging.disable(previous_level)
+        if owns_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for case, by_scale in results.items():
+        for scale, m in by_scale.items():
+            logger.info(f"{case:<8} {scale:>7} arquivos: {m['files_per_sec']:>10.0f} arquivos/s, "
+                        f"pico {m['peak_mb']:.1f} MB")
+    return results
+
+
+def make_mammograms(root: str, n_images: int, shape=DEFAULT_CHANNEL_SHAPE, seed: int = 0) -> List[str]:
+    """
+    Gera JPEGs de 3 canais com conteúdo cinza (fundo escuro, mama clara e ruído),
+    como os do corpus extraído. Retorna os caminhos relativos.
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    yy, xx = np.mgrid[0:height, 0:width]
+    paths = []
+    for i in range(n_images):
+        radius = rng.uniform(0.6, 0.9) * width
+        breast = np.clip(1 - ((xx / radius) ** 2 + ((yy - height / 2) / (height / 2)) ** 2), 0, 1)
+        gray = np.clip(breast * 180 + rng.normal(0, 12, shape) * (breast > 0), 0, 255).astype(np.uint8)
+        rel = _relative_paths(n_images)[i]
+        os.makedirs(os.path.join(root, os.path.dirname(rel)), exist_ok=True)
+        cv2.imwrite(os.path.join(root, rel), cv2.merge([gray, gray, gray]))
+        paths.append(rel)
+    return paths
+
+
+def run_channel_benchmark(n_images: int = DEFAULT_CHANNEL_IMAGES, shape=DEFAULT_CHANNEL_SHAPE,
+                          repeat: int = DEFAULT_REPEAT, work_dir: Optional[str] = None) -> dict:
+    """
+    Compara o armazenamento em 3 canais com o de 1 canal (grayscale.convert_tree):
+    bytes a enviar e vazão de decodificação (3 canais via IMREAD_COLOR vs. 1 canal
+    replicado na leitura com grayscale.load_image).
+    """
+    import cv2
+
+    owns_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="cbis-bench-channels-")
+    color_dir, gray_dir = os.path.join(work_dir, "color"), os.path.join(work_dir, "gray")
+    previous_level = logging.root.manager.disable
+    logging.disable(logging.INFO)
+    try:
+        rels = make_mammograms(color_dir, n_images, shape)
+        grayscale.convert_tree(color_dir, gray_dir, rels)
+        color_paths = [os.path.join(color_dir, rel) for rel in rels]
+        gray_paths = [os.path.join(gray_dir, rel) for rel in rels]
+
+        results = {
+            "color": measure(lambda: [cv2.imread(p, cv2.IMREAD_COLOR) for p in color_paths], n_images, repeat),
+            "grayscale": measure(lambda: [grayscale.load_image(p) for p in gray_paths], n_images, repeat),
+        }
+        for name, paths in (("color", color_paths), ("grayscale", gray_paths)):
+            results[name]["upload_mb"] = round(sum(os.path.getsize(p) for p in paths) / 1e6, 3)
+    finally:
+        logging.disable(previous_level)
+        if owns_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results["upload_ratio"] = round(results["color"]["upload_mb"] / results["grayscale"]["upload_mb"], 2)
+    results["decode_speedup"] = round(results["grayscale"]["files_per_sec"] / results["color"]["files_per_sec"], 2)
+    logger.info(f"Canais: upload {results['upload_ratio']:.2f}x menor, "
+                f"decodificação {results['decode_speedup']:.2f}x mais rápida em 1 canal")
+    return results
+
+
+def machine_info() -> dict:
+    return {"platform": platform.platform(), "python": platform.python_version(),
+            "cpu_count": os.cpu_count()}
+
+
+def save_baseline(results: dict, path: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"machine": machine_info(), "results": results}, f, indent=2, sort_keys=True)
+    logger.info(f"Baseline gravado em {path}")
+    return path
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)["results"]
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Compara a vazão com o baseline. Retorna as regressões (vazão abaixo de
+    baseline * (1 - tolerance)); casos/escalas sem baseline são ignorados.
+    """
+    regressions = []
+    for case, by_scale in results.items():
+        for scale, metrics in by_scale.items():
+            reference = baseline.get(case, {}).get(scale)
+            if not reference:
+                continue
+            floor = reference["files_per_sec"] * (1 - tolerance)
+            if metrics["files_per_sec"] < floor:
+                regressions.append(
+                    f"{case} @ {scale} arquivos: {metrics['files_per_sec']:.0f} arquivos/s "
+                    f"< {floor:.0f} (baseline {reference['files_per_sec']:.0f}, tolerância {tolerance:.0%})")
+    for regression in regressions:
+        logger.error(f"Regressão de desempenho: {regression}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de escala do data_utils (arquivos/s e pico de memória).")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=CASES)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--baseline", default=os.path.join("benchmarks", "baseline.json"))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Grava os resultados como novo baseline em vez de comparar.")
+    parser.add_argument("--output", help="Grava os resultados desta execução em JSON.")
+    parser.add_argument("--channels", action="store_true",
+                        help="Compara armazenamento em 3 canais e em 1 canal (bytes e decodificação).")
+    parser.add_argument("--channel-images", type=int, default=DEFAULT_CHANNEL_IMAGES)
+    args = parser.parse_args(argv)
+
+    if args.channels:
+        results = run_channel_benchmark(args.channel_images, repeat=args.repeat)
+        print(json.dumps(results, indent=2))
+        return 0
+
+    results = run_suite(args.scales, repeat=args.repeat, cases=args.cases)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        save_baseline(results, args.output)
+    if args.update_baseline:
+        save_baseline(results, args.baseline)
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        logger.warning(f"Baseline não encontrado em {args.baseline}; use --update-baseline.")
+        return 0
+    return 1 if compare(results, baseline, args.tolerance) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
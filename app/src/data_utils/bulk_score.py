@@ -0,0 +1,342 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+
+from . import adaptive_client, config, endpoint_router
+from .inventory import IMAGE_EXTENSIONS, scan_tree
+from .s3_catalog import S3Catalog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINT_NAME = "cbis-ddsm-serverless-endpoint"
+DEFAULT_WORKERS = 8
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_PREFETCH = 32
+DEFAULT_FLUSH_EVERY = 1000
+DEFAULT_THRESHOLD = 0.5
+PART_GLOB = os.path.join("diagnosis=*", "part-*.parquet")
+# Colunas gravadas em cada partição (a coluna de partição `diagnosis` vem do diretório)
+COLUMNS = ("key", "bytes", "prob_benign", "prob_malignant", "confidence", "latency_ms", "scored_at")
+_DONE = object()
+
+
+def _is_image(key: str) -> bool:
+    return os.path.splitext(key)[1].lower() in IMAGE_EXTENSIONS
+
+
+class LocalSource:
+    """
+    Imagens sob um diretório local; as chaves são caminhos relativos com '/'.
+    """
+
+    def __init__(self, root: str, max_workers: int = 16):
+        self.root = root
+        self.max_workers = max_workers
+
+    def __str__(self):
+        return self.root
+
+    def keys(self) -> Iterator[str]:
+        return iter(sorted(rel for rel, _ in scan_tree(self.root, self.max_workers) if _is_image(rel)))
+
+    def read(self, key: str) -> bytes:
+        with open(os.path.join(self.root, key), "rb") as f:
+            return f.read()
+
+
+class S3Source:
+    """
+    Imagens sob s3://bucket/prefix; as chaves são as chaves S3 completas, listadas
+    página a página (o consumo começa antes do fim da listagem).
+    Com um S3Catalog, as chaves vêm do catálogo local, atualizado antes da leitura.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", s3_client=None, catalog=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3_client = s3_client or config.get_client("s3")
+        self.catalog = catalog
+
+    def __str__(self):
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def keys(self) -> Iterator[str]:
+        if self.catalog is not None:
+            self.catalog.refresh(self.bucket, self.prefix)
+            yield from (key for key in self.catalog.keys(self.bucket, self.prefix) if _is_image(key))
+            return
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                if _is_image(obj["Key"]):
+                    yield obj["Key"]
+
+    def read(self, key: str) -> bytes:
+        return self.s3_client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+
+def open_source(uri: str, s3_client=None, catalog=None):
+    """
+    LocalSource para um diretório ou S3Source para s3://bucket/prefix.
+    """
+    if uri.startswith("s3://"):
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return S3Source(bucket, prefix, s3_client, catalog)
+    if not os.path.isdir(uri):
+        raise FileNotFoundError(f"Diretório não encontrado: {uri}")
+    return LocalSource(uri)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("pyarrow é necessário para gravar Parquet (pip install pyarrow).") from e
+    return pyarrow
+
+
+def load_done_keys(output_dir: str) -> Set[str]:
+    """
+    Chaves já pontuadas: a coluna `key` de todas as partições gravadas. Cada partição é
+    renomeada para o nome final só depois de completa, então ela é o próprio checkpoint.
+    """
+    paths = glob.glob(os.path.join(output_dir, PART_GLOB))
+    if not paths:
+        return set()
+    pq = _pyarrow().parquet
+    done = set()
+    for path in paths:
+        done.update(pq.read_table(path, columns=["key"]).column("key").to_pylist())
+    return done
+
+
+class ParquetPartitionWriter:
+    """
+    Acumula resultados e grava um arquivo por diagnóstico a cada `flush`
+    (output_dir/diagnosis=<X>/part-<run>-<n>.parquet), via arquivo temporário + os.replace.
+    """
+
+    def __init__(self, output_dir: str, run_id: Optional[str] = None):
+        self.output_dir = output_dir
+        self.run_id = run_id or uuid.uuid4().hex[:8]
+        self.buffer: List[dict] = []
+        self.parts = 0
+        self.rows = 0
+
+    def add(self, record: dict):
+        self.buffer.append(record)
+
+    def flush(self) -> List[str]:
+        if not self.buffer:
+            return []
+        pa = _pyarrow()
+        by_diagnosis = {}
+        for record in self.buffer:
+            by_diagnosis.setdefault(record["diagnosis"], []).append(record)
+
+        written = []
+        for diagnosis, records in sorted(by_diagnosis.items()):
+            directory = os.path.join(self.output_dir, f"diagnosis={diagnosis}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{self.run_id}-{self.parts:05d}.parquet")
+            table = pa.table({column: [r[column] for r in records] for column in COLUMNS})
+            pa.parquet.write_table(table, path + ".tmp")
+            os.replace(path + ".tmp", path)
+            written.append(path)
+        self.parts += 1
+        self.rows += len(self.buffer)
+        self.buffer = []
+        return written
+
+
+def endpoint_scorer(endpoint_names: List[str], runtime_client=None, adaptive: bool = True,
+                    hedge_percentile: Optional[float] = None) -> Callable[[bytes], list]:
+    """
+    Função body -> [prob_benigno, prob_maligno] sobre invoke_endpoint, como na Lambda:
+    cliente adaptativo compartilhado (AIMD + retries de throttling) e, com mais de um
+    endpoint, roteamento por latência.
+    """
+    runtime_client = runtime_client or config.get_client("sagemaker-runtime")
+    if adaptive:
+        runtime_client = adaptive_client.shared(runtime_client)
+
+    def invoke(endpoint_name, body):
+        response = runtime_client.invoke_endpoint(EndpointName=endpoint_name,
+                                                  ContentType="application/x-image", Body=body)
+        return json.loads(response["Body"].read().decode())
+
+    if len(endpoint_names) > 1:
+        router = endpoint_router.EndpointRouter(endpoint_names, invoke, hedge_percentile=hedge_percentile)
+        return router.call
+    return lambda body: invoke(endpoint_names[0], body)
+
+
+def _score_record(key: str, body: bytes, probs: list, latency: float, threshold: float) -> dict:
+    prob_benign, prob_malignant = float(probs[0]), float(probs[1])
+    diagnosis = "MALIGNANT" if prob_malignant > threshold else "BENIGN"
+    return {"key": key, "bytes": len(body), "prob_benign": prob_benign, "prob_malignant": prob_malignant,
+            "diagnosis": diagnosis, "confidence": prob_malignant if diagnosis == "MALIGNANT" else prob_benign,
+            "latency_ms": round(latency * 1000, 2), "scored_at": datetime.now(timezone.utc).isoformat()}
+
+
+def bulk_score(source, output_dir: str, score: Callable[[bytes], list], workers: int = DEFAULT_WORKERS,
+               fetch_workers: int = DEFAULT_FETCH_WORKERS, prefetch: int = DEFAULT_PREFETCH,
+               flush_every: int = DEFAULT_FLUSH_EVERY, threshold: float = DEFAULT_THRESHOLD,
+               limit: Optional[int] = None, keys: Optional[Iterable[str]] = None) -> dict:
+    """
+    Pontua todas as imagens de `source` (LocalSource/S3Source) e grava os resultados em
+    Parquet particionado por diagnóstico sob `output_dir`.
+
+    `fetch_workers` threads leem os bytes para uma fila limitada a `prefetch` imagens
+    (memória constante) e `workers` threads chamam `score(body)`. A cada `flush_every`
+    resultados uma partição é gravada: se o job morrer, a próxima execução pula as chaves
+    já gravadas e perde no máximo os resultados ainda não gravados. Falhas são contadas
+    e não gravadas, então são tentadas de novo na próxima execução.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    done = load_done_keys(output_dir)
+    writer = ParquetPartitionWriter(output_dir)
+    stats = {"scored": 0, "skipped": 0, "failed": 0, "read_errors": 0, "bytes": 0}
+    failures: List[dict] = []
+    stop = threading.Event()
+
+    def pending_keys():
+        emitted = 0
+        for key in (keys if keys is not None else source.keys()):
+            if key in done:
+                stats["skipped"] += 1
+                continue
+            if stop.is_set() or (limit is not None and emitted >= limit):
+                return
+            emitted += 1
+            yield key
+
+    key_iter, key_lock = pending_keys(), threading.Lock()
+    bodies: queue.Queue = queue.Queue(maxsize=max(prefetch, 1))
+    results: queue.Queue = queue.Queue()
+
+    def fetch():
+        while True:
+            with key_lock:
+                key = next(key_iter, None)
+            if key is None:
+                return
+            try:
+                bodies.put((key, source.read(key), None))
+            except Exception as e:
+                bodies.put((key, None, e))
+
+    def infer():
+        try:
+            while True:
+                item = bodies.get()
+                if item is _DONE:
+                    return
+                key, body, error = item
+                if error is None:
+                    t0 = time.perf_counter()
+                    try:
+                        results.put(_score_record(key, body, score(body), time.perf_counter() - t0, threshold))
+                        continue
+                    except Exception as e:
+                        error = e
+                results.put({"key": key, "error": f"{type(error).__name__}: {error}", "read": body is None})
+        finally:
+            results.put(_DONE)  # Mesmo se a thread morrer, o laço principal não fica esperando
+
+    fetchers = [threading.Thread(target=fetch, name=f"fetch-{i}", daemon=True) for i in range(fetch_workers)]
+    scorers = [threading.Thread(target=infer, name=f"score-{i}", daemon=True) for i in range(workers)]
+    for thread in fetchers + scorers:
+        thread.start()
+
+    def close_queue():
+        for thread in fetchers:
+            thread.join()
+        for _ in scorers:
+            bodies.put(_DONE)
+
+    threading.Thread(target=close_queue, daemon=True).start()
+
+    finished = 0
+    try:
+        while finished < len(scorers):
+            item = results.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            if "error" in item:
+                stats["read_errors" if item.pop("read") else "failed"] += 1
+                failures.append(item)
+                logger.warning(f"Falha em {item['key']}: {item['error']}")
+                continue
+            writer.add(item)
+            stats["scored"] += 1
+            stats["bytes"] += item["bytes"]
+            if len(writer.buffer) >= flush_every:
+                writer.flush()
+                logger.info(f"Checkpoint: {stats['scored']} imagens pontuadas "
+                            f"({stats['scored'] / (time.perf_counter() - start):.1f} imagens/s)")
+    finally:
+        stop.set()
+        writer.flush()
+
+    seconds = time.perf_counter() - start
+    report = {"source": str(source), "output": os.path.abspath(output_dir), "run_id": writer.run_id,
+              **stats, "parts": writer.parts, "seconds": round(seconds, 3),
+              "images_per_sec": round(stats["scored"] / seconds, 2) if seconds > 0 else 0.0,
+              "failures": failures[:100]}
+    logger.info(f"Bulk scoring: {stats['scored']} pontuadas, {stats['skipped']} já feitas, "
+                f"{stats['failed'] + stats['read_errors']} falhas em {seconds:.1f}s "
+                f"({report['images_per_sec']:.1f} imagens/s)")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Pontua em lote as imagens de um prefixo S3 ou diretório local e grava Parquet particionado.")
+    parser.add_argument("source", help="s3://bucket/prefix ou diretório local")
+    parser.add_argument("output", help="Diretório de saída (Parquet particionado por diagnóstico)")
+    parser.add_argument("--endpoint", action="append", dest="endpoints",
+                        help="Endpoint do SageMaker (repita para rotear entre réplicas). "
+                             "Padrão: endpoint_name do SSM.")
+    parser.add_argument("--hedge-percentile", type=float)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH)
+    parser.add_argument("--flush-every", type=int, default=DEFAULT_FLUSH_EVERY)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--limit", type=int, help="Pontua no máximo N imagens nesta execução.")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="Chama invoke_endpoint direto, sem o cliente adaptativo.")
+    parser.add_argument("--catalog", help="Catálogo SQLite das chaves (s3_catalog): só partições novas são listadas.")
+    parser.add_argument("--project", default=config.DEFAULT_PROJECT_NAME)
+    parser.add_argument("--env", default=config.DEFAULT_ENV)
+    args = parser.parse_args(argv)
+
+    endpoints = args.endpoints or [config.get_parameter("endpoint_name", DEFAULT_ENDPOINT_NAME,
+                                                        project_name=args.project, env=args.env)]
+    score = endpoint_scorer(endpoints, adaptive=not args.no_adaptive, hedge_percentile=args.hedge_percentile)
+    catalog = S3Catalog(args.catalog) if args.catalog and args.source.startswith("s3://") else None
+    try:
+        report = bulk_score(open_source(args.source, catalog=catalog), args.output, score, workers=args.workers,
+                            fetch_workers=args.fetch_workers, prefetch=args.prefetch,
+                            flush_every=args.flush_every, threshold=args.threshold, limit=args.limit)
+    finally:
+        if catalog is not None:
+            catalog.close()
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] or report["read_errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,8 +2,12 @@ import os
 import zipfile
 import logging
 import sys
+from collections import namedtuple
+from typing import Optional
 from tqdm import tqdm
 
+from . import profiling
+
 # --- 1. Configuração do Logger ---
 logging.basicConfig(
     level=logging.INFO,
@@ -15,7 +19,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Linha de um manifesto .lst do SageMaker: Índice \t Label \t Caminho_Relativo
+LstEntry = namedtuple("LstEntry", ["index", "label", "path"])
+
+# Patologia do CSV -> label (MALIGNANT = 1, BENIGN = 0)
+CLASS_MAP = {"MALIGNANT": 1, "BENIGN": 0, "BENIGN_WITHOUT_CALLBACK": 0}
+# Prefixo dos UIDs DICOM que nomeiam as pastas das imagens extraídas
+DICOM_UID_MARKER = "1.3.6.1.4"
 
+
+@profiling.profiled("extract_dataset")
 def extract_dataset(zip_path: str, extract_to: str = "data"):
     """
     Extrai um arquivo ZIP para o diretório de destino.
@@ -95,6 +108,7 @@ def download_from_kaggle(dataset_slug: str, output_path: str = "data"):
         logger.error(f"Erro durante download: {e}")
         return None
 
+@profiling.profiled("download_and_extract")
 def download_and_extract(dataset_slug: str, data_dir: str = "data"):
     """
     Orquestra Download -> Extração.
@@ -117,4 +131,41 @@ def download_and_extract(dataset_slug: str, data_dir: str = "data"):
     else:
         logger.info(f"Dados já extraídos em: {extract_path}")
 
-    return extract_path
\ No newline at end of file
+    return extract_path
+
+def read_lst_file(lst_path: str):
+    """
+    Lê um arquivo .lst e retorna a lista de LstEntry (índice, label, caminho relativo).
+    """
+    entries = []
+    with open(lst_path, "r") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 3:
+                continue
+            entries.append(LstEntry(int(parts[0]), int(float(parts[1])), parts[2]))
+    return entries
+
+
+def resolve_uid(original_path: str, file_map: dict) -> Optional[str]:
+    """
+    Caminho relativo da imagem de uma linha do CSV: o primeiro segmento de
+    `image file path` com UID DICOM presente no índice UID -> imagem (index_images).
+    """
+    for part in original_path.split("/"):
+        if DICOM_UID_MARKER in part and part in file_map:
+            return file_map[part]
+    return None
+
+
+def write_lst_file(entries, lst_path: str):
+    """
+    Grava uma sequência de (label, caminho_relativo) no formato .lst, reindexando a partir de 0.
+    """
+    count = 0
+    with open(lst_path, "w") as f:
+        for index, (label, relative_path) in enumerate(entries):
+            f.write(f"{index}\t{label}\t{relative_path}\n")
+            count += 1
+    logger.info(f"Arquivo LST gerado: {lst_path} ({count} imagens)")
+    return count
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Devem coincidir com o terraform.tfvars
+DEFAULT_PROJECT_NAME = "cbis-ddsm"
+DEFAULT_ENV = "dev"
+DEFAULT_TTL_SECONDS = 3600
+
+_clients: Dict[tuple, object] = {}
+_clients_lock = threading.Lock()
+_memory_cache: Dict[tuple, tuple] = {}
+_cache_lock = threading.Lock()
+
+
+def get_client(service: str, region: Optional[str] = None):
+    """
+    Retorna um cliente boto3 reutilizado por (serviço, região) no processo.
+    """
+    key = (service, region)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            import boto3
+            client = boto3.client(service, region_name=region) if region else boto3.client(service)
+            _clients[key] = client
+    return client
+
+
+def default_cache_dir() -> str:
+    """
+    Diretório do cache em disco: CBIS_CONFIG_CACHE_DIR, /tmp no Lambda ou ~/.cache/cbis-ddsm.
+    """
+    if os.environ.get("CBIS_CONFIG_CACHE_DIR"):
+        return os.environ["CBIS_CONFIG_CACHE_DIR"]
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        return "/tmp/cbis-ddsm-config"
+    return os.path.join(os.path.expanduser("~"), ".cache", "cbis-ddsm")
+
+
+def _disk_cache_path(cache_dir: str, project_name: str, env: str) -> str:
+    return os.path.join(cache_dir, f"ssm_{project_name}_{env}.json")
+
+
+def fetch_parameters(project_name: str = DEFAULT_PROJECT_NAME, env: str = DEFAULT_ENV,
+                     region: Optional[str] = None, client=None) -> Dict[str, str]:
+    """
+    Busca todos os parâmetros sob /{project_name}/{env}/ com get_parameters_by_path.
+    As chaves retornadas são relativas ao caminho (ex.: 's3_bucket_name').
+    """
+    client = client or get_client("ssm", region)
+    path = f"/{project_name}/{env}/"
+    params = {}
+    kwargs = {"Path": path, "Recursive": True, "WithDecryption": True}
+    while True:
+        response = client.get_parameters_by_path(**kwargs)
+        for param in response.get("Parameters", []):
+            params[param["Name"][len(path):]] = param["Value"]
+        token = response.get("NextToken")
+        if not token:
+            break
+        kwargs["NextToken"] = token
+    logger.info(f"{len(params)} parâmetros carregados do SSM em {path}")
+    return params
+
+
+def load_config(project_name: str = DEFAULT_PROJECT_NAME, env: str = DEFAULT_ENV,
+                region: Optional[str] = None, ttl: int = DEFAULT_TTL_SECONDS,
+                cache_dir: Optional[str] = None, use_disk_cache: bool = True,
+                refresh: bool = False, client=None) -> Dict[str, str]:
+    """
+    Carrega a configuração do projeto: cache em memória -> cache em disco (TTL) -> SSM.
+    Se o SSM falhar, usa o cache em disco mesmo expirado; sem cache, retorna {}.
+    """
+    key = (project_name, env)
+    now = time.time()
+
+    if not refresh:
+        with _cache_lock:
+            cached = _memory_cache.get(key)
+        if cached and cached[0] > now:
+            return dict(cached[1])
+
+    cache_dir = cache_dir or default_cache_dir()
+    disk_path = _disk_cache_path(cache_dir, project_name, env)
+    disk_data = None
+    if use_disk_cache and os.path.exists(disk_path):
+        try:
+            with open(disk_path, "r") as f:
+                disk_data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache de configuração ilegível ({disk_path}): {e}")
+
+    if not refresh and disk_data and disk_data.get("fetched_at", 0) + ttl > now:
+        params = disk_data["parameters"]
+    else:
+        try:
+            params = fetch_parameters(project_name, env, region, client)
+        except Exception as e:
+            if disk_data:
+                logger.warning(f"Erro ao ler o SSM ({e}); usando cache em disco expirado.")
+                params = disk_data["parameters"]
+            else:
+                logger.warning(f"Erro ao ler o SSM ({e}); nenhuma configuração disponível.")
+                return {}
+        else:
+            if use_disk_cache:
+                try:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    with open(disk_path, "w") as f:
+                        json.dump({"fetched_at": now, "parameters": params}, f)
+                except OSError as e:
+                    logger.warning(f"Não foi possível gravar o cache de configuração: {e}")
+
+    with _cache_lock:
+        _memory_cache[key] = (now + ttl, dict(params))
+    return dict(params)
+
+
+def get_parameter(name: str, default: Optional[str] = None, **kwargs) -> Optional[str]:
+    """
+    Valor de um parâmetro (nome relativo, ex.: 's3_bucket_name') ou `default`.
+    """
+    return load_config(**kwargs).get(name, default)
+
+
+def clear_cache(disk: bool = False, cache_dir: Optional[str] = None):
+    """
+    Limpa o cache em memória (e, opcionalmente, os arquivos do cache em disco).
+    """
+    with _cache_lock:
+        _memory_cache.clear()
+    if disk:
+        cache_dir = cache_dir or default_cache_dir()
+        if os.path.isdir(cache_dir):
+            for name in os.listdir(cache_dir):
+                if name.startswith("ssm_") and name.endswith(".json"):
+                    os.remove(os.path.join(cache_dir, name))
@@ -0,0 +1,180 @@
+import logging
+import os
+import shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from . import commons
+from .pipeline import ContentHasher
+
+logger = logging.getLogger(__name__)
+
+
+def cas_key(digest: str, extension: str = ".jpg") -> str:
+    """
+    Chave endereçada por conteúdo: ab/cd/<sha256><ext> (dois níveis evitam prefixos enormes).
+    """
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def hash_files(paths: Iterable[str], max_workers: int = 8,
+               hasher: Optional[ContentHasher] = None) -> Dict[str, str]:
+    """
+    Calcula o sha256 de vários arquivos em paralelo (hashlib libera o GIL).
+    Com um ContentHasher com memo, arquivos inalterados não são relidos.
+    """
+    hasher = hasher or ContentHasher()
+    unique = list(dict.fromkeys(paths))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        digests = list(pool.map(hasher.hash_file, unique))
+    return dict(zip(unique, digests))
+
+
+def build_cas_index(image_root: str, relative_paths: Iterable[str], max_workers: int = 8,
+                    memo_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Mapeia caminho relativo (como no .lst) -> chave CAS. Arquivos ausentes ficam de fora.
+    """
+    relative_paths = list(dict.fromkeys(relative_paths))
+    existing = [p for p in relative_paths if os.path.isfile(os.path.join(image_root, p))]
+    if len(existing) < len(relative_paths):
+        logger.warning(f"{len(relative_paths) - len(existing)} imagens não encontradas em {image_root}")
+
+    hasher = ContentHasher(memo_path)
+    digests = hash_files([os.path.join(image_root, p) for p in existing], max_workers, hasher)
+    hasher.save()
+
+    index = {}
+    for rel in existing:
+        extension = os.path.splitext(rel)[1].lower() or ".jpg"
+        index[rel] = cas_key(digests[os.path.join(image_root, rel)], extension)
+
+    unique = len(set(index.values()))
+    logger.info(f"{len(index)} imagens indexadas, {unique} conteúdos únicos "
+                f"({len(index) - unique} duplicatas)")
+    return index
+
+
+def rewrite_lst(lst_path: str, output_path: str, index: Dict[str, str], dedupe: bool = True) -> int:
+    """
+    Reescreve um .lst trocando os caminhos pelas chaves CAS.
+    Com dedupe, linhas repetidas (mesma imagem e label) são gravadas uma única vez.
+    """
+    rows, seen, missing = [], set(), 0
+    for entry in commons.read_lst_file(lst_path):
+        key = index.get(entry.path)
+        if key is None:
+            missing += 1
+            continue
+        if dedupe and (entry.label, key) in seen:
+            continue
+        seen.add((entry.label, key))
+        rows.append((entry.label, key))
+    if missing:
+        logger.warning(f"{missing} linhas de {lst_path} sem chave CAS foram descartadas")
+    return commons.write_lst_file(rows, output_path)
+
+
+def find_leakage(splits: Dict[str, str]) -> Dict[str, dict]:
+    """
+    Encontra imagens idênticas em mais de um split. `splits` mapeia nome -> .lst com chaves CAS.
+    Retorna {chave: {"splits": [...], "labels": [...]}}; labels divergentes indicam conflito.
+    """
+    seen = defaultdict(lambda: {"splits": set(), "labels": set()})
+    for split_name, lst_path in splits.items():
+        for entry in commons.read_lst_file(lst_path):
+            seen[entry.path]["splits"].add(split_name)
+            seen[entry.path]["labels"].add(entry.label)
+
+    leaked = {key: {"splits": sorted(info["splits"]), "labels": sorted(info["labels"])}
+              for key, info in seen.items() if len(info["splits"]) > 1}
+    if leaked:
+        logger.warning(f"Vazamento entre splits: {len(leaked)} imagens aparecem em mais de um split")
+    return leaked
+
+
+def drop_keys(lst_path: str, keys: Iterable[str], output_path: Optional[str] = None) -> int:
+    """
+    Remove do .lst as linhas com as chaves informadas (ex.: vazamento no split de validação).
+    """
+    keys = set(keys)
+    rows = [(e.label, e.path) for e in commons.read_lst_file(lst_path) if e.path not in keys]
+    return commons.write_lst_file(rows, output_path or lst_path)
+
+
+def link_local(index: Dict[str, str], image_root: str, cas_root: str) -> int:
+    """
+    Monta o layout CAS localmente com hard links (cópia se não suportado),
+    para que ferramentas locais resolvam os caminhos dos .lst reescritos.
+    """
+    created = 0
+    for rel, key in index.items():
+        target = os.path.join(cas_root, key)
+        if os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        source = os.path.join(image_root, rel)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+        created += 1
+    logger.info(f"{created} arquivos adicionados ao layout CAS local em {cas_root}")
+    return created
+
+
+def list_existing_keys(s3_client, bucket: str, prefix: str) -> set:
+    """
+    Chaves já presentes sob o prefixo (relativas ao prefixo).
+    """
+    prefix = prefix.rstrip("/") + "/"
+    keys = set()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            keys.add(obj["Key"][len(prefix):])
+    return keys
+
+
+def upload_cas(index: Dict[str, str], image_root: str, bucket: str, key_prefix: str,
+               s3_client=None, max_workers: int = 16, catalog=None) -> dict:
+    """
+    Envia cada conteúdo único uma só vez para s3://bucket/key_prefix/<chave CAS>,
+    pulando chaves que já existem no bucket.
+    Com um S3Catalog, as chaves existentes vêm do catálogo (só partições novas ou sujas
+    são listadas) e as partições que recebem envios são marcadas como sujas.
+    """
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client("s3")
+
+    sources: Dict[str, str] = {}
+    for rel, key in index.items():
+        sources.setdefault(key, os.path.join(image_root, rel))
+
+    prefix = key_prefix.rstrip("/")
+    if catalog is not None:
+        catalog.refresh(bucket, prefix + "/")
+        existing = {key[len(prefix) + 1:] for key in catalog.keys(bucket, prefix + "/")}
+    else:
+        existing = list_existing_keys(s3_client, bucket, key_prefix)
+    pending: List[tuple] = [(path, key) for key, path in sources.items() if key not in existing]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda item: s3_client.upload_file(item[0], bucket, f"{prefix}/{item[1]}"), pending))
+    if catalog is not None:
+        catalog.mark_dirty(bucket, [f"{prefix}/{key}" for _, key in pending])
+
+    stats = {
+        "files": len(index),
+        "unique": len(sources),
+        "uploaded": len(pending),
+        "skipped": len(sources) - len(pending),
+        "bytes_uploaded": sum(os.path.getsize(path) for path, _ in pending),
+        "bytes_saved": sum(os.path.getsize(os.path.join(image_root, rel)) for rel in index)
+        - sum(os.path.getsize(path) for path in sources.values()),
+    }
+    logger.info(f"CAS: {stats['uploaded']} enviados, {stats['skipped']} já existentes, "
+                f"{stats['files'] - stats['unique']} duplicatas evitadas")
+    return stats
@@ -0,0 +1,326 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+import zipfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+# Bloco de leitura/escrita do download sem Range (o corpo nunca fica inteiro em memória)
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+KAGGLE_DOWNLOAD_URL = "https://www.kaggle.com/api/v1/datasets/download/{slug}"
+_CONTENT_RANGE = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+@dataclass
+class RemoteFile:
+    """
+    Metadados do arquivo remoto. `url` é a URL final (após redirecionamentos).
+    """
+    url: str
+    size: int
+    etag: Optional[str] = None
+    accept_ranges: bool = True
+
+
+class Transport(ABC):
+    """
+    Interface de transporte: probe() descobre tamanho/suporte a Range, get_range()
+    baixa os bytes [start, end] (inclusivo) e stream() grava o corpo inteiro em blocos,
+    para servidores que ignoram Range.
+    """
+
+    @abstractmethod
+    def probe(self, url: str) -> RemoteFile:
+        """Levanta IOError se o tamanho remoto não puder ser determinado."""
+
+    @abstractmethod
+    def get_range(self, url: str, start: int, end: int) -> bytes:
+        ...
+
+    @abstractmethod
+    def stream(self, url: str, fileobj: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+        """Grava o corpo em `fileobj` e retorna o número de bytes."""
+
+
+class _StripAuthRedirect(urllib.request.HTTPRedirectHandler):
+    """
+    Não repassa o Authorization quando o redirecionamento muda de host (ex.: URL assinada).
+    """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new_req = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new_req is not None and urlparse(newurl).netloc != urlparse(req.full_url).netloc:
+            new_req.remove_header("Authorization")
+        return new_req
+
+
+class HTTPTransport(Transport):
+    """
+    Transporte HTTP(S) com urllib. O probe usa GET com Range bytes=0-0, que funciona
+    mesmo onde HEAD não é permitido, e resolve redirecionamentos (ex.: URL assinada).
+    Os cabeçalhos extras (ex.: autenticação) só são enviados ao host da URL original.
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, timeout: float = 60):
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self._auth_host: Optional[str] = None
+        self._opener = urllib.request.build_opener(_StripAuthRedirect)
+
+    def _open(self, url: str, byte_range: Optional[str] = None):
+        headers = dict(self.headers) if urlparse(url).netloc == self._auth_host else {}
+        if byte_range:
+            headers["Range"] = byte_range
+        return self._opener.open(urllib.request.Request(url, headers=headers), timeout=self.timeout)
+
+    def probe(self, url: str) -> RemoteFile:
+        self._auth_host = urlparse(url).netloc
+        with self._open(url, "bytes=0-0") as response:
+            final_url = response.geturl()
+            etag = response.headers.get("ETag")
+            if response.status == 206:
+                match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+                if match:
+                    return RemoteFile(final_url, int(match.group(1)), etag, True)
+            elif response.headers.get("Content-Length"):
+                return RemoteFile(final_url, int(response.headers["Content-Length"]), etag, False)
+        # Ex.: resposta chunked ou Content-Range "bytes 0-0/*": sem tamanho não há como
+        # dividir em chunks nem verificar o arquivo baixado
+        raise IOError(f"Tamanho do arquivo remoto desconhecido (sem Content-Range nem Content-Length): {final_url}")
+
+    def get_range(self, url: str, start: int, end: int) -> bytes:
+        with self._open(url, f"bytes={start}-{end}") as response:
+            if response.status != 206 and not (response.status == 200 and start == 0):
+                raise IOError(f"Servidor ignorou o Range ({response.status})")
+            return response.read(end - start + 1)  # Um 200 traria o arquivo inteiro: lê só o pedido
+
+    def stream(self, url: str, fileobj: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+        written = 0
+        with self._open(url) as response:
+            for block in iter(lambda: response.read(block_size), b""):
+                fileobj.write(block)
+                written += len(block)
+        return written
+
+
+class DownloadJournal:
+    """
+    Diário do download parcial (<destino>.part.json): quais chunks já estão gravados
+    em <destino>.part. Só é reaproveitado se URL base, tamanho, ETag e chunk coincidirem.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state: dict = {}
+        self._lock = threading.Lock()
+
+    def load(self, source: str, remote: RemoteFile, chunk_size: int) -> set:
+        expected = {"source": source, "size": remote.size, "etag": remote.etag, "chunk_size": chunk_size}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    state = json.load(f)
+                if all(state.get(k) == v for k, v in expected.items()):
+                    self.state = state
+                    return set(state["done"])
+                logger.info("Arquivo remoto mudou; reiniciando o download.")
+            except (OSError, ValueError):
+                logger.warning(f"Diário ilegível, reiniciando: {self.path}")
+        self.state = dict(expected, done=[])
+        self._save()
+        return set()
+
+    def mark_done(self, chunk: int):
+        with self._lock:
+            self.state["done"].append(chunk)
+            self._save()
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_file(path: str, expected_size: Optional[int] = None,
+                expected_sha256: Optional[str] = None) -> bool:
+    """
+    Confere tamanho e, se informado, sha256 do arquivo.
+    """
+    if not os.path.exists(path):
+        return False
+    if expected_size is not None and os.path.getsize(path) != expected_size:
+        logger.error(f"Tamanho inválido: {path} ({os.path.getsize(path)} != {expected_size})")
+        return False
+    if expected_sha256 and sha256_file(path) != expected_sha256.lower():
+        logger.error(f"Checksum inválido: {path}")
+        return False
+    return True
+
+
+def verify_zip(path: str, deep: bool = False) -> bool:
+    """
+    Valida o ZIP: diretório central legível (detecta truncamento) e, com deep=True,
+    o CRC de todos os membros.
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            if deep:
+                bad = zf.testzip()
+                if bad:
+                    logger.error(f"CRC inválido em {bad} ({path})")
+                    return False
+        return True
+    except (zipfile.BadZipFile, OSError) as e:
+        logger.error(f"ZIP inválido: {path} ({e})")
+        return False
+
+
+def _fetch_chunk(transport: Transport, url: str, part_path: str, start: int, end: int,
+                 retries: int, backoff: float):
+    for attempt in range(retries + 1):
+        try:
+            data = transport.get_range(url, start, end)
+            if len(data) != end - start + 1:
+                raise IOError(f"Chunk incompleto: {len(data)} de {end - start + 1} bytes")
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                f.write(data)
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait = backoff * (2 ** attempt)
+            logger.warning(f"Falha no chunk {start}-{end} ({e}); nova tentativa em {wait:.1f}s")
+            time.sleep(wait)
+
+
+def _stream_whole(transport: Transport, url: str, part_path: str, size: int, retries: int, backoff: float):
+    for attempt in range(retries + 1):
+        try:
+            with open(part_path, "wb") as f:
+                written = transport.stream(url, f)
+            if written != size:
+                raise IOError(f"Download incompleto: {written} de {size} bytes")
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait = backoff * (2 ** attempt)
+            logger.warning(f"Falha no download ({e}); nova tentativa em {wait:.1f}s")
+            time.sleep(wait)
+
+
+def download_file(url: str, dest: str, transport: Optional[Transport] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, max_workers: int = 8,
+                  expected_size: Optional[int] = None, expected_sha256: Optional[str] = None,
+                  retries: int = 3, backoff: float = 1.0) -> str:
+    """
+    Baixa `url` em chunks paralelos por byte-range para `dest`.
+
+    Os chunks são gravados em <dest>.part e registrados em <dest>.part.json;
+    uma execução interrompida continua apenas com os chunks pendentes.
+    Se o servidor ignora Range, o corpo é gravado em blocos numa única requisição, sem retomada.
+    O arquivo só é movido para `dest` após conferir tamanho (e sha256, se informado).
+    """
+    transport = transport or HTTPTransport()
+    part_path, journal = dest + ".part", DownloadJournal(dest + ".part.json")
+
+    remote = transport.probe(url)
+    if expected_size is not None and remote.size != expected_size:
+        raise IOError(f"Tamanho remoto {remote.size} difere do esperado {expected_size}")
+    if os.path.exists(dest) and verify_file(dest, remote.size, expected_sha256):
+        logger.info(f"Arquivo já baixado e verificado: {dest}")
+        return dest
+
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    if not remote.accept_ranges:
+        journal.remove()
+        logger.info(f"Baixando {os.path.basename(dest)} sem Range, em uma requisição ({remote.size / 1e6:.1f} MB)")
+        _stream_whole(transport, remote.url, part_path, remote.size, retries, backoff)
+    else:
+        if not os.path.exists(part_path):
+            journal.remove()  # Diário sem o arquivo parcial não serve para retomar
+        done = journal.load(url, remote, chunk_size)
+        with open(part_path, "ab") as f:
+            f.truncate(remote.size)
+
+        chunks = [(i, i * chunk_size, min((i + 1) * chunk_size, remote.size) - 1)
+                  for i in range((remote.size + chunk_size - 1) // chunk_size)]
+        pending = [c for c in chunks if c[0] not in done]
+        logger.info(f"Baixando {os.path.basename(dest)}: {len(pending)}/{len(chunks)} chunks pendentes "
+                    f"({remote.size / 1e6:.1f} MB)")
+
+        def run(chunk):
+            index, start, end = chunk
+            _fetch_chunk(transport, remote.url, part_path, start, end, retries, backoff)
+            journal.mark_done(index)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(run, pending))
+
+    if not verify_file(part_path, remote.size, expected_sha256):
+        journal.remove()
+        raise IOError(f"Falha na verificação de integridade: {dest}")
+    os.replace(part_path, dest)
+    journal.remove()
+    logger.info(f"Download concluído e verificado: {dest}")
+    return dest
+
+
+def kaggle_credentials(config_dir: Optional[str] = None) -> Optional[tuple]:
+    """
+    (usuário, chave) do Kaggle: variáveis KAGGLE_USERNAME/KAGGLE_KEY ou kaggle.json
+    em KAGGLE_CONFIG_DIR (ou ~/.kaggle).
+    """
+    if os.environ.get("KAGGLE_USERNAME") and os.environ.get("KAGGLE_KEY"):
+        return os.environ["KAGGLE_USERNAME"], os.environ["KAGGLE_KEY"]
+    config_dir = config_dir or os.environ.get("KAGGLE_CONFIG_DIR") or os.path.expanduser("~/.kaggle")
+    path = os.path.join(config_dir, "kaggle.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        data = json.load(f)
+    return data["username"], data["key"]
+
+
+def download_kaggle_dataset(dataset_slug: str, zip_path: str, transport: Optional[Transport] = None,
+                            deep_verify: bool = False, **kwargs) -> str:
+    """
+    Download retomável do ZIP de um dataset do Kaggle, validado antes da extração.
+    """
+    if transport is None:
+        credentials = kaggle_credentials()
+        if credentials is None:
+            raise IOError("Credenciais do Kaggle não encontradas (kaggle.json ou KAGGLE_USERNAME/KAGGLE_KEY).")
+        token = base64.b64encode(f"{credentials[0]}:{credentials[1]}".encode()).decode()
+        transport = HTTPTransport(headers={"Authorization": f"Basic {token}"})
+
+    download_file(KAGGLE_DOWNLOAD_URL.format(slug=dataset_slug), zip_path, transport, **kwargs)
+    if not verify_zip(zip_path, deep=deep_verify):
+        raise IOError(f"ZIP corrompido: {zip_path}")
+    return zip_path
@@ -0,0 +1,376 @@
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from .image_headers import read_image_header
+
+logger = logging.getLogger(__name__)
+
+# Faixas fixas por feature: (mínimo, máximo, número de bins).
+# Valores fora da faixa vão para os bins de underflow/overflow, então a memória é constante.
+FEATURE_BINS = {
+    "prob_malignant": (0.0, 1.0, 50),
+    "width": (0.0, 6000.0, 60),
+    "height": (0.0, 6000.0, 60),
+    "file_size_kb": (0.0, 20000.0, 100),
+    "mean_intensity": (0.0, 255.0, 64),
+    "std_intensity": (0.0, 128.0, 64),
+}
+
+
+class FixedHistogram:
+    """
+    Histograma de faixas fixas, mesclável e serializável (memória constante).
+    """
+
+    def __init__(self, low: float, high: float, n_bins: int, counts=None, n: int = 0,
+                 total: float = 0.0, total_sq: float = 0.0, min_value=None, max_value=None):
+        if high <= low or n_bins <= 0:
+            raise ValueError(f"Faixa inválida: [{low}, {high}) com {n_bins} bins")
+        self.low = float(low)
+        self.high = float(high)
+        self.n_bins = int(n_bins)
+        # counts[0] = underflow, counts[-1] = overflow
+        self.counts = list(counts) if counts is not None else [0] * (self.n_bins + 2)
+        self.n = n
+        self.total = total
+        self.total_sq = total_sq
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @property
+    def bin_width(self) -> float:
+        return (self.high - self.low) / self.n_bins
+
+    def _index(self, value: float) -> int:
+        if value < self.low:
+            return 0
+        if value >= self.high:
+            return self.n_bins + 1
+        return min(1 + int((value - self.low) / self.bin_width), self.n_bins)
+
+    def update(self, value: Optional[float]):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return
+        value = float(value)
+        self.counts[self._index(value)] += 1
+        self.n += 1
+        self.total += value
+        self.total_sq += value * value
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+        self.max_value = value if self.max_value is None else max(self.max_value, value)
+
+    def is_compatible(self, other: "FixedHistogram") -> bool:
+        return (self.low, self.high, self.n_bins) == (other.low, other.high, other.n_bins)
+
+    def merge(self, other: "FixedHistogram") -> "FixedHistogram":
+        if not self.is_compatible(other):
+            raise ValueError("Histogramas com faixas diferentes não podem ser mesclados.")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.n += other.n
+        self.total += other.total
+        self.total_sq += other.total_sq
+        mins = [v for v in (self.min_value, other.min_value) if v is not None]
+        maxs = [v for v in (self.max_value, other.max_value) if v is not None]
+        self.min_value = min(mins) if mins else None
+        self.max_value = max(maxs) if maxs else None
+        return self
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.n if self.n else None
+
+    @property
+    def std(self) -> Optional[float]:
+        if not self.n:
+            return None
+        variance = max(self.total_sq / self.n - (self.total / self.n) ** 2, 0.0)
+        return math.sqrt(variance)
+
+    def cdf(self):
+        """
+        Frações acumuladas ao fim de cada bin (incluindo underflow e overflow).
+        """
+        if not self.n:
+            return [0.0] * len(self.counts)
+        acc, out = 0, []
+        for c in self.counts:
+            acc += c
+            out.append(acc / self.n)
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Quantil aproximado por interpolação linear dentro do bin.
+        """
+        if not self.n:
+            return None
+        target = q * self.n
+        acc = 0
+        for i, c in enumerate(self.counts):
+            if c and acc + c >= target:
+                if i == 0:
+                    return self.min_value
+                if i == self.n_bins + 1:
+                    return self.max_value
+                start = self.low + (i - 1) * self.bin_width
+                return start + self.bin_width * (target - acc) / c
+            acc += c
+        return self.max_value
+
+    def to_dict(self) -> dict:
+        return {"low": self.low, "high": self.high, "n_bins": self.n_bins, "counts": self.counts,
+                "n": self.n, "total": self.total, "total_sq": self.total_sq,
+                "min_value": self.min_value, "max_value": self.max_value}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FixedHistogram":
+        return cls(**data)
+
+
+class DriftSketch:
+    """
+    Conjunto de histogramas (um por feature) atualizado a cada inferência.
+    Parciais de containers diferentes podem ser mesclados com merge().
+    """
+
+    def __init__(self, feature_bins: Optional[Dict[str, tuple]] = None):
+        feature_bins = feature_bins or FEATURE_BINS
+        self.histograms = {name: FixedHistogram(*spec) for name, spec in feature_bins.items()}
+        self.n = 0
+
+    def update(self, features: dict):
+        for name, hist in self.histograms.items():
+            hist.update(features.get(name))
+        self.n += 1
+
+    def update_inference(self, prob_malignant: Optional[float], image_bytes: Optional[bytes] = None):
+        features = image_features(image_bytes) if image_bytes is not None else {}
+        features["prob_malignant"] = prob_malignant
+        self.update(features)
+
+    def merge(self, other: "DriftSketch") -> "DriftSketch":
+        for name, hist in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(hist)
+            else:
+                self.histograms[name] = FixedHistogram.from_dict(hist.to_dict())
+        self.n += other.n
+        return self
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "histograms": {k: h.to_dict() for k, h in self.histograms.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DriftSketch":
+        sketch = cls(feature_bins={})
+        sketch.histograms = {k: FixedHistogram.from_dict(v) for k, v in data["histograms"].items()}
+        sketch.n = data.get("n", 0)
+        return sketch
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text) -> "DriftSketch":
+        return cls.from_dict(json.loads(text))
+
+    def save(self, path: str) -> str:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "w") as f:
+            f.write(self.to_json())
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "DriftSketch":
+        with open(path, "r") as f:
+            return cls.from_json(f.read())
+
+
+def merge_sketches(sketches: Iterable[DriftSketch]) -> DriftSketch:
+    """
+    Mescla vários parciais num único sketch.
+    """
+    merged = None
+    for sketch in sketches:
+        merged = DriftSketch.from_dict(sketch.to_dict()) if merged is None else merged.merge(sketch)
+    return merged if merged is not None else DriftSketch()
+
+
+def intensity_statistics(image_bytes: bytes):
+    """
+    Média e desvio-padrão da intensidade numa versão reduzida (1/4) da imagem.
+    Retorna (None, None) se o OpenCV não estiver disponível ou a imagem não decodificar.
+    """
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return None, None
+
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None:
+        return None, None
+    mean, std = cv2.meanStdDev(img)
+    return float(mean[0][0]), float(std[0][0])
+
+
+def image_features(image_bytes: bytes) -> dict:
+    """
+    Extrai as features de monitoramento de uma imagem: dimensões (só cabeçalho),
+    tamanho em KB e estatísticas de intensidade.
+    """
+    header = read_image_header(image_bytes) or {}
+    mean, std = intensity_statistics(image_bytes)
+    return {
+        "width": header.get("width"),
+        "height": header.get("height"),
+        "file_size_kb": len(image_bytes) / 1024,
+        "mean_intensity": mean,
+        "std_intensity": std,
+    }
+
+
+def _fractions(hist: FixedHistogram, eps: float):
+    total = hist.n + eps * len(hist.counts)
+    return [(c + eps) / total for c in hist.counts]
+
+
+def psi(expected: FixedHistogram, actual: FixedHistogram, eps: float = 1e-4) -> float:
+    """
+    Population Stability Index entre o histograma de referência e o atual.
+    """
+    if not expected.is_compatible(actual):
+        raise ValueError("Histogramas com faixas diferentes.")
+    if not expected.n or not actual.n:
+        return float("nan")
+    e = _fractions(expected, eps)
+    a = _fractions(actual, eps)
+    return sum((ai - ei) * math.log(ai / ei) for ai, ei in zip(a, e))
+
+
+def ks_statistic(expected: FixedHistogram, actual: FixedHistogram) -> float:
+    """
+    Estatística KS calculada nas bordas dos bins (limite inferior da KS exata).
+    """
+    if not expected.is_compatible(actual):
+        raise ValueError("Histogramas com faixas diferentes.")
+    if not expected.n or not actual.n:
+        return float("nan")
+    return max(abs(a - b) for a, b in zip(expected.cdf(), actual.cdf()))
+
+
+def ks_pvalue(d: float, n1: int, n2: int) -> float:
+    """
+    p-valor assintótico (distribuição de Kolmogorov) para o teste KS de duas amostras.
+    """
+    if math.isnan(d) or not n1 or not n2:
+        return float("nan")
+    ne = n1 * n2 / (n1 + n2)
+    lam = (math.sqrt(ne) + 0.12 + 0.11 / math.sqrt(ne)) * d
+    if lam < 1e-3:
+        return 1.0
+    p = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam) for k in range(1, 101))
+    return min(max(p, 0.0), 1.0)
+
+
+def drift_report(baseline: DriftSketch, current: DriftSketch, psi_threshold: float = 0.2,
+                 ks_alpha: float = 0.01) -> Dict[str, dict]:
+    """
+    PSI e KS por feature, calculados apenas a partir dos sketches.
+    Uma feature é marcada como drift se PSI >= psi_threshold ou p-valor KS < ks_alpha.
+    Uma feature com amostras de um lado só (ex.: intensidade sem OpenCV na Lambda) sai
+    com `missing=True` e drift=None, com aviso no log, em vez de sumir do relatório.
+    """
+    report = {}
+    for name, base_hist in baseline.histograms.items():
+        cur_hist = current.histograms.get(name)
+        n_current = cur_hist.n if cur_hist is not None else 0
+        if not base_hist.n and not n_current:
+            continue
+        if not base_hist.n or not n_current:
+            logger.warning(f"Feature '{name}' sem amostras no "
+                           f"{'baseline' if not base_hist.n else 'período atual'}: drift não calculado.")
+            report[name] = {"psi": float("nan"), "ks": float("nan"), "ks_pvalue": float("nan"),
+                            "baseline_mean": base_hist.mean, "current_mean": cur_hist.mean if n_current else None,
+                            "n_baseline": base_hist.n, "n_current": n_current, "drift": None, "missing": True}
+            continue
+        psi_value = psi(base_hist, cur_hist)
+        d = ks_statistic(base_hist, cur_hist)
+        p_value = ks_pvalue(d, base_hist.n, cur_hist.n)
+        report[name] = {
+            "psi": psi_value,
+            "ks": d,
+            "ks_pvalue": p_value,
+            "baseline_mean": base_hist.mean,
+            "current_mean": cur_hist.mean,
+            "n_baseline": base_hist.n,
+            "n_current": cur_hist.n,
+            "drift": psi_value >= psi_threshold or p_value < ks_alpha,
+            "missing": False,
+        }
+    return report
+
+
+def build_baseline(lst_path: str, image_root: str, max_workers: int = 8,
+                   probabilities: Optional[Dict[str, float]] = None) -> DriftSketch:
+    """
+    Constrói o sketch de referência a partir das imagens listadas num .lst (ex.: train.lst).
+    probabilities (opcional) mapeia caminho relativo -> probabilidade de malignidade.
+    """
+    with open(lst_path, "r") as f:
+        paths = [line.rstrip("\n").split("\t")[2] for line in f if line.count("\t") >= 2]
+
+    def load_features(rel_path):
+        full_path = os.path.join(image_root, rel_path)
+        try:
+            with open(full_path, "rb") as img:
+                features = image_features(img.read())
+        except OSError as e:
+            logger.warning(f"Imagem ignorada no baseline ({full_path}): {e}")
+            return None
+        if probabilities is not None:
+            features["prob_malignant"] = probabilities.get(rel_path)
+        return features
+
+    sketch = DriftSketch()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for features in pool.map(load_features, paths):
+            if features is not None:
+                sketch.update(features)
+
+    logger.info(f"Baseline construído com {sketch.n} imagens de {os.path.basename(lst_path)}")
+    return sketch
+
+
+def save_partial_to_s3(sketch: DriftSketch, s3_client, bucket: str, prefix: str, container_id: str) -> str:
+    """
+    Grava um parcial do sketch no S3 em {prefix}/{container_id}/{timestamp}.json.
+    """
+    key = f"{prefix.rstrip('/')}/{container_id}/{int(time.time() * 1000)}.json"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=sketch.to_json().encode(), ContentType="application/json")
+    return key
+
+
+def load_sketches_from_s3(s3_client, bucket: str, prefix: str) -> DriftSketch:
+    """
+    Lê e mescla todos os parciais gravados sob o prefixo.
+    """
+    merged = DriftSketch()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    n_parts = 0
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if not obj["Key"].endswith(".json"):
+                continue
+            body = s3_client.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()
+            merged.merge(DriftSketch.from_json(body))
+            n_parts += 1
+    logger.info(f"{n_parts} parciais mesclados de s3://{bucket}/{prefix} ({merged.n} inferências)")
+    return merged
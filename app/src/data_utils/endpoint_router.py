@@ -0,0 +1,185 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALPHA = 0.3
+DEFAULT_WINDOW = 100
+# Amostras mínimas antes de usar o percentil como atraso do hedge
+MIN_HEDGE_SAMPLES = 10
+# Uma falha conta como latência = max(EWMA, duração, piso) * fator; o piso evita que
+# falhas rápidas (ex.: ThrottlingException) façam o endpoint parecer o mais rápido
+ERROR_PENALTY = 2.0
+ERROR_FLOOR_SECONDS = 1.0
+
+
+class EndpointStats:
+    """
+    Latência de um endpoint: EWMA para o roteamento e janela recente para percentis.
+    """
+
+    def __init__(self, name: str, alpha: float = DEFAULT_ALPHA, window: int = DEFAULT_WINDOW):
+        self.name = name
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.samples = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.last_used = 0.0
+
+    def record(self, seconds: float):
+        self.calls += 1
+        self.samples.append(seconds)
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+
+    def record_error(self, seconds: float):
+        self.calls += 1
+        self.errors += 1
+        self.ewma = max(self.ewma or 0.0, seconds, ERROR_FLOOR_SECONDS) * ERROR_PENALTY
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)  # Nearest-rank
+        return ordered[min(max(math.ceil(len(ordered) * pct / 100) - 1, 0), len(ordered) - 1)]
+
+    def to_dict(self) -> dict:
+        return {"ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+                "p50_ms": round((self.percentile(50) or 0) * 1000, 1), "calls": self.calls,
+                "errors": self.errors}
+
+
+class EndpointRouter:
+    """
+    Roteia cada chamada para o endpoint com menor latência (EWMA).
+
+    Com `hedge_percentile`, se o endpoint escolhido não responder dentro do percentil
+    indicado da sua própria latência, uma segunda requisição vai para o próximo
+    endpoint; vale a primeira resposta bem-sucedida e a outra é descartada. A latência
+    da descartada ainda atualiza o EWMA, mas limitada ao tempo até a chamada ser
+    resolvida: o que ela leva depois disso não atrasou ninguém e distorceria os percentis.
+    Se o primeiro falhar antes disso, o próximo é tentado.
+    Com um único endpoint ou sem hedge, a chamada é direta, sem threads.
+
+    `invoke(endpoint_name, body)` faz a chamada real (ex.: invoke_endpoint + leitura do corpo).
+    """
+
+    def __init__(self, endpoints: List[str], invoke: Callable[[str, Any], Any],
+                 alpha: float = DEFAULT_ALPHA, window: int = DEFAULT_WINDOW,
+                 hedge_percentile: Optional[float] = None, hedge_min_delay: float = 0.05,
+                 explore_every: int = 50):
+        if not endpoints:
+            raise ValueError("Informe pelo menos um endpoint.")
+        self.stats: Dict[str, EndpointStats] = {
+            name: EndpointStats(name, alpha, window) for name in dict.fromkeys(endpoints)}
+        self.invoke = invoke
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.explore_every = explore_every
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.last_endpoint: Optional[str] = None
+        self._calls = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def ranked(self) -> List[str]:
+        """
+        Endpoints do mais rápido para o mais lento; sem amostras vem primeiro (exploração).
+        A cada `explore_every` chamadas, o endpoint usado há mais tempo passa à frente,
+        para que um endpoint penalizado possa se recuperar.
+        """
+        with self._lock:
+            self._calls += 1
+            order = sorted(self.stats.values(), key=lambda s: (s.ewma is not None, s.ewma or 0.0))
+            if self.explore_every and len(order) > 1 and self._calls % self.explore_every == 0:
+                stalest = min(order, key=lambda s: s.last_used)
+                order.remove(stalest)
+                order.insert(0, stalest)
+        return [s.name for s in order]
+
+    def _timed(self, name: str, body, resolved: Optional[dict] = None):
+        """
+        `resolved` é o estado da chamada com hedge: {"at": perf_counter da resolução ou None}.
+        """
+        stats = self.stats[name]
+        stats.last_used = time.time()
+        start = time.perf_counter()
+        try:
+            result = self.invoke(name, body)
+        except Exception:
+            with self._lock:
+                stats.record_error(self._elapsed(start, resolved))
+            raise
+        with self._lock:
+            stats.record(self._elapsed(start, resolved))
+        return result
+
+    @staticmethod
+    def _elapsed(start: float, resolved: Optional[dict]) -> float:
+        end = time.perf_counter()
+        if resolved and resolved["at"] is not None:
+            end = min(end, resolved["at"])  # Perdedora do hedge: só conta até a chamada ser resolvida
+        return max(end - start, 0.0)
+
+    def hedge_delay(self, name: str) -> float:
+        stats = self.stats[name]
+        if len(stats.samples) < MIN_HEDGE_SAMPLES:
+            return self.hedge_min_delay
+        return max(stats.percentile(self.hedge_percentile), self.hedge_min_delay)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=2 * len(self.stats), thread_name_prefix="hedge")
+        return self._pool
+
+    def call(self, body):
+        """
+        Executa a chamada no melhor endpoint (com hedge, se configurado) e retorna o resultado.
+        """
+        order = self.ranked()
+        primary = order[0]
+        if not self.hedge_percentile or len(order) == 1:
+            self.last_endpoint = primary
+            return self._timed(primary, body)
+
+        pool = self._executor()
+        resolved = {"at": None}
+        futures = {pool.submit(self._timed, primary, body, resolved): primary}
+        delay = self.hedge_delay(primary)
+        done, _ = wait(futures, timeout=delay)
+        hedged = not done
+        if hedged or next(iter(done)).exception() is not None:
+            secondary = order[1]
+            if hedged:
+                self.hedges_fired += 1
+                logger.info(f"Hedge: {primary} sem resposta em {delay * 1000:.0f} ms, "
+                            f"enviando também para {secondary}")
+            else:
+                logger.warning(f"Falha em {primary}; tentando {secondary}")
+            futures[pool.submit(self._timed, secondary, body, resolved)] = secondary
+
+        errors = {}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    errors[futures[future]] = future.exception()
+                    continue
+                with self._lock:
+                    resolved["at"] = time.perf_counter()
+                self.last_endpoint = futures[future]
+                if hedged and self.last_endpoint != primary:
+                    self.hedges_won += 1
+                return future.result()  # A requisição perdedora continua e é descartada
+        raise errors.get(primary) or next(iter(errors.values()))
+
+    def metrics(self) -> dict:
+        return {"endpoints": {name: s.to_dict() for name, s in self.stats.items()},
+                "hedges_fired": self.hedges_fired, "hedges_won": self.hedges_won}
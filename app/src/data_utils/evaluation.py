@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def parse_endpoint_probabilities(body) -> float:
+    """
+    Converte a resposta do endpoint ([prob_benigno, prob_maligno]) na probabilidade de malignidade.
+    """
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode()
+    probs = json.loads(body) if isinstance(body, str) else body
+    return float(probs[1])
+
+
+def _as_arrays(y_true, y_score):
+    y_true = np.asarray(y_true, dtype=np.uint8).ravel()
+    y_score = np.asarray(y_score, dtype=np.float64).ravel()
+    if y_true.shape != y_score.shape:
+        raise ValueError(f"Tamanhos diferentes: y_true={y_true.shape}, y_score={y_score.shape}")
+    return y_true, y_score
+
+
+def binary_curve_counts(y_true, y_score):
+    """
+    Calcula, numa única ordenação, os verdadeiros/falsos positivos acumulados
+    para cada limiar distinto (predição positiva quando score >= limiar).
+    """
+    y_true, y_score = _as_arrays(y_true, y_score)
+    order = np.argsort(y_score, kind="mergesort")[::-1]
+    scores = y_score[order]
+    labels = y_true[order]
+
+    # Último índice de cada bloco de scores iguais
+    distinct = np.flatnonzero(np.diff(scores)) if scores.size else np.empty(0, dtype=np.intp)
+    ends = np.r_[distinct, scores.size - 1] if scores.size else distinct
+
+    tps = np.cumsum(labels, dtype=np.int64)[ends]
+    fps = (ends + 1) - tps
+    return scores[ends], tps, fps
+
+
+def roc_curve(y_true, y_score):
+    """
+    Curva ROC: retorna (fpr, tpr, thresholds), começando no ponto (0, 0).
+    """
+    thresholds, tps, fps = binary_curve_counts(y_true, y_score)
+    n_pos = tps[-1] if tps.size else 0
+    n_neg = fps[-1] if fps.size else 0
+
+    tps = np.r_[0, tps]
+    fps = np.r_[0, fps]
+    thresholds = np.r_[np.inf, thresholds]
+
+    tpr = tps / n_pos if n_pos else np.full(tps.shape, np.nan)
+    fpr = fps / n_neg if n_neg else np.full(fps.shape, np.nan)
+    return fpr, tpr, thresholds
+
+
+def precision_recall_curve(y_true, y_score):
+    """
+    Curva Precision-Recall: retorna (precision, recall, thresholds) em ordem de recall crescente.
+    """
+    thresholds, tps, fps = binary_curve_counts(y_true, y_score)
+    n_pos = tps[-1] if tps.size else 0
+
+    precision = tps / np.maximum(tps + fps, 1)
+    recall = tps / n_pos if n_pos else np.full(tps.shape, np.nan)
+    return precision, recall, thresholds
+
+
+def roc_auc(y_true, y_score) -> float:
+    """
+    Área sob a curva ROC (regra do trapézio).
+    """
+    fpr, tpr, _ = roc_curve(y_true, y_score)
+    if np.isnan(fpr).any() or np.isnan(tpr).any():
+        return float("nan")
+    return float(_trapezoid(tpr, fpr))
+
+
+def average_precision(y_true, y_score) -> float:
+    """
+    Average Precision (área sob a curva PR, soma em degraus).
+    """
+    precision, recall, _ = precision_recall_curve(y_true, y_score)
+    if recall.size == 0 or np.isnan(recall).any():
+        return float("nan")
+    return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+
+def threshold_sweep(y_true, y_score, thresholds: Optional[Sequence[float]] = None) -> Dict[str, np.ndarray]:
+    """
+    Matriz de confusão e métricas para vários limiares de uma vez.
+    Segue a regra do Lambda: maligno quando score > limiar.
+    """
+    y_true, y_score = _as_arrays(y_true, y_score)
+    if thresholds is None:
+        thresholds = np.linspace(0.0, 1.0, 101)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    pos = np.sort(y_score[y_true == 1])
+    neg = np.sort(y_score[y_true == 0])
+
+    tp = pos.size - np.searchsorted(pos, thresholds, side="right")
+    fp = neg.size - np.searchsorted(neg, thresholds, side="right")
+    fn = pos.size - tp
+    tn = neg.size - fp
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(pos.size > 0, tp / max(pos.size, 1), np.nan)
+        specificity = np.where(neg.size > 0, tn / max(neg.size, 1), np.nan)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    accuracy = (tp + tn) / max(y_true.size, 1)
+
+    return {
+        "threshold": thresholds,
+        "tp": tp, "fp": fp, "tn": tn, "fn": fn,
+        "precision": precision,
+        "recall": recall,
+        "specificity": specificity,
+        "f1": f1,
+        "accuracy": accuracy,
+    }
+
+
+def calibration_bins(y_true, y_score, n_bins: int = 10) -> Dict[str, np.ndarray]:
+    """
+    Agrupa as probabilidades em faixas iguais e compara a média prevista com a fração real de positivos.
+    """
+    y_true, y_score = _as_arrays(y_true, y_score)
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    idx = np.clip(np.searchsorted(edges, y_score, side="right") - 1, 0, n_bins - 1)
+
+    count = np.bincount(idx, minlength=n_bins)
+    sum_pred = np.bincount(idx, weights=y_score, minlength=n_bins)
+    sum_true = np.bincount(idx, weights=y_true, minlength=n_bins)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_pred = np.where(count > 0, sum_pred / np.maximum(count, 1), np.nan)
+        frac_pos = np.where(count > 0, sum_true / np.maximum(count, 1), np.nan)
+
+    gap = np.abs(np.nan_to_num(mean_pred) - np.nan_to_num(frac_pos))
+    ece = float(np.sum(gap * count) / max(y_true.size, 1))
+
+    return {
+        "edges": edges,
+        "count": count,
+        "mean_predicted": mean_pred,
+        "fraction_positive": frac_pos,
+        "ece": ece,
+    }
+
+
+def evaluate_probabilities(y_true, y_score, threshold: float = 0.5,
+                           thresholds: Optional[Sequence[float]] = None, n_bins: int = 10) -> dict:
+    """
+    Calcula curvas, AUCs, calibração e varredura de limiares a partir das probabilidades.
+    """
+    y_true, y_score = _as_arrays(y_true, y_score)
+    fpr, tpr, roc_thr = roc_curve(y_true, y_score)
+    precision, recall, pr_thr = precision_recall_curve(y_true, y_score)
+    sweep = threshold_sweep(y_true, y_score, thresholds)
+    at_threshold = threshold_sweep(y_true, y_score, [threshold])
+
+    return {
+        "n_samples": int(y_true.size),
+        "n_positive": int(y_true.sum()),
+        "roc_auc": roc_auc(y_true, y_score),
+        "average_precision": average_precision(y_true, y_score),
+        "roc": {"fpr": fpr, "tpr": tpr, "thresholds": roc_thr},
+        "pr": {"precision": precision, "recall": recall, "thresholds": pr_thr},
+        "calibration": calibration_bins(y_true, y_score, n_bins),
+        "sweep": sweep,
+        "at_threshold": {k: v[0].item() for k, v in at_threshold.items()},
+    }
+
+
+def save_scores(path: str, y_true, y_score, image_paths: Optional[Iterable[str]] = None,
+                metadata: Optional[dict] = None) -> str:
+    """
+    Salva labels e probabilidades num .npz compacto para reanálise sem chamar o endpoint.
+    """
+    y_true, y_score = _as_arrays(y_true, y_score)
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    arrays = {
+        "y_true": y_true.astype(np.uint8),
+        "y_score": y_score.astype(np.float32),
+        "metadata": np.array(json.dumps(metadata or {})),
+    }
+    if image_paths is not None:
+        arrays["image_paths"] = np.asarray(list(image_paths), dtype=np.str_)
+
+    np.savez_compressed(path, **arrays)
+    if not path.endswith(".npz"):
+        path += ".npz"
+    logger.info(f"Scores salvos em: {path} ({y_true.size} imagens)")
+    return path
+
+
+def load_scores(path: str) -> dict:
+    """
+    Carrega scores salvos por save_scores.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        result = {
+            "y_true": data["y_true"],
+            "y_score": data["y_score"],
+            "metadata": json.loads(str(data["metadata"])),
+        }
+        result["image_paths"] = data["image_paths"].tolist() if "image_paths" in data.files else None
+    return result
+
+
+class ScoreCollector:
+    """
+    Acumula label e probabilidade por imagem em arrays NumPy pré-alocados.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._y_true = np.empty(max(capacity, 1), dtype=np.uint8)
+        self._y_score = np.empty(max(capacity, 1), dtype=np.float32)
+        self._paths: List[str] = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, label: int, prob_malignant: float, image_path: Optional[str] = None):
+        if self._size == self._y_true.size:
+            new_capacity = self._y_true.size * 2
+            self._y_true = np.resize(self._y_true, new_capacity)
+            self._y_score = np.resize(self._y_score, new_capacity)
+        self._y_true[self._size] = label
+        self._y_score[self._size] = prob_malignant
+        if image_path is not None:
+            self._paths.append(image_path)
+        self._size += 1
+
+    @property
+    def y_true(self) -> np.ndarray:
+        return self._y_true[:self._size]
+
+    @property
+    def y_score(self) -> np.ndarray:
+        return self._y_score[:self._size]
+
+    def evaluate(self, **kwargs) -> dict:
+        return evaluate_probabilities(self.y_true, self.y_score, **kwargs)
+
+    def save(self, path: str, metadata: Optional[dict] = None) -> str:
+        paths = self._paths if len(self._paths) == self._size else None
+        return save_scores(path, self.y_true, self.y_score, paths, metadata)
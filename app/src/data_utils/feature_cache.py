@@ -0,0 +1,366 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import commons, evaluation
+from .content_store import hash_files
+from .pipeline import ContentHasher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKBONE = "resnet50"
+DEFAULT_DTYPE = "float16"
+FEATURES_FILE = "features.bin"
+KEYS_FILE = "keys.txt"
+META_FILE = "meta.json"
+# Normalização do ImageNet (a mesma do ResNet-50 pré-treinado)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+# Espaço de busca do HyperparameterTuner do 02_resnet50_train_model.ipynb
+DEFAULT_GRID = {
+    "learning_rate": [0.1, 0.01, 0.001, 0.0001],
+    "batch_size": [16, 32, 64],
+    "optimizer": ["sgd", "adam", "rmsprop"],
+}
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+Extractor = Callable[[np.ndarray], np.ndarray]
+
+
+class FeatureCache:
+    """
+    Features da penúltima camada, uma linha por conteúdo de imagem (sha256), em um
+    arquivo binário lido por memory map (features.bin) + keys.txt (linha i -> sha256).
+    Só cresce por append: as features são gravadas antes das chaves, então uma escrita
+    interrompida deixa no máximo bytes sobrando, descartados na próxima abertura.
+    meta.json guarda a dimensão, o dtype e o backbone; trocar o backbone exige outro diretório.
+    É gravado na criação quando `dim` é informado, senão no primeiro append.
+    """
+
+    def __init__(self, cache_dir: str, dim: Optional[int] = None, dtype: str = DEFAULT_DTYPE,
+                 backbone: str = DEFAULT_BACKBONE):
+        self.cache_dir = cache_dir
+        self.features_path = os.path.join(cache_dir, FEATURES_FILE)
+        self.keys_path = os.path.join(cache_dir, KEYS_FILE)
+        meta_path = os.path.join(cache_dir, META_FILE)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        meta = {"dim": dim, "dtype": dtype, "backbone": backbone}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                stored = json.load(f)
+            if stored["backbone"] != backbone or (dim is not None and stored["dim"] != dim):
+                raise ValueError(f"Cache em {cache_dir} é de {stored['backbone']} (dim {stored['dim']}), "
+                                 f"não de {backbone} (dim {dim})")
+            meta = stored
+        self.meta = meta
+        self.meta_path = meta_path
+        if dim is not None and not os.path.exists(meta_path):
+            self._write_meta()
+        self.index: Dict[str, int] = {}
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r") as f:
+                for line in f:
+                    self.index.setdefault(line.strip(), len(self.index))
+        self._recover()
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.meta["dim"]
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * np.dtype(self.meta["dtype"]).itemsize
+
+    def _write_meta(self):
+        with open(self.meta_path, "w") as f:
+            json.dump(self.meta, f)
+
+    def _recover(self):
+        """Descarta features de uma escrita interrompida (bytes além da última chave)."""
+        if self.dim is None or not os.path.exists(self.features_path):
+            return
+        expected = len(self.index) * self.row_bytes
+        size = os.path.getsize(self.features_path)
+        if size < expected:
+            raise ValueError(f"{self.features_path} tem {size} bytes; esperado ao menos {expected}")
+        if size > expected:
+            logger.warning(f"Descartando {(size - expected) // self.row_bytes} linhas incompletas de {self.features_path}")
+            with open(self.features_path, "r+b") as f:
+                f.truncate(expected)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self.index
+
+    def array(self) -> np.ndarray:
+        """Todas as features (N x dim) como memory map somente leitura."""
+        if not self.index:
+            return np.zeros((0, self.dim or 0), dtype=self.meta["dtype"])
+        return np.memmap(self.features_path, dtype=self.meta["dtype"], mode="r", shape=(len(self.index), self.dim))
+
+    def get(self, digests: Sequence[str]) -> np.ndarray:
+        rows = [self.index[d] for d in digests]
+        return np.asarray(self.array()[rows], dtype=np.float32)
+
+    def append(self, digests: Sequence[str], features: np.ndarray):
+        features = np.asarray(features).reshape(len(digests), -1)
+        if self.dim is None:
+            self.meta["dim"] = features.shape[1]
+            self._write_meta()
+        elif features.shape[1] != self.dim:
+            raise ValueError(f"Features com dimensão {features.shape[1]}; o cache usa {self.dim}")
+
+        new = [i for i, d in enumerate(digests) if d not in self.index]
+        if not new:
+            return
+        with open(self.features_path, "ab") as f:
+            f.write(features[new].astype(self.meta["dtype"]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.keys_path, "a") as f:
+            for i in new:
+                self.index[digests[i]] = len(self.index)
+                f.write(digests[i] + "\n")
+
+
+def digest_paths(image_root: str, relative_paths: Iterable[str], memo_path: Optional[str] = None,
+                 max_workers: int = 8) -> Dict[str, str]:
+    """
+    Caminho relativo -> sha256. Caminhos do CAS (ab/cd/<sha256>.jpg) já trazem o hash;
+    os demais são lidos (com memo). Arquivos ausentes ficam de fora.
+    """
+    result, to_hash = {}, []
+    for rel in dict.fromkeys(relative_paths):
+        stem = os.path.splitext(os.path.basename(rel))[0]
+        if _SHA256.match(stem):
+            result[rel] = stem
+        elif os.path.isfile(os.path.join(image_root, rel)):
+            to_hash.append(rel)
+    if to_hash:
+        hasher = ContentHasher(memo_path)
+        digests = hash_files([os.path.join(image_root, rel) for rel in to_hash], max_workers, hasher)
+        hasher.save()
+        result.update({rel: digests[os.path.join(image_root, rel)] for rel in to_hash})
+    return result
+
+
+def onnx_extractor(model_path: str, output_name: Optional[str] = None,
+                   mean: Sequence[float] = IMAGENET_MEAN, std: Sequence[float] = IMAGENET_STD,
+                   threads: Optional[int] = None) -> Extractor:
+    """
+    Extrator em CPU a partir de um backbone exportado para ONNX (ex.: ResNet-50 sem a
+    camada fc, saída 2048). Recebe lotes N x H x W x 3 uint8 e retorna N x dim.
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError as exc:
+        raise ImportError("onnxruntime é necessário para extrair features: pip install onnxruntime") from exc
+
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    output_names = [output_name] if output_name else [session.get_outputs()[0].name]
+    mean = np.asarray(mean, dtype=np.float32).reshape(1, 3, 1, 1)
+    std = np.asarray(std, dtype=np.float32).reshape(1, 3, 1, 1)
+
+    def extract(images: np.ndarray) -> np.ndarray:
+        batch = (images.transpose(0, 3, 1, 2).astype(np.float32) / 255.0 - mean) / std
+        output = session.run(output_names, {input_name: batch})[0]
+        return output.reshape(len(images), -1)
+
+    return extract
+
+
+def extract_features(lst_paths: Iterable[str], image_root: str, cache_dir: str, extractor: Extractor,
+                     backbone: str = DEFAULT_BACKBONE, batch_size: int = 32,
+                     image_size: Tuple[int, int] = (224, 224), num_workers: Optional[int] = None,
+                     memo_path: Optional[str] = None) -> dict:
+    """
+    Passa pelo backbone, uma única vez, cada conteúdo de imagem dos .lst que ainda não
+    está no cache. As imagens são carregadas pelo BatchLoader (processos + memória compartilhada).
+    """
+    from .batch_loader import BatchLoader
+
+    paths = [e.path for lst in lst_paths for e in commons.read_lst_file(lst)]
+    digests = digest_paths(image_root, paths, memo_path)
+    cache = FeatureCache(cache_dir, backbone=backbone)
+    pending, missing = {}, len(set(paths)) - len(digests)
+    for rel, digest in digests.items():
+        if digest in cache or digest in pending:
+            continue
+        if os.path.isfile(os.path.join(image_root, rel)):
+            pending[digest] = rel
+        else:
+            missing += 1  # Chave CAS sem o arquivo em image_root
+
+    unique = len(set(digests.values()))
+    stats = {"images": len(paths), "unique": unique, "missing": missing,
+             "cached": sum(1 for d in set(digests.values()) if d in cache),
+             "extracted": 0, "failed": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    if pending:
+        order = list(pending.items())
+        with tempfile.TemporaryDirectory() as tmp:
+            lst = os.path.join(tmp, "pending.lst")
+            commons.write_lst_file([(0, rel) for _, rel in order], lst)
+            with BatchLoader(lst, image_root, batch_size=batch_size, image_size=image_size, shuffle=False,
+                             num_workers=num_workers) as loader:
+                for batch in loader:
+                    keep = np.setdiff1d(np.arange(len(batch.indices)), batch.failed)
+                    if len(keep):
+                        features = extractor(batch.images[keep])
+                        cache.append([order[batch.indices[i]][0] for i in keep], features)
+                    stats["extracted"] += len(keep)
+                    stats["failed"] += len(batch.failed)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["images_per_sec"] = round(stats["extracted"] / stats["seconds"], 1) if stats["seconds"] > 0 else 0.0
+    logger.info(f"Features: {stats['extracted']} extraídas ({stats['images_per_sec']} imagens/s), "
+                f"{stats['cached']} em cache, {stats['failed']} ilegíveis, {stats['missing']} ausentes")
+    return stats
+
+
+def load_split(cache_dir: str, lst_path: str, image_root: str, backbone: str = DEFAULT_BACKBONE,
+               memo_path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (X, y) de um .lst a partir do cache; imagens sem features são ignoradas com aviso.
+    """
+    entries = commons.read_lst_file(lst_path)
+    digests = digest_paths(image_root, [e.path for e in entries], memo_path)
+    cache = FeatureCache(cache_dir, backbone=backbone)
+    kept = [e for e in entries if digests.get(e.path) in cache]
+    if len(kept) < len(entries):
+        logger.warning(f"{len(entries) - len(kept)} imagens de {lst_path} sem features no cache")
+    X = cache.get([digests[e.path] for e in kept]) if kept else np.zeros((0, cache.dim or 0), np.float32)
+    return X, np.array([e.label for e in kept], dtype=np.int64)
+
+
+@dataclass
+class LinearHead:
+    """
+    Cabeça logística (binária) sobre as features padronizadas.
+    """
+    weights: np.ndarray
+    bias: float
+    mean: np.ndarray
+    std: np.ndarray
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        z = ((X - self.mean) / self.std) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def train_head(X: np.ndarray, y: np.ndarray, learning_rate: float = 0.001, optimizer: str = "adam",
+               batch_size: int = 32, epochs: int = 20, momentum: float = 0.9, weight_decay: float = 0.0,
+               seed: int = 42) -> LinearHead:
+    """
+    Treina a cabeça com mini-lotes, com os mesmos otimizadores do algoritmo da SageMaker
+    (sgd com momentum, adam, rmsprop).
+    """
+    if optimizer not in ("sgd", "adam", "rmsprop"):
+        raise ValueError(f"Otimizador desconhecido: {optimizer}")
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    mean = X.mean(axis=0)
+    std = X.std(axis=0) + 1e-6
+    Xs = (X - mean) / std
+
+    params = np.zeros(X.shape[1] + 1, dtype=np.float64)  # pesos + bias
+    m, v = np.zeros_like(params), np.zeros_like(params)
+    rng = np.random.default_rng(seed)
+    step = 0
+    for _ in range(epochs):
+        order = rng.permutation(len(Xs))
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            xb, yb = Xs[idx], y[idx]
+            p = 1.0 / (1.0 + np.exp(-np.clip(xb @ params[:-1] + params[-1], -30, 30)))
+            err = p - yb
+            grad = np.append(xb.T @ err, err.sum()) / len(idx)
+            grad[:-1] += weight_decay * params[:-1]
+            step += 1
+            if optimizer == "sgd":
+                m = momentum * m + grad
+                params -= learning_rate * m
+            elif optimizer == "adam":
+                m = 0.9 * m + 0.1 * grad
+                v = 0.999 * v + 0.001 * grad ** 2
+                params -= learning_rate * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+            else:
+                v = 0.9 * v + 0.1 * grad ** 2
+                params -= learning_rate * grad / (np.sqrt(v) + 1e-8)
+    return LinearHead(params[:-1].astype(np.float32), float(params[-1]), mean, std)
+
+
+def sweep_heads(train: Tuple[np.ndarray, np.ndarray], validation: Tuple[np.ndarray, np.ndarray],
+                grid: Optional[Dict[str, list]] = None, threshold: float = 0.5, **fixed) -> List[dict]:
+    """
+    Treina uma cabeça por combinação do grid e retorna os resultados ordenados pela
+    acurácia de validação (a métrica objetivo do tuner), com AUC e tempo de cada uma.
+    """
+    grid = grid or DEFAULT_GRID
+    names = list(grid)
+    y_val = validation[1]
+    results = []
+    for values in itertools.product(*(grid[n] for n in names)):
+        config = dict(zip(names, values))
+        start = time.perf_counter()
+        head = train_head(train[0], train[1], **{**fixed, **config})
+        seconds = time.perf_counter() - start
+        scores = head.predict_proba(validation[0])
+        accuracy = float(((scores >= threshold) == y_val).mean()) if len(y_val) else 0.0
+        auc = evaluation.roc_auc(y_val, scores) if 0 < y_val.sum() < len(y_val) else float("nan")
+        results.append({**config, "validation_accuracy": round(accuracy, 4), "validation_auc": round(auc, 4),
+                        "seconds": round(seconds, 3)})
+    results.sort(key=lambda r: r["validation_accuracy"], reverse=True)
+    logger.info(f"{len(results)} cabeças treinadas em {sum(r['seconds'] for r in results):.1f}s; "
+                f"melhor: {results[0] if results else None}")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Cache de features do backbone congelado e varredura de cabeças em CPU.")
+    parser.add_argument("cache_dir")
+    parser.add_argument("train_lst")
+    parser.add_argument("validation_lst")
+    parser.add_argument("--image-root", required=True)
+    parser.add_argument("--onnx", help="Backbone ONNX: extrai antes as features que faltam no cache")
+    parser.add_argument("--output-name", help="Saída do grafo ONNX com as features (padrão: a primeira)")
+    parser.add_argument("--backbone", default=DEFAULT_BACKBONE)
+    parser.add_argument("--memo", help="Memo de hashes (ex.: app/data/hash_memo.json)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--learning-rate", type=float, nargs="+", default=DEFAULT_GRID["learning_rate"])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=DEFAULT_GRID["batch_size"])
+    parser.add_argument("--optimizer", nargs="+", default=DEFAULT_GRID["optimizer"])
+    parser.add_argument("--epochs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    report = {}
+    if args.onnx:
+        report["extract"] = extract_features([args.train_lst, args.validation_lst], args.image_root, args.cache_dir,
+                                             onnx_extractor(args.onnx, args.output_name), backbone=args.backbone,
+                                             num_workers=args.workers, memo_path=args.memo)
+    train = load_split(args.cache_dir, args.train_lst, args.image_root, args.backbone, args.memo)
+    validation = load_split(args.cache_dir, args.validation_lst, args.image_root, args.backbone, args.memo)
+    grid = {"learning_rate": args.learning_rate, "batch_size": args.batch_size, "optimizer": args.optimizer}
+    report["heads"] = sweep_heads(train, validation, grid, epochs=args.epochs)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
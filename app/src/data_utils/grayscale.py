@@ -0,0 +1,132 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUALITY = 95
+DEFAULT_CHANNELS = 3
+# Formatos que o OpenCV grava em um canal (DICOM fica de fora: é convertido em outra etapa)
+CONVERTIBLE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def opencv_available() -> bool:
+    """
+    True se o OpenCV e o NumPy puderem ser importados. Na Lambda, só com uma layer.
+    """
+    try:
+        import cv2  # noqa: F401
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def replicate_channels(gray, channels: int = DEFAULT_CHANNELS, copy: bool = False):
+    """
+    Repete o canal cinza em HxWxC. Sem `copy`, retorna uma view somente leitura
+    (np.broadcast_to): nenhum byte extra é alocado até o consumidor precisar escrever.
+    """
+    import numpy as np
+
+    if gray.ndim == 3:
+        gray = gray[:, :, 0]
+    view = np.broadcast_to(gray[:, :, None], gray.shape + (channels,))
+    return view.copy() if copy else view
+
+
+def decode_image(data: bytes, channels: int = DEFAULT_CHANNELS):
+    """
+    Decodifica bytes JPEG/PNG em um canal (sem conversão de cor) e replica para
+    `channels` na hora do uso. channels=1 retorna a matriz HxW.
+    """
+    import cv2
+    import numpy as np
+
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Imagem ilegível.")
+    return gray if channels == 1 else replicate_channels(gray, channels)
+
+
+def load_image(path: str, channels: int = DEFAULT_CHANNELS):
+    """
+    Como decode_image, lendo de um arquivo.
+    """
+    with open(path, "rb") as f:
+        return decode_image(f.read(), channels)
+
+
+def encode_grayscale(data: bytes, quality: int = DEFAULT_QUALITY) -> bytes:
+    """
+    Recodifica uma imagem (JPEG/PNG) como JPEG de um canal.
+    """
+    import cv2
+
+    ok, buf = cv2.imencode(".jpg", decode_image(data, channels=1), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Falha ao codificar JPEG.")
+    return buf.tobytes()
+
+
+def _convert_worker(job: Tuple[str, str, int]) -> Tuple[str, int, int]:
+    """
+    Executado no ProcessPool: lê em um canal e grava no mesmo formato (tmp + os.replace).
+    """
+    import cv2
+
+    src, dst, quality = job
+    gray = cv2.imread(src, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return "unreadable", os.path.getsize(src), 0
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    ext = os.path.splitext(dst)[1]
+    tmp = dst + ".tmp" + ext
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext.lower() in (".jpg", ".jpeg") else []
+    if not cv2.imwrite(tmp, gray, params):
+        return "unreadable", os.path.getsize(src), 0
+    os.replace(tmp, dst)
+    return "ok", os.path.getsize(src), os.path.getsize(dst)
+
+
+def convert_tree(src_root: str, dst_root: str, relative_paths: Optional[Iterable[str]] = None,
+                 quality: int = DEFAULT_QUALITY, max_workers: Optional[int] = None) -> dict:
+    """
+    Grava em `dst_root`, com os mesmos caminhos relativos, a versão em um canal de cada
+    imagem de `src_root` (ou só de `relative_paths`). Imagens cuja cópia em `dst_root` é
+    mais nova que a original não são decodificadas de novo.
+    Os .lst continuam válidos: só a raiz das imagens muda.
+    """
+    if relative_paths is None:
+        from .inventory import scan_tree  # Importação tardia: este módulo também vai no pacote da Lambda
+
+        relative_paths = [rel for rel, _ in scan_tree(src_root)]
+    jobs = []
+    stats = {"files": 0, "converted": 0, "cached": 0, "unreadable": 0, "bytes_in": 0, "bytes_out": 0}
+    for rel in dict.fromkeys(relative_paths):
+        if os.path.splitext(rel)[1].lower() not in CONVERTIBLE_EXTENSIONS:
+            continue
+        stats["files"] += 1
+        src, dst = os.path.join(src_root, rel), os.path.join(dst_root, rel)
+        if not os.path.exists(src):
+            stats["unreadable"] += 1
+            continue
+        if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+            stats["cached"] += 1
+            continue
+        jobs.append((src, dst, quality))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for status, bytes_in, bytes_out in pool.map(_convert_worker, jobs, chunksize=16):
+                stats["converted" if status == "ok" else status] += 1
+                stats["bytes_in"] += bytes_in
+                stats["bytes_out"] += bytes_out
+    os.makedirs(dst_root, exist_ok=True)
+
+    ratio = stats["bytes_in"] / stats["bytes_out"] if stats["bytes_out"] else 0.0
+    logger.info(f"Escala de cinza: {stats['converted']} convertidas, {stats['cached']} em cache, "
+                f"{stats['unreadable']} ilegíveis ({stats['bytes_in'] / 1e6:.1f} MB -> "
+                f"{stats['bytes_out'] / 1e6:.1f} MB, {ratio:.2f}x)")
+    return stats
@@ -0,0 +1,241 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Optional, Tuple
+
+# Estados de claim() nos stores
+CLAIMED = "claimed"
+COMPLETED = "completed"
+IN_PROGRESS = "in_progress"
+
+# Desfechos de IdempotencyGuard.run()
+EXECUTED = "executed"
+REUSED = "reused"
+IN_FLIGHT = "in_flight"
+
+# Contadores de IdempotencyGuard.metrics(), acumulados no processo
+COUNTERS = ("executed", "duplicates_reused", "duplicates_waited", "duplicates_in_flight", "suppressed")
+
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_WAIT_SECONDS = 10.0
+DEFAULT_POLL_SECONDS = 0.25
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+def record_id(bucket: str, obj: dict) -> str:
+    """
+    Identidade de uma entrega: bucket, chave e versão do objeto. Usa o versionId
+    (bucket versionado) ou o sequencer do evento, que as reentregas repetem; aceita
+    tanto o formato da notificação S3 quanto o `detail.object` do EventBridge.
+    """
+    version = (obj.get("versionId") or obj.get("version-id") or obj.get("sequencer")
+               or obj.get("eTag") or obj.get("etag") or "")
+    return f"{bucket}/{obj['key']}@{version}"
+
+
+class MemoryStore:
+    """
+    Store em memória (um processo): para testes e execuções locais.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def claim(self, item_id: str, owner: str, now: float, lease_seconds: float) -> Tuple[str, Any]:
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is not None and item["expires_at"] > now:
+                if item["state"] == COMPLETED:
+                    return COMPLETED, item["result"]
+                return IN_PROGRESS, None
+            self._items[item_id] = {"state": IN_PROGRESS, "owner": owner, "expires_at": now + lease_seconds}
+            return CLAIMED, None
+
+    def complete(self, item_id: str, owner: str, result: Any, expires_at: float) -> bool:
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item["owner"] != owner:
+                return False
+            self._items[item_id] = {"state": COMPLETED, "owner": owner, "result": result, "expires_at": expires_at}
+            return True
+
+    def release(self, item_id: str, owner: str):
+        with self._lock:
+            if self._items.get(item_id, {}).get("owner") == owner:
+                del self._items[item_id]
+
+
+class SQLiteStore:
+    """
+    Store em SQLite: cada claim é uma transação BEGIN IMMEDIATE, então a escrita
+    condicional vale também entre processos que dividem o arquivo.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS idempotency (id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                           "owner TEXT NOT NULL, result TEXT, expires_at REAL NOT NULL)")
+
+    def claim(self, item_id: str, owner: str, now: float, lease_seconds: float) -> Tuple[str, Any]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT state, result, expires_at FROM idempotency WHERE id = ?",
+                                         (item_id,)).fetchone()
+                if row is not None and row[2] > now:
+                    return (COMPLETED, json.loads(row[1])) if row[0] == COMPLETED else (IN_PROGRESS, None)
+                self._conn.execute("INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, NULL, ?)",
+                                   (item_id, IN_PROGRESS, owner, now + lease_seconds))
+                return CLAIMED, None
+            finally:
+                self._conn.execute("COMMIT")
+
+    def complete(self, item_id: str, owner: str, result: Any, expires_at: float) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE idempotency SET state = ?, result = ?, expires_at = ? WHERE id = ? AND owner = ?",
+                (COMPLETED, json.dumps(result), expires_at, item_id, owner))
+            return cursor.rowcount == 1
+
+    def release(self, item_id: str, owner: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM idempotency WHERE id = ? AND owner = ?", (item_id, owner))
+
+
+class DynamoDBStore:
+    """
+    Store em DynamoDB (produção): o claim é um PutItem condicional, que só grava se
+    o item não existe, expirou ou é um claim cujo lease venceu (dono que morreu).
+    Tabela com chave de partição `pk` (S) e TTL no atributo `expires_at`.
+    """
+
+    def __init__(self, table_name: str, client):
+        self.table_name = table_name
+        self.client = client
+
+    @staticmethod
+    def _conditional_failed(error) -> bool:
+        return getattr(error, "response", {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+    def claim(self, item_id: str, owner: str, now: float, lease_seconds: float) -> Tuple[str, Any]:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={"pk": {"S": item_id}, "state": {"S": IN_PROGRESS}, "owner": {"S": owner},
+                      "expires_at": {"N": str(now + lease_seconds)}},
+                ConditionExpression="attribute_not_exists(pk) OR #expires < :now",
+                ExpressionAttributeNames={"#expires": "expires_at"},
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+            return CLAIMED, None
+        except ClientError as e:
+            if not self._conditional_failed(e):
+                raise
+        item = self.client.get_item(TableName=self.table_name, Key={"pk": {"S": item_id}},
+                                    ConsistentRead=True).get("Item")
+        if item and item["state"]["S"] == COMPLETED:
+            return COMPLETED, json.loads(item["result"]["S"])
+        return IN_PROGRESS, None
+
+    def complete(self, item_id: str, owner: str, result: Any, expires_at: float) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={"pk": {"S": item_id}},
+                UpdateExpression="SET #state = :done, #result = :result, #expires = :expires",
+                ConditionExpression="#owner = :owner",
+                ExpressionAttributeNames={"#state": "state", "#result": "result", "#expires": "expires_at",
+                                          "#owner": "owner"},
+                ExpressionAttributeValues={":done": {"S": COMPLETED}, ":result": {"S": json.dumps(result)},
+                                           ":expires": {"N": str(int(expires_at))}, ":owner": {"S": owner}},
+            )
+            return True
+        except ClientError as e:
+            if self._conditional_failed(e):
+                return False  # O lease venceu e outra entrega assumiu o item
+            raise
+
+    def release(self, item_id: str, owner: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.delete_item(
+                TableName=self.table_name, Key={"pk": {"S": item_id}},
+                ConditionExpression="#owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":owner": {"S": owner}},
+            )
+        except ClientError as e:
+            if not self._conditional_failed(e):
+                raise
+
+
+class IdempotencyGuard:
+    """
+    Executa `func` uma vez por identidade de entrega. A primeira entrega reserva o item
+    (lease) antes de trabalhar e grava o resultado; uma reentrega reutiliza o resultado
+    gravado e, enquanto a primeira ainda roda, espera até `wait_seconds` por ele. Se a
+    espera acabar, a duplicata é descartada (IN_FLIGHT): a entrega original, se falhar,
+    libera o item e é reenviada pelo próprio S3/EventBridge.
+    Se o dono morre sem liberar, o item fica disponível quando o lease vence.
+    """
+
+    def __init__(self, store, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 wait_seconds: float = DEFAULT_WAIT_SECONDS, poll_seconds: float = DEFAULT_POLL_SECONDS,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.counts = Counter()
+
+    def run(self, item_id: str, func: Callable[[], Any]) -> Tuple[str, Optional[Any]]:
+        """
+        Retorna (EXECUTED, resultado), (REUSED, resultado gravado) ou (IN_FLIGHT, None).
+        """
+        owner = uuid.uuid4().hex
+        deadline = self.clock() + self.wait_seconds
+        waited = False
+        while True:
+            state, result = self.store.claim(item_id, owner, self.clock(), self.lease_seconds)
+            if state == CLAIMED:
+                try:
+                    result = func()
+                except BaseException:
+                    self.store.release(item_id, owner)
+                    raise
+                self.store.complete(item_id, owner, result, self.clock() + self.ttl_seconds)
+                self.counts["executed"] += 1
+                return EXECUTED, result
+            if state == COMPLETED:
+                self.counts["duplicates_reused"] += 1
+                self.counts["duplicates_waited"] += int(waited)
+                return REUSED, result
+            if self.clock() >= deadline:
+                self.counts["duplicates_in_flight"] += 1
+                return IN_FLIGHT, None
+            waited = True
+            self.sleep(self.poll_seconds)
+
+    def metrics(self) -> dict:
+        """
+        Contadores acumulados no processo (todos em COUNTERS); `suppressed` = chamadas
+        ao endpoint evitadas.
+        """
+        metrics = {name: self.counts[name] for name in
+                   ("executed", "duplicates_reused", "duplicates_waited", "duplicates_in_flight")}
+        metrics["suppressed"] = metrics["duplicates_reused"] + metrics["duplicates_in_flight"]
+        return metrics
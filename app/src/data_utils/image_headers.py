@@ -0,0 +1,111 @@
+import io
+import logging
+import struct
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+DICOM_MAGIC = b"DICM"
+DICOM_PREAMBLE = 128
+
+# Marcadores SOF (Start Of Frame) que carregam as dimensões da imagem
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Marcadores sem campo de tamanho
+_JPEG_STANDALONE = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def sniff_format(head: bytes) -> str:
+    """
+    Identifica o formato pelos magic bytes: 'jpeg', 'png', 'dicom' ou 'unknown'.
+    """
+    if head.startswith(JPEG_MAGIC):
+        return "jpeg"
+    if head.startswith(PNG_MAGIC):
+        return "png"
+    if head[DICOM_PREAMBLE:DICOM_PREAMBLE + 4] == DICOM_MAGIC:
+        return "dicom"
+    return "unknown"
+
+
+def _read_jpeg_header(stream) -> Optional[dict]:
+    stream.seek(2)
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = stream.read(1)
+        while marker == b"\xff":  # bytes de preenchimento
+            marker = stream.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0xD9 or code == 0xDA:  # EOI / SOS antes de qualquer SOF
+            return None
+        if code in _JPEG_STANDALONE:
+            continue
+        length_bytes = stream.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if code in _JPEG_SOF_MARKERS:
+            segment = stream.read(6)
+            if len(segment) < 6:
+                return None
+            precision, height, width, components = struct.unpack(">BHHB", segment)
+            return {"format": "jpeg", "width": width, "height": height,
+                    "bit_depth": precision, "channels": components}
+        stream.seek(length - 2, io.SEEK_CUR)
+
+
+def _read_png_header(stream) -> Optional[dict]:
+    stream.seek(8)
+    chunk = stream.read(25)
+    if len(chunk) < 25 or chunk[4:8] != b"IHDR":
+        return None
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", chunk[8:18])
+    return {"format": "png", "width": width, "height": height,
+            "bit_depth": bit_depth, "channels": _PNG_CHANNELS.get(color_type, 0)}
+
+
+def _read_dicom_header(stream) -> Optional[dict]:
+    try:
+        import pydicom
+    except ImportError:
+        logger.warning("pydicom não instalado: dimensões de DICOM indisponíveis.")
+        return {"format": "dicom", "width": None, "height": None, "bit_depth": None, "channels": None}
+
+    stream.seek(0)
+    try:
+        ds = pydicom.dcmread(stream, stop_before_pixels=True, force=True)
+    except Exception as e:
+        logger.warning(f"Cabeçalho DICOM inválido: {e}")
+        return None
+    return {"format": "dicom",
+            "width": int(ds.Columns) if "Columns" in ds else None,
+            "height": int(ds.Rows) if "Rows" in ds else None,
+            "bit_depth": int(ds.BitsStored) if "BitsStored" in ds else None,
+            "channels": int(ds.SamplesPerPixel) if "SamplesPerPixel" in ds else None}
+
+
+def read_image_header(source) -> Optional[dict]:
+    """
+    Lê apenas o cabeçalho (JPEG, PNG ou DICOM) e retorna formato, largura, altura,
+    profundidade de bits e canais. Aceita bytes ou um arquivo binário aberto no início.
+    Retorna None se o formato não for reconhecido ou o cabeçalho estiver incompleto.
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    fmt = sniff_format(stream.read(DICOM_PREAMBLE + 4))
+
+    readers = {"jpeg": _read_jpeg_header, "png": _read_png_header, "dicom": _read_dicom_header}
+    if fmt not in readers:
+        return None
+    try:
+        return readers[fmt](stream)
+    except (struct.error, ValueError, OSError) as e:
+        logger.warning(f"Cabeçalho inválido ({fmt}): {e}")
+        return None
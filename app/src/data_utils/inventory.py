@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from . import commons
+from .image_headers import read_image_header
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".dcm"}
+JPEG_EOI = b"\xff\xd9"
+PNG_IEND = b"IEND"
+# Bytes finais inspecionados para o marcador de fim (alguns encoders acrescentam preenchimento)
+TAIL_BYTES = 64
+MAX_LISTED_PROBLEMS = 100
+
+
+def _scan_dir(path: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+    except OSError as e:
+        logger.warning(f"Diretório ilegível: {path} ({e})")
+    return files, subdirs
+
+
+def scan_tree(root: str, max_workers: int = 16) -> List[Tuple[str, int]]:
+    """
+    Lista (caminho relativo, tamanho) de todos os arquivos sob `root` com os.scandir
+    em paralelo: cada diretório descoberto vira uma nova tarefa.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(_scan_dir, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                results.extend((os.path.relpath(p, root).replace(os.sep, "/"), size) for p, size in files)
+                pending.update(pool.submit(_scan_dir, d) for d in subdirs)
+    return results
+
+
+def check_image(path: str, size: Optional[int] = None) -> dict:
+    """
+    Verifica uma imagem sem decodificar os pixels: cabeçalho (dimensões, bits, canais)
+    e marcador de fim (EOI do JPEG, IEND do PNG) para detectar truncamento.
+    status: 'ok', 'empty', 'corrupt' (cabeçalho ilegível) ou 'truncated'.
+    """
+    size = os.path.getsize(path) if size is None else size
+    record = {"status": "ok", "format": None, "width": None, "height": None,
+              "bit_depth": None, "channels": None}
+    if size == 0:
+        record["status"] = "empty"
+        return record
+
+    try:
+        with open(path, "rb") as f:
+            header = read_image_header(f)
+            if header is None:
+                record["status"] = "corrupt"
+                return record
+            record.update(header)
+            if header["format"] in ("jpeg", "png"):
+                f.seek(max(size - TAIL_BYTES, 0))
+                tail = f.read()
+                marker = JPEG_EOI if header["format"] == "jpeg" else PNG_IEND
+                if marker not in tail:
+                    record["status"] = "truncated"
+    except OSError as e:
+        logger.warning(f"Erro ao ler {path}: {e}")
+        record["status"] = "corrupt"
+    return record
+
+
+def _empty_group() -> dict:
+    return {"files": 0, "bytes": 0, "formats": Counter(), "status": Counter(),
+            "bit_depth": Counter(), "channels": Counter(), "width": [], "height": [], "problems": []}
+
+
+def _add(group: dict, rel: str, size: int, record: Optional[dict]):
+    group["files"] += 1
+    group["bytes"] += size
+    if record is None:
+        group["formats"]["other"] += 1
+        return
+    group["formats"][record["format"] or "unknown"] += 1
+    group["status"][record["status"]] += 1
+    if record["status"] != "ok":
+        group["problems"].append({"path": rel, "status": record["status"]})
+    if record["bit_depth"] is not None:
+        group["bit_depth"][str(record["bit_depth"])] += 1
+    if record["channels"] is not None:
+        group["channels"][str(record["channels"])] += 1
+    for dim in ("width", "height"):
+        if record[dim] is not None:
+            group[dim].append(record[dim])
+
+
+def _finish(group: dict) -> dict:
+    summary = {k: group[k] for k in ("files", "bytes")}
+    for key in ("formats", "status", "bit_depth", "channels"):
+        summary[key] = dict(group[key])
+    for dim in ("width", "height"):
+        values = group[dim]
+        summary[dim] = {"min": min(values), "max": max(values), "mean": sum(values) / len(values)} if values else None
+    summary["problem_count"] = len(group["problems"])
+    summary["problems"] = sorted(group["problems"], key=lambda p: p["path"])[:MAX_LISTED_PROBLEMS]
+    return summary
+
+
+def build_inventory(root: str, splits: Optional[Dict[str, str]] = None, max_workers: int = 16,
+                    check_images: bool = True) -> dict:
+    """
+    Inventário de `root`: contagem, bytes, formatos, dimensões, profundidade de bits e
+    imagens com problema. Com `splits` (nome -> .lst com caminhos relativos a `root`),
+    o resumo é agrupado por split e inclui imagens listadas mas ausentes no disco.
+    """
+    start = time.perf_counter()
+    files = scan_tree(root, max_workers)
+    sizes = dict(files)
+
+    if splits:
+        membership = {name: [e.path for e in commons.read_lst_file(lst)] for name, lst in splits.items()}
+    else:
+        membership = {"all": [rel for rel, _ in files]}
+    wanted = {rel for paths in membership.values() for rel in paths if rel in sizes}
+
+    def inspect(rel):
+        if not check_images or os.path.splitext(rel)[1].lower() not in IMAGE_EXTENSIONS:
+            return rel, None
+        return rel, check_image(os.path.join(root, rel), sizes[rel])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        records = dict(pool.map(inspect, wanted))
+
+    split_summaries = {}
+    for name, paths in membership.items():
+        group, missing = _empty_group(), []
+        for rel in dict.fromkeys(paths):
+            if rel in sizes:
+                _add(group, rel, sizes[rel], records[rel])
+            else:
+                missing.append(rel)
+        summary = _finish(group)
+        summary["missing_count"] = len(missing)
+        summary["missing"] = sorted(missing)[:MAX_LISTED_PROBLEMS]
+        split_summaries[name] = summary
+
+    inventory = {
+        "root": os.path.abspath(root),
+        "scanned_files": len(files),
+        "total_bytes": sum(sizes.values()),
+        "unreferenced_files": len(sizes) - len(wanted) if splits else 0,
+        "seconds": round(time.perf_counter() - start, 3),
+        "splits": split_summaries,
+    }
+    logger.info(f"Inventário: {len(files)} arquivos ({inventory['total_bytes'] / 1e9:.2f} GB) "
+                f"em {inventory['seconds']:.2f}s")
+    return inventory
+
+
+def save_inventory(inventory: dict, path: str) -> str:
+    with open(path, "w") as f:
+        json.dump(inventory, f, indent=2)
+    return path
+
+
+def preflight(inventory: dict, max_bad_fraction: float = 0.0, max_missing: int = 0,
+              min_files: int = 1) -> List[str]:
+    """
+    Regras de pré-voo sobre o inventário. Retorna a lista de falhas (vazia = aprovado).
+    """
+    failures = []
+    for name, summary in inventory["splits"].items():
+        if summary["files"] < min_files:
+            failures.append(f"{name}: {summary['files']} arquivos (mínimo {min_files})")
+        if summary["missing_count"] > max_missing:
+            failures.append(f"{name}: {summary['missing_count']} imagens listadas não encontradas")
+        if summary["files"] and summary["problem_count"] / summary["files"] > max_bad_fraction:
+            failures.append(f"{name}: {summary['problem_count']} imagens com problema "
+                            f"({dict((k, v) for k, v in summary['status'].items() if k != 'ok')})")
+    for failure in failures:
+        logger.error(f"Pré-voo: {failure}")
+    return failures
+
+
+def run_preflight(root: str, lst_paths: Dict[str, str], summary_path: str, max_workers: int = 16,
+                  max_bad_fraction: float = 0.0, max_missing: int = 0):
+    """
+    Etapa de pipeline: grava o inventário e falha (RuntimeError) se o pré-voo reprovar.
+    """
+    inventory = build_inventory(root, lst_paths, max_workers)
+    save_inventory(inventory, summary_path)
+    failures = preflight(inventory, max_bad_fraction, max_missing)
+    if failures:
+        raise RuntimeError("Pré-voo reprovado: " + "; ".join(failures))
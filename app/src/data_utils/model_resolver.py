@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Optional
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Registro publicado no bucket de dados para o Lambda (chave do cache de predições)
+MODEL_RECORD_KEY = "models/current_model.json"
+CACHE_FILE_NAME = "model_record.json"
+
+
+@dataclass
+class ModelRecord:
+    """
+    Resultado de "último tuning job concluído -> melhor training job -> artefato do modelo".
+    """
+    tuning_job_name: str
+    tuning_job_end_time: str
+    best_training_job: str
+    model_data_url: str
+    training_image: Optional[str] = None
+    objective_metric: Optional[str] = None
+    objective_value: Optional[float] = None
+
+    @property
+    def version_key(self) -> str:
+        """
+        Identificador estável do modelo: training job + hash do URI do artefato.
+        """
+        digest = hashlib.sha256(self.model_data_url.encode()).hexdigest()[:12]
+        return f"{self.best_training_job}-{digest}"
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["version_key"] = self.version_key
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ModelRecord":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+
+def latest_completed_tuning_job(sm_client, name_contains: Optional[str] = None) -> Optional[dict]:
+    """
+    Resumo do tuning job concluído mais recente (uma chamada list_*), ou None.
+    """
+    kwargs = {"SortBy": "CreationTime", "SortOrder": "Descending", "MaxResults": 1,
+              "StatusEquals": "Completed"}
+    if name_contains:
+        kwargs["NameContains"] = name_contains
+    summaries = sm_client.list_hyper_parameter_tuning_jobs(**kwargs)["HyperParameterTuningJobSummaries"]
+    return summaries[0] if summaries else None
+
+
+def describe_best_model(sm_client, tuning_job_name: str) -> ModelRecord:
+    """
+    Resolve o melhor training job de um tuning job e o URI do artefato (model.tar.gz).
+    """
+    tuning = sm_client.describe_hyper_parameter_tuning_job(HyperParameterTuningJobName=tuning_job_name)
+    best = tuning.get("BestTrainingJob")
+    if not best:
+        raise ValueError(f"O tuning job {tuning_job_name} não possui melhor training job.")
+
+    training = sm_client.describe_training_job(TrainingJobName=best["TrainingJobName"])
+    objective = best.get("FinalHyperParameterTuningJobObjectiveMetric", {})
+    end_time = tuning.get("HyperParameterTuningEndTime")
+
+    return ModelRecord(
+        tuning_job_name=tuning_job_name,
+        tuning_job_end_time=end_time.isoformat() if end_time else "",
+        best_training_job=best["TrainingJobName"],
+        model_data_url=training["ModelArtifacts"]["S3ModelArtifacts"],
+        training_image=training.get("AlgorithmSpecification", {}).get("TrainingImage"),
+        objective_metric=objective.get("MetricName"),
+        objective_value=objective.get("Value"),
+    )
+
+
+class ModelResolver:
+    """
+    Resolve o modelo atual com cache local em JSON.
+
+    O cache só é invalidado quando um tuning job mais novo é concluído: cada resolve()
+    custa uma chamada list_hyper_parameter_tuning_jobs (ou nenhuma, dentro de
+    min_check_interval segundos desde a última verificação).
+    """
+
+    def __init__(self, sm_client=None, cache_path: Optional[str] = None,
+                 min_check_interval: float = 0, name_contains: Optional[str] = None):
+        self.sm_client = sm_client
+        self.cache_path = cache_path or os.path.join(config.default_cache_dir(), CACHE_FILE_NAME)
+        self.min_check_interval = min_check_interval
+        self.name_contains = name_contains
+
+    def _client(self):
+        if self.sm_client is None:
+            self.sm_client = config.get_client("sagemaker")
+        return self.sm_client
+
+    def _read_cache(self) -> Optional[dict]:
+        if not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache de modelo ilegível ({self.cache_path}): {e}")
+            return None
+
+    def _write_cache(self, record: ModelRecord):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        with open(self.cache_path, "w") as f:
+            json.dump({"checked_at": time.time(), "record": record.to_dict()}, f, indent=2)
+
+    def cached(self) -> Optional[ModelRecord]:
+        """
+        Registro em cache, sem nenhuma chamada à API.
+        """
+        data = self._read_cache()
+        return ModelRecord.from_dict(data["record"]) if data else None
+
+    def resolve(self, refresh: bool = False) -> ModelRecord:
+        """
+        Retorna o registro do modelo atual, consultando o SageMaker só quando necessário.
+        """
+        data = self._read_cache()
+        cached = ModelRecord.from_dict(data["record"]) if data else None
+
+        if cached and not refresh and self.min_check_interval and \
+                time.time() - data.get("checked_at", 0) < self.min_check_interval:
+            return cached
+
+        summary = latest_completed_tuning_job(self._client(), self.name_contains)
+        if summary is None:
+            if cached:
+                logger.warning("Nenhum tuning job concluído encontrado; usando o modelo em cache.")
+                return cached
+            raise ValueError("Nenhum tuning job concluído encontrado. Execute o notebook 02 primeiro.")
+
+        if cached and not refresh and cached.tuning_job_name == summary["HyperParameterTuningJobName"]:
+            self._write_cache(cached)  # Atualiza checked_at
+            return cached
+
+        record = describe_best_model(self._client(), summary["HyperParameterTuningJobName"])
+        logger.info(f"Modelo resolvido: {record.best_training_job} ({record.version_key})")
+        self._write_cache(record)
+        return record
+
+
+def publish_record(record: ModelRecord, s3_client, bucket: str, key: str = MODEL_RECORD_KEY) -> str:
+    """
+    Publica o registro do modelo implantado no S3 (lido pelo Lambda).
+    """
+    s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(record.to_dict()).encode(),
+                         ContentType="application/json")
+    logger.info(f"Registro do modelo publicado em s3://{bucket}/{key}")
+    return key
+
+
+def load_published_record(s3_client, bucket: str, key: str = MODEL_RECORD_KEY) -> Optional[ModelRecord]:
+    """
+    Lê o registro publicado por publish_record; retorna None se não existir.
+    """
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        return ModelRecord.from_dict(json.loads(body))
+    except Exception as e:
+        logger.warning(f"Registro do modelo indisponível em s3://{bucket}/{key}: {e}")
+        return None
+
+
+def prediction_cache_key(version_key: str, payload: bytes) -> str:
+    """
+    Chave de cache de predição: versão do modelo + SHA-256 da imagem.
+    """
+    return f"{version_key}:{hashlib.sha256(payload).hexdigest()}"
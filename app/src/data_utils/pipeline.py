@@ -0,0 +1,481 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from . import commons, download, inventory, streaming_split
+from .grayscale import convert_tree
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+@dataclass
+class Stage:
+    """
+    Etapa do pipeline: func(**params) lê `inputs` e grava `outputs` (arquivos ou diretórios).
+    Dependências são inferidas quando um input é output de outra etapa; `after` força ordem extra.
+    """
+    name: str
+    func: Callable
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    after: List[str] = field(default_factory=list)
+    version: str = "1"
+
+
+class ContentHasher:
+    """
+    Hash de conteúdo (sha256) com memo por (caminho, tamanho, mtime) persistido em disco,
+    para que arquivos grandes inalterados não sejam relidos a cada execução.
+    Diretórios usam um fingerprint de (caminho relativo, tamanho, mtime) de cada arquivo.
+    """
+
+    def __init__(self, memo_path: Optional[str] = None, chunk_size: int = 1024 * 1024):
+        self.memo_path = memo_path
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._memo: Dict[str, list] = {}
+        self._dir_cache: Dict[str, str] = {}
+        if memo_path and os.path.exists(memo_path):
+            with open(memo_path, "r") as f:
+                self._memo = json.load(f)
+
+    def hash_file(self, path: str) -> str:
+        st = os.stat(path)
+        abs_path = os.path.abspath(path)
+        with self._lock:
+            cached = self._memo.get(abs_path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(self.chunk_size), b""):
+                digest.update(block)
+        value = digest.hexdigest()
+        with self._lock:
+            self._memo[abs_path] = [st.st_size, st.st_mtime_ns, value]
+        return value
+
+    def fingerprint_dir(self, path: str) -> str:
+        digest = hashlib.sha256()
+        stack = [path]
+        entries = []
+        while stack:
+            current = stack.pop()
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        st = entry.stat()
+                        entries.append((os.path.relpath(entry.path, path), st.st_size, st.st_mtime_ns))
+        for rel, size, mtime in sorted(entries):
+            digest.update(f"{rel}\0{size}\0{mtime}\n".encode())
+        return "dir:" + digest.hexdigest()
+
+    def hash_path(self, path: str, refresh: bool = False) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+        if not os.path.isdir(path):
+            return self.hash_file(path)
+        abs_path = os.path.abspath(path)
+        with self._lock:
+            cached = None if refresh else self._dir_cache.get(abs_path)
+        if cached is None:
+            cached = self.fingerprint_dir(path)
+            with self._lock:
+                self._dir_cache[abs_path] = cached
+        return cached
+
+    def save(self):
+        if not self.memo_path:
+            return
+        with self._lock:
+            data = json.dumps(self._memo)
+        with open(self.memo_path, "w") as f:
+            f.write(data)
+
+
+class Pipeline:
+    """
+    Executor local de um DAG de etapas com cache por hash de conteúdo.
+    Etapas cujos inputs, parâmetros e outputs não mudaram são puladas;
+    etapas independentes rodam em paralelo.
+    """
+
+    def __init__(self, stages: List[Stage], cache_dir: str = ".pipeline_cache", max_workers: int = 4):
+        self.stages = {s.name: s for s in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Nomes de etapas duplicados no pipeline.")
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.deps = self._resolve_dependencies()
+        self._check_acyclic()
+
+    def _resolve_dependencies(self) -> Dict[str, set]:
+        producers = {}
+        for stage in self.stages.values():
+            for out in stage.outputs:
+                producers[os.path.normpath(out)] = stage.name
+        deps = {}
+        for stage in self.stages.values():
+            found = {producers[os.path.normpath(i)] for i in stage.inputs if os.path.normpath(i) in producers}
+            for name in stage.after:
+                if name not in self.stages:
+                    raise ValueError(f"Etapa '{stage.name}' depende de etapa inexistente: {name}")
+                found.add(name)
+            found.discard(stage.name)
+            deps[stage.name] = found
+        return deps
+
+    def _check_acyclic(self):
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Ciclo detectado no pipeline: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dep in self.deps[name]:
+                visit(dep, path + [name])
+            state[name] = "done"
+
+        for name in self.stages:
+            visit(name, [])
+
+    def _record_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def _cache_key(self, stage: Stage, hasher: ContentHasher) -> str:
+        payload = {
+            "cache_version": CACHE_VERSION,
+            "stage": stage.name,
+            "version": stage.version,
+            "params": stage.params,
+            "inputs": {i: hasher.hash_path(i) for i in stage.inputs},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _is_fresh(self, stage: Stage, key: str, hasher: ContentHasher) -> bool:
+        path = self._record_path(stage.name)
+        if not os.path.exists(path):
+            return False
+        with open(path, "r") as f:
+            record = json.load(f)
+        if record.get("key") != key:
+            return False
+        current = {o: hasher.hash_path(o) for o in stage.outputs}
+        return all(v is not None for v in current.values()) and current == record.get("outputs")
+
+    def _run_stage(self, stage: Stage, hasher: ContentHasher, force: bool) -> str:
+        key = self._cache_key(stage, hasher)
+        if not force and self._is_fresh(stage, key, hasher):
+            logger.info(f"[{stage.name}] Sem mudanças, usando cache.")
+            return "cached"
+
+        logger.info(f"[{stage.name}] Executando...")
+        stage.func(**stage.params)
+
+        outputs = {o: hasher.hash_path(o, refresh=True) for o in stage.outputs}
+        missing = [o for o, h in outputs.items() if h is None]
+        if missing:
+            raise RuntimeError(f"Etapa '{stage.name}' não gerou os outputs: {missing}")
+        with open(self._record_path(stage.name), "w") as f:
+            json.dump({"key": key, "outputs": outputs, "finished_at": time.time()}, f, indent=2)
+        return "ran"
+
+    def run(self, targets: Optional[List[str]] = None, force: Optional[List[str]] = None) -> Dict[str, dict]:
+        """
+        Executa o pipeline (ou só as etapas necessárias para `targets`).
+        Retorna {etapa: {"status": ran|cached|failed|blocked, "seconds": ...}}.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        hasher = ContentHasher(os.path.join(self.cache_dir, "_hash_memo.json"))
+        force = set(force or [])
+
+        selected = set()
+        pending = list(targets or self.stages)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise ValueError(f"Etapa desconhecida: {name}")
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.deps[name])
+
+        report: Dict[str, dict] = {}
+        remaining = set(selected)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while remaining or running:
+                for name in sorted(remaining):
+                    deps = self.deps[name]
+                    if any(report.get(d, {}).get("status") in ("failed", "blocked") for d in deps):
+                        report[name] = {"status": "blocked", "seconds": 0.0}
+                        remaining.discard(name)
+                        logger.error(f"[{name}] Bloqueada por falha em dependência.")
+                    elif all(d in report for d in deps):
+                        remaining.discard(name)
+                        running[pool.submit(self._timed, self.stages[name], hasher, name in force)] = name
+
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    report[name] = future.result()
+
+        hasher.save()
+        ran = sum(1 for r in report.values() if r["status"] == "ran")
+        cached = sum(1 for r in report.values() if r["status"] == "cached")
+        logger.info(f"Pipeline concluído: {ran} executadas, {cached} em cache, "
+                    f"{len(report) - ran - cached} com falha/bloqueadas.")
+        return report
+
+    def _timed(self, stage: Stage, hasher: ContentHasher, force: bool) -> dict:
+        start = time.perf_counter()
+        try:
+            status = self._run_stage(stage, hasher, force)
+            return {"status": status, "seconds": time.perf_counter() - start}
+        except Exception as e:
+            logger.error(f"[{stage.name}] Erro: {e}")
+            return {"status": "failed", "seconds": time.perf_counter() - start, "error": str(e)}
+
+
+# --- Etapas do pipeline CBIS-DDSM (equivalentes aos notebooks 01 -> 02) ---
+
+def download_if_missing(dataset_slug: str, output_path: str, zip_path: str):
+    """
+    Baixa o ZIP do Kaggle apenas se ele ainda não estiver em disco (ou estiver corrompido).
+    O download é retomável por chunks e o ZIP é validado antes da extração.
+    """
+    if os.path.exists(zip_path) and download.verify_zip(zip_path):
+        logger.info(f"Arquivo ZIP já existe: {zip_path}")
+        return zip_path
+    os.makedirs(output_path, exist_ok=True)
+    return download.download_kaggle_dataset(dataset_slug, zip_path)
+
+
+def index_images(jpeg_dir: str, index_path: str):
+    """
+    Mapeia o UID da pasta (DICOM) -> caminho relativo do .jpg, como no 01_preprocessing.ipynb.
+    """
+    file_map = {}
+    stack = [jpeg_dir]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".jpg"):
+                    file_map[os.path.basename(current)] = os.path.relpath(entry.path, jpeg_dir)
+
+    with open(index_path, "w") as f:
+        json.dump(file_map, f, sort_keys=True)
+    logger.info(f"Pastas de imagens indexadas: {len(file_map)}")
+
+
+def export_split(lst_dir: str, output_dir: str, splits_path: str, names=("train", "validation")):
+    """
+    Copia os .lst da divisão em streaming (<lst_dir>/<split>.lst) para output_dir e grava
+    splits.json para os recortes ROI, como no 01_preprocessing.ipynb.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name in names:
+        src, dst = os.path.join(lst_dir, f"{name}.lst"), os.path.join(output_dir, f"{name}.lst")
+        if os.path.exists(src):
+            shutil.copyfile(src, dst)
+        else:
+            open(dst, "w").close()  # Split ainda sem imagens
+    streaming_split.export_splits(lst_dir, splits_path, names)
+
+
+def build_cas_layout(image_root: str, lst_paths: Dict[str, str], output_dir: str, index_path: str,
+                     cas_root: str, memo_path: Optional[str] = None):
+    """
+    Passos 1-4 do upload do 01_preprocessing.ipynb: hash das imagens listadas, .lst
+    reescritos com as chaves CAS em output_dir (mesmos nomes), imagens repetidas entre
+    splits removidas da validação e layout CAS local (hard links) em cas_root.
+    O índice caminho -> chave é gravado em index_path para a etapa de upload.
+    """
+    from . import content_store  # content_store importa este módulo
+
+    paths = [entry.path for lst in lst_paths.values() for entry in commons.read_lst_file(lst)]
+    index = content_store.build_cas_index(image_root, paths, memo_path=memo_path)
+    with open(index_path, "w") as f:
+        json.dump(index, f, sort_keys=True)
+
+    os.makedirs(output_dir, exist_ok=True)
+    cas_lsts = {name: os.path.join(output_dir, os.path.basename(lst)) for name, lst in lst_paths.items()}
+    for name, lst in lst_paths.items():
+        content_store.rewrite_lst(lst, cas_lsts[name], index)
+    leaked = content_store.find_leakage(cas_lsts)
+    if leaked and "validation" in cas_lsts:
+        content_store.drop_keys(cas_lsts["validation"], leaked)
+    os.makedirs(cas_root, exist_ok=True)
+    content_store.link_local(index, image_root, cas_root)
+
+
+def upload_cas_images(index_path: str, image_root: str, bucket: str, key_prefix: str, manifest_path: str,
+                      max_workers: int = 16, s3_client=None):
+    """
+    Envia as imagens do índice CAS para s3://bucket/key_prefix/<chave> (cada conteúdo
+    uma vez, pulando chaves já existentes), no mesmo layout do 01_preprocessing.ipynb.
+    """
+    from . import content_store
+
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    stats = content_store.upload_cas(index, image_root, bucket, key_prefix, s3_client=s3_client,
+                                     max_workers=max_workers)
+    with open(manifest_path, "w") as f:
+        json.dump({"bucket": bucket, "keys": sorted(f"{key_prefix}/{k}" for k in set(index.values())),
+                   "stats": stats}, f)
+
+
+def upload_to_s3(local_paths: List[str], bucket: str, key_prefix: str, manifest_path: str,
+                 max_workers: int = 16, s3_client=None):
+    """
+    Envia arquivos (ou diretórios inteiros) para s3://bucket/key_prefix em paralelo
+    e grava um manifesto com o que foi enviado.
+    """
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client("s3")
+
+    uploads = []
+    for local_path in local_paths:
+        if os.path.isdir(local_path):
+            for root, _, files in os.walk(local_path):
+                for name in files:
+                    full = os.path.join(root, name)
+                    rel = os.path.relpath(full, local_path).replace(os.sep, "/")
+                    uploads.append((full, f"{key_prefix}/{rel}"))
+        else:
+            uploads.append((local_path, f"{key_prefix}/{os.path.basename(local_path)}"))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda item: s3_client.upload_file(item[0], bucket, item[1]), uploads))
+
+    with open(manifest_path, "w") as f:
+        json.dump({"bucket": bucket, "keys": sorted(k for _, k in uploads)}, f)
+    logger.info(f"{len(uploads)} arquivos enviados para s3://{bucket}/{key_prefix}")
+
+
+def build_cbis_pipeline(dataset_slug: str, data_dir: str, work_dir: str, csv_names: List[str],
+                        bucket: Optional[str] = None, prefix: str = "cbis-ddsm-classification",
+                        test_size: float = 0.2, salt: str = streaming_split.DEFAULT_SALT, max_workers: int = 4,
+                        roi_crop_size: Optional[int] = None, grayscale: bool = False) -> Pipeline:
+    """
+    Monta o pipeline download -> extração -> indexação -> divisão -> .lst -> CAS -> pré-voo -> upload.
+    Sem `bucket`, as etapas de upload são omitidas. O upload só roda se o pré-voo
+    (inventário das imagens listadas) for aprovado.
+    Como no 01_preprocessing.ipynb, o S3 recebe as imagens por chave de conteúdo
+    (images/ab/cd/<sha256>.jpg) e os .lst de work_dir/cas_lst, que apontam para essas chaves;
+    work_dir/train.lst e validation.lst mantêm os caminhos originais.
+    A divisão é a mesma do 01_preprocessing.ipynb (streaming_split, por hash do paciente
+    com `salt`): o estado fica em work_dir/splits e novas linhas só acrescentam imagens,
+    sem mover as já atribuídas.
+    Com `roi_crop_size`, inclui a etapa de recortes guiados pelas máscaras ROI
+    (roi_train.lst / roi_validation.lst, seguindo a mesma divisão das mamografias).
+    Com `grayscale`, as imagens são regravadas em um canal (work_dir/jpeg_gray) e o
+    pré-voo, os recortes e o upload usam essa cópia; o treino replica o canal na leitura.
+    """
+    dataset_name = dataset_slug.split("/")[-1]
+    zip_path = os.path.join(data_dir, dataset_name + ".zip")
+    extract_dir = os.path.join(data_dir, dataset_name)
+    jpeg_dir = os.path.join(extract_dir, "jpeg")
+    csv_paths = [os.path.join(extract_dir, "csv", name) for name in csv_names]
+    index_path = os.path.join(work_dir, "file_index.json")
+    split_dir = os.path.join(work_dir, "splits")
+    splits_path = os.path.join(work_dir, "splits.json")
+    train_lst = os.path.join(work_dir, "train.lst")
+    val_lst = os.path.join(work_dir, "validation.lst")
+    inventory_path = os.path.join(work_dir, "inventory.json")
+    image_dir = os.path.join(work_dir, "jpeg_gray") if grayscale else jpeg_dir
+    cas_index_path = os.path.join(work_dir, "cas_index.json")
+    cas_lst_dir = os.path.join(work_dir, "cas_lst")
+    cas_train_lst = os.path.join(cas_lst_dir, "train.lst")
+    cas_val_lst = os.path.join(cas_lst_dir, "validation.lst")
+    cas_root = os.path.join(work_dir, "cas")
+    os.makedirs(work_dir, exist_ok=True)
+
+    stages = [
+        Stage("download", download_if_missing, outputs=[zip_path],
+              params={"dataset_slug": dataset_slug, "output_path": data_dir, "zip_path": zip_path}),
+        # Só a pasta de imagens é output verificado: editar um CSV extraído não força nova extração
+        Stage("extract", commons.extract_dataset, inputs=[zip_path], outputs=[jpeg_dir],
+              params={"zip_path": zip_path, "extract_to": extract_dir}),
+        Stage("index", index_images, inputs=[jpeg_dir], outputs=[index_path],
+              params={"jpeg_dir": jpeg_dir, "index_path": index_path}),
+        Stage("split", streaming_split.split_csv_files, inputs=csv_paths + [index_path], outputs=[split_dir],
+              params={"csv_paths": csv_paths, "index_path": index_path, "lst_dir": split_dir,
+                      "fractions": {"train": 1 - test_size, "validation": test_size}, "salt": salt},
+              after=["extract"]),
+        Stage("export", export_split, inputs=[split_dir], outputs=[train_lst, val_lst, splits_path],
+              params={"lst_dir": split_dir, "output_dir": work_dir, "splits_path": splits_path}),
+        Stage("cas", build_cas_layout, inputs=[image_dir, train_lst, val_lst],
+              outputs=[cas_index_path, cas_train_lst, cas_val_lst, cas_root],
+              params={"image_root": image_dir, "lst_paths": {"train": train_lst, "validation": val_lst},
+                      "output_dir": cas_lst_dir, "index_path": cas_index_path, "cas_root": cas_root,
+                      "memo_path": os.path.join(work_dir, "cas_hash_memo.json")}),
+        Stage("preflight", inventory.run_preflight, inputs=[cas_root, cas_train_lst, cas_val_lst],
+              outputs=[inventory_path],
+              params={"root": cas_root, "lst_paths": {"train": cas_train_lst, "validation": cas_val_lst},
+                      "summary_path": inventory_path}),
+    ]
+    if grayscale:
+        stages.append(Stage("grayscale", convert_tree, inputs=[jpeg_dir], outputs=[image_dir],
+                            params={"src_root": jpeg_dir, "dst_root": image_dir}))
+
+    roi_dir = os.path.join(work_dir, "roi_crops")
+    roi_lsts = [os.path.join(work_dir, "roi_train.lst"), os.path.join(work_dir, "roi_validation.lst")]
+    if roi_crop_size:
+        from .roi_crops import build_roi_crops  # roi_crops importa este módulo
+
+        stages.append(
+            Stage("roi_crops", build_roi_crops, inputs=csv_paths + [image_dir, splits_path],
+                  outputs=[roi_dir] + roi_lsts,
+                  params={"csv_paths": csv_paths, "jpeg_dir": image_dir, "output_dir": roi_dir,
+                          "lst_dir": work_dir, "splits_path": splits_path, "size": roi_crop_size,
+                          "memo_path": os.path.join(work_dir, "roi_hash_memo.json")}))
+
+    if bucket:
+        images_manifest = os.path.join(work_dir, "upload_images.json")
+        metadata_manifest = os.path.join(work_dir, "upload_metadata.json")
+        stages += [
+            Stage("upload_images", upload_cas_images, inputs=[cas_index_path], outputs=[images_manifest],
+                  params={"index_path": cas_index_path, "image_root": image_dir, "bucket": bucket,
+                          "key_prefix": f"{prefix}/images", "manifest_path": images_manifest},
+                  after=["preflight"]),
+            Stage("upload_metadata", upload_to_s3, inputs=[cas_train_lst, cas_val_lst], outputs=[metadata_manifest],
+                  params={"local_paths": [cas_train_lst, cas_val_lst], "bucket": bucket,
+                          "key_prefix": f"{prefix}/metadata", "manifest_path": metadata_manifest},
+                  after=["preflight"]),
+        ]
+        if roi_crop_size:
+            roi_images_manifest = os.path.join(work_dir, "upload_roi_images.json")
+            roi_metadata_manifest = os.path.join(work_dir, "upload_roi_metadata.json")
+            stages += [
+                Stage("upload_roi_images", upload_to_s3, inputs=[roi_dir], outputs=[roi_images_manifest],
+                      params={"local_paths": [roi_dir], "bucket": bucket, "key_prefix": f"{prefix}/roi_images",
+                              "manifest_path": roi_images_manifest}, after=["preflight"]),
+                Stage("upload_roi_metadata", upload_to_s3, inputs=roi_lsts, outputs=[roi_metadata_manifest],
+                      params={"local_paths": roi_lsts, "bucket": bucket, "key_prefix": f"{prefix}/roi_metadata",
+                              "manifest_path": roi_metadata_manifest}, after=["preflight"]),
+            ]
+
+    return Pipeline(stages, cache_dir=os.path.join(work_dir, ".pipeline_cache"), max_workers=max_workers)
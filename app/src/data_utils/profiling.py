@@ -0,0 +1,240 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, FrozenSet, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# CBIS_PROFILE: "1"/"all" ou lista separada por vírgula de MODES (vazio = desligado)
+MODES = ("cprofile", "memory", "time")
+DEFAULT_TOP = 15
+
+
+def default_output_dir() -> str:
+    """
+    CBIS_PROFILE_DIR ou <tmp>/cbis-profile (/tmp no Lambda).
+    """
+    return os.environ.get("CBIS_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "cbis-profile")
+
+
+@dataclass
+class ProfileSettings:
+    """
+    Configuração do profiling. Com `modes` vazio os wrappers apenas repassam a chamada.
+    """
+    modes: FrozenSet[str] = frozenset()
+    sample_rate: float = 1.0
+    output_dir: str = field(default_factory=default_output_dir)
+    top: int = DEFAULT_TOP
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.modes) and self.sample_rate > 0
+
+
+def _parse_modes(value: str) -> FrozenSet[str]:
+    value = value.strip().lower()
+    if value in ("", "0", "false", "off"):
+        return frozenset()
+    if value in ("1", "true", "on", "all"):
+        return frozenset(MODES)
+    modes = {m.strip() for m in value.split(",") if m.strip()}
+    unknown = modes - set(MODES)
+    if unknown:
+        logger.warning(f"Modos de profiling ignorados: {sorted(unknown)} (válidos: {MODES})")
+    return frozenset(modes & set(MODES))
+
+
+def load_settings() -> ProfileSettings:
+    """
+    Lê CBIS_PROFILE, CBIS_PROFILE_SAMPLE_RATE, CBIS_PROFILE_DIR e CBIS_PROFILE_TOP.
+    """
+    try:
+        sample_rate = float(os.environ.get("CBIS_PROFILE_SAMPLE_RATE", "1.0"))
+        top = int(os.environ.get("CBIS_PROFILE_TOP", str(DEFAULT_TOP)))
+    except ValueError as e:
+        logger.warning(f"Configuração de profiling inválida ({e}); profiling desligado.")
+        return ProfileSettings()
+    return ProfileSettings(_parse_modes(os.environ.get("CBIS_PROFILE", "")),
+                           min(max(sample_rate, 0.0), 1.0), default_output_dir(), top)
+
+
+_settings = load_settings()
+_enabled = _settings.enabled
+_local = threading.local()
+
+
+def configure(settings: Optional[ProfileSettings] = None) -> ProfileSettings:
+    """
+    Substitui a configuração ativa (sem argumento, relê as variáveis de ambiente).
+    """
+    global _settings, _enabled
+    _settings = settings if settings is not None else load_settings()
+    _enabled = _settings.enabled
+    return _settings
+
+
+def get_settings() -> ProfileSettings:
+    return _settings
+
+
+class ProfileRun:
+    """
+    Uma execução amostrada: spans de tempo, cProfile e tracemalloc.
+    Após o término, `report` contém o resumo e `paths` os arquivos gravados.
+    """
+
+    def __init__(self, name: str, settings: ProfileSettings):
+        self.name = name
+        self.settings = settings
+        self.run_id = (f"{time.strftime('%Y%m%dT%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}"
+                       f"-{os.getpid()}-{uuid.uuid4().hex[:6]}")
+        self.spans: List[dict] = []
+        self.depth = 0
+        self.report: dict = {}
+        self.paths: List[str] = []
+        self._profiler: Optional[cProfile.Profile] = None
+        self._owns_tracemalloc = False
+        self._start = 0.0
+
+    def start(self):
+        if "memory" in self.settings.modes:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+        if "cprofile" in self.settings.modes:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start = time.perf_counter()
+
+    def stop(self, error: Optional[BaseException] = None):
+        wall = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.report = {"name": self.name, "run_id": self.run_id, "wall_seconds": round(wall, 6),
+                       "error": repr(error) if error else None, "spans": self.spans}
+
+        if "memory" in self.settings.modes:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+            self.report["memory"] = {
+                "peak_mb": round(peak / 1e6, 3),
+                "top": [{"location": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                         "size_kb": round(s.size / 1024, 1), "count": s.count}
+                        for s in snapshot.statistics("lineno")[:self.settings.top]],
+            }
+        self._write()
+
+    def _write(self):
+        base = os.path.join(self.settings.output_dir, self.run_id)
+        try:
+            os.makedirs(self.settings.output_dir, exist_ok=True)
+            if self._profiler is not None:
+                self._profiler.dump_stats(base + ".prof")
+                text = io.StringIO()
+                pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(self.settings.top)
+                with open(base + ".txt", "w") as f:
+                    f.write(text.getvalue())
+                self.report["pstats"] = base + ".prof"
+                self.paths += [base + ".prof", base + ".txt"]
+            with open(base + ".json", "w") as f:
+                json.dump(self.report, f, indent=2)
+            self.paths.append(base + ".json")
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o profiling em {self.settings.output_dir}: {e}")
+            return
+        memory = self.report.get("memory")
+        logger.info(f"Profiling {self.name}: {self.report['wall_seconds']:.3f}s"
+                    + (f", pico {memory['peak_mb']:.1f} MB" if memory else "") + f" -> {base}.json")
+
+
+def _active_run() -> Optional[ProfileRun]:
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Span de tempo de parede dentro de uma execução amostrada; sem execução ativa, não faz nada.
+    """
+    run = _active_run()
+    if run is None:
+        yield
+        return
+    record = {"name": name, "depth": run.depth, "offset": round(time.perf_counter() - run._start, 6)}
+    run.spans.append(record)
+    run.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        run.depth -= 1
+
+
+@contextmanager
+def profile_block(name: str, settings: Optional[ProfileSettings] = None):
+    """
+    Perfila o bloco se o profiling estiver ligado e a execução for sorteada.
+    Dentro de outra execução ativa (chamadas aninhadas), vira apenas um span.
+    Produz o ProfileRun (ou None quando não amostrado).
+    """
+    settings = settings or _settings
+    if _active_run() is not None:
+        with span(name):
+            yield None
+        return
+    if not settings.enabled or random.random() >= settings.sample_rate:
+        yield None
+        return
+
+    run = ProfileRun(name, settings)
+    _local.run = run
+    run.start()
+    error = None
+    try:
+        yield run
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _local.run = None
+        run.stop(error)
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """
+    Decorador de profiling opt-in (CBIS_PROFILE). Desligado, custa uma checagem de flag.
+    """
+
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with profile_block(label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
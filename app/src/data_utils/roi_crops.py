@@ -0,0 +1,256 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from . import commons
+from .commons import CLASS_MAP, DICOM_UID_MARKER
+from .image_headers import read_image_header
+from .inventory import scan_tree
+from .pipeline import ContentHasher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CROP_SIZE = 224
+DEFAULT_PADDING = 0.15
+# Limiar para binarizar máscaras salvas em JPEG (artefatos de compressão nas bordas)
+MASK_THRESHOLD = 127
+
+
+@dataclass(frozen=True)
+class CropSpec:
+    """
+    Parâmetros do recorte: lado final em pixels, margem relativa em torno da
+    lesão e lado mínimo (pixels da imagem original) para lesões muito pequenas.
+    """
+    size: int = DEFAULT_CROP_SIZE
+    padding: float = DEFAULT_PADDING
+    min_side: int = 0
+
+    @property
+    def tag(self) -> str:
+        return f"s{self.size}-p{int(round(self.padding * 100))}-m{self.min_side}"
+
+
+@dataclass
+class Lesion:
+    """
+    Uma linha dos CSVs de descrição: imagem completa, máscara ROI e label.
+    """
+    label: int
+    image_path: str
+    mask_path: str
+
+
+def _uid_candidates(csv_path_value: str, uid_files: Dict[str, List[str]]) -> List[str]:
+    for part in csv_path_value.strip().split("/"):
+        if DICOM_UID_MARKER in part and part in uid_files:
+            return uid_files[part]
+    return []
+
+
+def _largest_image(jpeg_dir: str, candidates: List[str]) -> Optional[str]:
+    """
+    A pasta da série ROI também contém o recorte do CBIS; a máscara tem o tamanho da
+    mamografia completa, então é a maior imagem (só os cabeçalhos são lidos).
+    """
+    best, best_area = None, -1
+    for rel in candidates:
+        with open(os.path.join(jpeg_dir, rel), "rb") as f:
+            header = read_image_header(f)
+        area = header["width"] * header["height"] if header and header["width"] else 0
+        if area > best_area:
+            best, best_area = rel, area
+    return best
+
+
+def collect_lesions(csv_paths: List[str], jpeg_dir: str, max_workers: int = 16) -> List[Lesion]:
+    """
+    Liga cada linha dos CSVs (image file path / ROI mask file path) aos .jpg extraídos.
+    Linhas sem imagem, sem máscara ou com patologia desconhecida são descartadas.
+    """
+    uid_files: Dict[str, List[str]] = defaultdict(list)
+    for rel, _ in scan_tree(jpeg_dir, max_workers):
+        if rel.lower().endswith(".jpg"):
+            uid_files[rel.split("/")[-2] if "/" in rel else ""].append(rel)
+    for files in uid_files.values():
+        files.sort()
+
+    rows = []
+    for csv_path in csv_paths:
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                label = CLASS_MAP.get(row.get("pathology", ""))
+                images = _uid_candidates(row.get("image file path", ""), uid_files)
+                masks = _uid_candidates(row.get("ROI mask file path", ""), uid_files)
+                if label is None or not images or not masks:
+                    continue
+                rows.append((label, images[0], masks))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        mask_paths = list(pool.map(lambda r: _largest_image(jpeg_dir, r[2]), rows))
+
+    lesions = [Lesion(label, image, mask) for (label, image, _), mask in zip(rows, mask_paths) if mask]
+    logger.info(f"{len(lesions)} lesões com máscara ROI encontradas")
+    return lesions
+
+
+def mask_bbox(mask, threshold: int = MASK_THRESHOLD) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Caixa (x0, y0, x1, y1), com x1/y1 exclusivos, dos pixels acima do limiar; None se vazia.
+    """
+    import numpy as np
+
+    binary = mask > threshold
+    rows, cols = np.flatnonzero(binary.any(axis=1)), np.flatnonzero(binary.any(axis=0))
+    if rows.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def crop_box(bbox: Tuple[int, int, int, int], spec: CropSpec) -> Tuple[int, int, int, int]:
+    """
+    Caixa quadrada centrada na lesão, com margem; pode ultrapassar os limites da imagem.
+    """
+    x0, y0, x1, y1 = bbox
+    side = max(int(round(max(x1 - x0, y1 - y0) * (1 + 2 * spec.padding))), spec.min_side, 1)
+    cx, cy = (x0 + x1) // 2, (y0 + y1) // 2
+    left, top = cx - side // 2, cy - side // 2
+    return left, top, left + side, top + side
+
+
+def extract_crop(image, box: Tuple[int, int, int, int], size: int):
+    """
+    Recorta `box` completando com preto o que sair da imagem e redimensiona para size x size.
+    """
+    import cv2
+
+    height, width = image.shape[:2]
+    left, top, right, bottom = box
+    crop = image[max(top, 0):min(bottom, height), max(left, 0):min(right, width)]
+    pad = (max(-top, 0), max(bottom - height, 0), max(-left, 0), max(right - width, 0))
+    if any(pad):
+        crop = cv2.copyMakeBorder(crop, *pad, cv2.BORDER_CONSTANT, value=0)
+    interpolation = cv2.INTER_AREA if crop.shape[0] > size else cv2.INTER_LINEAR
+    return cv2.resize(crop, (size, size), interpolation=interpolation)
+
+
+def _crop_worker(job: Tuple[str, str, str, CropSpec]) -> Tuple[str, Optional[list]]:
+    """
+    Executado no ProcessPool: decodifica máscara e imagem, calcula a caixa e grava o recorte.
+    """
+    import cv2
+
+    image_path, mask_path, output_path, spec = job
+    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+    image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    if mask is None or image is None:
+        return "unreadable", None
+    bbox = mask_bbox(mask)
+    if bbox is None:
+        return "empty_mask", None
+
+    # Algumas máscaras do CBIS-DDSM não têm exatamente o tamanho da mamografia
+    if mask.shape[:2] != image.shape[:2]:
+        sy, sx = image.shape[0] / mask.shape[0], image.shape[1] / mask.shape[1]
+        bbox = (int(bbox[0] * sx), int(bbox[1] * sy), int(round(bbox[2] * sx)), int(round(bbox[3] * sy)))
+
+    box = crop_box(bbox, spec)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp.jpg"
+    if not cv2.imwrite(tmp_path, extract_crop(image, box, spec.size)):
+        return "unreadable", None
+    os.replace(tmp_path, output_path)
+    return "ok", list(box)
+
+
+def crop_key(mask_digest: str, image_digest: str, spec: CropSpec) -> str:
+    """
+    Caminho do recorte relativo ao diretório de saída, endereçado pelo hash da máscara
+    (combinado ao da mamografia, pois máscaras idênticas podem vir de imagens diferentes).
+    """
+    digest = hashlib.sha256(f"{mask_digest}:{image_digest}".encode()).hexdigest()
+    return f"{digest[:2]}/{digest}-{spec.tag}.jpg"
+
+
+def build_roi_crops(csv_paths: List[str], jpeg_dir: str, output_dir: str, lst_dir: str,
+                    splits_path: Optional[str] = None, size: int = DEFAULT_CROP_SIZE,
+                    padding: float = DEFAULT_PADDING, min_side: int = 0,
+                    max_workers: Optional[int] = None, memo_path: Optional[str] = None) -> dict:
+    """
+    Etapa de recortes guiados por ROI: caixa da lesão a partir da máscara, recorte
+    quadrado com margem e tamanho fixo, e um .lst por split (roi_<split>.lst, caminhos
+    relativos a `output_dir`).
+
+    Os recortes são endereçados pelo sha256 da máscara (e da mamografia) + parâmetros:
+    máscaras já processadas não são decodificadas de novo. Com `splits_path` (splits.json de
+    export_splits), cada lesão segue o split da sua mamografia, evitando vazamento entre
+    treino e validação.
+    """
+    spec = CropSpec(size, padding, min_side)
+    lesions = collect_lesions(csv_paths, jpeg_dir)
+
+    hasher = ContentHasher(memo_path)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        mask_digests = list(pool.map(lambda l: hasher.hash_file(os.path.join(jpeg_dir, l.mask_path)), lesions))
+        image_digests = list(pool.map(lambda l: hasher.hash_file(os.path.join(jpeg_dir, l.image_path)), lesions))
+    hasher.save()
+
+    index_path = os.path.join(output_dir, "crops.json")
+    crop_index = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            crop_index = json.load(f)
+
+    keys, jobs, sources = [], {}, {}
+    for lesion, mask_digest, image_digest in zip(lesions, mask_digests, image_digests):
+        key = crop_key(mask_digest, image_digest, spec)
+        keys.append(key)
+        if key not in jobs and not (key in crop_index and os.path.exists(os.path.join(output_dir, key))):
+            jobs[key] = (os.path.join(jpeg_dir, lesion.image_path), os.path.join(jpeg_dir, lesion.mask_path),
+                         os.path.join(output_dir, key), spec)
+            sources[key] = lesion.image_path
+
+    stats = {"lesions": len(lesions), "cached": len(set(keys)) - len(jobs), "cropped": 0,
+             "empty_mask": 0, "unreadable": 0}
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for key, (status, box) in zip(jobs, pool.map(_crop_worker, jobs.values(), chunksize=8)):
+                stats["cropped" if status == "ok" else status] += 1
+                if status == "ok":
+                    crop_index[key] = {"image": sources[key], "box": box}
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(index_path, "w") as f:
+        json.dump(crop_index, f, indent=1, sort_keys=True)
+
+    membership = {}
+    if splits_path:
+        with open(splits_path, "r") as f:
+            for split_name, rows in json.load(f).items():
+                membership.update({path: split_name for _, path in rows})
+
+    splits: Dict[str, List[tuple]] = defaultdict(list)
+    seen = set()
+    for lesion, key in zip(lesions, keys):
+        if key not in crop_index or key in seen:
+            continue
+        seen.add(key)
+        split_name = membership.get(lesion.image_path, "all" if not splits_path else None)
+        if split_name:
+            splits[split_name].append((lesion.label, key))
+
+    os.makedirs(lst_dir, exist_ok=True)
+    stats["lst"] = {}
+    for split_name in (sorted(set(membership.values())) if splits_path else ["all"]):
+        lst_path = os.path.join(lst_dir, f"roi_{split_name}.lst")
+        stats["lst"][split_name] = commons.write_lst_file(splits[split_name], lst_path)
+
+    logger.info(f"Recortes ROI: {stats['cropped']} novos, {stats['cached']} em cache, "
+                f"{stats['empty_mask']} máscaras vazias, {stats['unreadable']} ilegíveis")
+    return stats
@@ -0,0 +1,274 @@
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 16
+DEFAULT_DEPTH = 1
+# Chaves lidas do SQLite por consulta em keys() (o cursor não fica aberto entre threads)
+KEYS_CHUNK = 1000
+# Maior caractere possível: prefix + _MAX_CHAR limita a faixa de chaves do prefixo
+_MAX_CHAR = "\U0010ffff"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    partition TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    last_modified TEXT,
+    PRIMARY KEY (bucket, key)
+);
+CREATE INDEX IF NOT EXISTS objects_partition ON objects (bucket, partition);
+CREATE TABLE IF NOT EXISTS partitions (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    recursive INTEGER NOT NULL,
+    listed_at REAL NOT NULL,
+    objects INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, prefix)
+);
+"""
+
+Listing = Tuple[List[tuple], List[str], int]
+
+
+class S3Catalog:
+    """
+    Catálogo local (SQLite) das chaves de um bucket: chave, tamanho, ETag e data.
+    refresh() divide o prefixo em partições (prefixos comuns até `depth` níveis do
+    delimitador, ou uma lista explícita de subprefixos, ex.: UIDs ou "0".."f" do CAS),
+    lista as partições em paralelo e grava cada uma de uma vez.
+
+    Uma partição já catalogada só é listada de novo se for marcada como suja
+    (mark_dirty, chamado por quem grava no bucket), se for mais velha que `max_age`
+    segundos ou com full=True. Partições novas e os objetos soltos nos níveis
+    intermediários saem da própria descoberta e estão sempre atualizados.
+
+    Uso:
+        with S3Catalog("s3_catalog.sqlite") as catalog:
+            catalog.refresh(bucket, "cbis-ddsm-classification/images/")
+            keys = list(catalog.keys(bucket, "cbis-ddsm-classification/images/"))
+    """
+
+    def __init__(self, db_path: str, s3_client=None):
+        self.db_path = db_path
+        self.s3_client = s3_client or config.get_client("s3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _list(self, bucket: str, prefix: str, delimiter: Optional[str] = None) -> Listing:
+        """Uma partição: (objetos, prefixos comuns, páginas)."""
+        kwargs = {"Bucket": bucket, "Prefix": prefix}
+        if delimiter:
+            kwargs["Delimiter"] = delimiter
+        objects, prefixes, pages = [], [], 0
+        for page in self.s3_client.get_paginator("list_objects_v2").paginate(**kwargs):
+            pages += 1
+            for obj in page.get("Contents", []):
+                modified = obj.get("LastModified")
+                objects.append((obj["Key"], obj["Size"], obj["ETag"].strip('"'),
+                                modified.isoformat() if modified is not None else None))
+            prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+        return objects, prefixes, pages
+
+    def _known(self, bucket: str, prefix: str) -> Dict[str, tuple]:
+        rows = self._conn.execute(
+            "SELECT prefix, recursive, listed_at, dirty FROM partitions WHERE bucket = ? AND prefix >= ? AND prefix < ?",
+            (bucket, prefix, prefix + _MAX_CHAR)).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def _replace(self, bucket: str, partition: str, objects: List[tuple], recursive: bool) -> Tuple[int, int, int]:
+        """Troca o conteúdo da partição; retorna (novos, removidos, alterados)."""
+        old = dict(self._conn.execute("SELECT key, etag FROM objects WHERE bucket = ? AND partition = ?",
+                                      (bucket, partition)))
+        new = {key: etag for key, _, etag, _ in objects}
+        added = sum(1 for key in new if key not in old)
+        changed = sum(1 for key, etag in new.items() if key in old and old[key] != etag)
+        removed = sum(1 for key in old if key not in new)
+        with self._conn:
+            self._conn.execute("DELETE FROM objects WHERE bucket = ? AND partition = ?", (bucket, partition))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO objects (bucket, key, partition, size, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((bucket, key, partition, size, etag, modified) for key, size, etag, modified in objects))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO partitions (bucket, prefix, recursive, listed_at, objects, bytes, dirty) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (bucket, partition, int(recursive), time.time(), len(objects), sum(o[1] for o in objects)))
+        return added, removed, changed
+
+    def _drop(self, bucket: str, partition: str) -> int:
+        with self._conn:
+            removed = self._conn.execute("DELETE FROM objects WHERE bucket = ? AND partition = ?",
+                                         (bucket, partition)).rowcount
+            self._conn.execute("DELETE FROM partitions WHERE bucket = ? AND prefix = ?", (bucket, partition))
+        return removed
+
+    def refresh(self, bucket: str, prefix: str = "", depth: int = DEFAULT_DEPTH,
+                partitions: Optional[Iterable[str]] = None, delimiter: str = "/",
+                max_age: Optional[float] = None, full: bool = False, max_workers: int = DEFAULT_WORKERS) -> dict:
+        """
+        Atualiza o catálogo de s3://bucket/prefix e retorna as estatísticas da execução.
+        Com `partitions`, as partições são prefix + cada item (sem descoberta): chaves fora
+        delas não entram no catálogo.
+        """
+        start = time.perf_counter()
+        stats = {"partitions": 0, "listed": 0, "skipped": 0, "dropped": 0, "pages": 0,
+                 "added": 0, "removed": 0, "changed": 0}
+        with self._lock, ThreadPoolExecutor(max_workers=max_workers) as pool:
+            known = self._known(bucket, prefix)
+            loose: Dict[str, List[tuple]] = {}
+            if partitions is None:
+                level = [prefix]
+                for _ in range(depth):
+                    next_level = []
+                    for parent, (objects, children, pages) in zip(
+                            level, pool.map(lambda p: self._list(bucket, p, delimiter), level)):
+                        loose[parent] = objects
+                        next_level.extend(children)
+                        stats["pages"] += pages
+                    level = next_level
+                leaves = level
+            else:
+                leaves = [prefix + p for p in partitions]
+
+            now = time.time()
+            to_list = [p for p in leaves
+                       if full or p not in known or known[p][2] or not known[p][0]
+                       or (max_age is not None and now - known[p][1] > max_age)]
+            stats["partitions"] = len(leaves)
+            stats["skipped"] = len(leaves) - len(to_list)
+
+            results = pool.map(lambda p: self._list(bucket, p), to_list)
+            for partition, (objects, _, pages) in zip(to_list, results):
+                counts = self._replace(bucket, partition, objects, recursive=True)
+                for name, n in zip(("added", "removed", "changed"), counts):
+                    stats[name] += n
+                stats["pages"] += pages
+                stats["listed"] += 1
+            for partition, objects in loose.items():
+                counts = self._replace(bucket, partition, objects, recursive=False)
+                for name, n in zip(("added", "removed", "changed"), counts):
+                    stats[name] += n
+
+            if partitions is None:
+                current = set(leaves) | set(loose)
+                for partition in known:
+                    if partition not in current:
+                        stats["removed"] += self._drop(bucket, partition)
+                        stats["dropped"] += 1
+
+        stats.update(self.summary(bucket, prefix))
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(f"Catálogo s3://{bucket}/{prefix}: {stats['listed']}/{stats['partitions']} partições listadas "
+                    f"({stats['pages']} páginas), {stats['objects']} objetos, +{stats['added']} "
+                    f"-{stats['removed']} ~{stats['changed']} em {stats['seconds']}s")
+        return stats
+
+    def mark_dirty(self, bucket: str, keys: Iterable[str]) -> int:
+        """
+        Marca as partições (recursivas) que contêm `keys` para a próxima refresh().
+        Retorna quantas partições foram marcadas.
+        """
+        with self._lock:
+            prefixes = [row[0] for row in self._conn.execute(
+                "SELECT prefix FROM partitions WHERE bucket = ? AND recursive = 1", (bucket,))]
+            dirty = set()
+            for key in keys:
+                matches = [p for p in prefixes if key.startswith(p)]
+                if matches:
+                    dirty.add(max(matches, key=len))
+            with self._conn:
+                self._conn.executemany("UPDATE partitions SET dirty = 1 WHERE bucket = ? AND prefix = ?",
+                                       ((bucket, p) for p in dirty))
+        return len(dirty)
+
+    def keys(self, bucket: str, prefix: str = "") -> Iterator[str]:
+        """
+        Chaves catalogadas sob o prefixo, em ordem, lidas em blocos (seguro entre threads).
+        """
+        last = None
+        while True:
+            with self._lock:
+                if last is None:
+                    rows = self._conn.execute(
+                        "SELECT key FROM objects WHERE bucket = ? AND key >= ? AND key < ? ORDER BY key LIMIT ?",
+                        (bucket, prefix, prefix + _MAX_CHAR, KEYS_CHUNK)).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        "SELECT key FROM objects WHERE bucket = ? AND key > ? AND key < ? ORDER BY key LIMIT ?",
+                        (bucket, last, prefix + _MAX_CHAR, KEYS_CHUNK)).fetchall()
+            for (key,) in rows:
+                yield key
+            if len(rows) < KEYS_CHUNK:
+                return
+            last = rows[-1][0]
+
+    def get(self, bucket: str, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT size, etag, last_modified FROM objects WHERE bucket = ? AND key = ?",
+                                     (bucket, key)).fetchone()
+        return None if row is None else {"key": key, "size": row[0], "etag": row[1], "last_modified": row[2]}
+
+    def summary(self, bucket: str, prefix: str = "") -> dict:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects WHERE bucket = ? AND key >= ? AND key < ?",
+                (bucket, prefix, prefix + _MAX_CHAR)).fetchone()
+        return {"objects": count, "bytes": size}
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    if not uri.startswith("s3://"):
+        raise ValueError(f"URI S3 inválida: {uri}")
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    return bucket, prefix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Lista um prefixo S3 em paralelo para um catálogo SQLite local.")
+    parser.add_argument("uri", help="s3://bucket/prefix/")
+    parser.add_argument("--db", default="s3_catalog.sqlite")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH,
+                        help="Níveis do delimitador usados para descobrir as partições.")
+    parser.add_argument("--partition", action="append", dest="partitions",
+                        help="Subprefixo explícito (repita); desliga a descoberta.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-age", type=float, help="Lista de novo partições mais velhas que N segundos.")
+    parser.add_argument("--full", action="store_true", help="Lista de novo todas as partições.")
+    args = parser.parse_args(argv)
+
+    bucket, prefix = parse_s3_uri(args.uri)
+    with S3Catalog(args.db) as catalog:
+        stats = catalog.refresh(bucket, prefix, depth=args.depth, partitions=args.partitions,
+                                max_age=args.max_age, full=args.full, max_workers=args.workers)
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
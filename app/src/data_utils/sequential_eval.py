@@ -0,0 +1,164 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .evaluation import ScoreCollector, roc_auc
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_METRICS = ("recall", "precision", "auc")
+
+
+def stratified_order(labels: Sequence[int], seed: int = 42) -> np.ndarray:
+    """
+    Ordem aleatória em que todo prefixo mantém aproximadamente a proporção de cada classe.
+    """
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    position = np.empty(labels.size, dtype=np.float64)
+
+    for value in np.unique(labels):
+        idx = np.flatnonzero(labels == value)
+        rng.shuffle(idx)
+        # Cada classe é espalhada uniformemente no intervalo [0, 1)
+        position[idx] = (np.arange(idx.size) + rng.random(idx.size)) / idx.size
+
+    return np.argsort(position, kind="mergesort")
+
+
+def wilson_interval(successes: int, n: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    Intervalo de confiança de Wilson para uma proporção.
+    """
+    if n <= 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / n
+    denom = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def bootstrap_auc_interval(y_true, y_score, n_boot: int = 200, confidence: float = 0.95,
+                           seed: int = 42) -> Tuple[float, float]:
+    """
+    Intervalo de confiança bootstrap (percentil) para a AUC ROC.
+    """
+    y_true = np.asarray(y_true)
+    y_score = np.asarray(y_score)
+    if y_true.size == 0 or y_true.min() == y_true.max():
+        return 0.0, 1.0
+
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(0, y_true.size, size=(n_boot, y_true.size))
+    aucs = np.array([roc_auc(y_true[s], y_score[s]) for s in samples])
+    aucs = aucs[~np.isnan(aucs)]
+    if aucs.size == 0:
+        return 0.0, 1.0
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(aucs, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+@dataclass
+class SequentialReport:
+    """
+    Resultado de uma avaliação sequencial.
+    """
+    n_scored: int
+    n_total: int
+    stopped_early: bool
+    estimates: Dict[str, float]
+    intervals: Dict[str, Tuple[float, float]]
+    collector: ScoreCollector = field(repr=False)
+
+    @property
+    def fraction_scored(self) -> float:
+        return self.n_scored / self.n_total if self.n_total else 0.0
+
+    def summary(self) -> str:
+        lines = [
+            f"Imagens avaliadas: {self.n_scored}/{self.n_total} ({self.fraction_scored * 100:.1f}%)"
+            + (" - parada antecipada" if self.stopped_early else ""),
+        ]
+        for metric, (low, high) in self.intervals.items():
+            lines.append(f"{metric}: {self.estimates[metric]:.4f} [{low:.4f}, {high:.4f}] (largura {high - low:.4f})")
+        return "\n".join(lines)
+
+
+def compute_intervals(y_true, y_score, metrics: Sequence[str] = SUPPORTED_METRICS, threshold: float = 0.5,
+                      confidence: float = 0.95, n_boot: int = 200, seed: int = 42):
+    """
+    Estimativas pontuais e intervalos de confiança para as métricas pedidas.
+    """
+    y_true = np.asarray(y_true)
+    y_score = np.asarray(y_score)
+    pred = y_score > threshold
+    tp = int(np.sum(pred & (y_true == 1)))
+    fp = int(np.sum(pred & (y_true == 0)))
+    fn = int(np.sum(~pred & (y_true == 1)))
+
+    estimates, intervals = {}, {}
+    for metric in metrics:
+        if metric == "recall":
+            estimates[metric] = tp / (tp + fn) if tp + fn else float("nan")
+            intervals[metric] = wilson_interval(tp, tp + fn, confidence)
+        elif metric == "precision":
+            estimates[metric] = tp / (tp + fp) if tp + fp else float("nan")
+            intervals[metric] = wilson_interval(tp, tp + fp, confidence)
+        elif metric == "auc":
+            estimates[metric] = roc_auc(y_true, y_score) if y_true.size else float("nan")
+            intervals[metric] = bootstrap_auc_interval(y_true, y_score, n_boot, confidence, seed)
+        else:
+            raise ValueError(f"Métrica não suportada: {metric}. Use uma de {SUPPORTED_METRICS}")
+    return estimates, intervals
+
+
+def sequential_evaluate(entries: Sequence, score_fn: Callable[[object], float], target_width: float = 0.1,
+                        confidence: float = 0.95, metrics: Sequence[str] = SUPPORTED_METRICS,
+                        threshold: float = 0.5, min_samples: int = 50, check_every: int = 25,
+                        max_samples: Optional[int] = None, n_boot: int = 200,
+                        seed: int = 42) -> SequentialReport:
+    """
+    Avalia as entradas de um .lst em ordem aleatória estratificada e para assim que todos os
+    intervalos de confiança ficam mais estreitos que target_width.
+
+    score_fn recebe uma entrada (com atributos label e path) e retorna a probabilidade de malignidade.
+    """
+    order = stratified_order([e.label for e in entries], seed)
+    limit = len(entries) if max_samples is None else min(max_samples, len(entries))
+    collector = ScoreCollector(capacity=max(limit, 1))
+
+    estimates, intervals = {}, {}
+    stopped_early = False
+
+    for position, idx in enumerate(order[:limit], start=1):
+        entry = entries[idx]
+        collector.add(entry.label, score_fn(entry), entry.path)
+
+        if position < min_samples or (position - min_samples) % check_every:
+            continue
+
+        estimates, intervals = compute_intervals(collector.y_true, collector.y_score, metrics, threshold,
+                                                 confidence, n_boot, seed)
+        widths = {m: high - low for m, (low, high) in intervals.items()}
+        logger.info(f"[{position}/{len(entries)}] larguras dos ICs: "
+                    + ", ".join(f"{m}={w:.3f}" for m, w in widths.items()))
+
+        if all(w <= target_width for w in widths.values()):
+            stopped_early = position < len(entries)
+            break
+
+    if len(collector) and (not intervals or not stopped_early):
+        estimates, intervals = compute_intervals(collector.y_true, collector.y_score, metrics, threshold,
+                                                 confidence, n_boot, seed)
+
+    report = SequentialReport(len(collector), len(entries), stopped_early, estimates, intervals, collector)
+    logger.info(f"Avaliação sequencial concluída com {report.n_scored} de {report.n_total} imagens.")
+    return report
@@ -0,0 +1,187 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional
+
+from . import commons
+from .commons import CLASS_MAP, resolve_uid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRACTIONS = {"train": 0.8, "validation": 0.2}
+DEFAULT_SALT = "cbis-ddsm"
+ASSIGNMENTS_FILE = "assignments.tsv"
+# Um split só perde um paciente novo quando já passou da sua cota do label por mais que isso
+DEFAULT_SLACK = 1.0
+
+
+def hash_unit(key: str, salt: str = DEFAULT_SALT) -> float:
+    """
+    Posição estável de `key` em [0, 1): não depende da ordem das linhas nem da execução.
+    """
+    digest = hashlib.blake2b(f"{salt}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+class StreamingSplitter:
+    """
+    Divisão em uma passada, sem carregar a tabela: cada paciente vai para o split indicado
+    pelo hash do seu ID (todas as imagens dele ficam juntas). Se o split sorteado já
+    passou da cota do label do paciente (fração * total visto + folga), ele vai para o
+    split mais abaixo da cota, o que mantém a estratificação mesmo com poucos pacientes.
+
+    O estado vem dos próprios <lst_dir>/<split>.lst (caminhos, contagens por label e
+    próximo índice) e de assignments.tsv (paciente -> split). Novas linhas são apenas
+    acrescentadas: atribuições antigas nunca mudam e imagens já listadas são ignoradas.
+    """
+
+    def __init__(self, lst_dir: str, fractions: Optional[Dict[str, float]] = None,
+                 salt: str = DEFAULT_SALT, slack: float = DEFAULT_SLACK):
+        fractions = dict(fractions or DEFAULT_FRACTIONS)
+        if not fractions or any(f <= 0 for f in fractions.values()) or abs(sum(fractions.values()) - 1) > 1e-6:
+            raise ValueError(f"Frações inválidas (devem ser positivas e somar 1): {fractions}")
+        self.lst_dir = lst_dir
+        self.fractions = fractions
+        self.salt = salt
+        self.slack = slack
+        self.counts: Dict[int, Counter] = defaultdict(Counter)
+        self.next_index = {name: 0 for name in fractions}
+        self.paths = set()
+        self.patients: Dict[str, str] = {}
+        self.added = Counter()
+        self._files = {}
+        os.makedirs(lst_dir, exist_ok=True)
+        self._load()
+        self._assignments = open(os.path.join(lst_dir, ASSIGNMENTS_FILE), "a")
+
+    def _load(self):
+        for name in self.fractions:
+            path = self.lst_path(name)
+            if not os.path.exists(path):
+                continue
+            for entry in commons.read_lst_file(path):
+                self.paths.add(entry.path)
+                self.counts[entry.label][name] += 1
+                self.next_index[name] = max(self.next_index[name], entry.index + 1)
+        assignments = os.path.join(self.lst_dir, ASSIGNMENTS_FILE)
+        if os.path.exists(assignments):
+            with open(assignments, "r") as f:
+                for line in f:
+                    patient, _, name = line.rstrip("\n").partition("\t")
+                    if name in self.fractions:
+                        self.patients[patient] = name
+
+    def lst_path(self, name: str) -> str:
+        return os.path.join(self.lst_dir, f"{name}.lst")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        self._assignments.close()
+
+    def choose(self, patient_id: str, label: int) -> str:
+        """
+        Split do paciente: o já atribuído ou, para um paciente novo, o do hash com correção de cota.
+        """
+        if patient_id in self.patients:
+            return self.patients[patient_id]
+
+        u, cumulative, chosen = hash_unit(patient_id, self.salt), 0.0, None
+        for name, fraction in self.fractions.items():
+            cumulative += fraction
+            if u < cumulative:
+                chosen = name
+                break
+        chosen = chosen or name  # Arredondamento da soma das frações
+
+        counts = self.counts[label]
+        total = sum(counts.values()) + 1
+        if counts[chosen] + 1 > self.fractions[chosen] * total + self.slack:
+            chosen = max(self.fractions, key=lambda n: self.fractions[n] * total - counts[n])
+
+        self.patients[patient_id] = chosen
+        self._assignments.write(f"{patient_id}\t{chosen}\n")
+        return chosen
+
+    def add(self, patient_id: str, label: int, path: str) -> Optional[str]:
+        """
+        Acrescenta a imagem ao .lst do split do paciente. Retorna o split, ou None se já listada.
+        """
+        if path in self.paths:
+            return None
+        name = self.choose(patient_id, label)
+        f = self._files.get(name)
+        if f is None:
+            f = self._files[name] = open(self.lst_path(name), "a")
+        f.write(f"{self.next_index[name]}\t{label}\t{path}\n")
+        self.next_index[name] += 1
+        self.counts[label][name] += 1
+        self.paths.add(path)
+        self.added[name] += 1
+        return name
+
+    def summary(self) -> dict:
+        return {"added": dict(self.added), "patients": len(self.patients),
+                "labels": {str(label): {n: counts[n] for n in self.fractions}
+                           for label, counts in sorted(self.counts.items())}}
+
+
+def export_splits(lst_dir: str, splits_path: str, names: Iterable[str] = ("train", "validation")):
+    """
+    Grava os .lst da divisão no formato de splits.json ({split: [[label, caminho], ...]}),
+    usado por build_roi_crops para seguir a mesma divisão.
+    """
+    splits = {}
+    for name in names:
+        path = os.path.join(lst_dir, f"{name}.lst")
+        entries = commons.read_lst_file(path) if os.path.exists(path) else []
+        splits[name] = [[e.label, e.path] for e in entries]
+    with open(splits_path, "w") as f:
+        json.dump(splits, f)
+
+
+def iter_csv_rows(csv_paths: Iterable[str]) -> Iterable[dict]:
+    for csv_path in csv_paths:
+        with open(csv_path, newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def split_csv_files(csv_paths: Iterable[str], index_path: str, lst_dir: str,
+                    fractions: Optional[Dict[str, float]] = None, salt: str = DEFAULT_SALT,
+                    patient_column: str = "patient_id", slack: float = DEFAULT_SLACK) -> dict:
+    """
+    Lê os CSVs de descrição linha a linha, liga cada linha à imagem pelo UID (índice de
+    index_images) e acrescenta as imagens novas a <lst_dir>/<split>.lst.
+    Linhas sem imagem ou com patologia desconhecida são contadas e descartadas; sem a coluna
+    do paciente, cada imagem é o seu próprio grupo.
+    """
+    with open(index_path, "r") as f:
+        file_map = json.load(f)
+
+    stats = Counter()
+    with StreamingSplitter(lst_dir, fractions, salt, slack) as splitter:
+        for row in iter_csv_rows(csv_paths):
+            stats["rows"] += 1
+            label = CLASS_MAP.get(row.get("pathology", ""))
+            rel_path = resolve_uid(row.get("image file path", ""), file_map)
+            if label is None or rel_path is None:
+                stats["unresolved"] += 1
+                continue
+            if splitter.add(row.get(patient_column) or rel_path, label, rel_path) is None:
+                stats["existing"] += 1
+        summary = splitter.summary()
+
+    summary.update({"rows": stats["rows"], "unresolved": stats["unresolved"], "existing": stats["existing"]})
+    logger.info(f"Divisão em streaming: {stats['rows']} linhas, novas {summary['added']}, "
+                f"{stats['existing']} já listadas, {stats['unresolved']} sem imagem/label")
+    return summary
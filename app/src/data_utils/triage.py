@@ -0,0 +1,171 @@
+import logging
+import time
+from collections import Counter, deque
+from typing import Iterable, List
+
+from .grayscale import opencv_available
+from .image_headers import read_image_header, sniff_format
+
+logger = logging.getLogger(__name__)
+
+# Formatos aceitos pelo endpoint (application/x-image); DICOM é convertido antes, no pipeline
+ACCEPTED_FORMATS = ("jpeg", "png")
+MIN_BYTES = 128
+# Menor lado abaixo disso é miniatura, não exame (recortes de ROI têm centenas de pixels)
+MIN_SIDE = 128
+# Desvio-padrão e faixa p1..p99 mínimos na versão reduzida; um exame em branco fica abaixo
+MIN_STD = 4.0
+MIN_RANGE = 16.0
+# Lado mínimo da versão reduzida usada nas estatísticas de intensidade
+PREVIEW_MIN_SIDE = 64
+
+# Motivos de rejeição
+EMPTY = "empty"
+NOT_AN_IMAGE = "not_an_image"
+UNSUPPORTED_FORMAT = "unsupported_format"
+CORRUPT_HEADER = "corrupt_header"
+TOO_SMALL = "too_small"
+UNDECODABLE = "undecodable"
+BLANK = "blank"
+REASONS = (EMPTY, NOT_AN_IMAGE, UNSUPPORTED_FORMAT, CORRUPT_HEADER, TOO_SMALL, UNDECODABLE, BLANK)
+
+# Contadores de TriageGate.metrics(), acumulados no processo
+COUNTERS = ("checked", "accepted", "rejected", "intensity_skipped", "endpoint_calls_avoided",
+            *(f"rejected_{reason}" for reason in REASONS))
+# Latências guardadas para drain_ms() (o EMF aceita até 100 valores por métrica)
+RECENT_MS = 100
+
+
+def preview_statistics(data: bytes, width: int, height: int):
+    """
+    Desvio-padrão e faixa p1..p99 da intensidade numa versão reduzida: o JPEG é
+    decodificado direto em 1/2, 1/4 ou 1/8 (escala na DCT, sem decodificar a imagem
+    inteira), mantendo o menor lado >= PREVIEW_MIN_SIDE.
+    Levanta ValueError se não decodificar.
+    """
+    import cv2
+    import numpy as np
+
+    flag = cv2.IMREAD_GRAYSCALE
+    for factor, reduced in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                            (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+        if min(width, height) // factor >= PREVIEW_MIN_SIDE:
+            flag = reduced
+            break
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    if img is None:
+        raise ValueError("Imagem ilegível.")
+    low, high = np.percentile(img, (1, 99))
+    return float(img.std()), float(high - low)
+
+
+class TriageGate:
+    """
+    Triagem barata em CPU antes do invoke_endpoint: tamanho, magic bytes, dimensões
+    lidas só do cabeçalho e, por último, brilho/contraste numa versão reduzida.
+    As verificações vão da mais barata para a mais cara e param na primeira rejeição.
+    A verificação de intensidade precisa do OpenCV. Sem ele, o aviso sai uma vez na
+    criação, as de cabeçalho continuam e cada objeto aceito sem ela sai com
+    `intensity_checked=False` e conta em `intensity_skipped`. Na dúvida, o objeto segue para o modelo.
+    """
+
+    def __init__(self, min_bytes: int = MIN_BYTES, min_side: int = MIN_SIDE, min_std: float = MIN_STD,
+                 min_range: float = MIN_RANGE, formats: Iterable[str] = ACCEPTED_FORMATS,
+                 intensity: bool = True):
+        self.min_bytes = min_bytes
+        self.min_side = min_side
+        self.min_std = min_std
+        self.min_range = min_range
+        self.formats = tuple(formats)
+        self.intensity = intensity and opencv_available()
+        if intensity and not self.intensity:
+            logger.warning("OpenCV indisponível: a triagem não verifica exames em branco, "
+                           "só tamanho, formato e cabeçalho.")
+        self.counts = Counter()
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent_ms = deque(maxlen=RECENT_MS)
+
+    def _verdict(self, data: bytes) -> dict:
+        if len(data) < self.min_bytes:
+            return {"reason": EMPTY, "detail": f"{len(data)} bytes"}
+        fmt = sniff_format(data[:256])
+        if fmt == "unknown":
+            return {"reason": NOT_AN_IMAGE, "detail": f"magic {data[:8].hex()}"}
+        if fmt not in self.formats:
+            return {"reason": UNSUPPORTED_FORMAT, "detail": fmt, "format": fmt}
+
+        header = read_image_header(data)
+        if not header or not header["width"] or not header["height"]:
+            return {"reason": CORRUPT_HEADER, "detail": f"{fmt} sem dimensões", "format": fmt}
+        info = {"format": fmt, "width": header["width"], "height": header["height"]}
+        if min(header["width"], header["height"]) < self.min_side:
+            return {"reason": TOO_SMALL, "detail": f"{header['width']}x{header['height']}", **info}
+        if not self.intensity:
+            return {"reason": None, **info}
+
+        try:
+            std, value_range = preview_statistics(data, header["width"], header["height"])
+        except ValueError as e:
+            return {"reason": UNDECODABLE, "detail": str(e), **info}
+        info.update(std=round(std, 2), range=round(value_range, 2))
+        if std < self.min_std or value_range < self.min_range:
+            return {"reason": BLANK, "detail": f"std={std:.2f} range={value_range:.0f}", **info}
+        return {"reason": None, **info}
+
+    def check(self, data: bytes) -> dict:
+        """
+        Retorna {"accepted", "reason", "detail", "format", "width", "height",
+        "intensity_checked", "ms", ...}.
+        Um objeto rejeitado é uma chamada ao endpoint evitada.
+        """
+        start = time.perf_counter()
+        verdict = self._verdict(data)
+        ms = (time.perf_counter() - start) * 1000
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.recent_ms.append(round(ms, 3))
+        self.counts["checked"] += 1
+
+        accepted = verdict["reason"] is None
+        verdict["intensity_checked"] = "std" in verdict
+        if accepted:
+            self.counts["accepted"] += 1
+            self.counts["intensity_skipped"] += int(not verdict["intensity_checked"])
+        else:
+            self.counts["rejected"] += 1
+            self.counts[f"rejected_{verdict['reason']}"] += 1
+            logger.info(f"Triagem rejeitou o objeto: {verdict['reason']} ({verdict.get('detail')})")
+        return {"accepted": accepted, "detail": None, **verdict, "ms": round(ms, 3)}
+
+    def metrics(self) -> dict:
+        """
+        Contadores acumulados no processo e latência da própria triagem (ms);
+        `endpoint_calls_avoided` = objetos rejeitados, `intensity_skipped` = aceitos
+        sem a verificação de intensidade.
+        """
+        checked = self.counts["checked"]
+        metrics = {name: self.counts[name] for name in ("checked", "accepted", "rejected", "intensity_skipped")}
+        metrics.update({f"rejected_{reason}": self.counts[f"rejected_{reason}"] for reason in REASONS})
+        metrics["endpoint_calls_avoided"] = metrics["rejected"]
+        metrics["gate_ms_mean"] = round(self.total_ms / checked, 3) if checked else 0.0
+        metrics["gate_ms_max"] = round(self.max_ms, 3)
+        return metrics
+
+    def drain_ms(self) -> List[float]:
+        """
+        Latências (ms) das verificações desde a última chamada, no máximo as RECENT_MS
+        mais recentes; publicadas por invocação, deixam as estatísticas para o CloudWatch.
+        """
+        values = list(self.recent_ms)
+        self.recent_ms.clear()
+        return values
+
+
+def reject_record(bucket: str, key: str, verdict: dict) -> dict:
+    """
+    Registro de rejeição gravado no lugar do resultado do modelo.
+    """
+    return {"bucket": bucket, "key": key, "rejected_at": int(time.time()),
+            **{k: v for k, v in verdict.items() if k != "accepted"}}
+
@@ -1,46 +1,356 @@
 import boto3
 import json
 import os
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    # Lambda package: data_utils is shipped next to the handler
+    from data_utils import (adaptive_client, config, drift, endpoint_router, grayscale, idempotency,
+                            model_resolver, profiling, triage)
+    from data_utils.image_headers import read_image_header
+except ImportError:
+    # Running from the repository root (tests)
+    from app.src.data_utils import (adaptive_client, config, drift, endpoint_router, grayscale, idempotency,
+                                    model_resolver, profiling, triage)
+    from app.src.data_utils.image_headers import read_image_header
 
 # Configuration
-ENDPOINT_NAME = os.environ.get('ENDPOINT_NAME', 'cbis-ddsm-serverless-endpoint')
+# ENDPOINT_NAME overrides the SSM lookup (/{CONFIG_PROJECT}/{CONFIG_ENV}/endpoint_name);
+# a single name in ENDPOINT_NAMES (below) overrides both
+DEFAULT_ENDPOINT_NAME = 'cbis-ddsm-serverless-endpoint'
+ENDPOINT_NAME = os.environ.get('ENDPOINT_NAME', '')
+CONFIG_PROJECT = os.environ.get('CONFIG_PROJECT', config.DEFAULT_PROJECT_NAME)
+CONFIG_ENV = os.environ.get('CONFIG_ENV', config.DEFAULT_ENV)
 s3_client = boto3.client('s3')
 sm_runtime = boto3.client('sagemaker-runtime')
 
+# Drift monitoring (opt-in): each container keeps a fixed-memory sketch and
+# flushes it to S3 as a mergeable partial every DRIFT_FLUSH_EVERY inferences, or on
+# the first inference after DRIFT_FLUSH_SECONDS. Lambda has no shutdown hook, so the
+# inferences since the last flush are lost when an idle container is recycled.
+# The intensity features need OpenCV from a layer (Terraform `layers`)
+DRIFT_MONITORING = os.environ.get('DRIFT_MONITORING', 'false').lower() == 'true'
+DRIFT_SKETCH_PREFIX = os.environ.get('DRIFT_SKETCH_PREFIX', 'monitoring/partials')
+DRIFT_FLUSH_EVERY = int(os.environ.get('DRIFT_FLUSH_EVERY', '50'))
+DRIFT_FLUSH_SECONDS = float(os.environ.get('DRIFT_FLUSH_SECONDS', '300'))
+CONTAINER_ID = uuid.uuid4().hex
+drift_sketch = drift.DriftSketch()
+drift_flushed_at = time.time()
+
+# Prediction cache (opt-in): in-container LRU keyed by model version + image hash.
+# The version comes from the record published by notebook 04 (MODEL_RECORD_KEY),
+# re-read every MODEL_RECORD_TTL seconds so a new deployment never serves stale results
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '0'))
+MODEL_RECORD_KEY = os.environ.get('MODEL_RECORD_KEY', model_resolver.MODEL_RECORD_KEY)
+MODEL_RECORD_TTL = int(os.environ.get('MODEL_RECORD_TTL', '300'))
+prediction_cache = OrderedDict()
+model_version = {'key': None, 'expires_at': 0.0}
+
+# Multi-endpoint routing (opt-in): ENDPOINT_NAMES is a comma-separated list of
+# replicas; each call goes to the lowest-EWMA-latency endpoint and, with
+# HEDGE_PERCENTILE set, a second request is sent to the next endpoint when the
+# first exceeds that percentile of its own latency (the slower answer is discarded).
+# With a single name there is nothing to route: that endpoint is called directly
+ENDPOINT_NAMES = [n.strip() for n in os.environ.get('ENDPOINT_NAMES', '').split(',') if n.strip()]
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '0')) or None
+HEDGE_MIN_DELAY_MS = float(os.environ.get('HEDGE_MIN_DELAY_MS', '50'))
+router = None
+
+# Adaptive concurrency (opt-in): invoke_endpoint goes through a shared wrapper with
+# an AIMD concurrency limit, a token bucket, jittered retries on ThrottlingException
+# and a circuit breaker; its limits are logged as CloudWatch EMF metrics
+ADAPTIVE_CLIENT = os.environ.get('ADAPTIVE_CLIENT', 'false').lower() == 'true'
+ADAPTIVE_MAX_RETRIES = int(os.environ.get('ADAPTIVE_MAX_RETRIES', '4'))
+ADAPTIVE_METRICS_NAMESPACE = os.environ.get('ADAPTIVE_METRICS_NAMESPACE', 'CBIS/Inference')
+
+# Grayscale payload (opt-in): multi-channel uploads are re-encoded as single-channel
+# JPEG before invoke_endpoint; the endpoint replicates the channel back to the
+# 3 channels of image_shape when decoding. The re-encode costs CPU on every call and is
+# a second lossy JPEG generation, so storing the images in grayscale upstream is
+# preferred. Needs OpenCV from a layer (Terraform `layers`); without it the option is
+# turned off at cold start with a warning and uploads are sent unchanged
+GRAYSCALE_PAYLOAD = os.environ.get('GRAYSCALE_PAYLOAD', 'false').lower() == 'true'
+
+# Duplicate suppression (opt-in): S3/EventBridge deliveries are at-least-once. With
+# IDEMPOTENCY_TABLE set, each (bucket, key, versionId/sequencer) is claimed in DynamoDB
+# with a conditional write before the object is read; a duplicate reuses the stored
+# result, or waits up to IDEMPOTENCY_WAIT_SECONDS while the first delivery is running.
+# The lease must outlast the function timeout so a crashed owner cannot block forever
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE', '')
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '60'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '10'))
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+idempotency_guard = None
+
+# Pre-triage (opt-in): before invoke_endpoint, uploads are checked on CPU from the
+# cheapest test to the most expensive: size, magic bytes, header dimensions and
+# low-resolution intensity (blank scans). A rejected object never reaches the model;
+# its reject record goes to TRIAGE_REJECT_PREFIX (empty = log only). The intensity
+# check needs OpenCV from a layer (Terraform `layers`); without it a warning is printed
+# at cold start, only the header checks run and blank scans still reach the model
+TRIAGE_GATE = os.environ.get('TRIAGE_GATE', 'false').lower() == 'true'
+TRIAGE_MIN_SIDE = int(os.environ.get('TRIAGE_MIN_SIDE', str(triage.MIN_SIDE)))
+TRIAGE_MIN_STD = float(os.environ.get('TRIAGE_MIN_STD', str(triage.MIN_STD)))
+TRIAGE_REJECT_PREFIX = os.environ.get('TRIAGE_REJECT_PREFIX', '')
+triage_gate = None
+
+
+def record_drift(bucket, image_bytes, prob_malignant):
+    """Update the container sketch and flush a partial to S3 when it is full enough or old enough."""
+    global drift_sketch, drift_flushed_at
+
+    drift_sketch.update_inference(prob_malignant, image_bytes)
+    now = time.time()
+    if drift_sketch.n >= DRIFT_FLUSH_EVERY or now - drift_flushed_at >= DRIFT_FLUSH_SECONDS:
+        key = drift.save_partial_to_s3(drift_sketch, s3_client, bucket, DRIFT_SKETCH_PREFIX, CONTAINER_ID)
+        print(f"Drift sketch flushed to s3://{bucket}/{key} ({drift_sketch.n} inferences)")
+        drift_sketch = drift.DriftSketch()
+        drift_flushed_at = now
+
+
+def warn_missing_opencv():
+    """Cold-start warnings for enabled features that lose checks without an OpenCV layer."""
+    if grayscale.opencv_available():
+        return []
+    warnings = []
+    if DRIFT_MONITORING:
+        warnings.append("DRIFT_MONITORING: OpenCV not available (no layer), "
+                        "mean/std intensity are not sketched; only size features and probabilities are")
+    if GRAYSCALE_PAYLOAD:
+        warnings.append("GRAYSCALE_PAYLOAD: OpenCV not available (no layer), "
+                        "the conversion is disabled and uploads are sent unchanged")
+    for warning in warnings:
+        print(f"⚠️ {warning}")
+    return warnings
+
+
+warn_missing_opencv()
+GRAYSCALE_PAYLOAD = GRAYSCALE_PAYLOAD and grayscale.opencv_available()
+
+
+def get_endpoint_name():
+    """Endpoint name from the environment, else from SSM (one call per container)."""
+    if len(ENDPOINT_NAMES) == 1:
+        return ENDPOINT_NAMES[0]
+    override = ENDPOINT_NAME or os.environ.get('ENDPOINT_NAME')
+    if override:
+        return override
+    return config.get_parameter('endpoint_name', DEFAULT_ENDPOINT_NAME,
+                                project_name=CONFIG_PROJECT, env=CONFIG_ENV)
+
+
+def get_model_version(bucket):
+    """Version key of the deployed model, or None when no record has been published."""
+    now = time.time()
+    if now >= model_version['expires_at']:
+        record = model_resolver.load_published_record(s3_client, bucket, MODEL_RECORD_KEY)
+        model_version['key'] = record.version_key if record else None
+        model_version['expires_at'] = now + MODEL_RECORD_TTL
+    return model_version['key']
+
+
+def runtime_client():
+    """sm_runtime, or its shared adaptive wrapper when ADAPTIVE_CLIENT is enabled."""
+    if ADAPTIVE_CLIENT:
+        return adaptive_client.shared(sm_runtime, max_retries=ADAPTIVE_MAX_RETRIES)
+    return sm_runtime
+
+
+def invoke_model(endpoint_name, file_content):
+    """Single invoke_endpoint call returning the parsed probabilities."""
+    response = runtime_client().invoke_endpoint(
+        EndpointName=endpoint_name,
+        ContentType='application/x-image',
+        Body=file_content
+    )
+    return json.loads(response['Body'].read().decode())
 
-def lambda_handler(event, context):
-    print("Receiving event from S3...")
 
-    # Read event details
-    for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
-        key = record['s3']['object']['key']
+def to_grayscale_payload(file_content):
+    """Single-channel JPEG of a multi-channel upload (the header is read first, so gray images are untouched)."""
+    header = read_image_header(file_content)
+    if not header or header['format'] == 'dicom' or (header['channels'] or 1) == 1:
+        return file_content
+    try:
+        payload = grayscale.encode_grayscale(file_content)
+    except ImportError:
+        print("OpenCV not available: sending the original payload")
+        return file_content
+    except ValueError as e:
+        print(f"Grayscale conversion failed ({e}): sending the original payload")
+        return file_content
+    print(f"Grayscale payload: {len(file_content)} -> {len(payload)} bytes")
+    return payload
 
-        print(f"Processing file: s3://{bucket}/{key}")
 
-        # Download image from S3 to Lambda memory
+def get_router():
+    """Router over ENDPOINT_NAMES, created once per container (None for a single endpoint)."""
+    global router
+    if router is None and len(ENDPOINT_NAMES) > 1:
+        router = endpoint_router.EndpointRouter(
+            ENDPOINT_NAMES, invoke_model, hedge_percentile=HEDGE_PERCENTILE,
+            hedge_min_delay=HEDGE_MIN_DELAY_MS / 1000.0)
+    return router
+
+
+def predict(bucket, file_content):
+    """Invoke the endpoint, reusing cached probabilities for an identical image and model."""
+    cache_key = None
+    if PREDICTION_CACHE_SIZE > 0:
+        version_key = get_model_version(bucket)
+        if version_key:
+            cache_key = model_resolver.prediction_cache_key(version_key, file_content)
+            if cache_key in prediction_cache:
+                prediction_cache.move_to_end(cache_key)
+                print(f"Prediction cache hit (model {version_key})")
+                return prediction_cache[cache_key]
+
+    # Send to SageMaker Serverless Endpoint
+    with profiling.span('invoke_endpoint'):
+        # The wrapper's counters are per container: only this call's increments are published
+        before = runtime_client().metrics() if ADAPTIVE_CLIENT else None
+        try:
+            active_router = get_router()
+            if active_router is not None:
+                result = active_router.call(file_content)
+                print(f"Invoked endpoint: {active_router.last_endpoint} {active_router.metrics()}")
+            else:
+                endpoint_name = get_endpoint_name()
+                print(f"Invoking endpoint: {endpoint_name}")
+                result = invoke_model(endpoint_name, file_content)
+        finally:
+            if before is not None:
+                metrics = adaptive_client.metric_deltas(before, runtime_client().metrics(), adaptive_client.COUNTERS)
+                print(json.dumps(adaptive_client.emf_record(metrics, ADAPTIVE_METRICS_NAMESPACE)))
+
+    if cache_key:
+        prediction_cache[cache_key] = result
+        while len(prediction_cache) > PREDICTION_CACHE_SIZE:
+            prediction_cache.popitem(last=False)
+    return result
+
+
+def get_idempotency_guard():
+    """Guard over the DynamoDB table, created once per container (None when disabled)."""
+    global idempotency_guard
+    if idempotency_guard is None and IDEMPOTENCY_TABLE:
+        store = idempotency.DynamoDBStore(IDEMPOTENCY_TABLE, boto3.client('dynamodb'))
+        idempotency_guard = idempotency.IdempotencyGuard(
+            store, lease_seconds=IDEMPOTENCY_LEASE_SECONDS, wait_seconds=IDEMPOTENCY_WAIT_SECONDS,
+            ttl_seconds=IDEMPOTENCY_TTL_SECONDS)
+    return idempotency_guard
+
+
+def get_triage_gate():
+    """Pre-triage gate, created once per container (None when disabled)."""
+    global triage_gate
+    if triage_gate is None and TRIAGE_GATE:
+        triage_gate = triage.TriageGate(min_side=TRIAGE_MIN_SIDE, min_std=TRIAGE_MIN_STD)
+        if not triage_gate.intensity:
+            print("⚠️ TRIAGE_GATE: OpenCV not available (no layer), blank-scan check disabled; "
+                  "only size, format and header checks run")
+    return triage_gate
+
+
+def reject_object(bucket, key, verdict):
+    """Reject result for an upload that failed pre-triage (stored under TRIAGE_REJECT_PREFIX)."""
+    record = triage.reject_record(bucket, key, verdict)
+    if TRIAGE_REJECT_PREFIX:
+        reject_key = f"{TRIAGE_REJECT_PREFIX.rstrip('/')}/{key}.json"
+        s3_client.put_object(Bucket=bucket, Key=reject_key, Body=json.dumps(record).encode(),
+                             ContentType='application/json')
+        print(f"Reject record written to s3://{bucket}/{reject_key}")
+    return record
+
+
+def process_object(bucket, key):
+    """Download one upload, score it and update drift; returns the endpoint probabilities,
+    or a reject record (dict) when the pre-triage gate turns the upload away."""
+    # Download image from S3 to Lambda memory
+    with profiling.span('s3_get_object'):
         file_obj = s3_client.get_object(Bucket=bucket, Key=key)
         file_content = file_obj['Body'].read()
 
-        # Send to SageMaker Serverless Endpoint
-        print(f"Invoking endpoint: {ENDPOINT_NAME}")
-        response = sm_runtime.invoke_endpoint(
-            EndpointName=ENDPOINT_NAME,
-            ContentType='application/x-image',
-            Body=file_content
-        )
+    gate = get_triage_gate()
+    if gate is not None:
+        with profiling.span('triage'):
+            verdict = gate.check(file_content)
+        if not verdict['accepted']:
+            return reject_object(bucket, key, verdict)
+
+    payload = file_content
+    if GRAYSCALE_PAYLOAD:
+        with profiling.span('grayscale_payload'):
+            payload = to_grayscale_payload(file_content)
+
+    result = predict(bucket, payload)
+
+    if DRIFT_MONITORING:
+        record_drift(bucket, file_content, result[1])
+    return result
+
+
+# Profiling (opt-in): CBIS_PROFILE=all|cprofile,memory,time, sampled with
+# CBIS_PROFILE_SAMPLE_RATE; reports are written to CBIS_PROFILE_DIR (/tmp by default)
+@profiling.profiled('lambda_handler')
+def lambda_handler(event, context):
+    print("Receiving event from S3...")
+
+    diagnosis = None
+    guard = get_idempotency_guard()
+    gate = get_triage_gate()
+
+    # Guard and gate counters are per container: only this invocation's increments are published
+    guard_before = guard.metrics() if guard is not None else None
+    gate_before = gate.metrics() if gate is not None else None
+    if gate is not None:
+        gate.drain_ms()
+    try:
+        # Read event details
+        for record in event['Records']:
+            bucket = record['s3']['bucket']['name']
+            key = record['s3']['object']['key']
+
+            print(f"Processing file: s3://{bucket}/{key}")
+
+            if guard is None:
+                result = process_object(bucket, key)
+            else:
+                delivery = idempotency.record_id(bucket, record['s3']['object'])
+                status, result = guard.run(delivery, lambda: process_object(bucket, key))
+                if status == idempotency.IN_FLIGHT:
+                    print(f"Duplicate delivery {delivery} still in progress elsewhere: skipped")
+                    continue
+                if status == idempotency.REUSED:
+                    print(f"Duplicate delivery {delivery}: reusing the stored result")
+
+            if isinstance(result, dict):
+                diagnosis = "REJECTED"
+                print(f"⛔ Rejected {key} before inference: {result['reason']} ({result['detail']})")
+                continue
 
-        # Read the response
-        result = json.loads(response['Body'].read().decode())
-        prob_benign = result[0]
-        prob_malignant = result[1]
+            prob_benign = result[0]
+            prob_malignant = result[1]
 
-        diagnosis = "MALIGNANT" if prob_malignant > 0.5 else "BENIGN"
-        confidence = prob_malignant if diagnosis == "MALIGNANT" else prob_benign
+            diagnosis = "MALIGNANT" if prob_malignant > 0.5 else "BENIGN"
+            confidence = prob_malignant if diagnosis == "MALIGNANT" else prob_benign
 
-        print(f"✅ Result for {key}: {diagnosis} ({confidence * 100:.2f}%)")
+            print(f"✅ Result for {key}: {diagnosis} ({confidence * 100:.2f}%)")
 
-        # (Optional) Here you could save the result to DynamoDB or move the file
+            # (Optional) Here you could save the result to DynamoDB or move the file
+    finally:
+        if guard is not None:
+            metrics = adaptive_client.metric_deltas(guard_before, guard.metrics(), idempotency.COUNTERS)
+            print(json.dumps(adaptive_client.emf_record(metrics, ADAPTIVE_METRICS_NAMESPACE,
+                                                        {'Layer': 'Idempotency'})))
+        if gate is not None:
+            metrics = adaptive_client.metric_deltas(gate_before, gate.metrics(), triage.COUNTERS)
+            del metrics['gate_ms_mean'], metrics['gate_ms_max']  # Container aggregates
+            metrics['gate_ms'] = gate.drain_ms()  # One value per check in this invocation
+            print(json.dumps(adaptive_client.emf_record(metrics, ADAPTIVE_METRICS_NAMESPACE, {'Layer': 'Triage'},
+                                                        units={'gate_ms': 'Milliseconds'})))
 
     return {
         'statusCode': 200,
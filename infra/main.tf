@@ -19,8 +19,9 @@ module "s3" {
 # 2. Create IAM Roles
 module "iam" {
   source        = "./modules/iam"
-  project_name  = local.prefix
-  s3_bucket_arn = module.s3.bucket_arn
+  project_name       = local.prefix
+  s3_bucket_arn      = module.s3.bucket_arn
+  ssm_parameter_path = "/${var.project_name}/${var.environment}"
 }
 
 # 3. Create Lambda Function
@@ -28,8 +29,10 @@ module "lambda" {
   source           = "./modules/lambda"
   project_name     = local.prefix
   iam_role_arn     = module.iam.lambda_role_arn
-  endpoint_name    = "${var.endpoint_name}-${var.environment}" # Endpoint also gets a suffix
-  source_file_path = "${path.module}/src/inference_handler.py"
+  config_project   = var.project_name # Endpoint name is read from /{project}/{env}/endpoint_name
+  config_env       = var.environment
+  source_dir       = "${path.module}/../app/src"
+  layers           = var.lambda_layers
 }
 
 # 4. Configure EventBridge
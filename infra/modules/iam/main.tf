@@ -26,15 +26,18 @@ resource "aws_iam_role_policy_attachment" "sm_s3" {
 # --- SSM Parameter Store Access ---
 resource "aws_iam_policy" "ssm_read_policy" {
   name = "${var.project_name}-ssm-read"
-  description = "Allows SageMaker to read configuration parameters from SSM"
+  description = "Allows SageMaker and Lambda to read configuration parameters from SSM"
 
   policy = jsonencode({
     Version = "2012-10-17"
     Statement = [{
       Effect   = "Allow"
-      Action   = "ssm:GetParameter"
-      # Allows reading any parameter that starts with the project name
-      Resource = "arn:aws:ssm:*:*:parameter/${var.project_name}/*"
+      # data_utils.config loads the whole /{project}/{env}/ tree in one GetParametersByPath call
+      Action   = ["ssm:GetParameter", "ssm:GetParametersByPath"]
+      Resource = [
+        "arn:aws:ssm:*:*:parameter${var.ssm_parameter_path}",
+        "arn:aws:ssm:*:*:parameter${var.ssm_parameter_path}/*"
+      ]
     }]
   })
 }
@@ -68,11 +71,22 @@ resource "aws_iam_policy" "lambda_policy" {
         Action = ["s3:GetObject", "s3:ListBucket"],
         Resource = [var.s3_bucket_arn, "${var.s3_bucket_arn}/*"]
       },
+      {
+        Effect = "Allow",
+        Action = ["s3:PutObject"],
+        Resource = "${var.s3_bucket_arn}/monitoring/*"
+      },
       {
         Effect = "Allow",
         Action = ["sagemaker:InvokeEndpoint"],
         Resource = "*"
       },
+      {
+        # Duplicate-delivery claim table (created by the lambda module when idempotency is on)
+        Effect = "Allow",
+        Action = ["dynamodb:PutItem", "dynamodb:GetItem", "dynamodb:UpdateItem", "dynamodb:DeleteItem"],
+        Resource = "arn:aws:dynamodb:*:*:table/${var.project_name}-idempotency"
+      },
       {
         Effect = "Allow",
         Action = ["logs:CreateLogGroup", "logs:CreateLogStream", "logs:PutLogEvents"],
@@ -85,4 +99,10 @@ resource "aws_iam_policy" "lambda_policy" {
 resource "aws_iam_role_policy_attachment" "lambda_attach" {
   role       = aws_iam_role.lambda_role.name
   policy_arn = aws_iam_policy.lambda_policy.arn
+}
+
+# The Lambda resolves the endpoint name from SSM at cold start
+resource "aws_iam_role_policy_attachment" "lambda_ssm_attach" {
+  role       = aws_iam_role.lambda_role.name
+  policy_arn = aws_iam_policy.ssm_read_policy.arn
 }
\ No newline at end of file
@@ -1,2 +1,5 @@
 variable "project_name" {}
-variable "s3_bucket_arn" {}
\ No newline at end of file
+variable "s3_bucket_arn" {}
+
+# SSM path holding the project configuration, e.g. /cbis-ddsm/dev
+variable "ssm_parameter_path" {}
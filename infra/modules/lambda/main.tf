@@ -1,23 +1,72 @@
-# Package the Python code
+# Package the Python code (handler + data_utils, which the handler imports)
 data "archive_file" "lambda_zip" {
   type        = "zip"
-  source_file = var.source_file_path
+  source_dir  = var.source_dir
   output_path = "${path.module}/lambda_function.zip"
+  excludes    = ["models", "**/__pycache__/**"]
 }
 
 resource "aws_lambda_function" "inference" {
   filename      = data.archive_file.lambda_zip.output_path
   function_name = "${var.project_name}-processor"
   role          = var.iam_role_arn
-  handler       = "inference_handler.lambda_handler"
+  handler       = var.handler
   runtime       = "python3.9"
   timeout       = 30
+  layers        = var.layers
 
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
 
   environment {
     variables = {
-      ENDPOINT_NAME = var.endpoint_name
+      CONFIG_PROJECT           = var.config_project
+      CONFIG_ENV               = var.config_env
+      DRIFT_MONITORING         = var.drift_monitoring
+      DRIFT_SKETCH_PREFIX      = "monitoring/partials"
+      CBIS_PROFILE             = var.profile_modes
+      CBIS_PROFILE_SAMPLE_RATE = var.profile_sample_rate
+      ENDPOINT_NAMES           = var.endpoint_names
+      HEDGE_PERCENTILE         = var.hedge_percentile
+      ADAPTIVE_CLIENT          = var.adaptive_client
+      GRAYSCALE_PAYLOAD        = var.grayscale_payload
+      IDEMPOTENCY_TABLE        = var.idempotency == "true" ? aws_dynamodb_table.idempotency[0].name : ""
+      TRIAGE_GATE              = var.triage_gate
+      TRIAGE_REJECT_PREFIX     = "monitoring/rejected"
     }
   }
-}
\ No newline at end of file
+
+  # The zip holds only app/src: OpenCV/NumPy come from a layer
+  lifecycle {
+    precondition {
+      condition     = var.triage_gate != "true" || length(var.layers) > 0
+      error_message = "triage_gate needs an OpenCV layer in layers: without cv2 the blank-scan check never runs."
+    }
+    precondition {
+      condition     = var.drift_monitoring != "true" || length(var.layers) > 0
+      error_message = "drift_monitoring needs an OpenCV layer in layers: without cv2 the intensity features are never sketched."
+    }
+    precondition {
+      condition     = var.grayscale_payload != "true" || length(var.layers) > 0
+      error_message = "grayscale_payload needs an OpenCV layer in layers: without cv2 the conversion is turned off at cold start."
+    }
+  }
+}
+
+# Duplicate-delivery claims: (bucket, key, versionId/sequencer) -> in progress / stored result
+resource "aws_dynamodb_table" "idempotency" {
+  count        = var.idempotency == "true" ? 1 : 0
+  name         = "${var.project_name}-idempotency"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  # Claims and stored results are removed by DynamoDB after expires_at
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
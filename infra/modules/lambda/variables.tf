@@ -1,4 +1,60 @@
 variable "project_name" {}
 variable "iam_role_arn" {}
-variable "endpoint_name" {}
-variable "source_file_path" {}
\ No newline at end of file
+variable "config_project" {}
+variable "config_env" {}
+variable "source_dir" {}
+
+# Layer ARNs for the function; OpenCV + NumPy for python3.9 (e.g. opencv-python-headless)
+# are required by the triage gate's intensity check
+variable "layers" {
+  type    = list(string)
+  default = []
+}
+
+variable "handler" {
+  default = "lambda/lambda_function_inference.lambda_handler"
+}
+
+# Drift sketches flushed to monitoring/partials ("true" = on; needs an OpenCV layer in layers)
+variable "drift_monitoring" {
+  default = "false"
+}
+
+# Opt-in profiling ("" = off, "all" or e.g. "cprofile,time"); reports go to /tmp
+variable "profile_modes" {
+  default = ""
+}
+
+variable "profile_sample_rate" {
+  default = "0.01"
+}
+
+# Optional comma-separated endpoint replicas (routed by latency); one name = that endpoint, empty = endpoint from SSM
+variable "endpoint_names" {
+  default = ""
+}
+
+# Percentile of an endpoint's latency after which a hedged request is sent ("0" = off)
+variable "hedge_percentile" {
+  default = "0"
+}
+
+# Adaptive concurrency and throttling backoff around invoke_endpoint ("true" = on)
+variable "adaptive_client" {
+  default = "false"
+}
+
+# Re-encode multi-channel uploads as single-channel JPEG before invoke_endpoint ("true" = on; needs an OpenCV layer)
+variable "grayscale_payload" {
+  default = "false"
+}
+
+# Suppress duplicate S3/EventBridge deliveries through a DynamoDB claim table ("true" = on)
+variable "idempotency" {
+  default = "false"
+}
+
+# Reject blank, tiny or non-image uploads on CPU before invoke_endpoint ("true" = on)
+variable "triage_gate" {
+  default = "false"
+}
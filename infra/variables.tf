@@ -21,4 +21,10 @@ variable "environment" {
 variable "endpoint_name" {
   description = "Name of the SageMaker Endpoint"
   type        = string
-}
\ No newline at end of file
+}
+
+variable "lambda_layers" {
+  description = "Layer ARNs for the inference Lambda (OpenCV + NumPy for the image checks)"
+  type        = list(string)
+  default     = []
+}
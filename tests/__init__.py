@@ -4,4 +4,27 @@ Unit tests for the Breast Cancer ML Classifier project.
 This package contains unit tests for:
 - Data utilities (data_utils/commons.py)
 - Lambda inference function (lambda/lambda_function_inference.py)
+- Evaluation metrics (data_utils/evaluation.py)
+- Sequential evaluation (data_utils/sequential_eval.py)
+- Image header parsing (data_utils/image_headers.py)
+- Drift monitoring sketches (data_utils/drift.py)
+- Local pipeline runner (data_utils/pipeline.py)
+- Shared SSM configuration loader (data_utils/config.py)
+- Cached model resolution (data_utils/model_resolver.py)
+- Content-addressed image store (data_utils/content_store.py)
+- Resumable dataset download (data_utils/download.py)
+- Dataset inventory and preflight (data_utils/inventory.py)
+- Scaling benchmarks (data_utils/benchmark.py)
+- Opt-in profiling hooks (data_utils/profiling.py)
+- ROI-guided lesion crops (data_utils/roi_crops.py)
+- Latency-aware endpoint routing (data_utils/endpoint_router.py)
+- Adaptive concurrency control (AIMD, token bucket, circuit breaker)
+- Bulk scoring CLI (data_utils/bulk_score.py)
+- Single-channel image storage (data_utils/grayscale.py)
+- Shared-memory batch loader (data_utils/batch_loader.py)
+- Streaming stratified split (data_utils/streaming_split.py)
+- Frozen-backbone feature cache (data_utils/feature_cache.py)
+- Parallel S3 lister and SQLite catalog (data_utils/s3_catalog.py)
+- Duplicate-delivery suppression (data_utils/idempotency.py)
+- CPU pre-triage gate (data_utils/triage.py)
 """
@@ -0,0 +1,442 @@
+"""
+Unit tests for app/src/data_utils/adaptive_client.py
+
+Tests cover:
+- is_throttle() / is_server_error() / backoff_delay(): error classification and full jitter
+- AIMDLimiter: additive increase, multiplicative decrease, cooldown, blocking slots
+- TokenBucket: refill, blocking acquire and rate adaptation
+- CircuitBreaker: closed -> open -> half_open -> closed/open, probe release
+- AdaptiveClient: retries on ThrottlingException, error propagation, convergence
+  against a fake endpoint with a hard max-concurrency, half_open probe released on
+  slot timeout, metrics and EMF records
+- metric_deltas(): per-invocation counters for EMF
+- Lambda opt-in (ADAPTIVE_CLIENT)
+"""
+import importlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.src.data_utils import adaptive_client
+from app.src.data_utils.adaptive_client import (
+    AdaptiveClient,
+    AIMDLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    TokenBucket,
+    backoff_delay,
+    emf_record,
+    metric_deltas,
+    is_server_error,
+    is_throttle,
+)
+
+lambda_module = importlib.import_module('app.src.lambda.lambda_function_inference')
+
+
+def client_error(code, status):
+    return ClientError({"Error": {"Code": code, "Message": code},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, "InvokeEndpoint")
+
+
+def throttle():
+    return client_error("ThrottlingException", 400)
+
+
+class FakeClock:
+    """Manually advanced monotonic clock; sleep() advances it"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class CapacityEndpoint:
+    """Fake serverless endpoint: throttles when more than `capacity` calls are in flight"""
+
+    def __init__(self, capacity, latency=0.002):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def invoke_endpoint(self, **kwargs):
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.throttled += 1
+                raise throttle()
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return {"Body": BytesIO(b"[0.5, 0.5]")}
+
+
+def fast_client(endpoint, clock=None, **kwargs):
+    """AdaptiveClient without real waits in the token bucket or backoff"""
+    clock = clock or FakeClock()
+    kwargs.setdefault("bucket", TokenBucket(rate=1000, max_rate=10000, clock=clock, sleep=clock.sleep))
+    return AdaptiveClient(endpoint, sleep=lambda s: None, rng=random.Random(0), **kwargs)
+
+
+class TestClassification:
+    """Test suite for the error helpers"""
+
+    def test_is_throttle(self):
+        """Test throttling detection by error code and HTTP status"""
+        assert is_throttle(throttle())
+        assert is_throttle(client_error("ModelError", 429))
+        assert not is_throttle(client_error("ValidationError", 400))
+        assert not is_throttle(RuntimeError("x"))
+
+    def test_is_server_error(self):
+        """Test that 5xx and connection errors count, caller errors do not"""
+        assert is_server_error(client_error("InternalFailure", 500))
+        assert is_server_error(ConnectionError("reset"))
+        assert not is_server_error(client_error("ValidationError", 400))
+
+    def test_backoff_delay_is_capped_full_jitter(self):
+        """Test that delays stay within [0, min(cap, base * 2^attempt)]"""
+        rng = random.Random(1)
+        delays = [backoff_delay(attempt, 0.1, 1.0, rng) for attempt in range(8) for _ in range(20)]
+        assert all(0 <= d <= 1.0 for d in delays)
+        assert max(backoff_delay(0, 0.1, 1.0, rng) for _ in range(50)) <= 0.1
+
+
+class TestAIMDLimiter:
+    """Test suite for AIMDLimiter"""
+
+    def test_additive_increase(self):
+        """Test that a full window of successes adds about one slot"""
+        limiter = AIMDLimiter(initial=4, max_limit=5)
+        for _ in range(4):
+            limiter.on_success()
+        assert 4.9 < limiter.limit < 5.0
+        for _ in range(10):
+            limiter.on_success()
+        assert limiter.limit == 5
+
+    def test_multiplicative_decrease_with_cooldown(self):
+        """Test halving on throttle, ignoring a burst of throttles from one wave"""
+        clock = FakeClock()
+        limiter = AIMDLimiter(initial=16, cooldown=1.0, clock=clock)
+        assert limiter.on_throttle()
+        assert not limiter.on_throttle()
+        assert limiter.limit == 8
+        clock.now = 2.0
+        limiter.on_throttle()
+        assert limiter.limit == 4
+        for _ in range(5):
+            clock.now += 2.0
+            limiter.on_throttle()
+        assert limiter.limit == 1
+
+    def test_acquire_blocks_at_limit(self):
+        """Test that acquire times out when every slot is taken"""
+        limiter = AIMDLimiter(initial=1)
+        assert limiter.acquire()
+        assert not limiter.acquire(timeout=0.01)
+        limiter.release()
+        assert limiter.acquire(timeout=0.01)
+        assert limiter.peak_in_flight == 1
+
+    def test_invalid_limits(self):
+        """Test that inconsistent limits are rejected"""
+        with pytest.raises(ValueError):
+            AIMDLimiter(initial=0)
+        with pytest.raises(ValueError):
+            AIMDLimiter(decrease=1.5)
+
+
+class TestTokenBucket:
+    """Test suite for TokenBucket"""
+
+    def test_burst_then_rate(self):
+        """Test that the burst is free and later tokens wait 1 / rate"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=2, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+        assert clock.sleeps == []
+        bucket.acquire()
+        assert clock.now == pytest.approx(0.1)
+
+    def test_rate_adapts(self):
+        """Test multiplicative decrease on throttle and slow additive increase"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, min_rate=1, clock=clock, sleep=clock.sleep)
+        bucket.on_throttle()
+        assert bucket.rate == 5
+        assert bucket.tokens <= 1
+        bucket.on_success()
+        assert bucket.rate == pytest.approx(5.2)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestCircuitBreaker:
+    """Test suite for CircuitBreaker"""
+
+    def test_open_half_open_close(self):
+        """Test the full state cycle with a single probe in half_open"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+
+        clock.now = 10
+        assert breaker.state == "half_open"
+        breaker.allow()  # probe
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe restarts the reset timeout"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+        breaker.record_failure()
+        clock.now = 5
+        breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.times_opened == 2
+
+    def test_release_probe(self):
+        """Test that allow() flags the probe and release_probe() frees it for the next call"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+        assert breaker.allow() is False
+        breaker.record_failure()
+        clock.now = 5
+        assert breaker.allow() is True
+        breaker.release_probe()
+        assert breaker.state == "half_open"
+        assert breaker.allow() is True
+
+
+class TestAdaptiveClient:
+    """Test suite for AdaptiveClient"""
+
+    def test_retries_throttling_then_succeeds(self):
+        """Test that throttles are retried with backoff and shrink the limit"""
+        endpoint = MagicMock()
+        endpoint.invoke_endpoint.side_effect = [throttle(), throttle(), {"Body": "ok"}]
+        clock = FakeClock()
+        client = AdaptiveClient(endpoint, limiter=AIMDLimiter(initial=8, cooldown=0),
+                                bucket=TokenBucket(rate=100, max_rate=1000, clock=clock, sleep=clock.sleep),
+                                sleep=clock.sleep, rng=random.Random(0))
+
+        assert client.invoke_endpoint(EndpointName="e", Body=b"x") == {"Body": "ok"}
+        assert endpoint.invoke_endpoint.call_count == 3
+        assert len(clock.sleeps) == 2
+        metrics = client.metrics()
+        assert metrics["throttles"] == 2 and metrics["retries"] == 2 and metrics["successes"] == 1
+        assert metrics["concurrency_limit"] == 2
+        assert metrics["in_flight"] == 0
+
+    def test_exhausted_retries_raise_throttle(self):
+        """Test that the last ThrottlingException propagates and counts for the breaker"""
+        endpoint = MagicMock()
+        endpoint.invoke_endpoint.side_effect = throttle()
+        client = fast_client(endpoint, max_retries=2)
+        with pytest.raises(ClientError):
+            client.invoke_endpoint(EndpointName="e")
+        assert endpoint.invoke_endpoint.call_count == 3
+        assert client.breaker.failures == 1
+
+    def test_other_errors_propagate_immediately(self):
+        """Test that non-throttling errors are not retried"""
+        endpoint = MagicMock()
+        endpoint.invoke_endpoint.side_effect = client_error("ValidationError", 400)
+        client = fast_client(endpoint)
+        with pytest.raises(ClientError):
+            client.invoke_endpoint(EndpointName="e")
+        assert endpoint.invoke_endpoint.call_count == 1
+        assert client.breaker.failures == 0
+        assert client.metrics()["failures"] == 1
+
+    def test_circuit_opens_and_fails_fast(self):
+        """Test that repeated server errors open the circuit and skip the endpoint"""
+        endpoint = MagicMock()
+        endpoint.invoke_endpoint.side_effect = client_error("InternalFailure", 500)
+        client = fast_client(endpoint, breaker=CircuitBreaker(failure_threshold=3))
+        for _ in range(3):
+            with pytest.raises(ClientError):
+                client.invoke_endpoint(EndpointName="e")
+        with pytest.raises(CircuitOpenError):
+            client.invoke_endpoint(EndpointName="e")
+        assert endpoint.invoke_endpoint.call_count == 3
+        assert client.metrics()["circuit_state"] == "open"
+        assert client.metrics()["rejected"] == 1
+
+    def test_probe_released_when_slot_times_out(self):
+        """Test that a half_open probe that never reaches the endpoint does not wedge the breaker"""
+        endpoint = MagicMock()
+        endpoint.invoke_endpoint.side_effect = [client_error("InternalFailure", 500), {"Body": "ok"}]
+        clock = FakeClock()
+        limiter = AIMDLimiter(initial=1)
+        client = fast_client(endpoint, clock=clock, limiter=limiter, acquire_timeout=0,
+                             breaker=CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock))
+        with pytest.raises(ClientError):
+            client.invoke_endpoint(EndpointName="e")
+        clock.now = 5
+
+        assert limiter.acquire()  # Slot held elsewhere: the probe times out before the endpoint
+        with pytest.raises(TimeoutError):
+            client.invoke_endpoint(EndpointName="e")
+        limiter.release()
+        assert client.breaker.state == "half_open"
+
+        assert client.invoke_endpoint(EndpointName="e") == {"Body": "ok"}
+        assert client.breaker.state == "closed"
+        assert endpoint.invoke_endpoint.call_count == 2
+
+    def test_passes_other_attributes_through(self):
+        """Test that the wrapper behaves like the boto3 client for other attributes"""
+        endpoint = MagicMock()
+        endpoint.meta.region_name = "us-east-1"
+        assert AdaptiveClient(endpoint).meta.region_name == "us-east-1"
+
+    def test_converges_below_endpoint_capacity(self):
+        """Test that parallel callers find the endpoint's max concurrency on their own"""
+        endpoint = CapacityEndpoint(capacity=3)
+        client = fast_client(endpoint, limiter=AIMDLimiter(initial=16, cooldown=0.0), max_retries=20)
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            responses = list(pool.map(lambda i: client.invoke_endpoint(EndpointName="e", Body=b"x"), range(300)))
+
+        metrics = client.metrics()
+        assert len(responses) == 300
+        assert metrics["successes"] == 300 and metrics["failures"] == 0
+        assert metrics["throttles"] == endpoint.throttled > 0
+        assert metrics["concurrency_limit"] <= 8  # from 16 towards the hard limit of 3
+        late = client.metrics()["throttles"]
+        list(map(lambda i: client.invoke_endpoint(EndpointName="e"), range(20)))
+        assert client.metrics()["throttles"] == late  # sequential traffic fits
+
+    def test_shared_wrapper_per_client(self):
+        """Test that every caller of the same boto3 client shares one wrapper"""
+        first, second = MagicMock(), MagicMock()
+        wrapper = adaptive_client.shared(first, max_retries=1)
+        assert adaptive_client.shared(first) is wrapper
+        assert adaptive_client.shared(second) is not wrapper
+        assert wrapper.max_retries == 1
+
+
+class TestEmfRecord:
+    """Test suite for emf_record function"""
+
+    def test_embedded_metric_format(self):
+        """Test that numeric metrics are declared and strings are left out"""
+        record = emf_record({"concurrency_limit": 3, "circuit_state": "closed", "rate_limit": 2.5},
+                            namespace="Test", dimensions={"Endpoint": "e"})
+        (directive,) = record["_aws"]["CloudWatchMetrics"]
+        assert directive["Namespace"] == "Test"
+        assert directive["Dimensions"] == [["Endpoint"]]
+        assert [m["Name"] for m in directive["Metrics"]] == ["concurrency_limit", "rate_limit"]
+        assert record["concurrency_limit"] == 3 and record["Endpoint"] == "e"
+        assert "circuit_state" not in record
+
+    def test_units(self):
+        """Test that units override the Count default per metric"""
+        record = emf_record({"gate_ms_max": 1.5, "rejected": 2}, units={"gate_ms_max": "Milliseconds"})
+        units = {m["Name"]: m["Unit"] for m in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+        assert units == {"gate_ms_max": "Milliseconds", "rejected": "Count"}
+
+    def test_value_lists(self):
+        """Test that a list of numbers is published as several values and an empty list is left out"""
+        record = emf_record({"gate_ms": [1.5, 0.7], "empty_ms": [], "names": ["a"]})
+
+        assert record["gate_ms"] == [1.5, 0.7]
+        assert [m["Name"] for m in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]] == ["gate_ms"]
+
+
+class TestMetricDeltas:
+    """Test suite for metric_deltas function"""
+
+    def test_counters_become_deltas(self):
+        """Test that counters are differenced and gauges keep their current value"""
+        before = {"requests": 5, "throttles": 2, "concurrency_limit": 8}
+        after = {"requests": 7, "throttles": 2, "concurrency_limit": 4, "circuit_state": "closed"}
+
+        assert metric_deltas(before, after, ("requests", "throttles")) == {
+            "requests": 2, "throttles": 0, "concurrency_limit": 4, "circuit_state": "closed"}
+
+
+class TestLambdaAdaptiveClient:
+    """Test suite for the Lambda ADAPTIVE_CLIENT opt-in"""
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_throttled_invocation_is_retried(self, mock_s3, mock_sagemaker, s3_event_single_record,
+                                             mock_s3_image_data, monkeypatch, capsys):
+        """Test that the handler survives a ThrottlingException and logs EMF metrics"""
+        monkeypatch.setattr(lambda_module, 'ADAPTIVE_CLIENT', True)
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAME', 'test-endpoint')
+        monkeypatch.setattr(adaptive_client, 'backoff_delay', lambda *args: 0.0)
+        mock_s3.get_object.return_value = mock_s3_image_data
+        mock_sagemaker.invoke_endpoint.side_effect = [
+            throttle(), {'Body': BytesIO(json.dumps([0.1, 0.9]).encode())}]
+
+        result = lambda_module.lambda_handler(s3_event_single_record, None)
+
+        assert result['statusCode'] == 200
+        assert 'MALIGNANT' in result['body']
+        assert mock_sagemaker.invoke_endpoint.call_count == 2
+        emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+        assert emf[-1]['throttles'] == 1 and emf[-1]['successes'] == 1
+
+        # Warm container: the second invocation publishes only its own calls
+        mock_s3.get_object.return_value = {'Body': BytesIO(b'fake-image')}
+        mock_sagemaker.invoke_endpoint.side_effect = None
+        mock_sagemaker.invoke_endpoint.return_value = {'Body': BytesIO(json.dumps([0.8, 0.2]).encode())}
+        lambda_module.lambda_handler(s3_event_single_record, None)
+
+        emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+        assert emf[-1]['requests'] == 1 and emf[-1]['successes'] == 1 and emf[-1]['throttles'] == 0
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_failed_invocation_still_publishes(self, mock_s3, mock_sagemaker, s3_event_single_record,
+                                               mock_s3_image_data, monkeypatch, capsys):
+        """Test that the failure of an exhausted call is published before the error propagates"""
+        monkeypatch.setattr(lambda_module, 'ADAPTIVE_CLIENT', True)
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAME', 'test-endpoint')
+        monkeypatch.setattr(lambda_module, 'ADAPTIVE_MAX_RETRIES', 0)
+        mock_s3.get_object.return_value = mock_s3_image_data
+        mock_sagemaker.invoke_endpoint.side_effect = throttle()
+
+        with pytest.raises(ClientError):
+            lambda_module.lambda_handler(s3_event_single_record, None)
+
+        emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+        assert emf[-1]['failures'] == 1 and emf[-1]['requests'] == 1
+
+    @patch.object(lambda_module, 'sm_runtime')
+    def test_disabled_uses_raw_client(self, mock_sagemaker, monkeypatch):
+        """Test that without the opt-in the boto3 client is called directly"""
+        monkeypatch.setattr(lambda_module, 'ADAPTIVE_CLIENT', False)
+        assert lambda_module.runtime_client() is mock_sagemaker
@@ -0,0 +1,155 @@
+"""
+Unit tests for app/src/data_utils/batch_loader.py
+
+Tests cover:
+- load_resized(): single-channel decode and resize
+- BatchLoader: fixed-shape batches from a .lst split through the shared-memory ring,
+  deterministic shuffling per (seed, epoch), drop_last, unreadable images,
+  abandoned epochs and throughput report
+- measure_throughput() / main(): images/sec report
+"""
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from app.src.data_utils import batch_loader, commons
+from app.src.data_utils.batch_loader import BatchLoader, load_resized, measure_throughput
+
+
+@pytest.fixture
+def split(tmp_path):
+    """23 constant-valued images of different sizes; pixel value == row index * 10"""
+    root = tmp_path / "jpeg"
+    rows = []
+    for i in range(23):
+        rel = f"uid{i}/1-1.png"
+        (root / f"uid{i}").mkdir(parents=True)
+        value = np.full((20 + i, 16 + (i % 3) * 8), i * 10, dtype=np.uint8)
+        cv2.imwrite(str(root / rel), cv2.merge([value] * 3) if i % 2 else value)
+        rows.append((i % 2, rel))
+    lst = tmp_path / "train.lst"
+    commons.write_lst_file(rows, str(lst))
+    return str(lst), str(root)
+
+
+def pixel_ids(batch):
+    """Recover each image's row index from its constant pixel value"""
+    return (batch.images[:, 0, 0, 0] // 10).tolist()
+
+
+class TestLoadResized:
+    """Test suite for load_resized"""
+
+    def test_decodes_single_channel_and_resizes(self, split):
+        """Test that any input is returned as H x W uint8"""
+        _, root = split
+        image = load_resized(f"{root}/uid3/1-1.png", 8, 12)
+
+        assert image.shape == (8, 12)
+        assert image.dtype == np.uint8
+        assert (image == 30).all()
+
+
+class TestBatchLoader:
+    """Test suite for BatchLoader"""
+
+    def test_fixed_shape_batches_cover_epoch(self, split):
+        """Test that every image appears once per epoch, with its label, in fixed-shape batches"""
+        lst, root = split
+        with BatchLoader(lst, root, batch_size=5, image_size=(8, 6), num_workers=2, prefetch=2) as loader:
+            batches = [(b.images.copy(), b.labels.copy(), b.indices.copy()) for b in loader]
+
+        assert len(batches) == len(loader) == 5
+        assert [b[0].shape for b in batches] == [(5, 8, 6, 3)] * 4 + [(3, 8, 6, 3)]
+        seen = np.concatenate([b[2] for b in batches])
+        assert sorted(seen.tolist()) == list(range(23))
+        for images, labels, indices in batches:
+            assert (images[:, 0, 0, 0] // 10).tolist() == indices.tolist()
+            assert labels.tolist() == [i % 2 for i in indices]
+            assert (images[..., 0] == images[..., 2]).all()
+
+    def test_shuffle_is_deterministic(self, split):
+        """Test that the order depends only on (seed, epoch)"""
+        lst, root = split
+        with BatchLoader(lst, root, batch_size=23, image_size=(4, 4), num_workers=1, seed=7) as loader:
+            first = [pixel_ids(b) for b in loader]
+            second = [pixel_ids(b) for b in loader]
+        with BatchLoader(lst, root, batch_size=23, image_size=(4, 4), num_workers=3, seed=7) as other:
+            replay = [pixel_ids(b) for b in other]
+
+        assert first == replay
+        assert first != second
+        assert (BatchLoader(lst, root, seed=7).order(1) == loader.order(1)).all()
+        assert BatchLoader(lst, root, shuffle=False).order(0).tolist() == list(range(23))
+
+    def test_drop_last_and_single_channel(self, split):
+        """Test drop_last and channels=1"""
+        lst, root = split
+        with BatchLoader(lst, root, batch_size=10, image_size=(4, 4), channels=1, drop_last=True,
+                         num_workers=2) as loader:
+            shapes = [b.images.shape for b in loader]
+
+        assert shapes == [(10, 4, 4, 1)] * 2
+
+    def test_unreadable_images_are_reported(self, split, tmp_path):
+        """Test that a broken image becomes zeros and is listed in failed"""
+        lst, root = split
+        (tmp_path / "jpeg" / "uid4" / "1-1.png").write_bytes(b"broken")
+        with BatchLoader(lst, root, batch_size=23, image_size=(4, 4), shuffle=False, num_workers=2) as loader:
+            batch = next(iter(loader))
+            failed, zeros = batch.failed, bool((batch.images[4] == 0).all())
+
+        assert failed == [4]
+        assert zeros
+        assert loader.report()["failed"] == 1
+
+    def test_abandoned_epoch_does_not_leak(self, split):
+        """Test that breaking out of an epoch leaves the ring consistent for the next one"""
+        lst, root = split
+        with BatchLoader(lst, root, batch_size=3, image_size=(4, 4), num_workers=2, prefetch=3,
+                         shuffle=False) as loader:
+            epoch = iter(loader)
+            next(epoch)
+            epoch.close()
+            ids = [i for b in loader for i in pixel_ids(b)]
+
+        assert ids == list(range(23))
+
+    def test_report(self, split):
+        """Test the throughput report"""
+        lst, root = split
+        report = measure_throughput(lst, root, epochs=2, batch_size=8, image_size=(4, 4), num_workers=2)
+
+        assert report["epochs"] == 2
+        assert report["images"] == 46
+        assert report["images_per_sec"] > 0
+        assert report["wait_seconds"] <= report["seconds"]
+        assert report["prefetch"] == batch_loader.DEFAULT_PREFETCH
+
+    def test_closed_loader_releases_shared_memory(self, split):
+        """Test that close() unlinks the ring"""
+        lst, root = split
+        loader = BatchLoader(lst, root, batch_size=4, image_size=(4, 4), num_workers=1)
+        loader.start()
+        name = loader._shm.name
+        loader.close()
+
+        with pytest.raises(FileNotFoundError):
+            batch_loader.shared_memory.SharedMemory(name=name)
+        with pytest.raises(RuntimeError):
+            loader._wait()
+
+    def test_empty_split(self, tmp_path):
+        """Test that an empty .lst is rejected"""
+        lst = tmp_path / "empty.lst"
+        lst.write_text("")
+        with pytest.raises(ValueError):
+            BatchLoader(str(lst), str(tmp_path))
+
+    def test_cli(self, split, capsys):
+        """Test the command-line throughput report"""
+        lst, root = split
+        assert batch_loader.main([lst, root, "--batch-size", "8", "--image-size", "4", "4", "--workers", "1"]) == 0
+        assert json.loads(capsys.readouterr().out)["images"] == 23
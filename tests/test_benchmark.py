@@ -0,0 +1,150 @@
+"""
+Unit tests for app/src/data_utils/benchmark.py
+
+Tests cover:
+- make_archive() / make_tree(): synthetic CBIS-DDSM layouts
+- measure() / run_suite(): files/sec and peak memory per case and scale
+- compare(): throughput regression against a stored baseline
+- main(): CLI baseline update and comparison
+- Opt-in regression guard against benchmarks/baseline.json (CBIS_BENCHMARK=1)
+"""
+import json
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from app.src.data_utils.benchmark import (
+    CASES,
+    DEFAULT_REPEAT,
+    DEFAULT_TOLERANCE,
+    compare,
+    load_baseline,
+    main,
+    make_archive,
+    make_tree,
+    measure,
+    run_suite,
+    save_baseline,
+)
+
+BASELINE_PATH = Path(__file__).resolve().parent.parent / "benchmarks" / "baseline.json"
+
+
+class TestSyntheticData:
+    """Test suite for the synthetic archive and tree generators"""
+
+    def test_archive_layout(self, tmp_path):
+        """Test that the archive has one entry per file under jpeg/<UID>/"""
+        zip_path = make_archive(str(tmp_path / "d.zip"), 10, file_size=64)
+        with zipfile.ZipFile(zip_path) as zf:
+            names = zf.namelist()
+            assert len(names) == 10
+            assert all(n.startswith("jpeg/1.3.6.1.4.1.9590.100.1.2.") for n in names)
+            assert zf.read(names[0]).endswith(b"\xff\xd9")
+            assert len(zf.read(names[0])) == 64
+
+    def test_tree_matches_archive(self, tmp_path):
+        """Test that make_tree writes the same relative paths"""
+        make_tree(str(tmp_path / "jpeg"), 9)
+        files = [p for p in (tmp_path / "jpeg").rglob("*.jpg")]
+        assert len(files) == 9
+        assert len({p.parent for p in files}) == 3
+
+
+class TestMeasure:
+    """Test suite for measure function"""
+
+    def test_reports_throughput_and_memory(self):
+        """Test that files/sec is derived from the best run and memory is traced"""
+        calls = []
+        metrics = measure(lambda: calls.append(bytearray(2_000_000)), 100, repeat=2,
+                          setup=lambda: calls.clear())
+        assert len(calls) == 1  # setup ran before the traced run
+        assert metrics["files"] == 100
+        assert metrics["files_per_sec"] > 0
+        assert metrics["peak_mb"] >= 2.0
+
+
+class TestRunSuite:
+    """Test suite for run_suite function"""
+
+    def test_all_cases_per_scale(self, tmp_path):
+        """Test that every case is measured at every scale"""
+        results = run_suite(scales=(8, 20), work_dir=str(tmp_path))
+        assert set(results) == set(CASES)
+        for by_scale in results.values():
+            assert set(by_scale) == {"8", "20"}
+            assert by_scale["20"]["files"] == 20
+            assert by_scale["20"]["files_per_sec"] > 0
+        assert not (tmp_path / "8").exists()  # scale directories are cleaned up
+
+    def test_subset_of_cases(self):
+        """Test that only the requested cases run"""
+        results = run_suite(scales=(8,), cases=("listing",))
+        assert list(results) == ["listing"]
+
+    def test_unknown_case(self):
+        """Test that an unknown case raises ValueError"""
+        with pytest.raises(ValueError, match="desconhecidos"):
+            run_suite(scales=(8,), cases=("listing", "nope"))
+
+
+class TestCompare:
+    """Test suite for compare function"""
+
+    def test_detects_regression_beyond_tolerance(self):
+        """Test that only drops larger than the tolerance are reported"""
+        baseline = {"extract": {"1000": {"files_per_sec": 1000.0}},
+                    "listing": {"1000": {"files_per_sec": 1000.0}}}
+        results = {"extract": {"1000": {"files_per_sec": 650.0}},
+                   "listing": {"1000": {"files_per_sec": 750.0}}}
+        regressions = compare(results, baseline, tolerance=0.3)
+        assert len(regressions) == 1
+        assert regressions[0].startswith("extract @ 1000")
+
+    def test_missing_baseline_entries_are_ignored(self):
+        """Test that new cases or scales do not fail the comparison"""
+        results = {"lst": {"500": {"files_per_sec": 1.0}}}
+        assert compare(results, {"lst": {"1000": {"files_per_sec": 10.0}}}) == []
+
+    def test_baseline_roundtrip(self, tmp_path):
+        """Test that saved baselines load back with machine info"""
+        path = save_baseline({"lst": {"10": {"files_per_sec": 5.0}}}, str(tmp_path / "b" / "base.json"))
+        assert load_baseline(path) == {"lst": {"10": {"files_per_sec": 5.0}}}
+        assert "cpu_count" in json.loads(Path(path).read_text())["machine"]
+        assert load_baseline(str(tmp_path / "missing.json")) is None
+
+
+class TestMain:
+    """Test suite for the benchmark CLI"""
+
+    def test_update_then_compare(self, tmp_path, capsys):
+        """Test that a fresh baseline passes and an inflated one fails"""
+        baseline = str(tmp_path / "baseline.json")
+        args = ["--scales", "8", "--cases", "listing", "--baseline", baseline]
+        assert main(args + ["--update-baseline"]) == 0
+        assert main(args + ["--tolerance", "0.99"]) == 0
+
+        data = json.loads(Path(baseline).read_text())
+        data["results"]["listing"]["8"]["files_per_sec"] *= 1000
+        Path(baseline).write_text(json.dumps(data))
+        assert main(args) == 1
+
+    def test_missing_baseline_passes(self, tmp_path):
+        """Test that the comparison is skipped without a baseline"""
+        output = str(tmp_path / "run.json")
+        assert main(["--scales", "8", "--cases", "lst", "--baseline", str(tmp_path / "none.json"),
+                     "--output", output]) == 0
+        assert os.path.exists(output)
+
+
+@pytest.mark.skipif(not os.environ.get("CBIS_BENCHMARK"),
+                    reason="benchmark de escala opcional; defina CBIS_BENCHMARK=1")
+def test_no_throughput_regression():
+    """Run the scale benchmark against the committed baseline (opt-in, slow)"""
+    scales = [int(s) for s in os.environ.get("CBIS_BENCHMARK_SCALES", "1000,10000").split(",")]
+    tolerance = float(os.environ.get("CBIS_BENCHMARK_TOLERANCE", str(DEFAULT_TOLERANCE)))
+    results = run_suite(scales=scales, repeat=DEFAULT_REPEAT)
+    assert compare(results, load_baseline(str(BASELINE_PATH)), tolerance) == []
@@ -0,0 +1,254 @@
+"""
+Unit tests for app/src/data_utils/bulk_score.py
+
+Tests cover:
+- LocalSource / S3Source / open_source(): image keys from a directory or S3 prefix (moto)
+- ParquetPartitionWriter / load_done_keys(): diagnosis partitions and checkpoint keys
+- bulk_score(): concurrent scoring, failures, resume after an interrupted run
+- endpoint_scorer(): invoke_endpoint wrapper, single endpoint and router
+- main(): CLI end to end
+"""
+import json
+import threading
+from io import BytesIO
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from moto import mock_aws
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from app.src.data_utils import bulk_score as bulk_module
+from app.src.data_utils.bulk_score import (
+    LocalSource,
+    ParquetPartitionWriter,
+    S3Source,
+    bulk_score,
+    endpoint_scorer,
+    load_done_keys,
+    open_source,
+)
+
+
+def fake_score(body):
+    """Malignant when the payload ends with 'M'"""
+    return [0.1, 0.9] if body.endswith(b"M") else [0.8, 0.2]
+
+
+def read_rows(output_dir):
+    rows = []
+    for path in sorted(output_dir.glob("diagnosis=*/part-*.parquet")):
+        diagnosis = path.parent.name.split("=", 1)[1]
+        rows.extend(dict(r, diagnosis=diagnosis) for r in pq.read_table(str(path)).to_pylist())
+    return sorted(rows, key=lambda r: r["key"])
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    """Local tree with 20 fake images (every 4th malignant) and a non-image file"""
+    root = tmp_path / "images"
+    for i in range(20):
+        path = root / f"uid{i % 5}" / f"1-{i}.jpg"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"\xff\xd8fake" + (b"M" if i % 4 == 0 else b"B"))
+    (root / "uid0" / "notes.txt").write_text("not an image")
+    return root
+
+
+class TestSources:
+    """Test suite for LocalSource, S3Source and open_source"""
+
+    def test_local_source_lists_images_only(self, image_dir):
+        """Test that keys are sorted relative paths of image files"""
+        source = LocalSource(str(image_dir))
+        keys = list(source.keys())
+
+        assert len(keys) == 20
+        assert keys == sorted(keys)
+        assert "uid0/notes.txt" not in keys
+        assert source.read("uid0/1-0.jpg").endswith(b"M")
+
+    @mock_aws
+    def test_s3_source_paginates_prefix(self):
+        """Test that S3Source lists every image under the prefix and reads bodies"""
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="archive")
+        for i in range(5):
+            s3.put_object(Bucket="archive", Key=f"studies/{i}.png", Body=b"png")
+        s3.put_object(Bucket="archive", Key="studies/manifest.csv", Body=b"csv")
+        s3.put_object(Bucket="archive", Key="other/9.png", Body=b"png")
+
+        source = open_source("s3://archive/studies/", s3_client=s3)
+
+        assert isinstance(source, S3Source)
+        assert sorted(source.keys()) == [f"studies/{i}.png" for i in range(5)]
+        assert source.read("studies/0.png") == b"png"
+        assert str(source) == "s3://archive/studies/"
+
+    def test_open_source_missing_directory(self, tmp_path):
+        """Test that a missing local directory raises FileNotFoundError"""
+        with pytest.raises(FileNotFoundError):
+            open_source(str(tmp_path / "missing"))
+
+
+class TestParquetPartitionWriter:
+    """Test suite for ParquetPartitionWriter and load_done_keys"""
+
+    def test_flush_writes_one_file_per_diagnosis(self, tmp_path):
+        """Test that records are split into hive-style diagnosis partitions"""
+        writer = ParquetPartitionWriter(str(tmp_path), run_id="r1")
+        for i, diagnosis in enumerate(["BENIGN", "MALIGNANT", "BENIGN"]):
+            writer.add(bulk_module._score_record(f"k{i}", b"x", [0.5, 0.5], 0.01, 0.5) | {"diagnosis": diagnosis})
+
+        written = writer.flush()
+
+        assert sorted(p.split("/")[-2] for p in written) == ["diagnosis=BENIGN", "diagnosis=MALIGNANT"]
+        assert writer.flush() == []
+        assert load_done_keys(str(tmp_path)) == {"k0", "k1", "k2"}
+        assert not list(tmp_path.rglob("*.tmp"))
+
+    def test_load_done_keys_empty(self, tmp_path):
+        """Test that an empty output directory has no finished keys"""
+        assert load_done_keys(str(tmp_path)) == set()
+
+
+class TestBulkScore:
+    """Test suite for bulk_score"""
+
+    def test_scores_every_image(self, image_dir, tmp_path):
+        """Test that every image gets one row with the Lambda's decision rule"""
+        output = tmp_path / "out"
+        report = bulk_score(LocalSource(str(image_dir)), str(output), fake_score,
+                            workers=4, fetch_workers=2, prefetch=3, flush_every=7)
+
+        rows = read_rows(output)
+        assert report["scored"] == 20 and report["failed"] == 0
+        assert report["parts"] == 3
+        assert len(rows) == 20
+        malignant = {r["key"] for r in rows if r["diagnosis"] == "MALIGNANT"}
+        assert malignant == {f"uid{i % 5}/1-{i}.jpg" for i in range(0, 20, 4)}
+        row = rows[0]
+        assert row["confidence"] == max(row["prob_benign"], row["prob_malignant"])
+        assert row["bytes"] == 7
+
+    def test_prefetch_queue_is_bounded(self, image_dir, tmp_path):
+        """Test that readers never run more than `prefetch` images ahead of scoring"""
+        source = LocalSource(str(image_dir))
+        read, scored, max_ahead = [0], [0], [0]
+        lock = threading.Lock()
+        original_read = source.read
+
+        def counting_read(key):
+            body = original_read(key)
+            with lock:
+                read[0] += 1
+                max_ahead[0] = max(max_ahead[0], read[0] - scored[0])
+            return body
+
+        def slow_score(body):
+            with lock:
+                scored[0] += 1
+            return fake_score(body)
+
+        source.read = counting_read
+        bulk_score(source, str(tmp_path / "out"), slow_score, workers=1, fetch_workers=1, prefetch=2)
+
+        # queue (2) + one body in the scorer + one body waiting in the reader
+        assert max_ahead[0] <= 4
+
+    def test_failures_are_retried_on_resume(self, image_dir, tmp_path):
+        """Test that failed images are not written and are scored by the next run"""
+        output = tmp_path / "out"
+
+        def flaky(body):
+            if body.endswith(b"M"):
+                raise RuntimeError("ModelError")
+            return fake_score(body)
+
+        first = bulk_score(LocalSource(str(image_dir)), str(output), flaky, workers=3)
+        second = bulk_score(LocalSource(str(image_dir)), str(output), fake_score, workers=3)
+
+        assert first["scored"] == 15 and first["failed"] == 5
+        assert first["failures"][0]["error"].startswith("RuntimeError")
+        assert second["scored"] == 5 and second["skipped"] == 15
+        assert len(read_rows(output)) == 20
+
+    def test_resume_after_interrupted_run(self, image_dir, tmp_path):
+        """Test that a partial run keeps its parts and the next run only scores the rest"""
+        output = tmp_path / "out"
+        first = bulk_score(LocalSource(str(image_dir)), str(output), fake_score, limit=10, flush_every=4)
+        # A flush killed before os.replace leaves only a .tmp file, which is not a checkpoint
+        (output / "diagnosis=BENIGN" / "part-dead-00000.parquet.tmp").write_bytes(b"partial")
+
+        second = bulk_score(LocalSource(str(image_dir)), str(output), fake_score, workers=2)
+
+        assert first["scored"] == 10 and first["parts"] == 3
+        assert second["skipped"] == 10 and second["scored"] == 10
+        assert [r["key"] for r in read_rows(output)] == sorted(LocalSource(str(image_dir)).keys())
+
+    def test_read_errors_are_counted(self, image_dir, tmp_path):
+        """Test that an unreadable image is reported without stopping the run"""
+        keys = list(LocalSource(str(image_dir)).keys()) + ["uid0/missing.jpg"]
+        report = bulk_score(LocalSource(str(image_dir)), str(tmp_path / "out"), fake_score, keys=keys)
+
+        assert report["scored"] == 20
+        assert report["read_errors"] == 1
+        assert report["failures"][0]["key"] == "uid0/missing.jpg"
+
+    def test_limit(self, image_dir, tmp_path):
+        """Test that --limit caps the images scored in one run"""
+        report = bulk_score(LocalSource(str(image_dir)), str(tmp_path / "out"), fake_score, limit=6)
+
+        assert report["scored"] == 6
+        assert len(load_done_keys(str(tmp_path / "out"))) == 6
+
+
+class TestEndpointScorer:
+    """Test suite for endpoint_scorer"""
+
+    @staticmethod
+    def runtime(probs):
+        client = MagicMock()
+        client.invoke_endpoint.side_effect = lambda **kw: {"Body": BytesIO(json.dumps(probs).encode())}
+        return client
+
+    def test_single_endpoint(self):
+        """Test that the scorer calls invoke_endpoint with the image payload"""
+        client = self.runtime([0.3, 0.7])
+        score = endpoint_scorer(["ep"], runtime_client=client, adaptive=False)
+
+        assert score(b"img") == [0.3, 0.7]
+        client.invoke_endpoint.assert_called_once_with(EndpointName="ep", ContentType="application/x-image",
+                                                       Body=b"img")
+
+    def test_multiple_endpoints_use_router(self):
+        """Test that several endpoints are routed through EndpointRouter"""
+        client = self.runtime([0.6, 0.4])
+        score = endpoint_scorer(["a", "b"], runtime_client=client, adaptive=False)
+
+        assert score(b"img") == [0.6, 0.4]
+        assert client.invoke_endpoint.call_args.kwargs["EndpointName"] in {"a", "b"}
+
+    def test_adaptive_wrapper(self):
+        """Test that the default scorer goes through the shared adaptive client"""
+        client = self.runtime([0.6, 0.4])
+        score = endpoint_scorer(["ep"], runtime_client=client)
+
+        score(b"img")
+        assert bulk_module.adaptive_client.shared(client).counters["successes"] == 1
+
+
+class TestMain:
+    """Test suite for the CLI entry point"""
+
+    def test_main_scores_directory(self, image_dir, tmp_path, mocker, capsys):
+        """Test that the CLI builds the scorer, writes Parquet and prints the report"""
+        scorer = mocker.patch.object(bulk_module, "endpoint_scorer", return_value=fake_score)
+
+        code = bulk_module.main([str(image_dir), str(tmp_path / "out"), "--endpoint", "ep",
+                                 "--workers", "2", "--no-adaptive"])
+
+        assert code == 0
+        scorer.assert_called_once_with(["ep"], adaptive=False, hedge_percentile=None)
+        assert json.loads(capsys.readouterr().out)["scored"] == 20
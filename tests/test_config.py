@@ -0,0 +1,152 @@
+"""
+Unit tests for app/src/data_utils/config.py
+
+Tests cover:
+- fetch_parameters(): one paginated get_parameters_by_path call per project/env
+- load_config(): in-memory cache, on-disk TTL cache and SSM failure fallback
+- get_parameter(): lookup with default
+- get_client(): pooled boto3 clients
+"""
+import json
+import time
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.src.data_utils import config
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    """Isolate the process-wide cache between tests"""
+    config.clear_cache()
+    yield
+    config.clear_cache()
+
+
+@pytest.fixture
+def ssm_client():
+    """moto SSM with the parameters created by infra/parameters.tf"""
+    with mock_aws():
+        client = boto3.client("ssm", region_name="us-east-1")
+        client.put_parameter(Name="/cbis-ddsm/dev/s3_bucket_name", Value="data-bucket", Type="String")
+        client.put_parameter(Name="/cbis-ddsm/dev/endpoint_name", Value="endpoint-dev", Type="String")
+        client.put_parameter(Name="/cbis-ddsm/prod/endpoint_name", Value="endpoint-prod", Type="String")
+        yield client
+
+
+class TestFetchParameters:
+    """Test suite for fetch_parameters function"""
+
+    def test_reads_whole_path(self, ssm_client):
+        """Test that only the requested project/env is returned, with relative names"""
+        params = config.fetch_parameters("cbis-ddsm", "dev", client=ssm_client)
+
+        assert params == {"s3_bucket_name": "data-bucket", "endpoint_name": "endpoint-dev"}
+
+    def test_follows_pagination(self):
+        """Test that NextToken pages are merged"""
+        client = MagicMock()
+        client.get_parameters_by_path.side_effect = [
+            {"Parameters": [{"Name": "/p/e/a", "Value": "1"}], "NextToken": "t"},
+            {"Parameters": [{"Name": "/p/e/b", "Value": "2"}]},
+        ]
+
+        params = config.fetch_parameters("p", "e", client=client)
+
+        assert params == {"a": "1", "b": "2"}
+        assert client.get_parameters_by_path.call_args_list[1].kwargs["NextToken"] == "t"
+
+
+class TestLoadConfig:
+    """Test suite for load_config / get_parameter functions"""
+
+    def test_memory_cache_single_round_trip(self, tmp_path):
+        """Test that repeated lookups hit SSM only once per process"""
+        client = MagicMock()
+        client.get_parameters_by_path.return_value = {
+            "Parameters": [{"Name": "/cbis-ddsm/dev/s3_bucket_name", "Value": "bucket"}]}
+
+        for _ in range(3):
+            assert config.get_parameter("s3_bucket_name", client=client,
+                                        cache_dir=str(tmp_path)) == "bucket"
+
+        assert client.get_parameters_by_path.call_count == 1
+
+    def test_disk_cache_shared_between_processes(self, tmp_path):
+        """Test that a fresh disk cache avoids SSM after the memory cache is gone"""
+        client = MagicMock()
+        client.get_parameters_by_path.return_value = {
+            "Parameters": [{"Name": "/cbis-ddsm/dev/endpoint_name", "Value": "ep"}]}
+        config.load_config(client=client, cache_dir=str(tmp_path))
+        config.clear_cache()  # Simulates a new notebook kernel
+
+        params = config.load_config(client=client, cache_dir=str(tmp_path))
+
+        assert params == {"endpoint_name": "ep"}
+        assert client.get_parameters_by_path.call_count == 1
+
+    def test_expired_disk_cache_is_refreshed(self, tmp_path):
+        """Test that the TTL forces a new SSM call"""
+        (tmp_path / "ssm_cbis-ddsm_dev.json").write_text(json.dumps(
+            {"fetched_at": time.time() - 7200, "parameters": {"endpoint_name": "old"}}))
+        client = MagicMock()
+        client.get_parameters_by_path.return_value = {
+            "Parameters": [{"Name": "/cbis-ddsm/dev/endpoint_name", "Value": "new"}]}
+
+        params = config.load_config(client=client, cache_dir=str(tmp_path), ttl=3600)
+
+        assert params["endpoint_name"] == "new"
+        saved = json.loads((tmp_path / "ssm_cbis-ddsm_dev.json").read_text())
+        assert saved["parameters"]["endpoint_name"] == "new"
+
+    def test_ssm_failure_uses_stale_cache(self, tmp_path):
+        """Test fallback to an expired disk cache when SSM is unreachable"""
+        (tmp_path / "ssm_cbis-ddsm_dev.json").write_text(json.dumps(
+            {"fetched_at": 0, "parameters": {"endpoint_name": "stale"}}))
+        client = MagicMock()
+        client.get_parameters_by_path.side_effect = RuntimeError("no network")
+
+        assert config.get_parameter("endpoint_name", client=client, cache_dir=str(tmp_path)) == "stale"
+
+    def test_ssm_failure_without_cache(self, tmp_path):
+        """Test that the default is returned when nothing is available"""
+        client = MagicMock()
+        client.get_parameters_by_path.side_effect = RuntimeError("no network")
+
+        assert config.get_parameter("endpoint_name", "fallback", client=client,
+                                    cache_dir=str(tmp_path)) == "fallback"
+
+    def test_refresh_and_clear_disk(self, ssm_client, tmp_path):
+        """Test refresh=True and clear_cache(disk=True)"""
+        config.load_config(client=ssm_client, cache_dir=str(tmp_path))
+        ssm_client.put_parameter(Name="/cbis-ddsm/dev/endpoint_name", Value="v2",
+                                 Type="String", Overwrite=True)
+
+        assert config.get_parameter("endpoint_name", client=ssm_client, cache_dir=str(tmp_path)) == "endpoint-dev"
+        assert config.get_parameter("endpoint_name", client=ssm_client, cache_dir=str(tmp_path),
+                                    refresh=True) == "v2"
+
+        config.clear_cache(disk=True, cache_dir=str(tmp_path))
+        assert not list(tmp_path.glob("ssm_*.json"))
+
+
+class TestClientPool:
+    """Test suite for get_client function"""
+
+    def test_clients_are_reused(self):
+        """Test that the same client is returned per service and region"""
+        with mock_aws():
+            assert config.get_client("ssm", "us-east-1") is config.get_client("ssm", "us-east-1")
+            assert config.get_client("ssm", "us-east-1") is not config.get_client("ssm", "eu-west-1")
+
+    def test_default_cache_dir(self, monkeypatch):
+        """Test cache directory selection"""
+        monkeypatch.delenv("CBIS_CONFIG_CACHE_DIR", raising=False)
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "fn")
+        assert config.default_cache_dir().startswith("/tmp")
+
+        monkeypatch.setenv("CBIS_CONFIG_CACHE_DIR", "/custom")
+        assert config.default_cache_dir() == "/custom"
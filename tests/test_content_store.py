@@ -0,0 +1,166 @@
+"""
+Unit tests for app/src/data_utils/content_store.py
+
+Tests cover:
+- cas_key() / hash_files(): content-addressed keys and parallel hashing
+- build_cas_index() / rewrite_lst(): .lst files pointing at hash keys
+- find_leakage() / drop_keys(): identical images across train/validation
+- link_local(): local CAS layout for tools reading the rewritten .lst
+- upload_cas(): each unique image uploaded once, existing keys skipped (moto)
+"""
+import hashlib
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.src.data_utils import commons
+from app.src.data_utils.content_store import (
+    build_cas_index,
+    cas_key,
+    drop_keys,
+    find_leakage,
+    hash_files,
+    link_local,
+    rewrite_lst,
+    upload_cas,
+)
+
+
+@pytest.fixture
+def image_tree(tmp_path):
+    """jpeg/ tree where the same full mammogram appears under two UIDs"""
+    root = tmp_path / "jpeg"
+    files = {
+        "uid1/1-1.jpg": b"full mammogram A",
+        "uid2/1-1.jpg": b"full mammogram A",  # same image, listed in mass and calc CSVs
+        "uid3/1-1.jpg": b"roi crop B",
+        "uid4/1-1.jpg": b"full mammogram C",
+    }
+    for rel, content in files.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(content)
+    return root, files
+
+
+class TestHashing:
+    """Test suite for cas_key / hash_files functions"""
+
+    def test_cas_key_layout(self):
+        """Test the two-level fan-out"""
+        digest = hashlib.sha256(b"x").hexdigest()
+        assert cas_key(digest) == f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        assert cas_key(digest, ".png").endswith(".png")
+
+    def test_hash_files_parallel(self, image_tree):
+        """Test parallel digests match hashlib and duplicates are hashed once"""
+        root, files = image_tree
+        paths = [str(root / rel) for rel in files] + [str(root / "uid1/1-1.jpg")]
+
+        digests = hash_files(paths, max_workers=4)
+
+        assert len(digests) == 4
+        assert digests[str(root / "uid3/1-1.jpg")] == hashlib.sha256(b"roi crop B").hexdigest()
+
+
+class TestCasIndex:
+    """Test suite for build_cas_index / rewrite_lst functions"""
+
+    def test_duplicates_share_a_key(self, image_tree, tmp_path):
+        """Test that identical content maps to the same key"""
+        root, files = image_tree
+
+        index = build_cas_index(str(root), list(files) + ["missing/1-1.jpg"],
+                                memo_path=str(tmp_path / "memo.json"))
+
+        assert index["uid1/1-1.jpg"] == index["uid2/1-1.jpg"]
+        assert len(set(index.values())) == 3
+        assert "missing/1-1.jpg" not in index
+        assert (tmp_path / "memo.json").exists()
+
+    def test_rewrite_lst_dedupes(self, image_tree, tmp_path):
+        """Test that rewritten .lst uses keys and drops repeated rows"""
+        root, files = image_tree
+        lst = tmp_path / "train.lst"
+        commons.write_lst_file([(1, "uid1/1-1.jpg"), (1, "uid2/1-1.jpg"), (0, "uid3/1-1.jpg"),
+                                (0, "ghost/1-1.jpg")], str(lst))
+        index = build_cas_index(str(root), files)
+
+        count = rewrite_lst(str(lst), str(tmp_path / "train_cas.lst"), index)
+
+        entries = commons.read_lst_file(str(tmp_path / "train_cas.lst"))
+        assert count == 2
+        assert [e.path for e in entries] == [index["uid1/1-1.jpg"], index["uid3/1-1.jpg"]]
+
+    def test_rewrite_lst_without_dedupe(self, image_tree, tmp_path):
+        """Test that dedupe can be disabled"""
+        root, files = image_tree
+        lst = tmp_path / "train.lst"
+        commons.write_lst_file([(1, "uid1/1-1.jpg"), (1, "uid2/1-1.jpg")], str(lst))
+
+        assert rewrite_lst(str(lst), str(lst), build_cas_index(str(root), files), dedupe=False) == 2
+
+
+class TestLinkLocal:
+    """Test suite for link_local function"""
+
+    def test_builds_local_layout_once(self, image_tree, tmp_path):
+        """Test that each key is materialized once and re-runs are no-ops"""
+        root, files = image_tree
+        index = build_cas_index(str(root), files)
+        cas_root = tmp_path / "cas"
+
+        assert link_local(index, str(root), str(cas_root)) == 3
+        assert link_local(index, str(root), str(cas_root)) == 0
+        assert (cas_root / index["uid3/1-1.jpg"]).read_bytes() == b"roi crop B"
+
+    def test_falls_back_to_copy(self, image_tree, tmp_path, mocker):
+        """Test the copy fallback when hard links are not supported"""
+        root, files = image_tree
+        mocker.patch("app.src.data_utils.content_store.os.link", side_effect=OSError("cross-device"))
+
+        assert link_local(build_cas_index(str(root), files), str(root), str(tmp_path / "cas")) == 3
+
+
+class TestLeakage:
+    """Test suite for find_leakage / drop_keys functions"""
+
+    def test_identical_image_across_splits(self, image_tree, tmp_path):
+        """Test leakage detection, label conflicts and removal from validation"""
+        root, files = image_tree
+        index = build_cas_index(str(root), files)
+        train, val = tmp_path / "train.lst", tmp_path / "val.lst"
+        commons.write_lst_file([(1, index["uid1/1-1.jpg"]), (0, index["uid3/1-1.jpg"])], str(train))
+        commons.write_lst_file([(0, index["uid2/1-1.jpg"]), (1, index["uid4/1-1.jpg"])], str(val))
+
+        leaked = find_leakage({"train": str(train), "validation": str(val)})
+
+        key = index["uid1/1-1.jpg"]
+        assert list(leaked) == [key]
+        assert leaked[key] == {"splits": ["train", "validation"], "labels": [0, 1]}
+
+        assert drop_keys(str(val), leaked) == 1
+        assert find_leakage({"train": str(train), "validation": str(val)}) == {}
+
+
+class TestUploadCas:
+    """Test suite for upload_cas function"""
+
+    @mock_aws
+    def test_uploads_unique_content_once(self, image_tree):
+        """Test that duplicates and already-present keys are not uploaded"""
+        root, files = image_tree
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="data-bucket")
+        index = build_cas_index(str(root), files)
+
+        first = upload_cas(index, str(root), "data-bucket", "prefix/images", s3_client=s3)
+        second = upload_cas(index, str(root), "data-bucket", "prefix/images", s3_client=s3)
+
+        assert first["uploaded"] == 3 and first["unique"] == 3 and first["files"] == 4
+        assert first["bytes_saved"] == len(b"full mammogram A")
+        assert second["uploaded"] == 0 and second["skipped"] == 3
+        keys = [o["Key"] for o in s3.list_objects_v2(Bucket="data-bucket")["Contents"]]
+        assert sorted(keys) == sorted(f"prefix/images/{k}" for k in set(index.values()))
+        body = s3.get_object(Bucket="data-bucket", Key=f"prefix/images/{index['uid3/1-1.jpg']}")["Body"].read()
+        assert body == b"roi crop B"
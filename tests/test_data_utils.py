@@ -6,6 +6,8 @@ Tests cover:
 - list_directory_structure(): Directory structure listing
 - download_from_kaggle(): Kaggle API integration
 - download_and_extract(): Orchestration workflow
+- read_lst_file() / write_lst_file(): .lst manifest helpers
+- resolve_uid(): CSV image path -> indexed image
 """
 import os
 import zipfile
@@ -18,7 +20,11 @@ from app.src.data_utils.commons import (
     extract_dataset,
     list_directory_structure,
     download_from_kaggle,
-    download_and_extract
+    download_and_extract,
+    read_lst_file,
+    resolve_uid,
+    write_lst_file,
+    LstEntry
 )
 
 
@@ -366,3 +372,40 @@ class TestDownloadAndExtract:
 
         # Verify path contains correct dataset name
         assert "my-dataset-name" in str(result)
+
+
+class TestLstFiles:
+    """Test suite for read_lst_file and write_lst_file functions"""
+
+    def test_write_and_read_roundtrip(self, tmp_path):
+        """Test that written entries are read back with fresh indexes"""
+        lst_path = tmp_path / "train.lst"
+
+        count = write_lst_file([(1, "uid1/a.jpg"), (0, "uid2/b.jpg")], str(lst_path))
+        entries = read_lst_file(str(lst_path))
+
+        assert count == 2
+        assert entries == [LstEntry(0, 1, "uid1/a.jpg"), LstEntry(1, 0, "uid2/b.jpg")]
+        assert lst_path.read_text() == "0\t1\tuid1/a.jpg\n1\t0\tuid2/b.jpg\n"
+
+    def test_read_float_labels_and_skips_blank_lines(self, tmp_path):
+        """Test labels written as floats and malformed lines"""
+        lst_path = tmp_path / "validation.lst"
+        lst_path.write_text("0\t1.0\tuid1/a.jpg\n\n1\t0.0\tuid2/b.jpg\n")
+
+        entries = read_lst_file(str(lst_path))
+
+        assert [e.label for e in entries] == [1, 0]
+
+
+class TestResolveUid:
+    """Test suite for resolve_uid function"""
+
+    def test_first_indexed_uid_segment(self):
+        """Test that the first DICOM UID segment present in the index wins"""
+        file_map = {"1.3.6.1.4.1.9590.7": "1.3.6.1.4.1.9590.7/1-1.jpg"}
+
+        assert resolve_uid("Mass-Training_P_1/1.3.6.1.4.1.9590.x/1.3.6.1.4.1.9590.7/000000.dcm",
+                           file_map) == "1.3.6.1.4.1.9590.7/1-1.jpg"
+        assert resolve_uid("Mass-Training_P_1/1.3.6.1.4.1.9590.9/000000.dcm", file_map) is None
+        assert resolve_uid("", file_map) is None
@@ -0,0 +1,348 @@
+"""
+Unit tests for app/src/data_utils/download.py
+
+Tests cover:
+- HTTPTransport: size probe, byte ranges, streaming and redirects against a local HTTP server
+- Transport: abstract interface checked at construction
+- download_file(): parallel chunks, resume from the journal, retries, integrity checks,
+  unknown remote size, streamed fallback for servers without Range
+- verify_zip(): truncated and corrupted archives
+- download_kaggle_dataset(): credentials and hand-off of a verified ZIP
+"""
+import hashlib
+import io
+import json
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.src.data_utils.download import (
+    DownloadJournal,
+    HTTPTransport,
+    RemoteFile,
+    Transport,
+    download_file,
+    download_kaggle_dataset,
+    kaggle_credentials,
+    verify_file,
+    verify_zip,
+)
+
+
+def make_zip_bytes(n_files=20):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for i in range(n_files):
+            zf.writestr(f"jpeg/uid{i}/1-1.jpg", bytes([i]) * 5000)
+    return buffer.getvalue()
+
+
+class RangeServer:
+    """Local stand-in for the dataset host: Range support, redirects, injected failures"""
+
+    def __init__(self, payload, support_ranges=True, send_length=True):
+        self.payload = payload
+        self.support_ranges = support_ranges
+        self.send_length = send_length
+        self.fail_next = 0
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get("Range"), self.headers.get("Authorization")))
+                if self.path == "/redirect":
+                    self.send_response(302)
+                    self.send_header("Location", f"http://localhost:{server.port}/file")
+                    self.end_headers()
+                    return
+                if server.fail_next > 0 and self.headers.get("Range") != "bytes=0-0":
+                    server.fail_next -= 1
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                data = server.payload
+                byte_range = self.headers.get("Range")
+                if byte_range and server.support_ranges:
+                    start, end = (int(x) for x in byte_range.split("=")[1].split("-"))
+                    end = min(end, len(data) - 1)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                    data = data[start:end + 1]
+                else:
+                    self.send_response(200)
+                if server.send_length:
+                    self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}/file"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def zip_payload():
+    return make_zip_bytes()
+
+
+@pytest.fixture
+def server(zip_payload):
+    srv = RangeServer(zip_payload)
+    yield srv
+    srv.close()
+
+
+class InterruptingTransport(Transport):
+    """Wraps a transport and fails permanently after N chunk requests"""
+
+    def __init__(self, inner, allowed):
+        self.inner = inner
+        self.allowed = allowed
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def probe(self, url):
+        return self.inner.probe(url)
+
+    def get_range(self, url, start, end):
+        with self.lock:
+            self.calls += 1
+            if self.calls > self.allowed:
+                raise ConnectionError("connection dropped")
+        return self.inner.get_range(url, start, end)
+
+    def stream(self, url, fileobj, block_size=1024):
+        return self.inner.stream(url, fileobj, block_size)
+
+
+class TestHTTPTransport:
+    """Test suite for HTTPTransport class"""
+
+    def test_probe_and_range(self, server, zip_payload):
+        """Test size discovery and inclusive byte ranges"""
+        transport = HTTPTransport()
+        remote = transport.probe(server.url)
+
+        assert remote.size == len(zip_payload)
+        assert remote.accept_ranges and remote.etag == '"v1"'
+        assert transport.get_range(server.url, 10, 19) == zip_payload[10:20]
+
+    def test_redirect_drops_auth_on_other_host(self, server):
+        """Test that credentials are not forwarded to the redirected host"""
+        transport = HTTPTransport(headers={"Authorization": "Basic secret"})
+        remote = transport.probe(f"http://127.0.0.1:{server.port}/redirect")
+        transport.get_range(remote.url, 0, 9)
+
+        assert remote.url.startswith("http://localhost:")
+        assert server.requests[0][2] == "Basic secret"
+        assert all(auth is None for path, _, auth in server.requests[1:])
+
+    def test_server_without_ranges(self, zip_payload):
+        """Test the probe of a server that ignores Range"""
+        srv = RangeServer(zip_payload, support_ranges=False)
+        try:
+            transport = HTTPTransport()
+            remote = transport.probe(srv.url)
+            assert remote.size == len(zip_payload) and not remote.accept_ranges
+            with pytest.raises(IOError):
+                transport.get_range(srv.url, 100, 200)
+            assert transport.get_range(srv.url, 0, 9) == zip_payload[:10]  # 200 body read only up to the range
+
+            buffer = io.BytesIO()
+            assert transport.stream(srv.url, buffer, block_size=1000) == len(zip_payload)
+            assert buffer.getvalue() == zip_payload
+        finally:
+            srv.close()
+
+    def test_unknown_size_is_rejected(self, zip_payload, tmp_path):
+        """Test that a response without Content-Length or Content-Range fails before any chunk"""
+        srv = RangeServer(zip_payload, support_ranges=False, send_length=False)
+        try:
+            with pytest.raises(IOError, match="desconhecido"):
+                download_file(srv.url, str(tmp_path / "data.zip"))
+        finally:
+            srv.close()
+        assert not (tmp_path / "data.zip.part").exists()
+
+    def test_incomplete_transport_fails_at_construction(self):
+        """Test that a transport missing part of the interface cannot be created"""
+        class RangeOnly(Transport):
+            def probe(self, url):
+                return RemoteFile(url, 0)
+
+            def get_range(self, url, start, end):
+                return b""
+
+        with pytest.raises(TypeError):
+            RangeOnly()
+
+
+class TestDownloadFile:
+    """Test suite for download_file function"""
+
+    def test_parallel_chunked_download(self, server, zip_payload, tmp_path):
+        """Test that the file is assembled from chunks and verified"""
+        dest = tmp_path / "data.zip"
+
+        download_file(server.url, str(dest), chunk_size=7000, max_workers=4,
+                      expected_sha256=hashlib.sha256(zip_payload).hexdigest())
+
+        assert dest.read_bytes() == zip_payload
+        assert not (tmp_path / "data.zip.part").exists()
+        assert not (tmp_path / "data.zip.part.json").exists()
+        ranges = [r for _, r, _ in server.requests if r and r != "bytes=0-0"]
+        assert len(ranges) == -(-len(zip_payload) // 7000)
+
+    def test_resume_after_interruption(self, server, zip_payload, tmp_path):
+        """Test that only missing chunks are fetched after a failure"""
+        dest = tmp_path / "data.zip"
+        n_chunks = -(-len(zip_payload) // 7000)
+
+        with pytest.raises(ConnectionError):
+            download_file(server.url, str(dest), InterruptingTransport(HTTPTransport(), allowed=3),
+                          chunk_size=7000, max_workers=1, retries=0)
+        journal = json.loads((tmp_path / "data.zip.part.json").read_text())
+        assert len(journal["done"]) == 3
+
+        resumed = InterruptingTransport(HTTPTransport(), allowed=10 ** 6)
+        download_file(server.url, str(dest), resumed, chunk_size=7000, max_workers=4)
+
+        assert resumed.calls == n_chunks - 3
+        assert dest.read_bytes() == zip_payload
+
+    def test_retries_transient_errors(self, server, zip_payload, tmp_path):
+        """Test that failed chunk requests are retried"""
+        server.fail_next = 2
+        dest = tmp_path / "data.zip"
+
+        download_file(server.url, str(dest), chunk_size=50000, max_workers=1, backoff=0.01)
+
+        assert dest.read_bytes() == zip_payload
+
+    def test_checksum_mismatch(self, server, tmp_path):
+        """Test that a wrong checksum is never handed off"""
+        dest = tmp_path / "data.zip"
+
+        with pytest.raises(IOError, match="integridade"):
+            download_file(server.url, str(dest), expected_sha256="0" * 64)
+
+        assert not dest.exists()
+
+    def test_expected_size_mismatch(self, server, tmp_path):
+        """Test that an unexpected remote size aborts before downloading"""
+        with pytest.raises(IOError):
+            download_file(server.url, str(tmp_path / "x.zip"), expected_size=1)
+
+    def test_existing_verified_file_is_kept(self, server, zip_payload, tmp_path):
+        """Test that an already complete file is not downloaded again"""
+        dest = tmp_path / "data.zip"
+        dest.write_bytes(zip_payload)
+
+        download_file(server.url, str(dest))
+
+        assert all(r == "bytes=0-0" for _, r, _ in server.requests)
+
+    def test_journal_reset_when_remote_changes(self, tmp_path):
+        """Test that a journal for another file version is discarded"""
+        journal = DownloadJournal(str(tmp_path / "j.json"))
+        journal.load("u", RemoteFile("u", 100, '"v1"'), 10)
+        journal.mark_done(0)
+
+        assert DownloadJournal(journal.path).load("u", RemoteFile("u", 100, '"v1"'), 10) == {0}
+        assert DownloadJournal(journal.path).load("u", RemoteFile("u", 100, '"v2"'), 10) == set()
+
+    def test_server_without_ranges_downloads_whole_file(self, zip_payload, tmp_path, mocker):
+        """Test the single-request fallback, streamed to disk instead of read through get_range"""
+        get_range = mocker.spy(HTTPTransport, "get_range")
+        srv = RangeServer(zip_payload, support_ranges=False)
+        try:
+            download_file(srv.url, str(tmp_path / "data.zip"), chunk_size=1000)
+        finally:
+            srv.close()
+        assert (tmp_path / "data.zip").read_bytes() == zip_payload
+        get_range.assert_not_called()
+
+
+class TestVerification:
+    """Test suite for verify_file / verify_zip functions"""
+
+    def test_verify_zip(self, zip_payload, tmp_path):
+        """Test valid, truncated and CRC-corrupted archives"""
+        good = tmp_path / "good.zip"
+        good.write_bytes(zip_payload)
+        truncated = tmp_path / "truncated.zip"
+        truncated.write_bytes(zip_payload[: len(zip_payload) // 2])
+        corrupted = bytearray(zip_payload)
+        corrupted[200] ^= 0xFF
+        (tmp_path / "crc.zip").write_bytes(bytes(corrupted))
+
+        assert verify_zip(str(good), deep=True)
+        assert not verify_zip(str(truncated))
+        assert verify_zip(str(tmp_path / "crc.zip"))  # central directory still intact
+        assert not verify_zip(str(tmp_path / "crc.zip"), deep=True)
+
+    def test_verify_file(self, tmp_path):
+        """Test size and checksum checks"""
+        path = tmp_path / "f.bin"
+        path.write_bytes(b"abc")
+
+        assert verify_file(str(path), 3, hashlib.sha256(b"abc").hexdigest())
+        assert not verify_file(str(path), 4)
+        assert not verify_file(str(tmp_path / "missing"))
+
+
+class TestKaggleDownload:
+    """Test suite for download_kaggle_dataset / kaggle_credentials functions"""
+
+    def test_credentials_sources(self, tmp_path, monkeypatch):
+        """Test environment variables and kaggle.json"""
+        monkeypatch.delenv("KAGGLE_USERNAME", raising=False)
+        monkeypatch.delenv("KAGGLE_KEY", raising=False)
+        (tmp_path / "kaggle.json").write_text(json.dumps({"username": "u", "key": "k"}))
+
+        assert kaggle_credentials(str(tmp_path)) == ("u", "k")
+        assert kaggle_credentials(str(tmp_path / "none")) is None
+
+        monkeypatch.setenv("KAGGLE_USERNAME", "env-user")
+        monkeypatch.setenv("KAGGLE_KEY", "env-key")
+        assert kaggle_credentials() == ("env-user", "env-key")
+
+    def test_missing_credentials(self, tmp_path, monkeypatch):
+        """Test that the download refuses to start without credentials"""
+        monkeypatch.delenv("KAGGLE_USERNAME", raising=False)
+        monkeypatch.delenv("KAGGLE_KEY", raising=False)
+        monkeypatch.setenv("KAGGLE_CONFIG_DIR", str(tmp_path))
+
+        with pytest.raises(IOError, match="Credenciais"):
+            download_kaggle_dataset("owner/ds", str(tmp_path / "ds.zip"))
+
+    def test_downloads_and_validates_zip(self, server, tmp_path, mocker):
+        """Test the Kaggle stage against the local server"""
+        mocker.patch("app.src.data_utils.download.KAGGLE_DOWNLOAD_URL", server.url + "?slug={slug}")
+
+        path = download_kaggle_dataset("owner/ds", str(tmp_path / "ds.zip"), HTTPTransport(), chunk_size=9000)
+
+        assert zipfile.ZipFile(path).namelist()[0] == "jpeg/uid0/1-1.jpg"
+
+    def test_rejects_non_zip(self, tmp_path, mocker):
+        """Test that a payload that is not a ZIP is rejected before extraction"""
+        srv = RangeServer(b"<html>login required</html>")
+        mocker.patch("app.src.data_utils.download.KAGGLE_DOWNLOAD_URL", srv.url + "?slug={slug}")
+        try:
+            with pytest.raises(IOError, match="ZIP"):
+                download_kaggle_dataset("owner/ds", str(tmp_path / "ds.zip"), HTTPTransport())
+        finally:
+            srv.close()
@@ -0,0 +1,244 @@
+"""
+Unit tests for app/src/data_utils/drift.py
+
+Tests cover:
+- FixedHistogram: updates, merge, quantiles and serialization
+- DriftSketch: per-inference updates, merge of container partials
+- psi() / ks_statistic() / drift_report(): drift scores from sketches only,
+  features missing on one side
+- build_baseline(): baseline from a .lst file
+- S3 partial persistence (moto)
+"""
+import math
+import random
+
+import boto3
+import cv2
+import numpy as np
+import pytest
+from moto import mock_aws
+
+from app.src.data_utils.drift import (
+    DriftSketch,
+    FixedHistogram,
+    build_baseline,
+    drift_report,
+    image_features,
+    ks_pvalue,
+    ks_statistic,
+    load_sketches_from_s3,
+    merge_sketches,
+    psi,
+    save_partial_to_s3,
+)
+
+
+def jpeg_bytes(value, shape=(40, 30)):
+    """Encode a constant-intensity grayscale JPEG"""
+    ok, buf = cv2.imencode(".jpg", np.full(shape, value, dtype=np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+def filled_histogram(values, low=0.0, high=1.0, n_bins=20):
+    hist = FixedHistogram(low, high, n_bins)
+    for v in values:
+        hist.update(v)
+    return hist
+
+
+class TestFixedHistogram:
+    """Test suite for FixedHistogram class"""
+
+    def test_update_and_out_of_range(self):
+        """Test bin assignment, underflow and overflow"""
+        hist = filled_histogram([-1.0, 0.0, 0.5, 0.99, 1.0, 5.0], n_bins=10)
+
+        assert hist.counts[0] == 1
+        assert hist.counts[-1] == 2
+        assert hist.counts[1] == 1
+        assert hist.counts[6] == 1
+        assert hist.n == 6
+        assert hist.min_value == -1.0 and hist.max_value == 5.0
+
+    def test_ignores_missing_values(self):
+        """Test that None and NaN do not count"""
+        hist = filled_histogram([None, float("nan"), 0.3])
+
+        assert hist.n == 1
+
+    def test_mean_std_and_quantile(self):
+        """Test summary statistics against NumPy"""
+        values = np.random.default_rng(0).random(5000)
+        hist = filled_histogram(values, n_bins=100)
+
+        assert hist.mean == pytest.approx(values.mean())
+        assert hist.std == pytest.approx(values.std())
+        assert hist.quantile(0.5) == pytest.approx(np.median(values), abs=0.01)
+        assert hist.quantile(0.9) == pytest.approx(np.quantile(values, 0.9), abs=0.01)
+
+    def test_merge_equals_single_pass(self):
+        """Test that merging partials gives the same counts as one sketch"""
+        values = [random.Random(1).random() for _ in range(200)]
+        full = filled_histogram(values)
+        left = filled_histogram(values[:80])
+        right = filled_histogram(values[80:])
+
+        merged = left.merge(right)
+
+        assert merged.counts == full.counts
+        assert merged.n == full.n
+        assert merged.mean == pytest.approx(full.mean)
+
+    def test_merge_incompatible_raises(self):
+        """Test that different bin layouts cannot be merged"""
+        with pytest.raises(ValueError):
+            FixedHistogram(0, 1, 10).merge(FixedHistogram(0, 2, 10))
+
+    def test_invalid_range_raises(self):
+        """Test range validation"""
+        with pytest.raises(ValueError):
+            FixedHistogram(1, 1, 10)
+
+    def test_empty_histogram(self):
+        """Test statistics of an empty histogram"""
+        hist = FixedHistogram(0, 1, 4)
+
+        assert hist.mean is None and hist.std is None and hist.quantile(0.5) is None
+        assert hist.cdf() == [0.0] * 6
+
+
+class TestDriftScores:
+    """Test suite for PSI / KS computed from sketches"""
+
+    def test_identical_distributions(self):
+        """Test that the same data gives zero drift"""
+        values = np.random.default_rng(0).random(1000)
+        a = filled_histogram(values)
+        b = filled_histogram(values)
+
+        assert psi(a, b) == pytest.approx(0.0, abs=1e-9)
+        assert ks_statistic(a, b) == pytest.approx(0.0)
+
+    def test_shifted_distribution(self):
+        """Test that a shifted distribution has high PSI and KS"""
+        rng = np.random.default_rng(0)
+        base = filled_histogram(rng.beta(2, 5, 2000))
+        shifted = filled_histogram(rng.beta(5, 2, 2000))
+
+        assert psi(base, shifted) > 1.0
+        assert ks_statistic(base, shifted) > 0.5
+
+    def test_ks_pvalue(self):
+        """Test p-value behaviour at the extremes"""
+        assert ks_pvalue(0.0, 100, 100) == 1.0
+        assert ks_pvalue(0.5, 1000, 1000) < 1e-6
+        assert math.isnan(ks_pvalue(0.2, 0, 10))
+
+    def test_empty_inputs_are_nan(self):
+        """Test scores with an empty histogram"""
+        assert math.isnan(psi(FixedHistogram(0, 1, 4), filled_histogram([0.5], n_bins=4)))
+        assert math.isnan(ks_statistic(FixedHistogram(0, 1, 4), filled_histogram([0.5], n_bins=4)))
+
+    def test_drift_report_flags_only_drifted_features(self):
+        """Test the per-feature report"""
+        rng = np.random.default_rng(3)
+        baseline, current = DriftSketch(), DriftSketch()
+        for _ in range(2000):
+            baseline.update({"prob_malignant": rng.beta(2, 5), "width": rng.normal(3000, 200)})
+            current.update({"prob_malignant": rng.beta(5, 2), "width": rng.normal(3000, 200)})
+
+        report = drift_report(baseline, current)
+
+        assert report["prob_malignant"]["drift"] is True
+        assert report["width"]["drift"] is False
+        assert "mean_intensity" not in report  # no data for this feature
+
+    def test_drift_report_flags_one_sided_features(self, caplog):
+        """Test that a feature sketched only in the baseline is reported as missing, not dropped"""
+        baseline, current = DriftSketch(), DriftSketch()
+        for i in range(100):
+            baseline.update({"width": 3000 + i, "mean_intensity": 80 + i % 10})
+            current.update({"width": 3000 + i})
+
+        report = drift_report(baseline, current)
+
+        assert report["width"]["missing"] is False
+        assert report["mean_intensity"]["missing"] is True
+        assert report["mean_intensity"]["drift"] is None
+        assert report["mean_intensity"]["n_current"] == 0
+        assert "mean_intensity" in caplog.text
+
+
+class TestDriftSketch:
+    """Test suite for DriftSketch class"""
+
+    def test_update_inference_with_image(self):
+        """Test features extracted from an inference"""
+        sketch = DriftSketch()
+        sketch.update_inference(0.8, jpeg_bytes(100))
+
+        assert sketch.n == 1
+        assert sketch.histograms["prob_malignant"].mean == pytest.approx(0.8)
+        assert sketch.histograms["width"].mean == 30
+        assert sketch.histograms["height"].mean == 40
+        assert sketch.histograms["mean_intensity"].mean == pytest.approx(100, abs=2)
+
+    def test_image_features_for_non_image(self):
+        """Test that undecodable content only yields the file size"""
+        features = image_features(b"x" * 2048)
+
+        assert features["file_size_kb"] == 2.0
+        assert features["width"] is None and features["mean_intensity"] is None
+
+    def test_json_roundtrip_and_merge(self, tmp_path):
+        """Test serialization and merge of container partials"""
+        a, b = DriftSketch(), DriftSketch()
+        a.update({"prob_malignant": 0.1})
+        b.update({"prob_malignant": 0.9})
+
+        restored = DriftSketch.load(a.save(str(tmp_path / "parts" / "a.json")))
+        merged = merge_sketches([restored, b])
+
+        assert merged.n == 2
+        assert merged.histograms["prob_malignant"].mean == pytest.approx(0.5)
+        assert a.n == 1  # inputs are not modified
+
+    def test_merge_empty_list(self):
+        """Test merging nothing"""
+        assert merge_sketches([]).n == 0
+
+
+class TestBaselineAndS3:
+    """Test suite for baseline building and S3 partials"""
+
+    def test_build_baseline_from_lst(self, tmp_path):
+        """Test baseline built from train.lst images"""
+        (tmp_path / "uid1").mkdir()
+        (tmp_path / "uid2").mkdir()
+        (tmp_path / "uid1" / "a.jpg").write_bytes(jpeg_bytes(50))
+        (tmp_path / "uid2" / "b.jpg").write_bytes(jpeg_bytes(150))
+        lst = tmp_path / "train.lst"
+        lst.write_text("0\t0\tuid1/a.jpg\n1\t1\tuid2/b.jpg\n2\t1\tmissing/c.jpg\n")
+
+        sketch = build_baseline(str(lst), str(tmp_path), probabilities={"uid1/a.jpg": 0.2})
+
+        assert sketch.n == 2
+        assert sketch.histograms["mean_intensity"].mean == pytest.approx(100, abs=2)
+        assert sketch.histograms["prob_malignant"].n == 1
+
+    @mock_aws
+    def test_partials_roundtrip_through_s3(self):
+        """Test that container partials written to S3 merge back together"""
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="monitoring-bucket")
+        for i, container in enumerate(["c1", "c2", "c2"]):
+            sketch = DriftSketch()
+            sketch.update({"prob_malignant": 0.1 * (i + 1)})
+            save_partial_to_s3(sketch, s3, "monitoring-bucket", "monitoring/partials/", container)
+        s3.put_object(Bucket="monitoring-bucket", Key="monitoring/partials/readme.txt", Body=b"x")
+
+        merged = load_sketches_from_s3(s3, "monitoring-bucket", "monitoring/partials")
+
+        assert merged.n == 3
+        assert merged.histograms["prob_malignant"].mean == pytest.approx(0.2)
@@ -0,0 +1,159 @@
+"""
+Unit tests for app/src/data_utils/endpoint_router.py
+
+Tests cover:
+- EndpointStats: EWMA, percentile window and error penalty
+- EndpointRouter: least-latency routing, exploration and single-endpoint direct calls
+- Hedged requests against fake endpoints with skewed latency; the discarded request's
+  latency is capped at the moment the call resolved
+- Failover when the chosen endpoint errors
+"""
+import threading
+import time
+
+import pytest
+
+from app.src.data_utils.endpoint_router import MIN_HEDGE_SAMPLES, EndpointRouter, EndpointStats
+
+
+class FakeEndpoints:
+    """Fake endpoints: name -> latency in seconds (or an exception to raise)"""
+
+    def __init__(self, latencies):
+        self.latencies = dict(latencies)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, name, body):
+        with self._lock:
+            self.calls.append(name)
+        latency = self.latencies[name]
+        if isinstance(latency, Exception):
+            raise latency
+        time.sleep(latency)
+        return {"endpoint": name, "body": body}
+
+
+class TestEndpointStats:
+    """Test suite for EndpointStats"""
+
+    def test_ewma_and_percentile(self):
+        """Test exponential averaging and the percentile over the window"""
+        stats = EndpointStats("a", alpha=0.5, window=4)
+        for seconds in (1.0, 3.0, 0.1, 0.2, 0.3):
+            stats.record(seconds)
+        assert stats.ewma == pytest.approx(((((1.0 + 3.0) / 2 + 0.1) / 2 + 0.2) / 2 + 0.3) / 2)
+        assert list(stats.samples) == [3.0, 0.1, 0.2, 0.3]
+        assert stats.percentile(50) == 0.2
+        assert stats.percentile(99) == 3.0
+
+    def test_error_penalty(self):
+        """Test that an error makes the endpoint look slower"""
+        stats = EndpointStats("a")
+        stats.record(0.1)
+        stats.record_error(0.05)  # fast failure (throttling) still counts as slow
+        assert stats.ewma == pytest.approx(2.0)
+        assert stats.to_dict()["errors"] == 1
+
+
+class TestRouting:
+    """Test suite for least-latency routing"""
+
+    def test_prefers_fastest_after_exploring(self):
+        """Test that each endpoint is tried once, then the fastest gets the traffic"""
+        fake = FakeEndpoints({"slow": 0.03, "fast": 0.001})
+        router = EndpointRouter(["slow", "fast"], fake, explore_every=0)
+        for _ in range(10):
+            router.call(b"img")
+        assert fake.calls[:2] == ["slow", "fast"]
+        assert set(fake.calls[2:]) == {"fast"}
+        assert router.metrics()["endpoints"]["fast"]["calls"] == 9
+
+    def test_exploration_revisits_penalized_endpoint(self):
+        """Test that a penalized endpoint is periodically retried"""
+        fake = FakeEndpoints({"a": RuntimeError("down"), "b": 0.0})
+        router = EndpointRouter(["a", "b"], fake, explore_every=5)
+        with pytest.raises(RuntimeError):
+            router.call(b"x")
+        fake.latencies["a"] = 0.0
+        for _ in range(4):
+            router.call(b"x")
+        assert fake.calls.count("a") == 2  # first call + exploration on call 5
+
+    def test_single_endpoint_is_direct(self):
+        """Test that one endpoint with hedging is still a direct call"""
+        fake = FakeEndpoints({"only": 0.0})
+        router = EndpointRouter(["only"], fake, hedge_percentile=95)
+        assert router.call(b"x")["endpoint"] == "only"
+        assert router._pool is None
+
+    def test_requires_endpoints(self):
+        """Test that an empty endpoint list is rejected"""
+        with pytest.raises(ValueError):
+            EndpointRouter([], lambda name, body: None)
+
+
+class TestHedging:
+    """Test suite for hedged requests"""
+
+    def test_hedge_wins_over_stalled_endpoint(self):
+        """Test that a stalled primary is hedged and the faster answer is returned"""
+        fake = FakeEndpoints({"a": 0.001, "b": 0.001})
+        router = EndpointRouter(["a", "b"], fake, hedge_percentile=90, hedge_min_delay=0.01, explore_every=0)
+        for _ in range(MIN_HEDGE_SAMPLES):
+            router.call(b"warm")
+
+        best = router.ranked()[0]
+        other = "b" if best == "a" else "a"
+        fake.latencies[best] = 0.3  # cold start / throttling on the preferred endpoint
+        start = time.perf_counter()
+        result = router.call(b"img")
+        elapsed = time.perf_counter() - start
+
+        assert result["endpoint"] == other
+        assert elapsed < 0.2
+        assert router.hedges_fired == 1 and router.hedges_won == 1
+        time.sleep(0.35)  # the discarded request still updates the EWMA
+        assert router.stats[best].ewma > router.stats[other].ewma
+
+    def test_loser_latency_capped_at_resolution(self):
+        """Test that the discarded request only records the time until the call resolved"""
+        fake = FakeEndpoints({"a": 0.001, "b": 0.001})
+        router = EndpointRouter(["a", "b"], fake, hedge_percentile=90, hedge_min_delay=0.01, explore_every=0)
+        for _ in range(MIN_HEDGE_SAMPLES):
+            router.call(b"warm")
+
+        best = router.ranked()[0]
+        calls = router.stats[best].calls
+        fake.latencies[best] = 0.3
+        start = time.perf_counter()
+        router.call(b"img")
+        elapsed = time.perf_counter() - start
+        time.sleep(0.35)
+
+        assert router.stats[best].calls == calls + 1
+        assert router.stats[best].samples[-1] <= elapsed
+        assert max(router.stats[best].samples) < 0.2
+
+    def test_no_hedge_when_primary_is_fast(self):
+        """Test that a fast primary answers before the hedge delay"""
+        fake = FakeEndpoints({"a": 0.0, "b": 0.0})
+        router = EndpointRouter(["a", "b"], fake, hedge_percentile=95, hedge_min_delay=0.2)
+        router.call(b"x")
+        assert router.hedges_fired == 0
+        assert len(fake.calls) == 1
+
+    def test_failover_on_error(self):
+        """Test that a failing primary falls over to the next endpoint"""
+        fake = FakeEndpoints({"a": RuntimeError("throttled"), "b": 0.0})
+        router = EndpointRouter(["a", "b"], fake, hedge_percentile=95, hedge_min_delay=0.5)
+        assert router.call(b"x")["endpoint"] == "b"
+        assert router.last_endpoint == "b"
+        assert router.hedges_fired == 0
+
+    def test_all_endpoints_fail(self):
+        """Test that the primary error is raised when every endpoint fails"""
+        fake = FakeEndpoints({"a": KeyError("a"), "b": ValueError("b")})
+        router = EndpointRouter(["a", "b"], fake, hedge_percentile=95)
+        with pytest.raises(KeyError):
+            router.call(b"x")
@@ -0,0 +1,219 @@
+"""
+Unit tests for app/src/data_utils/evaluation.py
+
+Tests cover:
+- ROC / Precision-Recall curves and their AUCs
+- Threshold sweep (confusion matrix per threshold)
+- Calibration bins
+- Score persistence (save_scores / load_scores)
+- ScoreCollector accumulation
+"""
+import json
+
+import numpy as np
+import pytest
+
+from app.src.data_utils.evaluation import (
+    ScoreCollector,
+    average_precision,
+    calibration_bins,
+    evaluate_probabilities,
+    load_scores,
+    parse_endpoint_probabilities,
+    precision_recall_curve,
+    roc_auc,
+    roc_curve,
+    save_scores,
+    threshold_sweep,
+)
+
+
+@pytest.fixture
+def small_scores():
+    """Classic 4-sample example with known ROC AUC (0.75) and AP (0.8333)"""
+    y_true = np.array([0, 0, 1, 1])
+    y_score = np.array([0.1, 0.4, 0.35, 0.8])
+    return y_true, y_score
+
+
+class TestCurves:
+    """Test suite for ROC and PR curves"""
+
+    def test_roc_curve_points(self, small_scores):
+        """Test ROC curve starts at origin and ends at (1, 1)"""
+        fpr, tpr, thresholds = roc_curve(*small_scores)
+
+        assert fpr[0] == 0 and tpr[0] == 0
+        assert fpr[-1] == 1 and tpr[-1] == 1
+        assert np.isinf(thresholds[0])
+        np.testing.assert_allclose(tpr, [0, 0.5, 0.5, 1, 1])
+        np.testing.assert_allclose(fpr, [0, 0, 0.5, 0.5, 1])
+
+    def test_roc_auc_known_value(self, small_scores):
+        """Test ROC AUC on the reference example"""
+        assert roc_auc(*small_scores) == pytest.approx(0.75)
+
+    def test_roc_auc_perfect_separation(self):
+        """Test that perfectly separated scores give AUC = 1"""
+        assert roc_auc([0, 0, 1, 1], [0.1, 0.2, 0.8, 0.9]) == pytest.approx(1.0)
+
+    def test_roc_auc_with_ties(self):
+        """Test that tied scores count as half a correct ordering"""
+        assert roc_auc([0, 1], [0.5, 0.5]) == pytest.approx(0.5)
+
+    def test_roc_auc_single_class_is_nan(self):
+        """Test that AUC is undefined when only one class is present"""
+        assert np.isnan(roc_auc([1, 1, 1], [0.2, 0.5, 0.9]))
+
+    def test_precision_recall_curve(self, small_scores):
+        """Test PR curve values in increasing recall order"""
+        precision, recall, thresholds = precision_recall_curve(*small_scores)
+
+        np.testing.assert_allclose(recall, [0.5, 0.5, 1.0, 1.0])
+        np.testing.assert_allclose(precision, [1.0, 0.5, 2 / 3, 0.5])
+        np.testing.assert_allclose(thresholds, [0.8, 0.4, 0.35, 0.1])
+
+    def test_average_precision_known_value(self, small_scores):
+        """Test AP on the reference example"""
+        assert average_precision(*small_scores) == pytest.approx(0.8333, abs=1e-4)
+
+    def test_mismatched_lengths_raise(self):
+        """Test that arrays with different sizes are rejected"""
+        with pytest.raises(ValueError):
+            roc_curve([0, 1], [0.5])
+
+
+class TestThresholdSweep:
+    """Test suite for threshold_sweep function"""
+
+    def test_sweep_matches_lambda_rule(self):
+        """Test that a score equal to the threshold is not positive (> rule)"""
+        sweep = threshold_sweep([1, 0], [0.5, 0.2], thresholds=[0.5])
+
+        assert sweep["tp"][0] == 0
+        assert sweep["fn"][0] == 1
+        assert sweep["tn"][0] == 1
+
+    def test_sweep_confusion_matrix_sums(self):
+        """Test that every threshold accounts for all samples"""
+        rng = np.random.default_rng(0)
+        y_true = rng.integers(0, 2, 500)
+        y_score = rng.random(500)
+
+        sweep = threshold_sweep(y_true, y_score)
+        totals = sweep["tp"] + sweep["fp"] + sweep["tn"] + sweep["fn"]
+
+        assert sweep["threshold"].size == 101
+        assert np.all(totals == 500)
+
+    def test_sweep_against_loop(self):
+        """Test vectorized counts against a plain Python loop"""
+        rng = np.random.default_rng(1)
+        y_true = rng.integers(0, 2, 200)
+        y_score = rng.random(200)
+        thresholds = [0.1, 0.3, 0.5, 0.9]
+
+        sweep = threshold_sweep(y_true, y_score, thresholds)
+
+        for i, t in enumerate(thresholds):
+            pred = y_score > t
+            assert sweep["tp"][i] == np.sum(pred & (y_true == 1))
+            assert sweep["fp"][i] == np.sum(pred & (y_true == 0))
+            assert sweep["recall"][i] == pytest.approx(np.sum(pred & (y_true == 1)) / np.sum(y_true == 1))
+
+
+class TestCalibration:
+    """Test suite for calibration_bins function"""
+
+    def test_bin_counts_and_fractions(self):
+        """Test that samples fall in the expected bins"""
+        calib = calibration_bins([0, 1, 1, 0], [0.05, 0.15, 0.95, 1.0], n_bins=10)
+
+        assert calib["count"][0] == 1
+        assert calib["count"][1] == 1
+        assert calib["count"][9] == 2
+        assert calib["fraction_positive"][9] == pytest.approx(0.5)
+        assert np.isnan(calib["mean_predicted"][5])
+
+    def test_perfect_calibration_has_zero_ece(self):
+        """Test ECE for predictions that match observed frequencies"""
+        calib = calibration_bins([0, 1], [0.0, 1.0], n_bins=2)
+
+        assert calib["ece"] == pytest.approx(0.0)
+
+
+class TestEvaluateAndPersist:
+    """Test suite for evaluate_probabilities and score persistence"""
+
+    def test_evaluate_summary(self, small_scores):
+        """Test the combined report"""
+        report = evaluate_probabilities(*small_scores, threshold=0.5)
+
+        assert report["n_samples"] == 4
+        assert report["n_positive"] == 2
+        assert report["roc_auc"] == pytest.approx(0.75)
+        assert report["at_threshold"]["tp"] == 1
+        assert report["at_threshold"]["fp"] == 0
+
+    def test_save_and_load_roundtrip(self, small_scores, tmp_path):
+        """Test that saved scores can be reloaded without loss"""
+        y_true, y_score = small_scores
+        path = save_scores(
+            str(tmp_path / "eval" / "scores"), y_true, y_score,
+            image_paths=["a.jpg", "b.jpg", "c.jpg", "d.jpg"],
+            metadata={"tuning_job": "job-1"}
+        )
+
+        assert path.endswith(".npz")
+        loaded = load_scores(path)
+
+        np.testing.assert_array_equal(loaded["y_true"], y_true)
+        np.testing.assert_allclose(loaded["y_score"], y_score, rtol=1e-6)
+        assert loaded["y_true"].dtype == np.uint8
+        assert loaded["y_score"].dtype == np.float32
+        assert loaded["image_paths"] == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+        assert loaded["metadata"] == {"tuning_job": "job-1"}
+
+    def test_load_without_paths(self, small_scores, tmp_path):
+        """Test loading scores saved without image paths"""
+        path = save_scores(str(tmp_path / "scores.npz"), *small_scores)
+
+        assert load_scores(path)["image_paths"] is None
+
+
+class TestScoreCollector:
+    """Test suite for ScoreCollector class"""
+
+    def test_collector_grows_past_capacity(self):
+        """Test that the collector resizes its arrays"""
+        collector = ScoreCollector(capacity=2)
+        for i in range(5):
+            collector.add(i % 2, i / 10, f"img{i}.jpg")
+
+        assert len(collector) == 5
+        np.testing.assert_array_equal(collector.y_true, [0, 1, 0, 1, 0])
+        np.testing.assert_allclose(collector.y_score, [0, 0.1, 0.2, 0.3, 0.4], rtol=1e-6)
+
+    def test_collector_evaluate_and_save(self, tmp_path):
+        """Test evaluate() and save() delegate to module functions"""
+        collector = ScoreCollector()
+        collector.add(0, 0.2, "a.jpg")
+        collector.add(1, 0.9, "b.jpg")
+
+        assert collector.evaluate()["roc_auc"] == pytest.approx(1.0)
+
+        loaded = load_scores(collector.save(str(tmp_path / "scores.npz")))
+        assert loaded["image_paths"] == ["a.jpg", "b.jpg"]
+
+
+class TestParseEndpointProbabilities:
+    """Test suite for parse_endpoint_probabilities function"""
+
+    @pytest.mark.parametrize("body", [
+        json.dumps([0.3, 0.7]).encode(),
+        json.dumps([0.3, 0.7]),
+        [0.3, 0.7],
+    ])
+    def test_parse_formats(self, body):
+        """Test bytes, str and already-decoded responses"""
+        assert parse_endpoint_probabilities(body) == pytest.approx(0.7)
@@ -0,0 +1,227 @@
+"""
+Unit tests for app/src/data_utils/feature_cache.py
+
+Tests cover:
+- FeatureCache: append-only memory-mapped features keyed by sha256, reopening,
+  recovery from an interrupted write, backbone/dimension checks, meta.json written on
+  creation when dim is given
+- digest_paths(): CAS keys vs hashed paths
+- extract_features(): one backbone pass per unique image, cache reuse, unreadable images
+- load_split() / train_head() / sweep_heads(): local head training on cached features
+- onnx_extractor() / main(): optional dependency and command-line sweep
+"""
+import json
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from app.src.data_utils import commons, feature_cache
+from app.src.data_utils.feature_cache import (
+    FeatureCache,
+    digest_paths,
+    extract_features,
+    load_split,
+    onnx_extractor,
+    sweep_heads,
+    train_head,
+)
+
+SHA_A = "a" * 64
+SHA_B = "b" * 64
+
+
+def mean_extractor(calls):
+    """Fake backbone: per-image mean and corner pixel, records batch sizes"""
+    def extract(images):
+        calls.append(len(images))
+        flat = images.reshape(len(images), -1).astype(np.float32)
+        return np.stack([flat.mean(axis=1), flat[:, 0]], axis=1)
+    return extract
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """20 images (label 1 bright, label 0 dark), two of them with identical content"""
+    root = tmp_path / "jpeg"
+    rows = []
+    for i in range(20):
+        label = i % 2
+        value = 40 + 5 * (i // 2) + 120 * label
+        rel = f"uid{i}/1-1.png"
+        (root / f"uid{i}").mkdir(parents=True)
+        cv2.imwrite(str(root / rel), np.full((12, 10), value if i != 3 else 165, np.uint8))
+        rows.append((label, rel))
+    cv2.imwrite(str(root / "uid5" / "1-1.png"), np.full((12, 10), 165, np.uint8))  # Same content as uid3
+    commons.write_lst_file(rows[:14], str(tmp_path / "train.lst"))
+    commons.write_lst_file(rows[14:], str(tmp_path / "validation.lst"))
+    return tmp_path, str(root)
+
+
+class TestFeatureCache:
+    """Test suite for FeatureCache"""
+
+    def test_append_get_and_reopen(self, tmp_path):
+        """Test that rows are stored once per digest and survive reopening"""
+        cache = FeatureCache(str(tmp_path))
+        cache.append([SHA_A, SHA_B], np.array([[1, 2, 3], [4, 5, 6]]))
+        cache.append([SHA_A], np.array([[9, 9, 9]]))
+
+        reopened = FeatureCache(str(tmp_path))
+        assert len(reopened) == 2 and SHA_B in reopened
+        assert reopened.get([SHA_B, SHA_A]).tolist() == [[4, 5, 6], [1, 2, 3]]
+        assert isinstance(reopened.array(), np.memmap)
+        assert reopened.array().dtype == np.float16
+
+    def test_interrupted_write_is_discarded(self, tmp_path):
+        """Test that feature bytes without a key are truncated on open"""
+        cache = FeatureCache(str(tmp_path))
+        cache.append([SHA_A], np.ones((1, 4)))
+        with open(cache.features_path, "ab") as f:
+            f.write(np.zeros(4, np.float16).tobytes())
+
+        reopened = FeatureCache(str(tmp_path))
+        assert len(reopened) == 1
+        reopened.append([SHA_B], np.full((1, 4), 2))
+        assert reopened.get([SHA_A, SHA_B]).tolist() == [[1] * 4, [2] * 4]
+
+    def test_mismatches_are_rejected(self, tmp_path):
+        """Test backbone and dimension checks"""
+        FeatureCache(str(tmp_path)).append([SHA_A], np.ones((1, 4)))
+
+        with pytest.raises(ValueError):
+            FeatureCache(str(tmp_path), backbone="efficientnet")
+        with pytest.raises(ValueError):
+            FeatureCache(str(tmp_path), dim=8)
+        with pytest.raises(ValueError):
+            FeatureCache(str(tmp_path)).append([SHA_B], np.ones((1, 8)))
+
+    def test_meta_written_when_dim_is_given(self, tmp_path):
+        """Test that an explicit dim is persisted before any append"""
+        FeatureCache(str(tmp_path), dim=4, backbone="resnet50")
+
+        assert json.loads((tmp_path / "meta.json").read_text()) == {
+            "dim": 4, "dtype": "float16", "backbone": "resnet50"}
+        with pytest.raises(ValueError):
+            FeatureCache(str(tmp_path), dim=8)
+        assert FeatureCache(str(tmp_path)).dim == 4
+
+
+class TestDigestPaths:
+    """Test suite for digest_paths"""
+
+    def test_cas_keys_and_hashed_paths(self, dataset):
+        """Test that CAS keys are parsed, other paths hashed and missing files dropped"""
+        _, root = dataset
+        cas = f"aa/aa/{SHA_A}.jpg"
+        digests = digest_paths(root, [cas, "uid3/1-1.png", "uid5/1-1.png", "nope/1-1.png"])
+
+        assert digests[cas] == SHA_A
+        assert digests["uid3/1-1.png"] == digests["uid5/1-1.png"]
+        assert "nope/1-1.png" not in digests
+
+
+class TestExtractFeatures:
+    """Test suite for extract_features and load_split"""
+
+    def test_each_content_is_extracted_once(self, dataset):
+        """Test that duplicates and cached images skip the backbone"""
+        tmp_path, root = dataset
+        lsts = [str(tmp_path / "train.lst"), str(tmp_path / "validation.lst")]
+        calls = []
+        cache_dir = str(tmp_path / "features")
+
+        first = extract_features(lsts, root, cache_dir, mean_extractor(calls), batch_size=8,
+                                 image_size=(6, 5), num_workers=2)
+        second = extract_features(lsts, root, cache_dir, mean_extractor(calls), batch_size=8,
+                                  image_size=(6, 5), num_workers=2)
+
+        assert first["images"] == 20 and first["unique"] == 19
+        assert first["extracted"] == 19 and sum(calls) == 19
+        assert second["cached"] == 19 and second["extracted"] == 0
+        assert len(FeatureCache(cache_dir)) == 19
+
+    def test_unreadable_images_are_not_cached(self, dataset):
+        """Test that failed decodes are reported and retried on the next run"""
+        tmp_path, root = dataset
+        (tmp_path / "jpeg" / "uid0" / "1-1.png").write_bytes(b"broken")
+        stats = extract_features([str(tmp_path / "train.lst")], root, str(tmp_path / "f"), mean_extractor([]),
+                                 image_size=(6, 5), num_workers=1)
+
+        assert stats["failed"] == 1
+        assert stats["extracted"] == 12
+
+    def test_load_split(self, dataset):
+        """Test that (X, y) follow the .lst order and labels"""
+        tmp_path, root = dataset
+        cache_dir = str(tmp_path / "features")
+        extract_features([str(tmp_path / "train.lst")], root, cache_dir, mean_extractor([]),
+                         image_size=(6, 5), num_workers=1)
+
+        X, y = load_split(cache_dir, str(tmp_path / "train.lst"), root)
+        assert X.shape == (14, 2) and X.dtype == np.float32
+        assert y.tolist() == [i % 2 for i in range(14)]
+        assert (X[y == 1, 0].min() > X[y == 0, 0].max())
+
+        X_val, y_val = load_split(cache_dir, str(tmp_path / "validation.lst"), root)
+        assert len(X_val) == 0 and len(y_val) == 0
+
+
+class TestHeads:
+    """Test suite for train_head and sweep_heads"""
+
+    @pytest.fixture
+    def blobs(self):
+        rng = np.random.default_rng(0)
+        y = rng.integers(0, 2, 400)
+        X = rng.normal(size=(400, 16)).astype(np.float32)
+        X[:, 0] += 4 * y
+        return (X[:300], y[:300]), (X[300:], y[300:])
+
+    @pytest.mark.parametrize("optimizer", ["sgd", "adam", "rmsprop"])
+    def test_head_learns_separable_features(self, blobs, optimizer):
+        """Test every optimizer on linearly separable features"""
+        (X, y), (X_val, y_val) = blobs
+        head = train_head(X, y, learning_rate=0.01, optimizer=optimizer, epochs=10)
+
+        assert (((head.predict_proba(X_val) >= 0.5) == y_val).mean()) > 0.85
+
+    def test_unknown_optimizer(self, blobs):
+        """Test that an optimizer outside the tuner's space is rejected"""
+        with pytest.raises(ValueError):
+            train_head(*blobs[0], optimizer="lbfgs")
+
+    def test_sweep_is_sorted(self, blobs):
+        """Test that every grid point is trained and results are ranked by validation accuracy"""
+        results = sweep_heads(*blobs, grid={"learning_rate": [0.01, 1e-6], "optimizer": ["sgd", "adam"]},
+                              epochs=3)
+
+        assert len(results) == 4
+        accuracies = [r["validation_accuracy"] for r in results]
+        assert accuracies == sorted(accuracies, reverse=True)
+        assert results[0]["learning_rate"] == 0.01
+        assert all(r["seconds"] >= 0 and 0 <= r["validation_auc"] <= 1 for r in results)
+
+
+class TestOnnxAndCli:
+    """Test suite for onnx_extractor and main"""
+
+    def test_missing_onnxruntime(self, mocker):
+        """Test the install hint when onnxruntime is absent"""
+        mocker.patch.dict(sys.modules, {"onnxruntime": None})
+        with pytest.raises(ImportError, match="pip install onnxruntime"):
+            onnx_extractor("model.onnx")
+
+    def test_cli_sweeps_cached_features(self, dataset, capsys):
+        """Test a sweep over an existing cache without a backbone"""
+        tmp_path, root = dataset
+        cache_dir = str(tmp_path / "features")
+        lsts = [str(tmp_path / "train.lst"), str(tmp_path / "validation.lst")]
+        extract_features(lsts, root, cache_dir, mean_extractor([]), image_size=(6, 5), num_workers=1)
+
+        assert feature_cache.main([cache_dir, *lsts, "--image-root", root, "--learning-rate", "0.01",
+                                   "--batch-size", "4", "--optimizer", "sgd", "adam", "--epochs", "5"]) == 0
+        report = json.loads(capsys.readouterr().out)
+        assert "extract" not in report
+        assert len(report["heads"]) == 2
@@ -0,0 +1,173 @@
+"""
+Unit tests for app/src/data_utils/grayscale.py
+
+Tests cover:
+- replicate_channels() / decode_image() / load_image(): load-time channel replication
+- encode_grayscale(): single-channel JPEG payloads
+- convert_tree(): parallel conversion, caching and size accounting
+- build_cbis_pipeline(grayscale=True): grayscale stage in the local pipeline
+- run_channel_benchmark(): upload size and decode throughput comparison
+"""
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from app.src.data_utils import benchmark
+from app.src.data_utils.grayscale import (
+    convert_tree,
+    decode_image,
+    encode_grayscale,
+    load_image,
+    replicate_channels,
+)
+from app.src.data_utils.image_headers import read_image_header
+from app.src.data_utils.pipeline import build_cbis_pipeline
+from tests.test_pipeline import make_cbis_zip
+
+
+def color_jpeg(shape=(40, 30)):
+    """3-channel JPEG whose three channels hold the same gray content"""
+    gray = np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", cv2.merge([gray, gray, gray]))
+    assert ok
+    return buf.tobytes()
+
+
+class TestReplication:
+    """Test suite for channel replication at load time"""
+
+    def test_replicate_is_a_view(self):
+        """Test that replication allocates no new pixels unless asked to"""
+        gray = np.arange(12, dtype=np.uint8).reshape(3, 4)
+
+        view = replicate_channels(gray)
+        copy = replicate_channels(gray, copy=True)
+
+        assert view.shape == (3, 4, 3)
+        assert np.shares_memory(view, gray)
+        assert not view.flags.writeable
+        assert copy.flags.writeable and not np.shares_memory(copy, gray)
+        assert all((view[:, :, c] == gray).all() for c in range(3))
+
+    def test_decode_color_payload(self):
+        """Test that any payload is decoded once, as gray, and replicated"""
+        image = decode_image(color_jpeg())
+
+        assert image.shape == (40, 30, 3)
+        assert decode_image(color_jpeg(), channels=1).shape == (40, 30)
+
+    def test_load_image(self, tmp_path):
+        """Test reading from a file"""
+        path = tmp_path / "a.jpg"
+        path.write_bytes(color_jpeg((8, 6)))
+
+        assert load_image(str(path)).shape == (8, 6, 3)
+
+    def test_unreadable_payload(self):
+        """Test that a non-image raises ValueError"""
+        with pytest.raises(ValueError):
+            decode_image(b"not an image")
+
+
+class TestEncodeGrayscale:
+    """Test suite for encode_grayscale"""
+
+    def test_single_channel_jpeg(self):
+        """Test that the re-encoded payload is a 1-channel JPEG with the same dimensions"""
+        header = read_image_header(encode_grayscale(color_jpeg()))
+
+        assert header["format"] == "jpeg"
+        assert header["channels"] == 1
+        assert (header["width"], header["height"]) == (30, 40)
+
+
+class TestConvertTree:
+    """Test suite for convert_tree"""
+
+    @pytest.fixture
+    def tree(self, tmp_path):
+        root = tmp_path / "jpeg"
+        for i in range(4):
+            (root / f"uid{i}").mkdir(parents=True)
+            (root / f"uid{i}" / "1-1.jpg").write_bytes(color_jpeg((32 + i, 24)))
+        (root / "uid0" / "2-1.png").write_bytes(cv2.imencode(".png", np.zeros((8, 8, 3), np.uint8))[1].tobytes())
+        (root / "uid1" / "broken.jpg").write_bytes(b"not an image")
+        (root / "uid1" / "notes.txt").write_text("skip me")
+        return root
+
+    def test_converts_whole_tree(self, tree, tmp_path):
+        """Test that every image is written as 1 channel under the same relative path"""
+        out = tmp_path / "gray"
+        stats = convert_tree(str(tree), str(out), max_workers=2)
+
+        assert stats["files"] == 6
+        assert stats["converted"] == 5
+        assert stats["unreadable"] == 1
+        assert stats["bytes_in"] > 0 and stats["bytes_out"] > 0
+        for rel in ("uid0/1-1.jpg", "uid3/1-1.jpg"):
+            assert read_image_header((out / rel).read_bytes())["channels"] == 1
+        assert read_image_header((out / "uid0" / "2-1.png").read_bytes())["channels"] == 1
+        assert not (out / "uid1" / "notes.txt").exists()
+        assert not list(out.rglob("*.tmp*"))
+
+    def test_second_run_is_cached(self, tree, tmp_path, mocker):
+        """Test that up-to-date outputs are not decoded again"""
+        out = tmp_path / "gray"
+        rels = ["uid0/1-1.jpg", "uid2/1-1.jpg", "missing/1-1.jpg"]
+        convert_tree(str(tree), str(out), rels, max_workers=1)
+
+        stats = convert_tree(str(tree), str(out), rels, max_workers=1)
+
+        assert stats["cached"] == 2
+        assert stats["converted"] == 0
+        assert stats["unreadable"] == 1
+        assert not (out / "uid1").exists()
+
+
+class TestGrayscalePipeline:
+    """Test suite for build_cbis_pipeline(grayscale=True)"""
+
+    def test_upload_uses_grayscale_copy(self, tmp_path):
+        """Test that preflight and upload read the single-channel tree"""
+        data_dir = make_cbis_zip(tmp_path)
+        work = tmp_path / "work"
+        pipeline = build_cbis_pipeline("owner/cbis-test", str(data_dir), str(work),
+                                       ["mass_case_description_train_set.csv"], bucket="test-bucket",
+                                       grayscale=True)
+        s3_client = MagicMock()
+        for name in ("upload_images", "upload_metadata"):
+            pipeline.stages[name].params["s3_client"] = s3_client
+
+        report = pipeline.run()
+
+        assert all(r["status"] == "ran" for r in report.values()), report
+        assert pipeline.deps["cas"] >= {"grayscale"}
+        assert pipeline.deps["upload_images"] >= {"cas", "preflight"}
+        uploaded = {c.args[0] for c in s3_client.upload_file.call_args_list}
+        assert all(str(work / "jpeg_gray") in p for p in uploaded if p.endswith(".jpg"))
+        assert len([p for p in uploaded if p.endswith(".jpg")]) == 10
+
+
+class TestChannelBenchmark:
+    """Test suite for the channel benchmark"""
+
+    def test_reports_bytes_and_throughput(self, tmp_path):
+        """Test that both layouts are measured on the same synthetic images"""
+        results = benchmark.run_channel_benchmark(n_images=4, shape=(64, 48), repeat=1, work_dir=str(tmp_path))
+
+        for name in ("color", "grayscale"):
+            assert results[name]["files"] == 4
+            assert results[name]["files_per_sec"] > 0
+            assert results[name]["upload_mb"] > 0
+        assert results["upload_ratio"] > 0 and results["decode_speedup"] > 0
+
+    def test_cli_channels(self, mocker, capsys):
+        """Test that --channels runs only the channel benchmark"""
+        run = mocker.patch.object(benchmark, "run_channel_benchmark", return_value={"upload_ratio": 1.0})
+        suite = mocker.patch.object(benchmark, "run_suite")
+
+        assert benchmark.main(["--channels", "--channel-images", "10", "--repeat", "1"]) == 0
+        run.assert_called_once_with(10, repeat=1)
+        suite.assert_not_called()
+        assert '"upload_ratio"' in capsys.readouterr().out
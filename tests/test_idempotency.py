@@ -0,0 +1,173 @@
+"""
+Unit tests for app/src/data_utils/idempotency.py
+
+Tests cover:
+- record_id(): delivery identity from S3 notifications and EventBridge details
+- MemoryStore / SQLiteStore / DynamoDBStore (moto): conditional claim, completion by the
+  owner only, lease expiry takeover, release, result TTL
+- IdempotencyGuard: single execution, result reuse, concurrent duplicates waiting for
+  the first result, wait timeout, failures releasing the claim, suppression metrics
+"""
+import threading
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.src.data_utils import idempotency
+from app.src.data_utils.idempotency import (
+    CLAIMED,
+    COMPLETED,
+    EXECUTED,
+    IN_FLIGHT,
+    IN_PROGRESS,
+    REUSED,
+    DynamoDBStore,
+    IdempotencyGuard,
+    MemoryStore,
+    SQLiteStore,
+    record_id,
+)
+
+TABLE = "cbis-ddsm-dev-idempotency"
+
+
+def create_table(client):
+    client.create_table(TableName=TABLE, KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+                        AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+                        BillingMode="PAY_PER_REQUEST")
+
+
+@pytest.fixture(params=["memory", "sqlite", "dynamodb"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryStore()
+    elif request.param == "sqlite":
+        yield SQLiteStore(str(tmp_path / "idempotency.sqlite"))
+    else:
+        with mock_aws():
+            client = boto3.client("dynamodb", region_name="us-east-1")
+            create_table(client)
+            yield DynamoDBStore(TABLE, client)
+
+
+class TestRecordId:
+    """Test suite for record_id"""
+
+    def test_version_sources(self):
+        """Test versionId, EventBridge version-id and sequencer, in that order"""
+        assert record_id("b", {"key": "k.jpg", "versionId": "v1", "sequencer": "00A"}) == "b/k.jpg@v1"
+        assert record_id("b", {"key": "k.jpg", "version-id": "v2"}) == "b/k.jpg@v2"
+        assert record_id("b", {"key": "k.jpg", "sequencer": "00A"}) == "b/k.jpg@00A"
+        assert record_id("b", {"key": "k.jpg"}) == "b/k.jpg@"
+
+
+class TestStores:
+    """Test suite for the conditional-write stores (same contract for all three)"""
+
+    def test_claim_complete_and_reuse(self, store):
+        """Test that only one owner claims and later claims see the stored result"""
+        assert store.claim("id", "a", 100.0, 60) == (CLAIMED, None)
+        assert store.claim("id", "b", 101.0, 60) == (IN_PROGRESS, None)
+
+        assert store.complete("id", "a", [0.2, 0.8], 1000.0)
+        assert store.claim("id", "b", 102.0, 60) == (COMPLETED, [0.2, 0.8])
+
+    def test_expired_lease_is_taken_over(self, store):
+        """Test that a crashed owner's claim can be taken once its lease expires"""
+        store.claim("id", "a", 100.0, 60)
+
+        assert store.claim("id", "b", 161.0, 60) == (CLAIMED, None)
+        assert not store.complete("id", "a", [1.0, 0.0], 1000.0)
+        assert store.complete("id", "b", [0.5, 0.5], 1000.0)
+
+    def test_release_and_ttl(self, store):
+        """Test that release frees the item (owner only) and results expire"""
+        store.claim("id", "a", 100.0, 60)
+        store.release("id", "b")
+        assert store.claim("id", "c", 101.0, 60) == (IN_PROGRESS, None)
+        store.release("id", "a")
+        assert store.claim("id", "c", 102.0, 60) == (CLAIMED, None)
+
+        store.complete("id", "c", [0.1, 0.9], 200.0)
+        assert store.claim("id", "d", 199.0, 60)[0] == COMPLETED
+        assert store.claim("id", "d", 201.0, 60) == (CLAIMED, None)
+
+
+class TestGuard:
+    """Test suite for IdempotencyGuard"""
+
+    def test_executes_once_and_reuses(self):
+        """Test that a redelivery reuses the first result"""
+        guard = IdempotencyGuard(MemoryStore())
+        calls = []
+
+        first = guard.run("id", lambda: calls.append(1) or [0.3, 0.7])
+        second = guard.run("id", lambda: calls.append(1) or [0.9, 0.1])
+
+        assert first == (EXECUTED, [0.3, 0.7])
+        assert second == (REUSED, [0.3, 0.7])
+        assert len(calls) == 1
+        assert guard.metrics() == {"executed": 1, "duplicates_reused": 1, "duplicates_waited": 0,
+                                   "duplicates_in_flight": 0, "suppressed": 1}
+
+    def test_concurrent_duplicates_wait_for_first_result(self, tmp_path):
+        """Test that duplicates arriving mid-flight get the result without a second call"""
+        guard = IdempotencyGuard(SQLiteStore(str(tmp_path / "s.sqlite")), wait_seconds=5, poll_seconds=0.01)
+        calls = []
+        started = threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return [0.4, 0.6]
+
+        outcomes = []
+        first = threading.Thread(target=lambda: outcomes.append(guard.run("id", slow)))
+        first.start()
+        started.wait()
+        others = [threading.Thread(target=lambda: outcomes.append(guard.run("id", slow))) for _ in range(3)]
+        for t in others:
+            t.start()
+        for t in [first] + others:
+            t.join()
+
+        assert len(calls) == 1
+        assert sorted(status for status, _ in outcomes) == [EXECUTED, REUSED, REUSED, REUSED]
+        assert all(result == [0.4, 0.6] for _, result in outcomes)
+        assert guard.metrics()["duplicates_waited"] == 3
+
+    def test_wait_timeout_skips_duplicate(self):
+        """Test that a duplicate gives up after wait_seconds while the first is running"""
+        store = MemoryStore()
+        store.claim("id", "other", time.time(), 60)
+        now = [0.0]
+        guard = IdempotencyGuard(store, wait_seconds=1, poll_seconds=0.5,
+                                 clock=lambda: time.time() + now[0],
+                                 sleep=lambda s: now.__setitem__(0, now[0] + s))
+
+        assert guard.run("id", lambda: pytest.fail("must not run")) == (IN_FLIGHT, None)
+        assert guard.metrics()["suppressed"] == 1
+
+    def test_failure_releases_claim(self):
+        """Test that an exception frees the item for the retry"""
+        guard = IdempotencyGuard(MemoryStore())
+
+        def failing():
+            raise RuntimeError("endpoint down")
+
+        with pytest.raises(RuntimeError):
+            guard.run("id", failing)
+
+        assert guard.run("id", lambda: [1.0, 0.0]) == (EXECUTED, [1.0, 0.0])
+
+    def test_dynamodb_errors_propagate(self):
+        """Test that non-conditional DynamoDB errors are not swallowed"""
+        with mock_aws():
+            store = DynamoDBStore("missing-table", boto3.client("dynamodb", region_name="us-east-1"))
+            with pytest.raises(Exception) as exc:
+                store.claim("id", "a", 1.0, 60)
+
+        assert not idempotency.DynamoDBStore._conditional_failed(exc.value)
@@ -0,0 +1,115 @@
+"""
+Unit tests for app/src/data_utils/image_headers.py
+
+Tests cover:
+- sniff_format(): magic-byte detection
+- read_image_header(): JPEG / PNG / DICOM header parsing without decoding pixels
+"""
+import io
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from app.src.data_utils.image_headers import read_image_header, sniff_format
+
+
+def encode(ext, shape):
+    """Encode a random image with OpenCV"""
+    img = np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8)
+    ok, buf = cv2.imencode(ext, img)
+    assert ok
+    return buf.tobytes()
+
+
+def make_dicom_bytes(rows=64, columns=48):
+    """Build a minimal DICOM file in memory with pydicom"""
+    pydicom = pytest.importorskip("pydicom")
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1.2"
+    meta.MediaStorageSOPInstanceUID = "1.2.3.4"
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = FileDataset("test.dcm", {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.Rows = rows
+    ds.Columns = columns
+    ds.BitsAllocated = 16
+    ds.BitsStored = 12
+    ds.SamplesPerPixel = 1
+    ds.PixelData = b"\0\0" * rows * columns
+
+    buffer = io.BytesIO()
+    try:
+        ds.save_as(buffer, enforce_file_format=True)
+    except TypeError:  # pydicom < 3
+        ds.save_as(buffer, write_like_original=False)
+    return buffer.getvalue()
+
+
+class TestSniffFormat:
+    """Test suite for sniff_format function"""
+
+    def test_detects_jpeg_and_png(self):
+        """Test JPEG and PNG signatures"""
+        assert sniff_format(encode(".jpg", (8, 8))) == "jpeg"
+        assert sniff_format(encode(".png", (8, 8))) == "png"
+
+    def test_detects_dicom(self):
+        """Test DICM marker after the 128-byte preamble"""
+        assert sniff_format(b"\0" * 128 + b"DICM") == "dicom"
+
+    def test_unknown_content(self):
+        """Test that arbitrary bytes are not recognised"""
+        assert sniff_format(b"fake-image-data-for-testing") == "unknown"
+
+
+class TestReadImageHeader:
+    """Test suite for read_image_header function"""
+
+    def test_grayscale_jpeg(self):
+        """Test dimensions and channels of a grayscale JPEG"""
+        header = read_image_header(encode(".jpg", (30, 40)))
+
+        assert header == {"format": "jpeg", "width": 40, "height": 30, "bit_depth": 8, "channels": 1}
+
+    def test_color_jpeg_from_file(self, tmp_path):
+        """Test reading from an open file object"""
+        path = tmp_path / "color.jpg"
+        path.write_bytes(encode(".jpg", (20, 10, 3)))
+
+        with open(path, "rb") as f:
+            header = read_image_header(f)
+
+        assert (header["width"], header["height"], header["channels"]) == (10, 20, 3)
+
+    def test_jpeg_with_extra_segments(self):
+        """Test that APPn segments before the SOF are skipped"""
+        jpeg = encode(".jpg", (12, 16))
+        app1 = b"\xff\xe1" + struct.pack(">H", 10) + b"Exif\0\0\0\0"
+        header = read_image_header(jpeg[:2] + app1 + jpeg[2:])
+
+        assert (header["width"], header["height"]) == (16, 12)
+
+    def test_png_header(self):
+        """Test PNG IHDR parsing"""
+        header = read_image_header(encode(".png", (5, 7, 3)))
+
+        assert header == {"format": "png", "width": 7, "height": 5, "bit_depth": 8, "channels": 3}
+
+    def test_truncated_jpeg_header(self):
+        """Test that a JPEG cut before the SOF returns None"""
+        assert read_image_header(b"\xff\xd8\xff\xe0\x00\x10JFIF") is None
+
+    def test_unknown_format(self):
+        """Test that non-image bytes return None"""
+        assert read_image_header(b"not an image") is None
+
+    def test_dicom_header(self):
+        """Test DICOM dimensions read without pixel data"""
+        header = read_image_header(make_dicom_bytes(rows=64, columns=48))
+
+        assert header == {"format": "dicom", "width": 48, "height": 64, "bit_depth": 12, "channels": 1}
@@ -0,0 +1,161 @@
+"""
+Unit tests for app/src/data_utils/inventory.py
+
+Tests cover:
+- scan_tree(): parallel os.scandir walk
+- check_image(): header-only checks, truncated / corrupt / empty images
+- build_inventory(): per-split summary, missing and unreferenced files
+- preflight() / run_preflight(): pass/fail gate
+"""
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from app.src.data_utils import commons
+from app.src.data_utils.inventory import (
+    build_inventory,
+    check_image,
+    preflight,
+    run_preflight,
+    save_inventory,
+    scan_tree,
+)
+
+
+def encode(ext, shape):
+    ok, buf = cv2.imencode(ext, np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """jpeg/ tree with good, truncated, corrupt and empty images plus .lst splits"""
+    root = tmp_path / "jpeg"
+    files = {
+        "uid1/1-1.jpg": encode(".jpg", (40, 30)),
+        "uid2/1-1.jpg": encode(".jpg", (20, 10)),
+        "uid3/1-1.png": encode(".png", (12, 16)),
+        "uid4/1-1.jpg": encode(".jpg", (40, 30))[:-300],  # truncated download
+        "uid5/1-1.jpg": b"<html>error</html>",
+        "uid6/1-1.jpg": b"",
+        "uid7/notes.txt": b"not an image",
+    }
+    for rel, content in files.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(content)
+
+    train, val = tmp_path / "train.lst", tmp_path / "validation.lst"
+    commons.write_lst_file([(0, "uid1/1-1.jpg"), (1, "uid2/1-1.jpg"), (1, "uid3/1-1.png")], str(train))
+    commons.write_lst_file([(0, "uid4/1-1.jpg"), (1, "uid5/1-1.jpg"), (0, "missing/1-1.jpg")], str(val))
+    return root, {"train": str(train), "validation": str(val)}
+
+
+class TestScanTree:
+    """Test suite for scan_tree function"""
+
+    def test_lists_all_files_with_sizes(self, dataset):
+        """Test that nested files are found with relative paths"""
+        root, _ = dataset
+
+        files = dict(scan_tree(str(root), max_workers=4))
+
+        assert len(files) == 7
+        assert files["uid6/1-1.jpg"] == 0
+        assert files["uid7/notes.txt"] == len(b"not an image")
+
+    def test_missing_root(self, tmp_path):
+        """Test that an unreadable directory yields nothing"""
+        assert scan_tree(str(tmp_path / "nope")) == []
+
+
+class TestCheckImage:
+    """Test suite for check_image function"""
+
+    def test_statuses(self, dataset):
+        """Test ok / truncated / corrupt / empty detection"""
+        root, _ = dataset
+
+        good = check_image(str(root / "uid1/1-1.jpg"))
+        assert good["status"] == "ok"
+        assert (good["width"], good["height"], good["bit_depth"], good["channels"]) == (30, 40, 8, 1)
+        assert check_image(str(root / "uid3/1-1.png"))["status"] == "ok"
+        assert check_image(str(root / "uid4/1-1.jpg"))["status"] == "truncated"
+        assert check_image(str(root / "uid5/1-1.jpg"))["status"] == "corrupt"
+        assert check_image(str(root / "uid6/1-1.jpg"))["status"] == "empty"
+
+    def test_truncated_png(self, tmp_path):
+        """Test that a PNG without IEND is truncated"""
+        path = tmp_path / "a.png"
+        path.write_bytes(encode(".png", (64, 64))[:-40])
+
+        assert check_image(str(path))["status"] == "truncated"
+
+
+class TestBuildInventory:
+    """Test suite for build_inventory / save_inventory functions"""
+
+    def test_per_split_summary(self, dataset, tmp_path):
+        """Test counts, dimensions, problems and missing files per split"""
+        root, splits = dataset
+
+        inventory = build_inventory(str(root), splits, max_workers=4)
+
+        train, val = inventory["splits"]["train"], inventory["splits"]["validation"]
+        assert train["files"] == 3 and train["problem_count"] == 0
+        assert train["formats"] == {"jpeg": 2, "png": 1}
+        assert train["width"] == {"min": 10, "max": 30, "mean": pytest.approx(56 / 3)}
+        assert val["status"] == {"truncated": 1, "corrupt": 1}
+        assert val["missing"] == ["missing/1-1.jpg"]
+        assert inventory["scanned_files"] == 7
+        assert inventory["unreferenced_files"] == 2
+
+        path = save_inventory(inventory, str(tmp_path / "inventory.json"))
+        assert json.loads(open(path).read())["splits"]["validation"]["missing_count"] == 1
+
+    def test_whole_tree_without_splits(self, dataset):
+        """Test the single 'all' group and non-image files"""
+        root, _ = dataset
+
+        inventory = build_inventory(str(root))
+
+        summary = inventory["splits"]["all"]
+        assert summary["files"] == 7
+        assert summary["formats"]["other"] == 1
+        assert summary["status"] == {"ok": 3, "truncated": 1, "corrupt": 1, "empty": 1}
+
+    def test_headers_only_mode(self, dataset):
+        """Test that image checks can be skipped for a pure size/count inventory"""
+        root, _ = dataset
+
+        summary = build_inventory(str(root), check_images=False)["splits"]["all"]
+
+        assert summary["files"] == 7 and summary["problem_count"] == 0
+
+
+class TestPreflight:
+    """Test suite for preflight / run_preflight functions"""
+
+    def test_gate(self, dataset):
+        """Test that problems and missing files fail the gate unless tolerated"""
+        root, splits = dataset
+        inventory = build_inventory(str(root), splits)
+
+        failures = preflight(inventory)
+
+        assert len(failures) == 2 and all(f.startswith("validation") for f in failures)
+        assert preflight(inventory, max_bad_fraction=1.0, max_missing=1) == []
+        assert preflight(inventory, max_bad_fraction=1.0, max_missing=1, min_files=4)
+
+    def test_run_preflight_raises(self, dataset, tmp_path):
+        """Test the pipeline stage: summary written, then RuntimeError"""
+        root, splits = dataset
+        summary = tmp_path / "inventory.json"
+
+        with pytest.raises(RuntimeError, match="Pré-voo"):
+            run_preflight(str(root), splits, str(summary))
+
+        assert summary.exists()
+        run_preflight(str(root), {"train": splits["train"]}, str(summary))
@@ -8,6 +8,13 @@ Tests cover:
 - Classification logic (benign vs malignant)
 - Confidence calculation
 - Error handling
+- Drift sketch monitoring (opt-in)
+- Endpoint name resolution (environment or SSM)
+- Prediction cache keyed by model version (opt-in)
+- Multi-endpoint routing (opt-in)
+- Single-channel payload (opt-in)
+- Duplicate-delivery suppression (opt-in)
+- CPU pre-triage gate (opt-in)
 """
 import json
 import importlib
@@ -426,3 +433,511 @@ class TestLambdaHandlerErrorCases:
         # Execute handler - should raise exception when trying to access indices
         with pytest.raises((IndexError, TypeError)):
             lambda_handler(s3_event_single_record, None)
+
+
+class TestDriftMonitoring:
+    """Test suite for the opt-in drift sketch in lambda_handler"""
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_disabled_by_default(
+        self,
+        mock_s3,
+        mock_sagemaker,
+        s3_event_single_record,
+        mock_s3_image_data,
+        set_endpoint_env
+    ):
+        """Test that no sketch partial is written when monitoring is off"""
+        mock_s3.get_object.return_value = mock_s3_image_data
+        mock_sagemaker.invoke_endpoint.return_value = {
+            'Body': BytesIO(json.dumps([0.6, 0.4]).encode('utf-8'))
+        }
+
+        lambda_handler(s3_event_single_record, None)
+
+        mock_s3.put_object.assert_not_called()
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_partial_flushed_to_s3(
+        self,
+        mock_s3,
+        mock_sagemaker,
+        s3_event_multiple_records,
+        mock_s3_image_data,
+        set_endpoint_env,
+        monkeypatch
+    ):
+        """Test that the container sketch is flushed every DRIFT_FLUSH_EVERY inferences"""
+        monkeypatch.setattr(lambda_module, 'DRIFT_MONITORING', True)
+        monkeypatch.setattr(lambda_module, 'DRIFT_FLUSH_EVERY', 2)
+        monkeypatch.setattr(lambda_module, 'drift_sketch', lambda_module.drift.DriftSketch())
+        monkeypatch.setattr(lambda_module, 'drift_flushed_at', __import__('time').time())
+
+        mock_s3.get_object.side_effect = lambda **kwargs: {'Body': BytesIO(b'fake-image-data-for-testing')}
+        mock_sagemaker.invoke_endpoint.side_effect = lambda **kwargs: {
+            'Body': BytesIO(json.dumps([0.3, 0.7]).encode('utf-8'))
+        }
+
+        lambda_handler(s3_event_multiple_records, None)
+
+        mock_s3.put_object.assert_called_once()
+        call_kwargs = mock_s3.put_object.call_args.kwargs
+        assert call_kwargs['Bucket'] == 'test-bucket'
+        assert call_kwargs['Key'].startswith('monitoring/partials/')
+
+        partial = lambda_module.drift.DriftSketch.from_json(call_kwargs['Body'])
+        assert partial.n == 2
+        assert partial.histograms['prob_malignant'].mean == pytest.approx(0.7)
+
+        # A fresh sketch is started after the flush
+        assert lambda_module.drift_sketch.n == 0
+
+    @patch.object(lambda_module, 's3_client')
+    def test_partial_flushed_after_interval(self, mock_s3, monkeypatch):
+        """Test that a partial older than DRIFT_FLUSH_SECONDS is flushed before it is full"""
+        import time as time_module
+
+        monkeypatch.setattr(lambda_module, 'DRIFT_FLUSH_EVERY', 50)
+        monkeypatch.setattr(lambda_module, 'drift_sketch', lambda_module.drift.DriftSketch())
+        monkeypatch.setattr(lambda_module, 'drift_flushed_at', time_module.time())
+
+        lambda_module.record_drift('test-bucket', b'fake-image', 0.4)
+        mock_s3.put_object.assert_not_called()
+
+        monkeypatch.setattr(lambda_module, 'drift_flushed_at', time_module.time() - lambda_module.DRIFT_FLUSH_SECONDS)
+        lambda_module.record_drift('test-bucket', b'fake-image', 0.6)
+
+        partial = lambda_module.drift.DriftSketch.from_json(mock_s3.put_object.call_args.kwargs['Body'])
+        assert partial.n == 2
+        assert lambda_module.drift_sketch.n == 0
+
+    def test_missing_opencv_is_reported(self, monkeypatch, capsys):
+        """Test the cold-start warning when drift is on and OpenCV is not packaged"""
+        monkeypatch.setattr(lambda_module, 'DRIFT_MONITORING', True)
+        assert lambda_module.warn_missing_opencv() == []
+
+        monkeypatch.setitem(sys.modules, 'cv2', None)
+        warnings = lambda_module.warn_missing_opencv()
+
+        assert len(warnings) == 1 and warnings[0].startswith('DRIFT_MONITORING')
+        assert 'OpenCV not available' in capsys.readouterr().out
+
+    def test_missing_opencv_disables_grayscale_payload(self, monkeypatch):
+        """Test the cold-start warning when the grayscale payload is on and OpenCV is not packaged"""
+        monkeypatch.setattr(lambda_module, 'GRAYSCALE_PAYLOAD', True)
+        monkeypatch.setitem(sys.modules, 'cv2', None)
+
+        warnings = lambda_module.warn_missing_opencv()
+
+        assert any(w.startswith('GRAYSCALE_PAYLOAD') and 'disabled' in w for w in warnings)
+
+
+class TestEndpointNameResolution:
+    """Test suite for the endpoint name lookup (environment or SSM)"""
+
+    def test_environment_overrides_ssm(self, monkeypatch):
+        """Test that ENDPOINT_NAME skips the SSM lookup"""
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAME', '')
+        monkeypatch.setenv('ENDPOINT_NAME', 'env-endpoint')
+        load_config = MagicMock()
+        monkeypatch.setattr(lambda_module.config, 'load_config', load_config)
+
+        assert lambda_module.get_endpoint_name() == 'env-endpoint'
+        load_config.assert_not_called()
+
+    def test_falls_back_to_ssm(self, monkeypatch):
+        """Test that the endpoint name is read from the project configuration"""
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAME', '')
+        monkeypatch.delenv('ENDPOINT_NAME', raising=False)
+        load_config = MagicMock(return_value={'endpoint_name': 'ssm-endpoint'})
+        monkeypatch.setattr(lambda_module.config, 'load_config', load_config)
+
+        assert lambda_module.get_endpoint_name() == 'ssm-endpoint'
+        load_config.assert_called_once_with(project_name=lambda_module.CONFIG_PROJECT,
+                                            env=lambda_module.CONFIG_ENV)
+
+    def test_default_when_ssm_has_no_value(self, monkeypatch):
+        """Test the built-in default when SSM is unavailable"""
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAME', '')
+        monkeypatch.delenv('ENDPOINT_NAME', raising=False)
+        monkeypatch.setattr(lambda_module.config, 'load_config', MagicMock(return_value={}))
+
+        assert lambda_module.get_endpoint_name() == lambda_module.DEFAULT_ENDPOINT_NAME
+
+
+class TestPredictionCache:
+    """Test suite for the opt-in prediction cache keyed by model version"""
+
+    @pytest.fixture(autouse=True)
+    def enable_cache(self, monkeypatch, set_endpoint_env):
+        monkeypatch.setattr(lambda_module, 'PREDICTION_CACHE_SIZE', 2)
+        monkeypatch.setattr(lambda_module, 'prediction_cache', lambda_module.OrderedDict())
+        monkeypatch.setattr(lambda_module, 'model_version', {'key': None, 'expires_at': 0.0})
+
+    @staticmethod
+    def s3_objects(version_key_url):
+        """S3 mock: published model record + constant image bytes"""
+        record = lambda_module.model_resolver.ModelRecord('tune-1', '', 'tune-1-003', version_key_url)
+
+        def get_object(Bucket, Key):
+            if Key == lambda_module.MODEL_RECORD_KEY:
+                return {'Body': BytesIO(json.dumps(record.to_dict()).encode('utf-8'))}
+            return {'Body': BytesIO(b'same-image-bytes')}
+        return get_object
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_repeated_image_hits_cache(self, mock_s3, mock_sagemaker, s3_event_single_record):
+        """Test that the same image and model are scored only once"""
+        mock_s3.get_object.side_effect = self.s3_objects('s3://b/model.tar.gz')
+        mock_sagemaker.invoke_endpoint.side_effect = lambda **kwargs: {
+            'Body': BytesIO(json.dumps([0.2, 0.8]).encode('utf-8'))
+        }
+
+        first = lambda_handler(s3_event_single_record, None)
+        second = lambda_handler(s3_event_single_record, None)
+
+        assert first == second
+        mock_sagemaker.invoke_endpoint.assert_called_once()
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_new_model_version_misses_cache(self, mock_s3, mock_sagemaker, s3_event_single_record, monkeypatch):
+        """Test that a newly published model is never served cached predictions"""
+        mock_sagemaker.invoke_endpoint.side_effect = lambda **kwargs: {
+            'Body': BytesIO(json.dumps([0.2, 0.8]).encode('utf-8'))
+        }
+        mock_s3.get_object.side_effect = self.s3_objects('s3://b/v1/model.tar.gz')
+        lambda_handler(s3_event_single_record, None)
+
+        mock_s3.get_object.side_effect = self.s3_objects('s3://b/v2/model.tar.gz')
+        monkeypatch.setitem(lambda_module.model_version, 'expires_at', 0.0)  # TTL elapsed
+        lambda_handler(s3_event_single_record, None)
+
+        assert mock_sagemaker.invoke_endpoint.call_count == 2
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_no_published_record_disables_cache(self, mock_s3, mock_sagemaker, s3_event_single_record):
+        """Test that nothing is cached without a known model version"""
+        def get_object(Bucket, Key):
+            if Key == lambda_module.MODEL_RECORD_KEY:
+                raise Exception('NoSuchKey')
+            return {'Body': BytesIO(b'same-image-bytes')}
+        mock_s3.get_object.side_effect = get_object
+        mock_sagemaker.invoke_endpoint.side_effect = lambda **kwargs: {
+            'Body': BytesIO(json.dumps([0.6, 0.4]).encode('utf-8'))
+        }
+
+        lambda_handler(s3_event_single_record, None)
+        lambda_handler(s3_event_single_record, None)
+
+        assert mock_sagemaker.invoke_endpoint.call_count == 2
+        assert len(lambda_module.prediction_cache) == 0
+
+    def test_lru_eviction(self, monkeypatch):
+        """Test that the cache keeps at most PREDICTION_CACHE_SIZE entries"""
+        monkeypatch.setattr(lambda_module, 'get_model_version', lambda bucket: 'v1')
+        monkeypatch.setattr(lambda_module, 'sm_runtime', MagicMock(**{
+            'invoke_endpoint.side_effect': lambda **kwargs: {'Body': BytesIO(b'[0.5, 0.5]')}
+        }))
+
+        for payload in (b'a', b'b', b'c'):
+            lambda_module.predict('bucket', payload)
+
+        assert len(lambda_module.prediction_cache) == 2
+        assert lambda_module.model_resolver.prediction_cache_key('v1', b'a') not in lambda_module.prediction_cache
+
+
+class TestEndpointRouting:
+    """Test suite for opt-in multi-endpoint routing"""
+
+    @pytest.fixture(autouse=True)
+    def two_endpoints(self, monkeypatch):
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAMES', ['ep-a', 'ep-b'])
+        monkeypatch.setattr(lambda_module, 'HEDGE_PERCENTILE', None)
+        monkeypatch.setattr(lambda_module, 'router', None)
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_routes_across_endpoints(self, mock_s3, mock_sagemaker, s3_event_single_record, mock_s3_image_data):
+        """Test that every configured endpoint is tried and the router persists per container"""
+        mock_s3.get_object.side_effect = lambda **kwargs: {'Body': BytesIO(b'image')}
+        mock_sagemaker.invoke_endpoint.side_effect = lambda **kwargs: {
+            'Body': BytesIO(json.dumps([0.9, 0.1]).encode('utf-8'))
+        }
+
+        lambda_handler(s3_event_single_record, None)
+        lambda_handler(s3_event_single_record, None)
+
+        called = [c.kwargs['EndpointName'] for c in mock_sagemaker.invoke_endpoint.call_args_list]
+        assert sorted(called) == ['ep-a', 'ep-b']
+        assert lambda_module.router.metrics()['endpoints']['ep-a']['calls'] == 1
+
+    @patch.object(lambda_module, 'sm_runtime')
+    def test_single_endpoint_keeps_direct_call(self, mock_sagemaker, monkeypatch):
+        """Test that one name in ENDPOINT_NAMES is called directly, without a router or SSM"""
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAMES', ['ep-a'])
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAME', '')
+        monkeypatch.delenv('ENDPOINT_NAME', raising=False)
+        get_parameter = MagicMock(return_value='ssm-endpoint')
+        monkeypatch.setattr(lambda_module.config, 'get_parameter', get_parameter)
+        mock_sagemaker.invoke_endpoint.return_value = {'Body': BytesIO(b'[0.9, 0.1]')}
+
+        lambda_module.predict('bucket', b'image')
+
+        assert lambda_module.get_router() is None
+        assert mock_sagemaker.invoke_endpoint.call_args.kwargs['EndpointName'] == 'ep-a'
+        get_parameter.assert_not_called()
+
+
+class TestGrayscalePayload:
+    """Test suite for the opt-in single-channel payload"""
+
+    @staticmethod
+    def jpeg(shape):
+        import cv2
+        import numpy as np
+
+        ok, buf = cv2.imencode('.jpg', np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8))
+        assert ok
+        return buf.tobytes()
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_color_upload_sent_as_single_channel(self, mock_s3, mock_sagemaker, s3_event_single_record,
+                                                 set_endpoint_env, monkeypatch):
+        """Test that a 3-channel upload reaches the endpoint as a 1-channel JPEG"""
+        monkeypatch.setattr(lambda_module, 'GRAYSCALE_PAYLOAD', True)
+        color = self.jpeg((64, 48, 3))
+        mock_s3.get_object.return_value = {'Body': BytesIO(color)}
+        mock_sagemaker.invoke_endpoint.return_value = {'Body': BytesIO(b'[0.8, 0.2]')}
+
+        lambda_handler(s3_event_single_record, None)
+
+        body = mock_sagemaker.invoke_endpoint.call_args.kwargs['Body']
+        header = lambda_module.read_image_header(body)
+        assert header['channels'] == 1
+        assert (header['width'], header['height']) == (48, 64)
+
+    def test_gray_and_unknown_payloads_unchanged(self):
+        """Test that gray images and non-images are passed through as is"""
+        gray = self.jpeg((32, 32))
+
+        assert lambda_module.to_grayscale_payload(gray) is gray
+        assert lambda_module.to_grayscale_payload(b'not an image') == b'not an image'
+
+    def test_missing_opencv_falls_back(self, monkeypatch):
+        """Test that the original bytes are sent when OpenCV is not packaged"""
+        color = self.jpeg((16, 16, 3))
+        monkeypatch.setattr(lambda_module.grayscale, 'encode_grayscale', MagicMock(side_effect=ImportError))
+
+        assert lambda_module.to_grayscale_payload(color) is color
+
+    def test_broken_image_falls_back(self, monkeypatch):
+        """Test that a decode failure sends the original bytes"""
+        color = self.jpeg((16, 16, 3))
+        monkeypatch.setattr(lambda_module.grayscale, 'encode_grayscale', MagicMock(side_effect=ValueError('bad')))
+
+        assert lambda_module.to_grayscale_payload(color) is color
+
+
+class TestIdempotency:
+    """Test suite for the opt-in duplicate-delivery suppression"""
+
+    @pytest.fixture
+    def guard(self, monkeypatch):
+        guard = lambda_module.idempotency.IdempotencyGuard(lambda_module.idempotency.MemoryStore())
+        monkeypatch.setattr(lambda_module, 'idempotency_guard', guard)
+        return guard
+
+    @staticmethod
+    def event(key='entrada/a.jpg', sequencer='0055AED6DCD90281E5'):
+        return {'Records': [{'s3': {'bucket': {'name': 'test-bucket'},
+                                    'object': {'key': key, 'sequencer': sequencer}}}]}
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_redelivery_reuses_result(self, mock_s3, mock_sagemaker, guard, set_endpoint_env, capsys):
+        """Test that the same delivery twice reads and scores the object once"""
+        mock_s3.get_object.side_effect = lambda **kw: {'Body': BytesIO(b'image')}
+        mock_sagemaker.invoke_endpoint.side_effect = lambda **kw: {'Body': BytesIO(b'[0.2, 0.8]')}
+
+        first = lambda_handler(self.event(), None)
+        second = lambda_handler(self.event(), None)
+
+        assert mock_s3.get_object.call_count == 1
+        assert mock_sagemaker.invoke_endpoint.call_count == 1
+        assert first == second
+        assert 'MALIGNANT' in json.loads(second['body'])
+        emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+        assert emf[-1]['suppressed'] == 1 and emf[-1]['Layer'] == 'Idempotency'
+        assert [(r['executed'], r['suppressed']) for r in emf] == [(1, 0), (0, 1)]  # per invocation
+
+        lambda_handler(self.event(key='entrada/b.jpg'), None)
+        emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+        assert (emf[-1]['executed'], emf[-1]['suppressed']) == (1, 0)
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_new_version_is_scored(self, mock_s3, mock_sagemaker, guard, set_endpoint_env):
+        """Test that a re-upload of the same key (new sequencer) is a new delivery"""
+        mock_s3.get_object.side_effect = lambda **kw: {'Body': BytesIO(b'image')}
+        mock_sagemaker.invoke_endpoint.side_effect = lambda **kw: {'Body': BytesIO(b'[0.9, 0.1]')}
+
+        lambda_handler(self.event(sequencer='01'), None)
+        lambda_handler(self.event(sequencer='02'), None)
+
+        assert mock_sagemaker.invoke_endpoint.call_count == 2
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_in_flight_duplicate_is_skipped(self, mock_s3, mock_sagemaker, guard, set_endpoint_env, monkeypatch):
+        """Test that a duplicate of a delivery still running elsewhere is not scored"""
+        import time as time_module
+
+        guard.store.claim('test-bucket/entrada/a.jpg@0055AED6DCD90281E5', 'other-container',
+                          time_module.time(), 60)
+        monkeypatch.setattr(guard, 'wait_seconds', 0)
+
+        response = lambda_handler(self.event(), None)
+
+        mock_s3.get_object.assert_not_called()
+        mock_sagemaker.invoke_endpoint.assert_not_called()
+        assert response['statusCode'] == 200
+
+    def test_guard_uses_dynamodb_table(self, monkeypatch):
+        """Test that IDEMPOTENCY_TABLE builds a DynamoDB-backed guard once per container"""
+        monkeypatch.setattr(lambda_module, 'IDEMPOTENCY_TABLE', 'cbis-ddsm-dev-idempotency')
+        monkeypatch.setattr(lambda_module, 'idempotency_guard', None)
+
+        guard = lambda_module.get_idempotency_guard()
+
+        assert isinstance(guard.store, lambda_module.idempotency.DynamoDBStore)
+        assert guard.store.table_name == 'cbis-ddsm-dev-idempotency'
+        assert lambda_module.get_idempotency_guard() is guard
+
+    def test_disabled_by_default(self, monkeypatch):
+        """Test that no guard exists without IDEMPOTENCY_TABLE"""
+        monkeypatch.setattr(lambda_module, 'IDEMPOTENCY_TABLE', '')
+        monkeypatch.setattr(lambda_module, 'idempotency_guard', None)
+
+        assert lambda_module.get_idempotency_guard() is None
+
+
+class TestTriageGate:
+    """Test suite for the opt-in CPU pre-triage gate"""
+
+    @pytest.fixture
+    def gate(self, monkeypatch):
+        monkeypatch.setattr(lambda_module, 'TRIAGE_GATE', True)
+        monkeypatch.setattr(lambda_module, 'TRIAGE_REJECT_PREFIX', 'monitoring/rejected')
+        monkeypatch.setattr(lambda_module, 'triage_gate', None)
+        return lambda_module.get_triage_gate()
+
+    @staticmethod
+    def scan():
+        import cv2
+        import numpy as np
+
+        image = np.full((512, 384), 10, np.uint8)
+        image[128:384, :192] = np.random.default_rng(0).integers(90, 220, (256, 192), dtype=np.uint8)
+        ok, buf = cv2.imencode('.jpg', image)
+        assert ok
+        return buf.tobytes()
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_rejected_upload_skips_endpoint(self, mock_s3, mock_sagemaker, gate, s3_event_single_record,
+                                            set_endpoint_env, capsys):
+        """Test that a non-image gets a reject record and no invoke_endpoint call"""
+        mock_s3.get_object.return_value = {'Body': BytesIO(b'%PDF-1.7' + b' ' * 500)}
+
+        response = lambda_handler(s3_event_single_record, None)
+
+        mock_sagemaker.invoke_endpoint.assert_not_called()
+        assert 'REJECTED' in json.loads(response['body'])
+        put = mock_s3.put_object.call_args.kwargs
+        assert put['Key'] == 'monitoring/rejected/entrada/test-image.jpg.json'
+        assert json.loads(put['Body'])['reason'] == 'not_an_image'
+        emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+        assert emf[-1]['Layer'] == 'Triage' and emf[-1]['endpoint_calls_avoided'] == 1
+
+        # Warm container: a second invocation publishes only its own check
+        mock_s3.get_object.return_value = {'Body': BytesIO(b'%PDF-1.7' + b' ' * 500)}
+        lambda_handler(s3_event_single_record, None)
+        emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+        assert (emf[-1]['checked'], emf[-1]['endpoint_calls_avoided']) == (1, 1)
+        assert len(emf[-1]['gate_ms']) == 1 and 'gate_ms_mean' not in emf[-1]
+        units = {m['Name']: m['Unit'] for m in emf[-1]['_aws']['CloudWatchMetrics'][0]['Metrics']}
+        assert units['gate_ms'] == 'Milliseconds' and units['checked'] == 'Count'
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_accepted_upload_is_scored(self, mock_s3, mock_sagemaker, gate, s3_event_single_record,
+                                       set_endpoint_env):
+        """Test that a usable scan reaches the endpoint unchanged"""
+        scan = self.scan()
+        mock_s3.get_object.return_value = {'Body': BytesIO(scan)}
+        mock_sagemaker.invoke_endpoint.return_value = {'Body': BytesIO(b'[0.3, 0.7]')}
+
+        response = lambda_handler(s3_event_single_record, None)
+
+        assert mock_sagemaker.invoke_endpoint.call_args.kwargs['Body'] == scan
+        assert 'MALIGNANT' in json.loads(response['body'])
+        mock_s3.put_object.assert_not_called()
+        assert gate.metrics()['accepted'] == 1
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_reject_is_stored_by_idempotency(self, mock_s3, mock_sagemaker, gate, monkeypatch):
+        """Test that a redelivered reject reuses the stored reject result"""
+        guard = lambda_module.idempotency.IdempotencyGuard(lambda_module.idempotency.MemoryStore())
+        monkeypatch.setattr(lambda_module, 'idempotency_guard', guard)
+        monkeypatch.setattr(lambda_module, 'TRIAGE_REJECT_PREFIX', '')
+        mock_s3.get_object.side_effect = lambda **kw: {'Body': BytesIO(b'')}
+        event = {'Records': [{'s3': {'bucket': {'name': 'test-bucket'},
+                                     'object': {'key': 'entrada/empty.jpg', 'sequencer': '01'}}}]}
+
+        lambda_handler(event, None)
+        response = lambda_handler(event, None)
+
+        assert mock_s3.get_object.call_count == 1
+        mock_s3.put_object.assert_not_called()
+        mock_sagemaker.invoke_endpoint.assert_not_called()
+        assert 'REJECTED' in json.loads(response['body'])
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_without_opencv_blank_scan_reaches_endpoint(self, mock_s3, mock_sagemaker, s3_event_single_record,
+                                                        set_endpoint_env, monkeypatch, capsys):
+        """Test the unpackaged-OpenCV path: warning at cold start, header checks only, counted as skipped"""
+        import cv2
+        import numpy as np
+
+        ok, blank = cv2.imencode('.jpg', np.zeros((512, 512), np.uint8))
+        monkeypatch.setitem(sys.modules, 'cv2', None)
+        monkeypatch.setattr(lambda_module, 'TRIAGE_GATE', True)
+        monkeypatch.setattr(lambda_module, 'TRIAGE_REJECT_PREFIX', '')
+        monkeypatch.setattr(lambda_module, 'triage_gate', None)
+        mock_s3.get_object.side_effect = [{'Body': BytesIO(blank.tobytes())}, {'Body': BytesIO(b'junk' * 100)}]
+        mock_sagemaker.invoke_endpoint.return_value = {'Body': BytesIO(b'[0.9, 0.1]')}
+
+        lambda_handler(s3_event_single_record, None)
+        lambda_handler(s3_event_single_record, None)
+
+        assert mock_sagemaker.invoke_endpoint.call_count == 1
+        out = capsys.readouterr().out
+        assert out.count('OpenCV not available') == 1
+        emf = [json.loads(line) for line in out.splitlines() if line.startswith('{"_aws"')]
+        assert emf[-2]['intensity_skipped'] == 1 and emf[-2]['rejected_not_an_image'] == 0
+        assert emf[-1]['intensity_skipped'] == 0 and emf[-1]['rejected_not_an_image'] == 1
+
+    def test_disabled_by_default(self, monkeypatch):
+        """Test that no gate exists without TRIAGE_GATE"""
+        monkeypatch.setattr(lambda_module, 'TRIAGE_GATE', False)
+        monkeypatch.setattr(lambda_module, 'triage_gate', None)
+
+        assert lambda_module.get_triage_gate() is None
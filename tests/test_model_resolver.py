@@ -0,0 +1,224 @@
+"""
+Unit tests for app/src/data_utils/model_resolver.py
+
+Tests cover:
+- describe_best_model(): tuning job -> best training job -> model artifact
+- ModelResolver: local cache invalidated only by a newer completed tuning job
+- ModelRecord: version key and serialization
+- publish_record() / load_published_record(): S3 round trip (moto)
+- prediction_cache_key()
+"""
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+from botocore.stub import ANY, Stubber
+from moto import mock_aws
+
+from app.src.data_utils.model_resolver import (
+    ModelRecord,
+    ModelResolver,
+    describe_best_model,
+    load_published_record,
+    prediction_cache_key,
+    publish_record,
+)
+
+NOW = datetime(2025, 1, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def list_response(job_name):
+    """Stubbed list_hyper_parameter_tuning_jobs response"""
+    summaries = []
+    if job_name:
+        summaries.append({
+            "HyperParameterTuningJobName": job_name,
+            "HyperParameterTuningJobArn": f"arn:aws:sagemaker:us-east-1:123456789012:hyper-parameter-tuning-job/{job_name}",
+            "HyperParameterTuningJobStatus": "Completed",
+            "Strategy": "Bayesian",
+            "CreationTime": NOW,
+            "TrainingJobStatusCounters": {},
+            "ObjectiveStatusCounters": {},
+        })
+    return {"HyperParameterTuningJobSummaries": summaries}
+
+
+def describe_tuning_response(job_name, best_job):
+    """Stubbed describe_hyper_parameter_tuning_job response"""
+    return {
+        "HyperParameterTuningJobName": job_name,
+        "HyperParameterTuningJobArn": f"arn:aws:sagemaker:us-east-1:123456789012:hyper-parameter-tuning-job/{job_name}",
+        "HyperParameterTuningJobConfig": {
+            "Strategy": "Bayesian",
+            "ResourceLimits": {"MaxParallelTrainingJobs": 1},
+        },
+        "HyperParameterTuningJobStatus": "Completed",
+        "CreationTime": NOW,
+        "HyperParameterTuningEndTime": NOW,
+        "TrainingJobStatusCounters": {},
+        "ObjectiveStatusCounters": {},
+        "BestTrainingJob": {
+            "TrainingJobName": best_job,
+            "TrainingJobArn": f"arn:aws:sagemaker:us-east-1:123456789012:training-job/{best_job}",
+            "CreationTime": NOW,
+            "TunedHyperParameters": {"learning_rate": "0.001"},
+            "TrainingJobStatus": "Completed",
+            "FinalHyperParameterTuningJobObjectiveMetric": {
+                "MetricName": "validation:accuracy", "Value": 0.81},
+        },
+    }
+
+
+def describe_training_response(best_job):
+    """Stubbed describe_training_job response"""
+    return {
+        "TrainingJobName": best_job,
+        "TrainingJobArn": f"arn:aws:sagemaker:us-east-1:123456789012:training-job/{best_job}",
+        "ModelArtifacts": {"S3ModelArtifacts": f"s3://bucket/output/{best_job}/output/model.tar.gz"},
+        "TrainingJobStatus": "Completed",
+        "SecondaryStatus": "Completed",
+        "StoppingCondition": {"MaxRuntimeInSeconds": 3600},
+        "CreationTime": NOW,
+        "AlgorithmSpecification": {"TrainingImage": "image-classification:1", "TrainingInputMode": "Pipe"},
+    }
+
+
+@pytest.fixture
+def sm_stub():
+    """SageMaker client with a botocore Stubber"""
+    client = boto3.client("sagemaker", region_name="us-east-1")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def stub_full_resolution(stubber, job_name, best_job):
+    stubber.add_response("list_hyper_parameter_tuning_jobs", list_response(job_name),
+                         {"SortBy": "CreationTime", "SortOrder": "Descending", "MaxResults": 1,
+                          "StatusEquals": "Completed"})
+    stubber.add_response("describe_hyper_parameter_tuning_job", describe_tuning_response(job_name, best_job),
+                         {"HyperParameterTuningJobName": job_name})
+    stubber.add_response("describe_training_job", describe_training_response(best_job),
+                         {"TrainingJobName": best_job})
+
+
+class TestDescribeBestModel:
+    """Test suite for describe_best_model function"""
+
+    def test_resolves_artifact(self, sm_stub):
+        """Test the tuning job -> training job -> artifact chain"""
+        client, stubber = sm_stub
+        stubber.add_response("describe_hyper_parameter_tuning_job",
+                             describe_tuning_response("tune-1", "tune-1-003"), {"HyperParameterTuningJobName": "tune-1"})
+        stubber.add_response("describe_training_job", describe_training_response("tune-1-003"),
+                             {"TrainingJobName": "tune-1-003"})
+
+        record = describe_best_model(client, "tune-1")
+
+        assert record.best_training_job == "tune-1-003"
+        assert record.model_data_url.endswith("tune-1-003/output/model.tar.gz")
+        assert record.training_image == "image-classification:1"
+        assert record.objective_value == pytest.approx(0.81)
+        assert record.tuning_job_end_time.startswith("2025-01-10")
+
+    def test_missing_best_job_raises(self, sm_stub):
+        """Test a tuning job without a best training job"""
+        client, stubber = sm_stub
+        response = describe_tuning_response("tune-1", "x")
+        del response["BestTrainingJob"]
+        stubber.add_response("describe_hyper_parameter_tuning_job", response, {"HyperParameterTuningJobName": ANY})
+
+        with pytest.raises(ValueError):
+            describe_best_model(client, "tune-1")
+
+
+class TestModelResolver:
+    """Test suite for ModelResolver class"""
+
+    def test_first_resolution_and_cache_hit(self, sm_stub, tmp_path):
+        """Test that an unchanged latest job costs one list call and no describes"""
+        client, stubber = sm_stub
+        stub_full_resolution(stubber, "tune-1", "tune-1-003")
+        stubber.add_response("list_hyper_parameter_tuning_jobs", list_response("tune-1"))
+        resolver = ModelResolver(client, cache_path=str(tmp_path / "model.json"))
+
+        first = resolver.resolve()
+        second = resolver.resolve()
+
+        assert first == second
+        assert resolver.cached().version_key == first.version_key
+
+    def test_newer_job_invalidates_cache(self, sm_stub, tmp_path):
+        """Test that a newly completed tuning job produces a new record"""
+        client, stubber = sm_stub
+        stub_full_resolution(stubber, "tune-1", "tune-1-003")
+        stub_full_resolution(stubber, "tune-2", "tune-2-007")
+        resolver = ModelResolver(client, cache_path=str(tmp_path / "model.json"))
+
+        old = resolver.resolve()
+        new = resolver.resolve()
+
+        assert new.best_training_job == "tune-2-007"
+        assert new.version_key != old.version_key
+
+    def test_check_interval_skips_api(self, sm_stub, tmp_path):
+        """Test that no call is made within min_check_interval"""
+        client, stubber = sm_stub
+        stub_full_resolution(stubber, "tune-1", "tune-1-003")
+        resolver = ModelResolver(client, cache_path=str(tmp_path / "model.json"), min_check_interval=3600)
+
+        resolver.resolve()
+        assert resolver.resolve().tuning_job_name == "tune-1"  # no pending stub needed
+
+    def test_no_completed_job(self, sm_stub, tmp_path):
+        """Test the error without cache and the fallback with cache"""
+        client, stubber = sm_stub
+        stubber.add_response("list_hyper_parameter_tuning_jobs", list_response(None))
+        resolver = ModelResolver(client, cache_path=str(tmp_path / "model.json"))
+
+        with pytest.raises(ValueError, match="notebook 02"):
+            resolver.resolve()
+
+        stub_full_resolution(stubber, "tune-1", "tune-1-003")
+        resolver.resolve()
+        stubber.add_response("list_hyper_parameter_tuning_jobs", list_response(None))
+        assert resolver.resolve().tuning_job_name == "tune-1"
+
+    def test_corrupted_cache_is_ignored(self, sm_stub, tmp_path):
+        """Test that an unreadable cache file triggers a fresh resolution"""
+        client, stubber = sm_stub
+        cache = tmp_path / "model.json"
+        cache.write_text("{not json")
+        stub_full_resolution(stubber, "tune-1", "tune-1-003")
+
+        assert ModelResolver(client, cache_path=str(cache)).resolve().tuning_job_name == "tune-1"
+
+
+class TestRecordSharing:
+    """Test suite for version keys and the record published for the Lambda"""
+
+    def test_version_key_depends_on_artifact(self):
+        """Test that the version key changes with the artifact URI"""
+        a = ModelRecord("t", "", "job-1", "s3://b/a/model.tar.gz")
+        b = ModelRecord("t", "", "job-1", "s3://b/b/model.tar.gz")
+
+        assert a.version_key.startswith("job-1-")
+        assert a.version_key != b.version_key
+        assert ModelRecord.from_dict(a.to_dict()) == a
+
+    def test_prediction_cache_key(self):
+        """Test that the cache key combines model version and image content"""
+        assert prediction_cache_key("v1", b"img") != prediction_cache_key("v2", b"img")
+        assert prediction_cache_key("v1", b"img") == prediction_cache_key("v1", b"img")
+
+    @mock_aws
+    def test_publish_and_load(self):
+        """Test the S3 round trip of the deployed model record"""
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="data-bucket")
+        record = ModelRecord("tune-1", "", "tune-1-003", "s3://b/model.tar.gz", objective_value=0.8)
+
+        publish_record(record, s3, "data-bucket")
+
+        assert load_published_record(s3, "data-bucket") == record
+        assert load_published_record(s3, "data-bucket", "models/missing.json") is None
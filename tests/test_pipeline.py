@@ -0,0 +1,384 @@
+"""
+Unit tests for app/src/data_utils/pipeline.py
+
+Tests cover:
+- Pipeline: dependency resolution, content-hash caching, parallel execution, failures
+- ContentHasher: file hash memo and directory fingerprint
+- CBIS-DDSM stages: download, index, streaming split, export, CAS layout, preflight and
+  upload (mocked S3) with the same content-addressed keys as 01_preprocessing.ipynb;
+  new CSV rows append to the split without moving earlier images
+"""
+import csv
+import json
+import re
+import threading
+import zipfile
+from unittest.mock import MagicMock
+
+import cv2
+import numpy as np
+import pytest
+
+from app.src.data_utils import commons
+from app.src.data_utils.pipeline import (
+    ContentHasher,
+    Pipeline,
+    Stage,
+    build_cbis_pipeline,
+    download_if_missing,
+    index_images,
+)
+from app.src.data_utils.streaming_split import split_csv_files
+
+
+def copy_upper(src, dst):
+    """Simple stage function: uppercase a text file"""
+    with open(src) as f_in, open(dst, "w") as f_out:
+        f_out.write(f_in.read().upper())
+
+
+@pytest.fixture
+def text_pipeline(tmp_path):
+    """Two-stage pipeline: raw.txt -> upper.txt -> final.txt"""
+    raw = tmp_path / "raw.txt"
+    raw.write_text("hello")
+    upper = tmp_path / "upper.txt"
+    final = tmp_path / "final.txt"
+    calls = []
+
+    def tracked(name):
+        def run(src, dst):
+            calls.append(name)
+            copy_upper(src, dst)
+        return run
+
+    stages = [
+        Stage("final", tracked("final"), inputs=[str(upper)], outputs=[str(final)],
+              params={"src": str(upper), "dst": str(final)}),
+        Stage("upper", tracked("upper"), inputs=[str(raw)], outputs=[str(upper)],
+              params={"src": str(raw), "dst": str(upper)}),
+    ]
+    return Pipeline(stages, cache_dir=str(tmp_path / "cache")), raw, final, calls
+
+
+class TestPipeline:
+    """Test suite for Pipeline class"""
+
+    def test_runs_in_dependency_order(self, text_pipeline):
+        """Test that dependencies inferred from inputs/outputs are respected"""
+        pipeline, _, final, calls = text_pipeline
+
+        report = pipeline.run()
+
+        assert calls == ["upper", "final"]
+        assert final.read_text() == "HELLO"
+        assert {r["status"] for r in report.values()} == {"ran"}
+
+    def test_second_run_is_cached(self, text_pipeline):
+        """Test that unchanged stages are skipped"""
+        pipeline, _, _, calls = text_pipeline
+        pipeline.run()
+        calls.clear()
+
+        report = pipeline.run()
+
+        assert calls == []
+        assert report["upper"]["status"] == "cached"
+        assert report["final"]["status"] == "cached"
+
+    def test_input_change_reruns_downstream(self, text_pipeline):
+        """Test that a content change invalidates the stage and its dependents"""
+        pipeline, raw, final, calls = text_pipeline
+        pipeline.run()
+        calls.clear()
+
+        raw.write_text("changed")
+        pipeline.run()
+
+        assert calls == ["upper", "final"]
+        assert final.read_text() == "CHANGED"
+
+    def test_deleted_output_reruns_stage(self, text_pipeline):
+        """Test that a missing output is regenerated"""
+        pipeline, _, final, calls = text_pipeline
+        pipeline.run()
+        calls.clear()
+
+        final.unlink()
+        pipeline.run()
+
+        assert calls == ["final"]
+
+    def test_force_and_targets(self, text_pipeline):
+        """Test forcing a stage and running only what a target needs"""
+        pipeline, _, _, calls = text_pipeline
+        pipeline.run()
+        calls.clear()
+
+        report = pipeline.run(targets=["upper"], force=["upper"])
+
+        assert calls == ["upper"]
+        assert set(report) == {"upper"}
+
+    def test_independent_stages_run_in_parallel(self, tmp_path):
+        """Test that stages without dependencies overlap in time"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait_for_peer(dst):
+            barrier.wait()  # Deadlocks (and times out) if run sequentially
+            open(dst, "w").close()
+
+        stages = [
+            Stage(f"s{i}", wait_for_peer, outputs=[str(tmp_path / f"{i}.out")],
+                  params={"dst": str(tmp_path / f"{i}.out")})
+            for i in range(2)
+        ]
+        report = Pipeline(stages, cache_dir=str(tmp_path / "cache"), max_workers=2).run()
+
+        assert all(r["status"] == "ran" for r in report.values())
+
+    def test_failure_blocks_dependents(self, tmp_path, caplog):
+        """Test that a failing stage blocks downstream stages"""
+        def boom():
+            raise RuntimeError("stage exploded")
+
+        out = str(tmp_path / "a.out")
+        stages = [
+            Stage("a", boom, outputs=[out]),
+            Stage("b", copy_upper, inputs=[out], outputs=[str(tmp_path / "b.out")],
+                  params={"src": out, "dst": str(tmp_path / "b.out")}),
+        ]
+        report = Pipeline(stages, cache_dir=str(tmp_path / "cache")).run()
+
+        assert report["a"]["status"] == "failed"
+        assert "stage exploded" in report["a"]["error"]
+        assert report["b"]["status"] == "blocked"
+
+    def test_missing_output_is_failure(self, tmp_path):
+        """Test that a stage must produce its declared outputs"""
+        stages = [Stage("noop", lambda: None, outputs=[str(tmp_path / "never.txt")])]
+
+        report = Pipeline(stages, cache_dir=str(tmp_path / "cache")).run()
+
+        assert report["noop"]["status"] == "failed"
+
+    def test_cycle_and_invalid_definitions(self, tmp_path):
+        """Test validation of the DAG definition"""
+        a, b = str(tmp_path / "a"), str(tmp_path / "b")
+        with pytest.raises(ValueError, match="Ciclo"):
+            Pipeline([Stage("x", print, inputs=[a], outputs=[b]), Stage("y", print, inputs=[b], outputs=[a])])
+        with pytest.raises(ValueError):
+            Pipeline([Stage("x", print), Stage("x", print)])
+        with pytest.raises(ValueError):
+            Pipeline([Stage("x", print, after=["ghost"])])
+        with pytest.raises(ValueError):
+            Pipeline([Stage("x", print)], cache_dir=str(tmp_path / "c")).run(targets=["ghost"])
+
+
+class TestContentHasher:
+    """Test suite for ContentHasher class"""
+
+    def test_memo_avoids_rereading(self, tmp_path, mocker):
+        """Test that the persisted memo is reused for unchanged files"""
+        data = tmp_path / "big.bin"
+        data.write_bytes(b"x" * 1000)
+        memo = str(tmp_path / "memo.json")
+
+        first = ContentHasher(memo)
+        digest = first.hash_file(str(data))
+        first.save()
+
+        second = ContentHasher(memo)
+        spy = mocker.patch("builtins.open", side_effect=AssertionError("file was re-read"))
+        assert second.hash_file(str(data)) == digest
+        spy.assert_not_called()
+
+    def test_directory_fingerprint_changes(self, tmp_path):
+        """Test that adding a file changes the directory fingerprint"""
+        (tmp_path / "d").mkdir()
+        (tmp_path / "d" / "a.txt").write_text("a")
+        hasher = ContentHasher()
+        before = hasher.hash_path(str(tmp_path / "d"))
+
+        (tmp_path / "d" / "b.txt").write_text("b")
+
+        assert hasher.hash_path(str(tmp_path / "d")) == before  # cached within the run
+        assert hasher.hash_path(str(tmp_path / "d"), refresh=True) != before
+        assert hasher.hash_path(str(tmp_path / "missing")) is None
+
+
+def jpeg_bytes(value):
+    """Small valid grayscale JPEG (the preflight stage checks image headers)"""
+    ok, buf = cv2.imencode(".jpg", np.full((8, 8), value, dtype=np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["patient_id", "pathology", "image file path"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def cbis_row(i):
+    uid = f"1.3.6.1.4.1.9590.{i}"
+    return {"patient_id": f"P_{i:05d}", "pathology": "MALIGNANT" if i % 2 else "BENIGN",
+            "image file path": f"Mass-Training_P_{i:05d}/1.3.6.1.4.1.9590.x/{uid}/000000.dcm"}
+
+
+def make_cbis_zip(tmp_path, corrupt_index=None, n_rows=10):
+    """Synthetic CBIS-DDSM archive with 10 images and one description CSV (first n_rows rows)"""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    with zipfile.ZipFile(data_dir / "cbis-test.zip", "w") as zf:
+        for i in range(10):
+            uid = f"1.3.6.1.4.1.9590.{i}"
+            content = b"not a jpeg" if i == corrupt_index else jpeg_bytes(i)
+            zf.writestr(f"jpeg/{uid}/1-1.jpg", content)
+        csv_local = tmp_path / "mass.csv"
+        write_csv(csv_local, [cbis_row(i) for i in range(n_rows)])
+        zf.write(csv_local, "csv/mass_case_description_train_set.csv")
+    return data_dir
+
+
+def fake_s3():
+    """S3 client mock whose listing returns the keys uploaded so far"""
+    uploaded = set()
+    s3_client = MagicMock()
+    s3_client.upload_file.side_effect = lambda path, bucket, key: uploaded.add(key)
+    s3_client.get_paginator.return_value.paginate.side_effect = lambda Bucket, Prefix: [
+        {"Contents": [{"Key": k} for k in sorted(uploaded) if k.startswith(Prefix)]}]
+    return s3_client
+
+
+@pytest.fixture
+def cbis_zip(tmp_path):
+    return make_cbis_zip(tmp_path)
+
+
+class TestCbisPipeline:
+    """Test suite for the CBIS-DDSM stage functions and pipeline"""
+
+    def test_index_and_split(self, tmp_path):
+        """Test UID indexing and the streaming split used by the split stage"""
+        jpeg = tmp_path / "jpeg"
+        for i in range(4):
+            (jpeg / f"1.3.6.1.4.{i}").mkdir(parents=True)
+            (jpeg / f"1.3.6.1.4.{i}" / "1-1.jpg").write_text("x")
+        index_path = tmp_path / "index.json"
+        index_images(str(jpeg), str(index_path))
+
+        csv_path = tmp_path / "d.csv"
+        write_csv(csv_path, [
+            {"patient_id": "P1", "pathology": "MALIGNANT", "image file path": "a/1.3.6.1.4.0/x.dcm"},
+            {"patient_id": "P2", "pathology": "BENIGN", "image file path": "a/1.3.6.1.4.1/x.dcm"},
+            {"patient_id": "P3", "pathology": "BENIGN_WITHOUT_CALLBACK", "image file path": "a/1.3.6.1.4.2/x.dcm"},
+            {"patient_id": "P4", "pathology": "MALIGNANT", "image file path": "a/1.3.6.1.4.3/x.dcm"},
+            {"patient_id": "P5", "pathology": "MALIGNANT", "image file path": "a/1.3.6.1.4.9/x.dcm"},
+        ])
+        stats = split_csv_files([str(csv_path)], str(index_path), str(tmp_path / "splits"),
+                                fractions={"train": 0.5, "validation": 0.5})
+
+        assert len(json.loads(index_path.read_text())) == 4
+        assert sum(stats["added"].values()) == 4
+        assert stats["unresolved"] == 1  # P5 has no image on disk
+
+    def test_full_run_then_csv_change(self, tmp_path):
+        """Test the whole pipeline and a cheap re-run when new CSV rows arrive"""
+        data_dir = make_cbis_zip(tmp_path, n_rows=8)
+        work = tmp_path / "work"
+        pipeline = build_cbis_pipeline("owner/cbis-test", str(data_dir), str(work),
+                                       ["mass_case_description_train_set.csv"], bucket="test-bucket")
+        s3_client = fake_s3()
+        for name in ("upload_images", "upload_metadata"):
+            pipeline.stages[name].params["s3_client"] = s3_client
+
+        first = pipeline.run()
+
+        assert all(r["status"] == "ran" for r in first.values()), first
+        train = (work / "train.lst").read_text().splitlines()
+        val = (work / "validation.lst").read_text().splitlines()
+        assert len(train) + len(val) == 8
+        assert s3_client.upload_file.call_count == 10  # 8 listed images + 2 .lst files
+
+        # New rows in the extracted CSV (images 8 and 9)
+        csv_path = data_dir / "cbis-test" / "csv" / "mass_case_description_train_set.csv"
+        with open(csv_path, "a", newline="") as f:
+            csv.DictWriter(f, fieldnames=["patient_id", "pathology", "image file path"]).writerows(
+                [cbis_row(8), cbis_row(9)])
+        s3_client.reset_mock()
+
+        second = pipeline.run()
+
+        rerun = {name for name, r in second.items() if r["status"] == "ran"}
+        assert rerun == {"split", "export", "cas", "preflight", "upload_images", "upload_metadata"}
+        assert second["download"]["status"] == "cached"
+        assert s3_client.upload_file.call_count == 4  # only the 2 new images + 2 .lst files
+        new_train = (work / "train.lst").read_text().splitlines()
+        new_val = (work / "validation.lst").read_text().splitlines()
+        assert len(new_train) + len(new_val) == 10
+        # Earlier images keep their split and index
+        assert new_train[:len(train)] == train and new_val[:len(val)] == val
+
+    def test_upload_matches_notebook_cas_layout(self, tmp_path):
+        """Test that images go to CAS keys and the uploaded .lst files point at those keys"""
+        data_dir = make_cbis_zip(tmp_path)
+        work = tmp_path / "work"
+        pipeline = build_cbis_pipeline("owner/cbis-test", str(data_dir), str(work),
+                                       ["mass_case_description_train_set.csv"], bucket="test-bucket")
+        s3_client = fake_s3()
+        for name in ("upload_images", "upload_metadata"):
+            pipeline.stages[name].params["s3_client"] = s3_client
+
+        assert all(r["status"] == "ran" for r in pipeline.run().values())
+
+        keys = {c.args[2] for c in s3_client.upload_file.call_args_list}
+        image_keys = {k for k in keys if k.endswith(".jpg")}
+        assert len(image_keys) == 10
+        assert all(re.fullmatch(r"cbis-ddsm-classification/images/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg", k)
+                   for k in image_keys)
+        assert {"cbis-ddsm-classification/metadata/train.lst",
+                "cbis-ddsm-classification/metadata/validation.lst"} <= keys
+        listed = [e.path for name in ("train", "validation")
+                  for e in commons.read_lst_file(str(work / "cas_lst" / f"{name}.lst"))]
+        assert {f"cbis-ddsm-classification/images/{p}" for p in listed} == image_keys
+        assert all((work / "cas" / p).is_file() for p in listed)
+
+    def test_preflight_failure_blocks_upload(self, tmp_path):
+        """Test that a corrupt image stops the pipeline before any upload"""
+        data_dir = make_cbis_zip(tmp_path, corrupt_index=3)
+        work = tmp_path / "work"
+        pipeline = build_cbis_pipeline("owner/cbis-test", str(data_dir), str(work),
+                                       ["mass_case_description_train_set.csv"], bucket="test-bucket")
+        s3_client = MagicMock()
+        for name in ("upload_images", "upload_metadata"):
+            pipeline.stages[name].params["s3_client"] = s3_client
+
+        report = pipeline.run()
+
+        assert report["preflight"]["status"] == "failed"
+        assert report["upload_images"]["status"] == "blocked"
+        s3_client.upload_file.assert_not_called()
+        assert json.loads((work / "inventory.json").read_text())["splits"]
+
+    def test_pipeline_without_bucket_has_no_upload(self, tmp_path):
+        """Test that upload stages are optional"""
+        pipeline = build_cbis_pipeline("owner/x", str(tmp_path), str(tmp_path / "w"), ["a.csv"])
+
+        assert "upload_images" not in pipeline.stages
+        assert pipeline.deps["split"] == {"index", "extract"}
+
+    def test_download_skips_valid_zip_and_replaces_corrupted(self, cbis_zip, tmp_path, mocker):
+        """Test that only a missing or corrupted ZIP is downloaded again"""
+        fetch = mocker.patch("app.src.data_utils.pipeline.download.download_kaggle_dataset",
+                             side_effect=lambda slug, zip_path: zip_path)
+        valid = str(cbis_zip / "cbis-test.zip")
+        corrupted = tmp_path / "broken.zip"
+        corrupted.write_bytes(b"PK\x03\x04 truncated")
+
+        assert download_if_missing("owner/cbis-test", str(cbis_zip), valid) == valid
+        fetch.assert_not_called()
+
+        download_if_missing("owner/broken", str(tmp_path), str(corrupted))
+        fetch.assert_called_once_with("owner/broken", str(corrupted))
@@ -0,0 +1,211 @@
+"""
+Unit tests for app/src/data_utils/profiling.py
+
+Tests cover:
+- load_settings(): CBIS_PROFILE* environment variables
+- profiled(): pass-through when disabled, sampling, error propagation
+- profile_block() / span(): cProfile, tracemalloc and wall-time reports
+- Nested profiled calls (download_and_extract -> extract_dataset)
+- lambda_handler profiling with S3 / endpoint spans
+"""
+import importlib
+import json
+import pstats
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+
+from app.src.data_utils import commons, profiling
+from app.src.data_utils.profiling import ProfileSettings, load_settings, profile_block, profiled, span
+
+lambda_module = importlib.import_module('app.src.lambda.lambda_function_inference')
+
+
+@pytest.fixture
+def enable_profiling(tmp_path):
+    """Enable every profiling mode for the test, writing to tmp_path"""
+    def enable(modes=profiling.MODES, sample_rate=1.0):
+        return profiling.configure(ProfileSettings(frozenset(modes), sample_rate, str(tmp_path), top=5))
+    yield enable
+    profiling.configure()
+
+
+def reports(directory):
+    return [json.loads(p.read_text()) for p in sorted(directory.glob("*.json"))]
+
+
+class TestLoadSettings:
+    """Test suite for load_settings function"""
+
+    def test_disabled_by_default(self, monkeypatch):
+        """Test that profiling is off without CBIS_PROFILE"""
+        monkeypatch.delenv("CBIS_PROFILE", raising=False)
+        assert not load_settings().enabled
+
+    @pytest.mark.parametrize("value,expected", [
+        ("1", set(profiling.MODES)),
+        ("all", set(profiling.MODES)),
+        ("cprofile, time", {"cprofile", "time"}),
+        ("time,bogus", {"time"}),
+        ("false", set()),
+    ])
+    def test_modes(self, monkeypatch, value, expected):
+        """Test parsing of CBIS_PROFILE values"""
+        monkeypatch.setenv("CBIS_PROFILE", value)
+        assert set(load_settings().modes) == expected
+
+    def test_sample_rate_and_dir(self, monkeypatch, tmp_path):
+        """Test that the sample rate is clamped and the output dir is honoured"""
+        monkeypatch.setenv("CBIS_PROFILE", "time")
+        monkeypatch.setenv("CBIS_PROFILE_SAMPLE_RATE", "5")
+        monkeypatch.setenv("CBIS_PROFILE_DIR", str(tmp_path))
+        settings = load_settings()
+        assert settings.sample_rate == 1.0
+        assert settings.output_dir == str(tmp_path)
+
+    def test_invalid_values_disable(self, monkeypatch):
+        """Test that malformed numbers turn profiling off instead of failing"""
+        monkeypatch.setenv("CBIS_PROFILE", "all")
+        monkeypatch.setenv("CBIS_PROFILE_SAMPLE_RATE", "often")
+        assert not load_settings().enabled
+
+
+class TestProfiled:
+    """Test suite for the profiled decorator"""
+
+    def test_passthrough_when_disabled(self, tmp_path):
+        """Test that a disabled wrapper only forwards the call"""
+        profiling.configure(ProfileSettings(output_dir=str(tmp_path)))
+
+        @profiled()
+        def add(a, b=1):
+            """Adds numbers."""
+            return a + b
+
+        assert add(2, b=3) == 5
+        assert add.__doc__ == "Adds numbers."
+        assert add.__wrapped__(1) == 2
+        assert list(tmp_path.iterdir()) == []
+        profiling.configure()
+
+    def test_writes_pstats_and_report(self, enable_profiling, tmp_path):
+        """Test that a sampled call dumps cProfile stats and a JSON report"""
+        enable_profiling()
+
+        @profiled("work")
+        def work():
+            with span("build"):
+                data = [bytearray(1024) for _ in range(200)]
+            with span("sum"):
+                return sum(len(d) for d in data)
+
+        assert work() == 200 * 1024
+        (report,) = reports(tmp_path)
+        assert report["name"] == "work"
+        assert report["error"] is None
+        assert [s["name"] for s in report["spans"]] == ["build", "sum"]
+        assert all(s["seconds"] >= 0 for s in report["spans"])
+        assert report["memory"]["peak_mb"] > 0.2
+        assert len(report["memory"]["top"]) <= 5
+        assert pstats.Stats(report["pstats"]).total_calls > 0
+        assert list(tmp_path.glob("*.txt"))
+
+    def test_time_only_mode(self, enable_profiling, tmp_path):
+        """Test that time-only profiling skips cProfile and tracemalloc"""
+        enable_profiling(modes=("time",))
+        profiled()(lambda: None)()
+        (report,) = reports(tmp_path)
+        assert "memory" not in report and "pstats" not in report
+        assert not list(tmp_path.glob("*.prof"))
+
+    def test_sampling(self, enable_profiling, tmp_path):
+        """Test that only sampled calls produce reports"""
+        enable_profiling(modes=("time",), sample_rate=0.5)
+        fn = profiled("sampled")(lambda: None)
+        with patch.object(profiling.random, "random", side_effect=[0.9, 0.1, 0.7]):
+            fn(), fn(), fn()
+        assert len(reports(tmp_path)) == 1
+
+    def test_error_is_recorded_and_raised(self, enable_profiling, tmp_path):
+        """Test that exceptions propagate and are noted in the report"""
+        enable_profiling(modes=("time",))
+
+        @profiled("boom")
+        def boom():
+            raise KeyError("x")
+
+        with pytest.raises(KeyError):
+            boom()
+        assert "KeyError" in reports(tmp_path)[0]["error"]
+
+    def test_unwritable_output_dir(self, tmp_path):
+        """Test that a failing output dir never breaks the wrapped call"""
+        blocker = tmp_path / "file"
+        blocker.write_text("x")
+        profiling.configure(ProfileSettings(frozenset(["time"]), 1.0, str(blocker / "sub")))
+        try:
+            assert profiled()(lambda: 7)() == 7
+        finally:
+            profiling.configure()
+
+
+class TestProfileBlock:
+    """Test suite for profile_block and span"""
+
+    def test_span_without_run_is_noop(self):
+        """Test that spans outside a profiled run do nothing"""
+        with span("idle"):
+            pass
+
+    def test_nested_blocks_become_spans(self, enable_profiling):
+        """Test that an inner block inside an active run is recorded as a span"""
+        enable_profiling(modes=("time",))
+        with profile_block("outer") as run:
+            with profile_block("inner") as inner:
+                assert inner is None
+        assert [s["name"] for s in run.report["spans"]] == ["inner"]
+        assert run.paths[-1].endswith(".json")
+
+    def test_existing_tracemalloc_is_left_running(self, enable_profiling):
+        """Test that profiling does not stop a tracemalloc session it did not start"""
+        import tracemalloc
+        enable_profiling(modes=("memory",))
+        tracemalloc.start()
+        try:
+            with profile_block("mem") as run:
+                bytearray(100_000)
+            assert tracemalloc.is_tracing()
+            assert "memory" in run.report
+        finally:
+            tracemalloc.stop()
+
+
+class TestEntryPoints:
+    """Test suite for the instrumented entry points"""
+
+    def test_download_and_extract(self, enable_profiling, tmp_path, sample_zip):
+        """Test that extraction inside download_and_extract is a span of one report"""
+        enable_profiling(modes=("time",))
+        data_dir = sample_zip.parent
+        commons.download_and_extract("owner/test_dataset", str(data_dir))
+        (report,) = reports(tmp_path)
+        assert report["name"] == "download_and_extract"
+        assert [s["name"] for s in report["spans"]] == ["extract_dataset"]
+
+    @patch.object(lambda_module, 'sm_runtime')
+    @patch.object(lambda_module, 's3_client')
+    def test_lambda_handler(self, mock_s3, mock_sagemaker, enable_profiling, tmp_path,
+                            s3_event_single_record, mock_s3_image_data, monkeypatch):
+        """Test that the handler report has S3 and endpoint spans"""
+        enable_profiling(modes=("time", "cprofile"))
+        monkeypatch.setattr(lambda_module, 'ENDPOINT_NAME', 'test-endpoint')
+        mock_s3.get_object.return_value = mock_s3_image_data
+        mock_sagemaker.invoke_endpoint.return_value = {'Body': BytesIO(json.dumps([0.2, 0.8]).encode())}
+
+        result = lambda_module.lambda_handler(s3_event_single_record, None)
+
+        assert result['statusCode'] == 200
+        (report,) = reports(tmp_path)
+        assert report["name"] == "lambda_handler"
+        assert [s["name"] for s in report["spans"]] == ["s3_get_object", "invoke_endpoint"]
@@ -0,0 +1,235 @@
+"""
+Unit tests for app/src/data_utils/roi_crops.py
+
+Tests cover:
+- mask_bbox() / crop_box() / extract_crop(): lesion box, square padding, out-of-bounds fill
+- collect_lesions(): CSV rows linked to the full image and the ROI mask
+- build_roi_crops(): parallel crops, per-split .lst, cache by mask hash
+- build_cbis_pipeline(roi_crop_size=...): ROI stage in the local pipeline
+"""
+import csv
+import json
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from app.src.data_utils import commons
+from app.src.data_utils.pipeline import build_cbis_pipeline
+from app.src.data_utils.roi_crops import (
+    CropSpec,
+    build_roi_crops,
+    collect_lesions,
+    crop_box,
+    crop_key,
+    extract_crop,
+    mask_bbox,
+)
+
+FIELDS = ["patient_id", "pathology", "image file path", "ROI mask file path"]
+
+
+def jpeg(array):
+    ok, buf = cv2.imencode(".jpg", array)
+    assert ok
+    return buf.tobytes()
+
+
+def lesion_files(i, box=(60, 40, 100, 90), shape=(200, 160)):
+    """Full mammogram, ROI mask (same size) and the small CBIS cropped image"""
+    rng = np.random.default_rng(i)
+    image = rng.integers(0, 120, shape, dtype=np.uint8)
+    x0, y0, x1, y1 = box
+    image[y0:y1, x0:x1] = 230
+    mask = np.zeros(shape, dtype=np.uint8)
+    mask[y0:y1, x0:x1] = 255
+    return {
+        f"1.3.6.1.4.1.9590.img{i}/1-1.jpg": jpeg(image),
+        f"1.3.6.1.4.1.9590.roi{i}/1-1.jpg": jpeg(image[y0:y1, x0:x1]),
+        f"1.3.6.1.4.1.9590.roi{i}/1-2.jpg": jpeg(mask),
+    }
+
+
+def csv_rows(n):
+    return [{"patient_id": f"P_{i:05d}", "pathology": "MALIGNANT" if i % 2 else "BENIGN",
+             "image file path": f"Mass-Training_P_{i:05d}/1.3.6.1.4.1.9590.x/1.3.6.1.4.1.9590.img{i}/000000.dcm",
+             "ROI mask file path": f"Mass-Training_P_{i:05d}_1/1.3.6.1.4.1.9590.y/1.3.6.1.4.1.9590.roi{i}/000001.dcm\n"}
+            for i in range(n)]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """jpeg/ tree with 4 lesions and a description CSV"""
+    jpeg_dir = tmp_path / "jpeg"
+    for i in range(4):
+        for rel, content in lesion_files(i).items():
+            (jpeg_dir / rel).parent.mkdir(parents=True, exist_ok=True)
+            (jpeg_dir / rel).write_bytes(content)
+    csv_path = tmp_path / "mass.csv"
+    write_csv(csv_path, csv_rows(4) + [{"patient_id": "P_X", "pathology": "MALIGNANT",
+                                         "image file path": "a/1.3.6.1.4.missing/x.dcm",
+                                         "ROI mask file path": "a/1.3.6.1.4.missing/y.dcm"}])
+    return jpeg_dir, csv_path
+
+
+class TestGeometry:
+    """Test suite for the box and crop helpers"""
+
+    def test_mask_bbox(self):
+        """Test the exclusive bounding box of a thresholded mask"""
+        mask = np.zeros((50, 40), dtype=np.uint8)
+        mask[10:20, 5:15] = 255
+        mask[0, 0] = 60  # JPEG noise below the threshold
+        assert mask_bbox(mask) == (5, 10, 15, 20)
+
+    def test_empty_mask(self):
+        """Test that an all-black mask has no box"""
+        assert mask_bbox(np.zeros((8, 8), dtype=np.uint8)) is None
+
+    def test_crop_box_is_square_and_padded(self):
+        """Test square box around the lesion with relative padding and minimum side"""
+        left, top, right, bottom = crop_box((10, 20, 30, 60), CropSpec(padding=0.25))
+        assert right - left == bottom - top == 60
+        assert (left + right) // 2 == 20 and (top + bottom) // 2 == 40
+        small = crop_box((10, 10, 12, 12), CropSpec(padding=0.0, min_side=32))
+        assert small[2] - small[0] == 32
+
+    def test_extract_crop_fills_out_of_bounds(self):
+        """Test that regions outside the image are black and the output has a fixed size"""
+        image = np.full((20, 20), 200, dtype=np.uint8)
+        crop = extract_crop(image, (-10, -10, 10, 10), 40)
+        assert crop.shape == (40, 40)
+        assert crop[:15, :15].max() == 0
+        assert crop[25:, 25:].min() == 200
+
+
+class TestCollectLesions:
+    """Test suite for collect_lesions function"""
+
+    def test_links_image_and_mask(self, dataset):
+        """Test that the full-size image in the ROI folder is chosen as the mask"""
+        jpeg_dir, csv_path = dataset
+        lesions = collect_lesions([str(csv_path)], str(jpeg_dir))
+        assert len(lesions) == 4
+        assert lesions[1].label == 1
+        assert lesions[0].image_path == "1.3.6.1.4.1.9590.img0/1-1.jpg"
+        assert lesions[0].mask_path == "1.3.6.1.4.1.9590.roi0/1-2.jpg"
+
+
+class TestBuildRoiCrops:
+    """Test suite for build_roi_crops function"""
+
+    def test_crops_and_lst(self, dataset, tmp_path):
+        """Test fixed-size crops centred on the lesion and the emitted .lst"""
+        jpeg_dir, csv_path = dataset
+        out, lst_dir = tmp_path / "crops", tmp_path / "lst"
+        stats = build_roi_crops([str(csv_path)], str(jpeg_dir), str(out), str(lst_dir), size=32, max_workers=2)
+
+        assert stats["cropped"] == 4 and stats["cached"] == 0
+        entries = commons.read_lst_file(str(lst_dir / "roi_all.lst"))
+        assert [e.label for e in entries] == [0, 1, 0, 1]
+        crop = cv2.imread(str(out / entries[0].path), cv2.IMREAD_GRAYSCALE)
+        assert crop.shape == (32, 32)
+        assert crop[8:24, 8:24].mean() > 180  # lesion fills the centre
+        index = json.loads((out / "crops.json").read_text())
+        assert index[entries[0].path]["image"] == "1.3.6.1.4.1.9590.img0/1-1.jpg"
+
+    def test_cache_by_mask_hash(self, dataset, tmp_path):
+        """Test that a re-run decodes nothing and new parameters produce new crops"""
+        jpeg_dir, csv_path = dataset
+        args = ([str(csv_path)], str(jpeg_dir), str(tmp_path / "crops"), str(tmp_path / "lst"))
+        memo = str(tmp_path / "memo.json")
+        build_roi_crops(*args, size=32, memo_path=memo)
+        again = build_roi_crops(*args, size=32, memo_path=memo)
+        assert again["cropped"] == 0 and again["cached"] == 4
+
+        resized = build_roi_crops(*args, size=48, memo_path=memo)
+        assert resized["cropped"] == 4
+
+    def test_follows_image_splits(self, dataset, tmp_path):
+        """Test that each crop goes to the split of its full mammogram"""
+        jpeg_dir, csv_path = dataset
+        splits = tmp_path / "splits.json"
+        splits.write_text(json.dumps({
+            "train": [[0, "1.3.6.1.4.1.9590.img0/1-1.jpg"], [1, "1.3.6.1.4.1.9590.img1/1-1.jpg"],
+                      [0, "1.3.6.1.4.1.9590.img2/1-1.jpg"]],
+            "validation": [[1, "1.3.6.1.4.1.9590.img3/1-1.jpg"]],
+        }))
+        stats = build_roi_crops([str(csv_path)], str(jpeg_dir), str(tmp_path / "crops"), str(tmp_path),
+                                splits_path=str(splits), size=32)
+        assert stats["lst"] == {"train": 3, "validation": 1}
+        (val,) = commons.read_lst_file(str(tmp_path / "roi_validation.lst"))
+        assert val.label == 1
+
+    def test_empty_mask_is_skipped(self, dataset, tmp_path):
+        """Test that lesions with an empty mask are counted and left out of the .lst"""
+        jpeg_dir, csv_path = dataset
+        (jpeg_dir / "1.3.6.1.4.1.9590.roi2/1-2.jpg").write_bytes(jpeg(np.zeros((200, 160), np.uint8)))
+        stats = build_roi_crops([str(csv_path)], str(jpeg_dir), str(tmp_path / "crops"), str(tmp_path),
+                                size=32)
+        assert stats["empty_mask"] == 1
+        assert stats["lst"] == {"all": 3}
+
+    def test_crop_key(self):
+        """Test that the key depends on the mask and image digests and the crop parameters"""
+        key = crop_key("a" * 64, "b" * 64, CropSpec(224, 0.15, 0))
+        assert key.endswith("-s224-p15-m0.jpg")
+        assert key != crop_key("a" * 64, "c" * 64, CropSpec(224, 0.15, 0))
+        assert key != crop_key("a" * 64, "b" * 64, CropSpec(128, 0.15, 0))
+
+
+class TestRoiPipelineStage:
+    """Test suite for the ROI stage of build_cbis_pipeline"""
+
+    def test_pipeline_with_roi_crops(self, tmp_path):
+        """Test that the ROI stage runs after extraction and follows the split"""
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        with zipfile.ZipFile(data_dir / "cbis-test.zip", "w") as zf:
+            for i in range(6):
+                for rel, content in lesion_files(i).items():
+                    zf.writestr(f"jpeg/{rel}", content)
+            csv_local = tmp_path / "mass.csv"
+            write_csv(csv_local, csv_rows(6))
+            zf.write(csv_local, "csv/mass_case_description_train_set.csv")
+
+        work = tmp_path / "work"
+        pipeline = build_cbis_pipeline("owner/cbis-test", str(data_dir), str(work),
+                                       ["mass_case_description_train_set.csv"], roi_crop_size=32)
+        results = pipeline.run()
+
+        assert results["roi_crops"]["status"] == "ran"
+        train = commons.read_lst_file(str(work / "roi_train.lst"))
+        val = commons.read_lst_file(str(work / "roi_validation.lst"))
+        assert len(train) + len(val) == 6
+        assert pipeline.run()["roi_crops"]["status"] == "cached"
+
+
+class TestCropWorker:
+    """Test suite for the process-pool worker"""
+
+    def test_rescales_box_for_smaller_mask(self, tmp_path):
+        """Test that a mask with a different size than the image is mapped to image coordinates"""
+        from app.src.data_utils.roi_crops import _crop_worker
+
+        image = np.zeros((200, 160), np.uint8)
+        image[80:120, 60:100] = 255
+        mask = np.zeros((100, 80), np.uint8)
+        mask[40:60, 30:50] = 255
+        cv2.imwrite(str(tmp_path / "image.png"), image)
+        cv2.imwrite(str(tmp_path / "mask.png"), mask)
+
+        status, box = _crop_worker((str(tmp_path / "image.png"), str(tmp_path / "mask.png"),
+                                    str(tmp_path / "out" / "crop.jpg"), CropSpec(32, 0.0, 0)))
+        assert status == "ok"
+        assert box == [60, 80, 100, 120]
+        assert _crop_worker((str(tmp_path / "nope.png"), str(tmp_path / "mask.png"), "x", CropSpec()))[0] \
+            == "unreadable"
@@ -0,0 +1,187 @@
+"""
+Unit tests for app/src/data_utils/s3_catalog.py
+
+Tests cover:
+- S3Catalog.refresh(): partition discovery by delimiter, explicit (UID/hex) partitions,
+  concurrent listing into SQLite with keys, sizes and ETags
+- Incremental refresh: only new, dirty or expired partitions are listed again;
+  added/removed/changed accounting, vanished partitions
+- keys() / get() / summary(): catalog queries
+- upload_cas(catalog=...) / S3Source(catalog=...): callers served from the catalog
+- main(): command-line refresh
+"""
+import json
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.src.data_utils import s3_catalog
+from app.src.data_utils.bulk_score import open_source
+from app.src.data_utils.content_store import build_cas_index, upload_cas
+from app.src.data_utils.s3_catalog import S3Catalog, parse_s3_uri
+
+BUCKET = "data-bucket"
+PREFIX = "cbis/images/"
+
+
+@pytest.fixture
+def s3():
+    """moto bucket with a CAS-like layout: 4 partitions x 3 objects + 1 loose object"""
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        for part in ("0a", "1b", "2c", "3d"):
+            for i in range(3):
+                client.put_object(Bucket=BUCKET, Key=f"{PREFIX}{part}/{part}{i}.jpg", Body=f"{part}-{i}".encode())
+        client.put_object(Bucket=BUCKET, Key=f"{PREFIX}README", Body=b"loose")
+        client.put_object(Bucket=BUCKET, Key="other/x.jpg", Body=b"x")
+        yield client
+
+
+@pytest.fixture
+def catalog(s3, tmp_path):
+    with S3Catalog(str(tmp_path / "catalog.sqlite"), s3_client=s3) as c:
+        yield c
+
+
+def spy_listings(mocker, catalog):
+    """Record the prefixes listed recursively (partition listings, not discovery)"""
+    real = catalog._list
+    listed = []
+
+    def wrapper(bucket, prefix, delimiter=None):
+        if delimiter is None:
+            listed.append(prefix)
+        return real(bucket, prefix, delimiter)
+
+    mocker.patch.object(catalog, "_list", side_effect=wrapper)
+    return listed
+
+
+class TestRefresh:
+    """Test suite for S3Catalog.refresh"""
+
+    def test_first_refresh_catalogs_every_object(self, catalog):
+        """Test that discovered partitions are listed and stored with size and ETag"""
+        stats = catalog.refresh(BUCKET, PREFIX, max_workers=4)
+
+        assert stats["partitions"] == 4 and stats["listed"] == 4
+        assert stats["objects"] == 13 and stats["added"] == 13
+        keys = list(catalog.keys(BUCKET, PREFIX))
+        assert keys == sorted(keys) and len(keys) == 13
+        assert "other/x.jpg" not in keys
+        obj = catalog.get(BUCKET, f"{PREFIX}1b/1b2.jpg")
+        assert obj["size"] == len(b"1b-2")
+        assert len(obj["etag"]) == 32 and '"' not in obj["etag"]
+        assert catalog.get(BUCKET, f"{PREFIX}missing.jpg") is None
+
+    def test_unchanged_partitions_are_not_listed_again(self, catalog, s3, mocker):
+        """Test that a second refresh only lists new and dirty partitions"""
+        catalog.refresh(BUCKET, PREFIX)
+        s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}4e/new.jpg", Body=b"new")
+        s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}0a/0a9.jpg", Body=b"added")
+        s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}2c/2c0.jpg", Body=b"rewritten")
+        s3.delete_object(Bucket=BUCKET, Key=f"{PREFIX}2c/2c1.jpg")
+        listed = spy_listings(mocker, catalog)
+
+        assert catalog.mark_dirty(BUCKET, [f"{PREFIX}2c/2c0.jpg", f"{PREFIX}2c/2c1.jpg"]) == 1
+        stats = catalog.refresh(BUCKET, PREFIX)
+
+        assert sorted(listed) == [f"{PREFIX}2c/", f"{PREFIX}4e/"]
+        assert stats["skipped"] == 3
+        assert (stats["added"], stats["removed"], stats["changed"]) == (1, 1, 1)
+        assert catalog.get(BUCKET, f"{PREFIX}0a/0a9.jpg") is None  # 0a was not marked dirty
+
+        stats = catalog.refresh(BUCKET, PREFIX, full=True)
+        assert stats["listed"] == 5
+        assert catalog.get(BUCKET, f"{PREFIX}0a/0a9.jpg") is not None
+
+    def test_max_age_expires_partitions(self, catalog, mocker):
+        """Test that partitions older than max_age are listed again"""
+        catalog.refresh(BUCKET, PREFIX)
+        mocker.patch.object(s3_catalog.time, "time", return_value=time.time() + 120)
+
+        assert catalog.refresh(BUCKET, PREFIX, max_age=3600)["listed"] == 0
+        assert catalog.refresh(BUCKET, PREFIX, max_age=60)["listed"] == 4
+
+    def test_vanished_partition_is_dropped(self, catalog, s3):
+        """Test that objects of a partition that no longer exists leave the catalog"""
+        catalog.refresh(BUCKET, PREFIX)
+        for i in range(3):
+            s3.delete_object(Bucket=BUCKET, Key=f"{PREFIX}3d/3d{i}.jpg")
+
+        stats = catalog.refresh(BUCKET, PREFIX)
+
+        assert stats["dropped"] == 1 and stats["removed"] == 3
+        assert catalog.summary(BUCKET, PREFIX)["objects"] == 10
+
+    def test_explicit_partitions(self, catalog):
+        """Test hex/UID prefixes as partitions without discovery"""
+        stats = catalog.refresh(BUCKET, PREFIX, partitions=["0", "1", "2"])
+
+        assert stats["partitions"] == 3
+        assert stats["objects"] == 9
+        assert catalog.get(BUCKET, f"{PREFIX}README") is None
+
+    def test_keys_are_read_in_chunks(self, catalog, mocker):
+        """Test that keys() pages through the catalog"""
+        catalog.refresh(BUCKET, PREFIX)
+        mocker.patch.object(s3_catalog, "KEYS_CHUNK", 5)
+
+        keys = list(catalog.keys(BUCKET, PREFIX))
+
+        assert len(keys) == 13 and len(set(keys)) == 13
+        assert list(catalog.keys(BUCKET, f"{PREFIX}1b/")) == [f"{PREFIX}1b/1b{i}.jpg" for i in range(3)]
+
+
+class TestCatalogCallers:
+    """Test suite for the catalog in upload_cas and bulk scoring"""
+
+    def test_upload_cas_with_catalog(self, s3, tmp_path):
+        """Test that upload_cas reads existing keys from the catalog and marks uploads dirty"""
+        root = tmp_path / "jpeg"
+        files = {f"uid{i}/1-1.jpg": f"image {i}".encode() for i in range(6)}
+        for rel, content in files.items():
+            (root / rel).parent.mkdir(parents=True)
+            (root / rel).write_bytes(content)
+        index = build_cas_index(str(root), files)
+
+        with S3Catalog(str(tmp_path / "c.sqlite"), s3_client=s3) as catalog:
+            first = upload_cas(index, str(root), BUCKET, "cas/images", s3_client=s3, catalog=catalog)
+            second = upload_cas(index, str(root), BUCKET, "cas/images", s3_client=s3, catalog=catalog)
+
+            assert first["uploaded"] == 6
+            assert second["uploaded"] == 0 and second["skipped"] == 6
+            assert catalog.summary(BUCKET, "cas/images/")["objects"] == 6
+
+    def test_s3_source_with_catalog(self, s3, tmp_path):
+        """Test that bulk scoring keys come from the refreshed catalog"""
+        with S3Catalog(str(tmp_path / "c.sqlite"), s3_client=s3) as catalog:
+            source = open_source(f"s3://{BUCKET}/{PREFIX}", s3_client=s3, catalog=catalog)
+
+            keys = list(source.keys())
+
+        assert len(keys) == 12
+        assert f"{PREFIX}README" not in keys
+
+
+class TestCli:
+    """Test suite for parse_s3_uri and main"""
+
+    def test_parse_s3_uri(self):
+        """Test bucket/prefix parsing"""
+        assert parse_s3_uri("s3://b/p/q/") == ("b", "p/q/")
+        with pytest.raises(ValueError):
+            parse_s3_uri("/local/path")
+
+    def test_cli(self, s3, tmp_path, mocker, capsys):
+        """Test the command-line refresh"""
+        mocker.patch.object(s3_catalog.config, "get_client", return_value=s3)
+        db = str(tmp_path / "cli.sqlite")
+
+        assert s3_catalog.main([f"s3://{BUCKET}/{PREFIX}", "--db", db, "--workers", "2"]) == 0
+        assert json.loads(capsys.readouterr().out)["objects"] == 13
+        assert s3_catalog.main([f"s3://{BUCKET}/{PREFIX}", "--db", db]) == 0
+        assert json.loads(capsys.readouterr().out)["listed"] == 0
@@ -0,0 +1,155 @@
+"""
+Unit tests for app/src/data_utils/sequential_eval.py
+
+Tests cover:
+- stratified_order(): class balance of every prefix
+- wilson_interval() / bootstrap_auc_interval(): confidence intervals
+- sequential_evaluate(): early stopping and full-pass fallback
+"""
+import zlib
+
+import numpy as np
+import pytest
+
+from app.src.data_utils.commons import LstEntry
+from app.src.data_utils.sequential_eval import (
+    bootstrap_auc_interval,
+    compute_intervals,
+    sequential_evaluate,
+    stratified_order,
+    wilson_interval,
+)
+
+
+def make_entries(n, positive_rate=0.3, seed=0):
+    """Build synthetic .lst entries with a fixed positive rate"""
+    rng = np.random.default_rng(seed)
+    labels = (rng.random(n) < positive_rate).astype(int)
+    return [LstEntry(i, int(label), f"uid{i}/img.jpg") for i, label in enumerate(labels)]
+
+
+def separable_score(entry):
+    """Score function that ranks malignant images high, with some overlap"""
+    noise = (zlib.crc32(entry.path.encode()) % 100) / 250
+    return 0.65 + noise if entry.label == 1 else 0.1 + noise
+
+
+class TestStratifiedOrder:
+    """Test suite for stratified_order function"""
+
+    def test_order_is_permutation(self):
+        """Test that every index appears exactly once"""
+        order = stratified_order([0, 1] * 50)
+
+        assert sorted(order.tolist()) == list(range(100))
+
+    def test_prefix_keeps_class_ratio(self):
+        """Test that prefixes keep the overall positive rate"""
+        labels = np.array([1] * 200 + [0] * 800)
+        order = stratified_order(labels, seed=7)
+
+        for prefix in (50, 100, 500):
+            rate = labels[order[:prefix]].mean()
+            assert rate == pytest.approx(0.2, abs=0.03)
+
+    def test_order_is_deterministic(self):
+        """Test that the same seed gives the same order"""
+        labels = [0, 1, 1, 0, 0, 1, 0]
+
+        np.testing.assert_array_equal(stratified_order(labels, 3), stratified_order(labels, 3))
+
+
+class TestIntervals:
+    """Test suite for confidence interval helpers"""
+
+    def test_wilson_contains_point_estimate(self):
+        """Test Wilson interval bounds"""
+        low, high = wilson_interval(80, 100)
+
+        assert low < 0.8 < high
+        assert low == pytest.approx(0.7112, abs=1e-3)
+        assert high == pytest.approx(0.8666, abs=1e-3)
+
+    def test_wilson_shrinks_with_more_samples(self):
+        """Test that width decreases as n grows"""
+        small = wilson_interval(8, 10)
+        large = wilson_interval(800, 1000)
+
+        assert (large[1] - large[0]) < (small[1] - small[0])
+
+    def test_wilson_empty_sample(self):
+        """Test interval when there are no observations"""
+        assert wilson_interval(0, 0) == (0.0, 1.0)
+
+    def test_bootstrap_auc_interval(self):
+        """Test bootstrap interval around a perfect classifier"""
+        y_true = np.array([0] * 30 + [1] * 30)
+        y_score = np.r_[np.linspace(0, 0.4, 30), np.linspace(0.6, 1, 30)]
+
+        low, high = bootstrap_auc_interval(y_true, y_score, n_boot=50)
+
+        assert low == pytest.approx(1.0)
+        assert high == pytest.approx(1.0)
+
+    def test_bootstrap_single_class(self):
+        """Test that a single-class sample gives the widest interval"""
+        assert bootstrap_auc_interval([1, 1, 1], [0.2, 0.4, 0.6]) == (0.0, 1.0)
+
+    def test_unknown_metric_raises(self):
+        """Test that unsupported metric names are rejected"""
+        with pytest.raises(ValueError):
+            compute_intervals([0, 1], [0.2, 0.8], metrics=["f2"])
+
+
+class TestSequentialEvaluate:
+    """Test suite for sequential_evaluate function"""
+
+    def test_stops_early_when_intervals_are_narrow(self):
+        """Test that evaluation stops before scoring the whole list"""
+        entries = make_entries(3000)
+        calls = []
+
+        def score_fn(entry):
+            calls.append(entry.path)
+            return separable_score(entry)
+
+        report = sequential_evaluate(entries, score_fn, target_width=0.15, min_samples=100,
+                                     check_every=100, n_boot=50)
+
+        assert report.stopped_early
+        assert report.n_scored < len(entries)
+        assert len(calls) == report.n_scored
+        assert all(high - low <= 0.15 for low, high in report.intervals.values())
+        assert "parada antecipada" in report.summary()
+
+    def test_scores_everything_when_target_unreachable(self):
+        """Test fallback to a full pass with final intervals"""
+        entries = make_entries(120)
+
+        report = sequential_evaluate(entries, separable_score, target_width=0.001, min_samples=20,
+                                     check_every=20, n_boot=20)
+
+        assert not report.stopped_early
+        assert report.n_scored == 120
+        assert report.fraction_scored == pytest.approx(1.0)
+        assert set(report.intervals) == {"recall", "precision", "auc"}
+
+    def test_max_samples_caps_cost(self):
+        """Test the hard limit on the number of endpoint calls"""
+        entries = make_entries(500)
+
+        report = sequential_evaluate(entries, separable_score, target_width=0.0001, min_samples=10,
+                                     max_samples=60, metrics=["recall"])
+
+        assert report.n_scored == 60
+        assert list(report.intervals) == ["recall"]
+
+    def test_collector_holds_scored_images(self, tmp_path):
+        """Test that scored probabilities can be persisted for re-analysis"""
+        entries = make_entries(50)
+
+        report = sequential_evaluate(entries, separable_score, target_width=1.0, min_samples=10,
+                                     check_every=5, n_boot=10)
+
+        assert len(report.collector) == report.n_scored
+        assert report.collector.save(str(tmp_path / "seq.npz")).endswith(".npz")
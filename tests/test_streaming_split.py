@@ -0,0 +1,171 @@
+"""
+Unit tests for app/src/data_utils/streaming_split.py
+
+Tests cover:
+- hash_unit(): stable position in [0, 1)
+- StreamingSplitter: patient grouping, per-label quotas, append-only growth of the
+  .lst files without moving earlier assignments, duplicate images
+- split_csv_files(): one pass over the description CSVs with the UID index
+- export_splits(): splits.json for the ROI crops
+"""
+import json
+from collections import Counter
+
+import pytest
+
+from app.src.data_utils import commons
+from app.src.data_utils.pipeline import index_images
+from app.src.data_utils.streaming_split import (
+    ASSIGNMENTS_FILE,
+    StreamingSplitter,
+    export_splits,
+    hash_unit,
+    split_csv_files,
+)
+from tests.test_pipeline import write_csv
+
+
+def split_of(lst_dir, names=("train", "validation")):
+    """path -> split name, read back from the .lst files"""
+    result = {}
+    for name in names:
+        path = lst_dir / f"{name}.lst"
+        if path.exists():
+            result.update({e.path: name for e in commons.read_lst_file(str(path))})
+    return result
+
+
+class TestHashUnit:
+    """Test suite for hash_unit"""
+
+    def test_stable_and_salted(self):
+        """Test that the position depends only on key and salt"""
+        values = [hash_unit(f"P_{i}") for i in range(200)]
+
+        assert values == [hash_unit(f"P_{i}") for i in range(200)]
+        assert all(0 <= v < 1 for v in values)
+        assert hash_unit("P_1", salt="other") != hash_unit("P_1")
+        assert 0.35 < sum(v < 0.5 for v in values) / 200 < 0.65
+
+
+class TestStreamingSplitter:
+    """Test suite for StreamingSplitter"""
+
+    def test_patient_images_stay_together(self, tmp_path):
+        """Test that every image of a patient lands in the same split"""
+        with StreamingSplitter(str(tmp_path)) as splitter:
+            for p in range(50):
+                for view in range(4):
+                    splitter.add(f"P{p}", p % 2, f"P{p}/{view}.jpg")
+
+        splits = split_of(tmp_path)
+        assert len(splits) == 200
+        for p in range(50):
+            assert len({splits[f"P{p}/{view}.jpg"] for view in range(4)}) == 1
+
+    def test_per_label_quotas(self, tmp_path):
+        """Test that each label is split close to the requested fractions"""
+        with StreamingSplitter(str(tmp_path), {"train": 0.7, "validation": 0.2, "test": 0.1}) as splitter:
+            for p in range(1000):
+                splitter.add(f"P{p}", int(p % 10 == 0), f"{p}.jpg")
+            summary = splitter.summary()
+
+        for label, total in (("0", 900), ("1", 100)):
+            counts = summary["labels"][label]
+            assert sum(counts.values()) == total
+            for name, fraction in (("train", 0.7), ("validation", 0.2), ("test", 0.1)):
+                assert abs(counts[name] - fraction * total) <= 2
+
+    def test_new_rows_extend_without_reshuffling(self, tmp_path):
+        """Test that a second run appends new images and keeps earlier assignments and indices"""
+        with StreamingSplitter(str(tmp_path)) as splitter:
+            for p in range(40):
+                splitter.add(f"P{p}", p % 2, f"P{p}/a.jpg")
+        before = split_of(tmp_path)
+        train_lines = (tmp_path / "train.lst").read_text()
+
+        with StreamingSplitter(str(tmp_path)) as splitter:
+            for p in range(60):
+                splitter.add(f"P{p}", p % 2, f"P{p}/a.jpg")
+                splitter.add(f"P{p}", p % 2, f"P{p}/b.jpg")
+            added = splitter.summary()["added"]
+
+        after = split_of(tmp_path)
+        assert sum(added.values()) == 80
+        assert all(after[path] == name for path, name in before.items())
+        assert all(after[f"P{p}/b.jpg"] == after[f"P{p}/a.jpg"] for p in range(60))
+        assert (tmp_path / "train.lst").read_text().startswith(train_lines)
+        for name in ("train", "validation"):
+            indices = [e.index for e in commons.read_lst_file(str(tmp_path / f"{name}.lst"))]
+            assert indices == list(range(len(indices)))
+        assert len((tmp_path / ASSIGNMENTS_FILE).read_text().splitlines()) == 60
+
+    def test_duplicate_image_is_listed_once(self, tmp_path):
+        """Test that an already listed path is skipped"""
+        with StreamingSplitter(str(tmp_path)) as splitter:
+            assert splitter.add("P1", 1, "x.jpg") is not None
+            assert splitter.add("P1", 0, "x.jpg") is None
+
+        assert len(split_of(tmp_path)) == 1
+
+    def test_invalid_fractions(self, tmp_path):
+        """Test that fractions must be positive and sum to 1"""
+        with pytest.raises(ValueError):
+            StreamingSplitter(str(tmp_path), {"train": 0.8, "validation": 0.3})
+        with pytest.raises(ValueError):
+            StreamingSplitter(str(tmp_path), {"train": 1.0, "validation": 0.0})
+
+
+class TestSplitCsvFiles:
+    """Test suite for split_csv_files and export_splits"""
+
+    @pytest.fixture
+    def dataset(self, tmp_path):
+        jpeg = tmp_path / "jpeg"
+        rows = []
+        for i in range(30):
+            uid = f"1.3.6.1.4.{i}"
+            (jpeg / uid).mkdir(parents=True)
+            (jpeg / uid / "1-1.jpg").write_text("x")
+            rows.append({"patient_id": f"P{i // 2}", "pathology": "MALIGNANT" if i % 3 == 0 else "BENIGN",
+                         "image file path": f"a/{uid}/000000.dcm"})
+        rows.append({"patient_id": "P99", "pathology": "BENIGN", "image file path": "a/1.3.6.1.4.999/x.dcm"})
+        rows.append({"patient_id": "P98", "pathology": "UNKNOWN", "image file path": "a/1.3.6.1.4.0/x.dcm"})
+        index_path = tmp_path / "index.json"
+        index_images(str(jpeg), str(index_path))
+        return tmp_path, rows, str(index_path)
+
+    def test_single_pass_and_resume(self, dataset):
+        """Test that rows are linked to images and a grown CSV only appends new images"""
+        tmp_path, rows, index_path = dataset
+        first_csv, full_csv = tmp_path / "first.csv", tmp_path / "full.csv"
+        write_csv(first_csv, rows[:20])
+        write_csv(full_csv, rows)
+        lst_dir = tmp_path / "splits"
+
+        first = split_csv_files([str(first_csv)], index_path, str(lst_dir))
+        before = split_of(lst_dir)
+        second = split_csv_files([str(full_csv)], index_path, str(lst_dir))
+
+        assert first["rows"] == 20 and sum(first["added"].values()) == 20
+        assert second["rows"] == 32
+        assert second["existing"] == 20
+        assert second["unresolved"] == 2
+        assert sum(second["added"].values()) == 10
+        after = split_of(lst_dir)
+        assert len(after) == 30
+        assert all(after[path] == name for path, name in before.items())
+        assert Counter(after.values())["validation"] >= 4
+
+    def test_export_splits(self, dataset):
+        """Test that splits.json mirrors the .lst files"""
+        tmp_path, rows, index_path = dataset
+        csv_path = tmp_path / "d.csv"
+        write_csv(csv_path, rows)
+        split_csv_files([str(csv_path)], index_path, str(tmp_path / "splits"))
+
+        export_splits(str(tmp_path / "splits"), str(tmp_path / "splits.json"))
+
+        splits = json.loads((tmp_path / "splits.json").read_text())
+        assert sorted(splits) == ["train", "validation"]
+        assert {p: name for name, rows_ in splits.items() for _, p in rows_} == split_of(tmp_path / "splits")
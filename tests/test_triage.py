@@ -0,0 +1,156 @@
+"""
+Unit tests for app/src/data_utils/triage.py
+
+Tests cover:
+- TriageGate.check(): empty objects, non-images by magic bytes, unsupported formats,
+  truncated headers, thumbnails, undecodable bodies and blank scans are rejected;
+  real scans (JPEG/PNG) pass
+- preview_statistics(): reduced-resolution decode
+- Missing OpenCV: warning, header checks only, intensity_checked/intensity_skipped
+- metrics() / drain_ms(): per-reason counts, endpoint calls avoided and gate latency
+- reject_record(): reject result written instead of the model output
+"""
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from app.src.data_utils import triage
+from app.src.data_utils.triage import (
+    BLANK,
+    COUNTERS,
+    CORRUPT_HEADER,
+    EMPTY,
+    NOT_AN_IMAGE,
+    TOO_SMALL,
+    UNDECODABLE,
+    UNSUPPORTED_FORMAT,
+    TriageGate,
+    preview_statistics,
+    reject_record,
+)
+
+
+def encode(image, ext=".jpg"):
+    ok, buf = cv2.imencode(ext, image)
+    assert ok
+    return buf.tobytes()
+
+
+def scan(shape=(1024, 768)):
+    """Synthetic mammogram: dark background with a bright textured region"""
+    rng = np.random.default_rng(0)
+    image = np.full(shape, 10, np.uint8)
+    h, w = shape
+    image[h // 4:3 * h // 4, : w // 2] = rng.integers(90, 220, (h - 2 * (h // 4), w // 2), dtype=np.uint8)
+    return image
+
+
+class TestTriageGate:
+    """Test suite for TriageGate.check"""
+
+    @pytest.mark.parametrize("ext", [".jpg", ".png"])
+    def test_scan_is_accepted(self, ext):
+        """Test that a usable image passes every check"""
+        verdict = TriageGate().check(encode(scan(), ext))
+
+        assert verdict["accepted"] and verdict["reason"] is None and verdict["intensity_checked"]
+        assert (verdict["width"], verdict["height"]) == (768, 1024)
+        assert verdict["std"] > triage.MIN_STD and verdict["ms"] >= 0
+
+    @pytest.mark.parametrize("data, reason", [
+        (b"", EMPTY),
+        (b"%PDF-1.7\n" + b"x" * 500, NOT_AN_IMAGE),
+        (b"\x00" * 128 + b"DICM" + b"\x00" * 200, UNSUPPORTED_FORMAT),
+        (b"\xff\xd8\xff\xe0" + b"\x00" * 300, CORRUPT_HEADER),
+    ])
+    def test_header_rejections(self, data, reason):
+        """Test the checks that never decode pixels"""
+        verdict = TriageGate().check(data)
+
+        assert not verdict["accepted"]
+        assert verdict["reason"] == reason
+
+    def test_thumbnail_is_too_small(self):
+        """Test that dimensions come from the header"""
+        verdict = TriageGate().check(encode(scan((96, 64))))
+
+        assert verdict["reason"] == TOO_SMALL and verdict["detail"] == "64x96"
+        assert TriageGate(min_side=32).check(encode(scan((96, 64))))["accepted"]
+
+    @pytest.mark.parametrize("value", [0, 255, 128])
+    def test_blank_scan(self, value):
+        """Test that uniform images are rejected, with a little noise too"""
+        image = np.full((512, 512), value, np.uint8)
+        image[::50, ::50] = np.clip(int(value) + 40, 0, 255) if value < 255 else 200
+
+        verdict = TriageGate().check(encode(image, ".png"))
+
+        assert verdict["reason"] == BLANK
+
+    def test_truncated_body_is_undecodable(self):
+        """Test that a valid header with missing pixel data is rejected"""
+        data = encode(scan(), ".png")
+        verdict = TriageGate().check(data[:200])
+
+        assert verdict["reason"] == UNDECODABLE
+
+    def test_intensity_skipped_without_opencv(self, mocker, caplog):
+        """Test that a missing OpenCV is reported and blank scans are accepted unchecked"""
+        data = encode(np.zeros((512, 512), np.uint8))
+        mocker.patch.dict(sys.modules, {"cv2": None})
+        gate = TriageGate()
+
+        verdict = gate.check(data)
+        assert verdict["accepted"] and not verdict["intensity_checked"]
+        assert "OpenCV" in caplog.text
+        assert gate.check(b"not an image" * 20)["reason"] == NOT_AN_IMAGE
+        assert gate.metrics()["intensity_skipped"] == 1
+
+    def test_intensity_disabled(self):
+        """Test that intensity=False stops after the header checks"""
+        assert TriageGate(intensity=False).check(encode(np.zeros((512, 512), np.uint8)))["accepted"]
+
+
+class TestPreviewStatistics:
+    """Test suite for preview_statistics"""
+
+    def test_reduced_decode(self, mocker):
+        """Test that large JPEGs are decoded at 1/8 and small ones at full size"""
+        spy = mocker.spy(cv2, "imdecode")
+
+        preview_statistics(encode(scan((1024, 768))), 768, 1024)
+        preview_statistics(encode(scan((128, 128))), 128, 128)
+
+        assert spy.call_args_list[0].args[1] == cv2.IMREAD_REDUCED_GRAYSCALE_8
+        assert spy.call_args_list[1].args[1] == cv2.IMREAD_REDUCED_GRAYSCALE_2
+
+
+class TestMetrics:
+    """Test suite for metrics and reject_record"""
+
+    def test_counts_and_latency(self):
+        """Test that every rejection is counted as an avoided endpoint call"""
+        gate = TriageGate()
+        for data in (encode(scan()), b"", b"junk" * 100, encode(np.zeros((256, 256), np.uint8))):
+            gate.check(data)
+
+        metrics = gate.metrics()
+        assert (metrics["checked"], metrics["accepted"], metrics["rejected"]) == (4, 1, 3)
+        assert metrics["endpoint_calls_avoided"] == 3
+        assert metrics[f"rejected_{EMPTY}"] == metrics[f"rejected_{BLANK}"] == 1
+        assert metrics[f"rejected_{TOO_SMALL}"] == 0
+        assert 0 <= metrics["gate_ms_mean"] <= metrics["gate_ms_max"]
+        assert set(metrics) >= set(COUNTERS)
+
+        assert len(gate.drain_ms()) == 4
+        assert gate.drain_ms() == []
+
+    def test_reject_record(self):
+        """Test the record stored instead of the probabilities"""
+        verdict = TriageGate().check(b"")
+        record = reject_record("bucket", "entrada/x.jpg", verdict)
+
+        assert record["key"] == "entrada/x.jpg" and record["reason"] == EMPTY
+        assert "accepted" not in record and record["rejected_at"] > 0